@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+
+"""
+AFD Summarizer
+
+updateForecastDiscussion() refetches the Area Forecast Discussion on every
+refresh and scoreSentence() re-scores every sentence with ~80 `includes`
+checks (hazardSets, severityWords, timeframeWords) plus six regexes, even when
+the AFD product has not changed.
+
+This module produces the same "Weather Highlights" (top 3, de-duplicated) with:
+- one Aho-Corasick pass per sentence for every scoring term (the regexes only
+  run when the sentence can match them),
+- results memoized by AFD product ID: an unchanged index entry costs one small
+  request and no product fetch or scoring,
+- incremental updates: a reissued AFD usually changes one or two sections, so
+  sentence scores are carried over from the previous product and only new
+  sentences are scored,
+- a batch mode that summarizes every WFO's latest AFD in one run.
+
+Usage:
+    python3 afd_summarizer.py --office RAH
+    python3 afd_summarizer.py --all
+    python3 afd_summarizer.py --bench
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sys
+import time
+
+import upstream
+from alert_matcher import AhoCorasick, WinterAlertClassifier
+
+NO_SIGNIFICANT_WEATHER = 'No significant weather is expected.'
+ADMIN_SECTION = 'WATCHES/WARNINGS/ADVISORIES'
+MAX_HIGHLIGHTS = 3
+
+# Scoring tables (copied from updateForecastDiscussion)
+HAZARD_SETS = {
+    'tornado': ['tornado', 'tornadic', 'rotation', 'wall cloud'],
+    'wind': ['damaging wind', 'gusts', 'straight line wind', 'microburst', 'downburst', 'wind damage'],
+    'hail': ['large hail', 'hailstones', 'hail up to', 'hail of'],
+    'thunder': ['severe thunderstorm', 'strong storms', 'severe storms', 'convection'],
+    'flood': ['flash flood', 'flooding', 'heavy rain', 'torrential', 'excessive rainfall'],
+    'winter': [
+        'snow', 'snowfall', 'snowing', 'snowstorm', 'snow shower', 'snow squall',
+        'freezing rain', 'freezing drizzle', 'freezing precipitation',
+        'sleet', 'sleeting',
+        'ice', 'icing', 'black ice', 'ice accumulation', 'ice buildup',
+        'wintry', 'wintry mix', 'winter precipitation', 'winter conditions', 'winter weather',
+        'accumulating snow', 'snow accumulation', 'snowfall rates', 'snow totals',
+        'freezing temperatures', 'below freezing',
+        'wind chill', 'windchill',
+        'blizzard', 'whiteout',
+        'flurries', 'wintry precipitation',
+        'winter weather advisory', 'winter storm warning', 'ice storm warning',
+        'blizzard warning', 'freezing rain advisory', 'snow advisory'
+    ],
+    'heat': ['heat advisory', 'excessive heat', 'heat index'],
+    'cold': ['wind chill', 'hard freeze', 'freeze warning'],
+    'fog': ['dense fog', 'patchy fog'],
+    'tropical': ['tropical storm', 'hurricane', 'tropical depression']
+}
+SEVERITY_WORDS = ['warning', 'watch', 'advisory', 'moderate', 'enhanced', 'slight', 'marginal',
+                  'elevated', 'high risk', 'significant', 'severe']
+TIMEFRAME_WORDS = ['today', 'tonight', 'this afternoon', 'this evening', 'overnight', 'morning',
+                   'afternoon', 'evening', 'weekend', 'through', 'into', 'late', 'early',
+                   'mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+NEGATIVE_PHRASES = ['no significant', 'quiet pattern', 'benign', 'below normal hazards']
+
+_MPH_RE = re.compile(r'\b(\d{2,3})\s?mph\b', re.ASCII)
+_INCH_RE = re.compile(r'\b(\d(?:\.\d)?)\s?(in|inch|inches)\b', re.ASCII)
+_INCH_RANGE_RE = re.compile(r'\b(\d{1,2})\s?-\s?(\d{1,2})\s?(in|inch|inches)\b', re.ASCII)
+_NEGATIVE_RE = re.compile(r'no significant|quiet pattern|benign|below normal hazards')
+_NAVIGATION_RE = re.compile(r'HOME\s+FORECAST|Toggle\s+navigation', re.IGNORECASE)
+_DIGIT_RE = re.compile(r'[0-9]')
+
+_NEWLINES_RE = re.compile(r'\r\n|\r|\n')
+_TAG_RE = re.compile(r'<[^>]*>')
+# Boilerplate patterns, each with the literal(s) it needs: a pattern only runs
+# when one of its literals occurs in the lower-cased text. Replacing matches
+# with spaces never creates a new literal, so one check up front is enough.
+_SANITIZE_RES = [(re.compile(p, re.IGNORECASE), literals) for p, literals in (
+    (r'https?://\S+', ('http',)),
+    (r'\b(?:www\.)?weather\.gov\b', ('weather.gov',)),
+    (r'\bgov"?>', ('gov',)),
+    (r'\bHOME\s+FORECAST\b', ('home',)),
+    (r'\bPAST\s+WEATHER\b', ('past',)),
+    (r'\bSAFETY\s+INFORMATION\b', ('safety',)),
+    (r'\bEDUCATION\b', ('education',)),
+    (r'\bNEWS\b', ('news',)),
+    (r'\bSEARCH\b', ('search',)),
+    (r'\bToggle\s+navigation\b', ('toggle',)),
+    (r'\bUnited\s+States\s+Department\s+of\s+Commerce\b', ('commerce',)),
+    (r'\bNational\s+Weather\s+Service\b', ('national',)),
+    (r'\bNOAA\b', ('noaa',)),
+    (r'\b(?:png|gif|jpg|jpeg|svg)\b', ('png', 'gif', 'jpg', 'jpeg', 'svg')),
+    (r'alt="[^"]*"', ('alt=',)),
+    (r'"?\s*Wireless\s+Emergency\s+Alerts\s*"?', ('wireless',)),
+    (r'\(\s*Wireless\s+Emergency\s+Alerts\s*\)', ('wireless',))
+)]
+_MULTISPACE_RE = re.compile(r'\s{2,}')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_DEDUP_RE = re.compile(r'[^a-z0-9]+')
+
+
+def sanitize_afd(text):
+    """Normalize line breaks, cut at the W/W/A section and strip page boilerplate"""
+    normalized = _NEWLINES_RE.sub(' ', text)
+    index_admin = normalized.upper().find(ADMIN_SECTION)
+    truncated = normalized[:index_admin] if index_admin != -1 else normalized
+    sanitized = _TAG_RE.sub(' ', truncated)
+    lowered = sanitized.lower()
+    for pattern, literals in _SANITIZE_RES:
+        if any(literal in lowered for literal in literals):
+            sanitized = pattern.sub(' ', sanitized)
+    return _MULTISPACE_RE.sub(' ', sanitized).strip()
+
+
+def split_sentences(sanitized):
+    sentences = (_WHITESPACE_RE.sub(' ', s).strip() for s in _SENTENCE_SPLIT_RE.split(sanitized))
+    return [s for s in sentences if 20 < len(s) < 240]
+
+
+def score_sentence(sentence):
+    """scoreSentence(): reference port, one substring scan per term"""
+    s = sentence.lower()
+    score = 0
+    for terms in HAZARD_SETS.values():
+        for k in terms:
+            if k in s:
+                score += 3
+    for k in SEVERITY_WORDS:
+        if k in s:
+            score += 2
+    for k in TIMEFRAME_WORDS:
+        if k in s:
+            score += 1
+    if _MPH_RE.search(s):
+        score += 2
+    if _INCH_RE.search(s):
+        score += 2
+    if _INCH_RANGE_RE.search(s):
+        score += 2
+    if _NEGATIVE_RE.search(s):
+        score -= 3
+    if _NAVIGATION_RE.search(sentence):
+        score = -10
+    return score
+
+
+def top_highlights(sentences, scores, limit=MAX_HIGHLIGHTS):
+    """Rank by score (stable), keep score >= 3, de-duplicate on the first 80 normalized chars"""
+    ranked = sorted((item for item in zip(sentences, scores) if item[1] >= 3),
+                    key=lambda item: -item[1])
+    unique, seen = [], set()
+    for sentence, _ in ranked:
+        key = _DEDUP_RE.sub(' ', sentence.lower())[:80]
+        if key not in seen:
+            seen.add(key)
+            unique.append(sentence)
+        if len(unique) == limit:
+            break
+    return unique
+
+
+def afd_content(highlights):
+    """The afd-content innerHTML the dashboard renders"""
+    if highlights:
+        return 'Weather Highlights:<br>• ' + '<br>• '.join(highlights)
+    return NO_SIGNIFICANT_WEATHER
+
+
+def summarize_reference(text):
+    """Full updateForecastDiscussion() pipeline with the reference scorer"""
+    if not text:
+        return []
+    sentences = split_sentences(sanitize_afd(text))
+    return top_highlights(sentences, [score_sentence(s) for s in sentences])
+
+
+class SentenceScorer:
+    """scoreSentence() compiled into one automaton pass plus gated regexes"""
+
+    def __init__(self):
+        weights = {}
+        for terms, weight in ([(t, 3) for t in HAZARD_SETS.values()]
+                              + [(SEVERITY_WORDS, 2), (TIMEFRAME_WORDS, 1)]):
+            for term in terms:
+                # A term listed twice (e.g. 'wind chill') scores twice, like the JS loops
+                weights[term] = weights.get(term, 0) + weight
+        self.automaton = AhoCorasick(list(weights) + ['mph', 'home', 'toggle'] + NEGATIVE_PHRASES)
+        pid = {p: i for i, p in enumerate(self.automaton.patterns)}
+        self._weights = {pid[t]: w for t, w in weights.items()}
+        self._mph_id = pid['mph']
+        self._negative_ids = frozenset(pid[p] for p in NEGATIVE_PHRASES)
+        self._navigation_ids = frozenset((pid['home'], pid['toggle']))
+
+    def score(self, sentence):
+        s = sentence.lower()
+        found = self.automaton.match_ids(s)
+        if found & self._navigation_ids and _NAVIGATION_RE.search(sentence):
+            return -10
+        weights = self._weights
+        score = sum(weights.get(i, 0) for i in found)
+        if _DIGIT_RE.search(s):
+            if self._mph_id in found and _MPH_RE.search(s):
+                score += 2
+            if _INCH_RE.search(s):
+                score += 2
+            if _INCH_RANGE_RE.search(s):
+                score += 2
+        if found & self._negative_ids:
+            score -= 3
+        return score
+
+
+class AFDSummary:
+    """Summary of one AFD product"""
+
+    __slots__ = ('office', 'product_id', 'issued', 'highlights', 'winter', 'scored', 'reused')
+
+    def __init__(self, office, product_id, issued, highlights, winter, scored, reused):
+        self.office = office
+        self.product_id = product_id
+        self.issued = issued
+        self.highlights = highlights
+        self.winter = winter
+        self.scored = scored
+        self.reused = reused
+
+    @property
+    def content(self):
+        return afd_content(self.highlights)
+
+    def to_dict(self):
+        return {
+            'office': self.office,
+            'product_id': self.product_id,
+            'issued': self.issued,
+            'highlights': self.highlights,
+            'content': self.content,
+            'winter': self.winter
+        }
+
+
+class AFDSummarizer:
+    """Per-office summaries memoized by product ID, re-scoring only new sentences"""
+
+    def __init__(self, upstreams=None, fetcher=None, concurrency=8):
+        self.upstreams = upstreams or upstream.Upstreams()
+        self.fetcher = fetcher or upstream.fetch_json
+        self.concurrency = concurrency
+        self.scorer = SentenceScorer()
+        self.winter = WinterAlertClassifier()
+        self._summaries = {}   # office -> AFDSummary of its latest product
+        self._scores = {}      # office -> {sentence: score} for that product
+        self.product_fetches = 0
+
+    def summarize_text(self, text, office=None, product_id=None, issued=None):
+        """Summarize AFD text, reusing sentence scores from the office's previous product"""
+        sanitized = sanitize_afd(text or '')
+        sentences = split_sentences(sanitized)
+        previous = self._scores.get(office, {})
+        current, scores, scored = {}, [], 0
+        for sentence in sentences:
+            score = current.get(sentence)
+            if score is None:
+                score = previous.get(sentence)
+                if score is None:
+                    score = self.scorer.score(sentence)
+                    scored += 1
+                current[sentence] = score
+            scores.append(score)
+        if product_id is None:
+            product_id = 'sha1:' + hashlib.sha1((text or '').encode('utf-8')).hexdigest()
+        summary = AFDSummary(office, product_id, issued, top_highlights(sentences, scores),
+                             self.winter.detect_in_text(sanitized)['status'],
+                             scored, len(sentences) - scored)
+        self._scores[office] = current
+        self._summaries[office] = summary
+        return summary
+
+    def cached(self, office):
+        return self._summaries.get(office)
+
+    @staticmethod
+    def _latest_entry(index):
+        """(product_id, issued) of the newest product in an AFD index response"""
+        if not isinstance(index, dict):
+            return None, None
+        entries = index.get('@graph') or index.get('features') or []
+        if not entries or not isinstance(entries[0], dict):
+            return None, None
+        entry = entries[0]
+        props = entry.get('properties') if isinstance(entry.get('properties'), dict) else entry
+        product_id = props.get('id') or entry.get('id') or props.get('@id') or entry.get('@id')
+        if not isinstance(product_id, str) or not product_id:
+            return None, None
+        return product_id.rstrip('/').rsplit('/', 1)[-1], props.get('issuanceTime')
+
+    async def summarize_office(self, office):
+        """Latest AFD summary for one office; the product is only fetched when its ID changes"""
+        try:
+            index = await self.fetcher(self.upstreams.afd_index_url(office), upstream.NWS_HEADERS,
+                                       upstream.TIMEOUTS['afd'])
+        except upstream.UpstreamError:
+            return self._summaries.get(office)
+        product_id, issued = self._latest_entry(index)
+        if product_id is None:
+            return self._summaries.get(office)
+        cached = self._summaries.get(office)
+        if cached is not None and cached.product_id == product_id:
+            return cached
+        try:
+            product = await self.fetcher(self.upstreams.product_url(product_id), upstream.NWS_HEADERS,
+                                         upstream.TIMEOUTS['afd'])
+        except upstream.UpstreamError:
+            return cached
+        self.product_fetches += 1
+        text = ''
+        if isinstance(product, dict):
+            text = product.get('productText') or (product.get('properties') or {}).get('productText') or ''
+            issued = issued or product.get('issuanceTime')
+        return self.summarize_text(text, office, product_id, issued)
+
+    async def offices(self):
+        """Every office that issues an AFD"""
+        data = await self.fetcher(self.upstreams.afd_locations_url(), upstream.NWS_HEADERS,
+                                  upstream.TIMEOUTS['afd'])
+        return sorted((data or {}).get('locations') or {})
+
+    async def summarize_all(self, offices=None):
+        """Summaries for many offices in one run; at most `concurrency` requests in flight"""
+        if offices is None:
+            offices = await self.offices()
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def one(office):
+            async with limit:
+                return office, await self.summarize_office(office)
+
+        return dict(await asyncio.gather(*(one(office) for office in offices)))
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+_SYNTHETIC_SENTENCES = [
+    'A cold front will approach from the west this afternoon with scattered convection developing.',
+    'Damaging wind gusts of 60 mph and large hail up to 1.5 inches are possible with the strongest storms.',
+    'An isolated tornado cannot be ruled out this evening given strong low-level rotation.',
+    'Heavy rain may lead to localized flooding in urban and poor drainage areas overnight.',
+    'High pressure builds in Wednesday with a quiet pattern and no significant weather expected.',
+    'Temperatures will run a few degrees above normal through the weekend.',
+    'Light snow may mix with sleet early Friday morning, with little or no accumulation.',
+    'Dewpoints in the upper 60s will support moderate instability by late afternoon.',
+    'Winds will become northwest at 10 to 15 mph behind the front.',
+    'Patchy fog is possible late tonight in the river valleys.',
+    'The SPC has placed the area in a slight risk for severe storms today.',
+    'Rain totals of 1-2 inches are expected along and east of Interstate 95.',
+]
+
+
+def synthetic_afd(seed=0, sections=6, per_section=12):
+    """AFD-shaped product text (section headers, 60-70 char lines, && separators)"""
+    rng = random.Random(seed)
+    names = ['SYNOPSIS', 'NEAR TERM /THROUGH TONIGHT/', 'SHORT TERM /MONDAY THROUGH TUESDAY/',
+             'LONG TERM /WEDNESDAY THROUGH SUNDAY/', 'AVIATION /12Z TAF PERIOD/', 'FIRE WEATHER',
+             'HYDROLOGY', 'CLIMATE']
+    parts = ['000\nFXUS62 KRAH 011200\nAFDRAH\n\nArea Forecast Discussion\n'
+             'National Weather Service Raleigh NC\n800 AM EDT Mon Jun 1 2026\n']
+    for i in range(sections):
+        body = ' '.join(rng.choice(_SYNTHETIC_SENTENCES)[:-1] + f' (ref {seed}-{i}-{j}).'
+                        for j in range(per_section))
+        lines, line = [], ''
+        for word in body.split():
+            if len(line) + len(word) > 66:
+                lines.append(line)
+                line = word
+            else:
+                line = (line + ' ' + word).strip()
+        lines.append(line)
+        parts.append('.' + names[i % len(names)] + '...\n' + '\n'.join(lines) + '\n\n&&\n')
+    parts.append('.RAH WATCHES/WARNINGS/ADVISORIES...\nNone.\n\n$$\n')
+    return '\n'.join(parts)
+
+
+def update_section(text, section_index, seed):
+    """Same product with one section rewritten (what a routine AFD update looks like)"""
+    sections = text.split('&&')
+    fresh = synthetic_afd(seed, sections=len(sections) - 1).split('&&')
+    sections[section_index] = fresh[section_index]
+    return '&&'.join(sections)
+
+
+def benchmark(offices=120, repeat=3, out=sys.stdout):
+    """Reference re-score of every office's AFD vs compiled + incremental scoring"""
+    products = [synthetic_afd(seed) for seed in range(offices)]
+    updates = [update_section(text, 2, seed + 10000) for seed, text in enumerate(products)]
+
+    def reference():
+        for text in products + updates:
+            summarize_reference(text)
+
+    summarizer = AFDSummarizer()
+
+    def compiled():
+        for seed, text in enumerate(products):
+            summarizer._scores.pop(seed, None)
+            summarizer.summarize_text(text, office=seed)
+        for seed, text in enumerate(updates):
+            summarizer.summarize_text(text, office=seed)
+
+    timings = {}
+    for label, fn in (('reference', reference), ('compiled', compiled)):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        timings[label] = best
+        print(f"{label:<10} {best * 1000:8.1f} ms for {offices} offices (issue + one-section update)", file=out)
+    rescored = sum(summarizer.cached(seed).scored for seed in range(offices))
+    total = sum(summarizer.cached(seed).scored + summarizer.cached(seed).reused for seed in range(offices))
+    print(f"update re-scored {rescored}/{total} sentences", file=out)
+    return timings
+
+
+async def _run(args):
+    summarizer = AFDSummarizer()
+    if args.all:
+        results = await summarizer.summarize_all()
+    else:
+        results = {args.office: await summarizer.summarize_office(args.office)}
+    print(json.dumps({office: summary.to_dict() if summary else None
+                      for office, summary in results.items()}, indent=2))
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Incremental AFD highlight summarizer')
+    parser.add_argument('--office', default=upstream.NWS_OFFICE)
+    parser.add_argument('--all', action='store_true', help='summarize every WFO')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--offices', type=int, default=120, help='offices in the benchmark')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.offices)
+    else:
+        asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
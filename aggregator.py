@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+"""
+Upstream Aggregation Proxy
+
+Fetches every upstream the forecast widget needs (Open-Meteo, NWS gridpoint,
+NWS hourly forecast, NWS alerts, SPC risk) once per refresh cycle and serves
+one combined JSON document to any number of clients.
+
+- Each source has its own refresh interval and timeout; stale sources are
+  refreshed concurrently.
+- Concurrent callers that need the same source share one in-flight request
+  (request coalescing), so a burst of viewers never multiplies upstream load.
+- A failed source keeps its last good payload and is reported as cached.
+- Optionally, upstream bodies go through http_cache.HttpCache (--cache-dir):
+  revalidated with ETag/Last-Modified and kept on disk across restarts.
+- Optionally (--metrics), upstream latencies and the decode / classify /
+  encode stages feed instrumentation.Metrics, served at /metrics
+  (Prometheus text) and /metrics.json.
+
+Usage:
+    python3 aggregator.py --port 8080
+    curl http://localhost:8080/api/snapshot
+"""
+
+import argparse
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import json
+import sys
+import time
+
+import asyncio_http
+import http_cache
+import instrumentation
+import upstream
+from dashboard_logic import spc_code_for_dn, summarize_alerts
+
+try:
+    from zoneinfo import ZoneInfo
+    LOCAL_TZ = ZoneInfo('America/New_York')
+except Exception:  # tzdata missing: fall back to EDT like etOffset()'s default
+    LOCAL_TZ = datetime.timezone(datetime.timedelta(hours=-4))
+
+SNAPSHOT_VERSION = 1
+
+# Seconds before each source is considered stale. Mirrors the widget cadences:
+# 15-min Open-Meteo cycle, 10-min NWS cache, 3-min alert/SPC polling.
+REFRESH_INTERVALS = {
+    'open_meteo': 900,
+    'gridpoint': 600,
+    'hourly': 600,
+    'alerts': 180,
+    'spc': 180
+}
+
+
+def forecast_dates(n=7, now=None):
+    """Local (Eastern) calendar dates for the day tabs, like dates(n)"""
+    today = (now or datetime.datetime.now(LOCAL_TZ)).date()
+    return [(today + datetime.timedelta(days=i)).isoformat() for i in range(n)]
+
+
+class Coalescer:
+    """Single-flight: concurrent calls with the same key share one task"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.joined = 0
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.started += 1
+
+            def _forget(done, key=key):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+            task.add_done_callback(_forget)
+        else:
+            self.joined += 1
+        # shield: one impatient caller being cancelled must not cancel the others
+        return await asyncio.shield(task)
+
+
+class SourceState:
+    """Last known payload and health of one upstream"""
+
+    __slots__ = ('name', 'data', 'fetched_at', 'ok', 'error', 'requests', 'failures')
+
+    def __init__(self, name):
+        self.name = name
+        self.data = None
+        self.fetched_at = 0.0
+        self.ok = False
+        self.error = None
+        self.requests = 0
+        self.failures = 0
+
+    def status(self, now):
+        """Live vs cached state for the snapshot (see RESILIENCE_AND_ACCURACY_ASSESSMENT.md)"""
+        if self.data is None:
+            state = 'unavailable'
+        else:
+            state = 'live' if self.ok else 'cached'
+        return {
+            'state': state,
+            'fetched_at': self.fetched_at or None,
+            'age_s': round(now - self.fetched_at, 1) if self.fetched_at else None,
+            'error': self.error
+        }
+
+
+class Aggregator:
+    """Shared, coalesced fetch of all widget upstreams"""
+
+    def __init__(self, upstreams=None, intervals=None, days=7, fetcher=None, clock=time.time, cache=None,
+                 metrics=None):
+        self.upstreams = upstreams or upstream.Upstreams()
+        self.intervals = dict(REFRESH_INTERVALS)
+        self.intervals.update(intervals or {})
+        self.days = days
+        # fetcher(url, headers, timeout) -> parsed JSON, raising UpstreamError on failure
+        self.fetcher = fetcher or upstream.fetch_json
+        self.clock = clock
+        # Optional http_cache.HttpCache; replaces the fetcher when set
+        self.cache = cache
+        # Optional instrumentation.Metrics (a cache's own fetch must be wrapped by the caller)
+        self.metrics = metrics
+        if metrics is not None:
+            self.fetcher = metrics.wrap_fetch(self.fetcher)
+        self.sources = {name: SourceState(name) for name in REFRESH_INTERVALS}
+        self.coalescer = Coalescer()
+        self._snapshot = None
+        self._snapshot_body = b''
+        self._snapshot_etag = ''
+        self._dirty = True
+
+    # ── Source definitions ───────────────────────────────────────────────
+
+    def _request_for(self, name, dates):
+        u = self.upstreams
+        if name == 'open_meteo':
+            return u.open_meteo(dates[0], dates[-1]), {}, upstream.TIMEOUTS['open_meteo']
+        if name == 'gridpoint':
+            return u.gridpoint_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['gridpoint']
+        if name == 'hourly':
+            return u.hourly_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['hourly']
+        if name == 'alerts':
+            return u.alerts_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['alerts']
+        if name == 'spc':
+            return u.spc_query_url(), {}, upstream.TIMEOUTS['spc']
+        raise KeyError(name)
+
+    @staticmethod
+    def _extract(name, data):
+        """Pull the part of each payload the widget uses (None if malformed)"""
+        if not isinstance(data, dict):
+            return None
+        if name == 'open_meteo':
+            return data.get('hourly') if isinstance(data.get('hourly'), dict) else None
+        if name == 'gridpoint':
+            return data.get('properties') if isinstance(data.get('properties'), dict) else None
+        if name == 'hourly':
+            props = data.get('properties')
+            periods = props.get('periods') if isinstance(props, dict) else None
+            return periods if isinstance(periods, list) else None
+        if name == 'alerts':
+            return data.get('features') if isinstance(data.get('features'), list) else None
+        if name == 'spc':
+            features = data.get('features')
+            if not isinstance(features, list):
+                return None
+            if not features:
+                return {'risk': None}
+            attrs = features[0].get('attributes') if isinstance(features[0], dict) else None
+            dn = attrs.get('dn') if isinstance(attrs, dict) else None
+            return {'risk': spc_code_for_dn(dn), 'dn': dn}
+        return None
+
+    # ── Refresh ──────────────────────────────────────────────────────────
+
+    def stale_sources(self, now=None):
+        now = self.clock() if now is None else now
+        return [name for name, state in self.sources.items()
+                if now - state.fetched_at >= self.intervals[name]]
+
+    async def _fetch_source(self, name, dates):
+        state = self.sources[name]
+        url, headers, timeout = self._request_for(name, dates)
+        state.requests += 1
+        cached_error = None
+        try:
+            if self.cache is not None:
+                data, resp = await self.cache.get_json(url, name, headers, timeout, allow_stale=False)
+                if resp.state != 'live':
+                    # Upstream failed but the disk cache still holds a usable copy
+                    cached_error = resp.error
+            else:
+                data = await self.fetcher(url, headers, timeout)
+            with self._span('decode', source=name):
+                extracted = self._extract(name, data)
+            if extracted is None:
+                raise upstream.UpstreamError(url, 'Invalid response structure')
+        except upstream.UpstreamError as e:
+            # Keep last good data; retry on the next cycle
+            state.ok = False
+            state.error = str(e)
+            state.failures += 1
+            state.fetched_at = self.clock()
+            self._dirty = True
+            return False
+        state.data = extracted
+        state.ok = cached_error is None
+        state.error = cached_error
+        if cached_error is not None:
+            state.failures += 1
+        state.fetched_at = self.clock()
+        self._dirty = True
+        return state.ok
+
+    def _span(self, stage, **labels):
+        return self.metrics.span(stage, **labels) if self.metrics is not None else contextlib.nullcontext()
+
+    async def refresh(self, force=False):
+        """Refresh stale sources concurrently; returns the names that were fetched"""
+        names = list(self.sources) if force else self.stale_sources()
+        if not names:
+            return []
+        dates = forecast_dates(self.days)
+        await asyncio.gather(*(
+            self.coalescer.run(('source', name),
+                               lambda name=name: self._fetch_source(name, dates))
+            for name in names))
+        return names
+
+    # ── Snapshot ─────────────────────────────────────────────────────────
+
+    def build_snapshot(self):
+        """Combine the current source payloads into one document"""
+        now = self.clock()
+        src = self.sources
+        alerts = src['alerts'].data or []
+        spc_risk = src['spc'].data['risk'] if src['spc'].data else None
+        return {
+            'version': SNAPSHOT_VERSION,
+            'generated_at': now,
+            'location': {
+                'lat': self.upstreams.lat, 'lon': self.upstreams.lon,
+                'gridpoint': self.upstreams.gridpoint, 'zone': self.upstreams.zone
+            },
+            'dates': forecast_dates(self.days),
+            # Same "all sources null" rule as fetchAll() -> showError()
+            'ok': any(src[n].data is not None for n in ('open_meteo', 'gridpoint', 'hourly')),
+            'sources': {name: state.status(now) for name, state in src.items()},
+            'open_meteo': src['open_meteo'].data,
+            'gridpoint': src['gridpoint'].data,
+            'hourly': src['hourly'].data or [],
+            'alerts': alerts,
+            'summary': summarize_alerts(alerts, spc_risk)
+        }
+
+    async def snapshot_body(self):
+        """Refresh if needed and return (json_bytes, etag); encoded once per change"""
+        await self.coalescer.run(('refresh',), self.refresh)
+        if self._dirty or self._snapshot is None:
+            with self._span('classify'):
+                self._snapshot = self.build_snapshot()
+            with self._span('encode'):
+                self._snapshot_body = json.dumps(self._snapshot, separators=(',', ':')).encode('utf-8')
+            self._snapshot_etag = '"' + hashlib.sha1(self._snapshot_body).hexdigest()[:16] + '"'
+            self._dirty = False
+        return self._snapshot_body, self._snapshot_etag
+
+    async def snapshot(self):
+        await self.snapshot_body()
+        return self._snapshot
+
+    def upstream_request_counts(self):
+        return {name: state.requests for name, state in self.sources.items()}
+
+    async def run_forever(self, tick=15.0):
+        """Background refresh so clients rarely wait on an upstream"""
+        while True:
+            try:
+                await self.snapshot_body()
+            except Exception as e:  # never let the refresh loop die
+                print(f"refresh error: {e}", file=sys.stderr)
+            await asyncio.sleep(tick)
+
+
+class AggregatorServer:
+    """Serves the aggregated snapshot over HTTP"""
+
+    def __init__(self, aggregator, max_age=60):
+        self.aggregator = aggregator
+        self.max_age = max_age
+        self.server = None
+
+    async def handle(self, reader, writer):
+        request = await asyncio_http.read_request(reader)
+        if request is None:
+            writer.close()
+            return
+        if request.method not in ('GET', 'HEAD'):
+            await asyncio_http.write_json(writer, 405, b'{"error":"method not allowed"}')
+            return
+        head_only = request.method == 'HEAD'
+        if request.path in ('/api/snapshot', '/api/snapshot.json'):
+            body, etag = await self.aggregator.snapshot_body()
+            headers = {'ETag': etag, 'Cache-Control': f'public, max-age={self.max_age}'}
+            if request.headers.get('if-none-match') == etag:
+                await asyncio_http.write_response(writer, 304, b'', headers)
+                return
+            await asyncio_http.write_json(writer, 200, body, headers, head_only)
+        elif request.path == '/healthz':
+            now = self.aggregator.clock()
+            body = json.dumps({name: s.status(now) for name, s in self.aggregator.sources.items()})
+            await asyncio_http.write_json(writer, 200, body.encode('utf-8'), None, head_only)
+        elif request.path == '/metrics' and self.aggregator.metrics is not None:
+            body = self.aggregator.metrics.prometheus_text().encode('utf-8')
+            await asyncio_http.write_response(
+                writer, 200, body, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}, head_only)
+        elif request.path == '/metrics.json' and self.aggregator.metrics is not None:
+            await asyncio_http.write_json(writer, 200, self.aggregator.metrics.json_bytes(), None, head_only)
+        else:
+            await asyncio_http.write_json(writer, 404, b'{"error":"not found"}')
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+async def _serve(args):
+    upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+    metrics = instrumentation.Metrics() if args.metrics else None
+    cache_fetch = metrics.wrap_fetch(upstream.fetch) if metrics is not None else None
+    cache = http_cache.HttpCache(args.cache_dir, fetch=cache_fetch) if args.cache_dir else None
+    aggregator = Aggregator(upstreams, cache=cache, metrics=metrics)
+    server = AggregatorServer(aggregator, max_age=args.max_age)
+    port = await server.start(args.host, args.port)
+    print(f"Serving aggregated snapshot on http://{args.host}:{port}/api/snapshot")
+    refresher = asyncio.create_task(aggregator.run_forever())
+    try:
+        await server.server.serve_forever()
+    finally:
+        refresher.cancel()
+        if cache is not None:
+            await cache.drain()  # last index write
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='MebaneWeather upstream aggregation proxy')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-age', type=int, default=60, help='Cache-Control max-age for clients')
+    parser.add_argument('--upstream', help='Send every upstream request to this base URL (stand-in server)')
+    parser.add_argument('--cache-dir', help='Persist upstream responses here and revalidate them conditionally')
+    parser.add_argument('--metrics', action='store_true', help='Record latencies and serve /metrics')
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+"""
+Winter-Weather Alert Matcher
+
+is_winter_weather_alert() runs 26 substring scans per event, and
+detect_winter_weather_from_alerts() then rescans the same text for warning,
+watch, advisory and statement. detectWinterWeatherInText() adds another ~90
+scans for the phenomena and severity lists.
+
+This module compiles every one of those terms into a single Aho-Corasick
+automaton (a flattened DFA: one dict lookup per character), so each event or
+text is classified in one pass. Event names repeat heavily in a state-wide
+feed (hundreds of alerts, a dozen distinct events), so event classifications
+are also memoized.
+
+Results are identical to dashboard_logic: same status, same priority.
+
+Usage:
+    python3 alert_matcher.py --bench
+"""
+
+import argparse
+import collections
+import random
+import sys
+import time
+from functools import lru_cache
+
+from dashboard_logic import (
+    WINTER_TEXT_WARNING_PATTERNS,
+    WINTER_WEATHER_SYNONYMS,
+    detect_winter_weather_from_alerts,
+    detect_winter_weather_in_text,
+)
+
+CATEGORY_WORDS = ('warning', 'watch', 'advisory', 'statement')
+
+# Higher wins when several alerts are present
+STATUS_PRIORITY = {'none': 0, 'advisory': 1, 'warning': 2}
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: which patterns occur anywhere in a text"""
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))  # unique, order kept
+        goto = [{}]
+        out = [set()]
+        for pid, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(set())
+                state = nxt
+            out[state].add(pid)
+
+        # Breadth-first failure links, folded into a full transition table so
+        # matching never walks fail chains
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            f = fail[state]
+            out[state] |= out[f]
+            row = dict(delta[f])
+            row.update(goto[state])
+            delta[state] = row
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[f].get(ch, 0) if state else 0
+                queue.append(nxt)
+        self._delta = delta
+        self._out = [frozenset(o) for o in out]
+        self._has_out = [bool(o) for o in out]
+
+    def match_ids(self, text):
+        """Set of pattern ids found in text (one pass)"""
+        delta, out, has_out = self._delta, self._out, self._has_out
+        found = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if has_out[state]:
+                found |= out[state]
+        return found
+
+    def matches(self, text):
+        """Set of pattern strings found in text"""
+        return {self.patterns[pid] for pid in self.match_ids(text)}
+
+
+class WinterAlertClassifier:
+    """One automaton over the alert, phenomena, severity and category term lists"""
+
+    def __init__(self, synonyms=None):
+        synonyms = synonyms or WINTER_WEATHER_SYNONYMS
+        self.alert_terms = list(synonyms['alerts'])
+        self.phenomena_terms = list(synonyms['phenomena'])
+        self.severity_terms = list(synonyms['severity'])
+        self.automaton = AhoCorasick(self.alert_terms + self.phenomena_terms + self.severity_terms
+                                     + list(CATEGORY_WORDS) + WINTER_TEXT_WARNING_PATTERNS)
+        pid = {p: i for i, p in enumerate(self.automaton.patterns)}
+        self._alert_ids = frozenset(pid[t] for t in self.alert_terms)
+        self._category_ids = {word: pid[word] for word in CATEGORY_WORDS}
+        self._warning_pattern_ids = frozenset(pid[t] for t in WINTER_TEXT_WARNING_PATTERNS)
+        # Text scoring weights per pattern id; list duplicates count twice, like the JS loops
+        self._text_weights = {}
+        for terms, weight in ((self.phenomena_terms, 2), (self.severity_terms, 1), (self.alert_terms, 3)):
+            for term in terms:
+                self._text_weights[pid[term]] = self._text_weights.get(pid[term], 0) + weight
+        self._warning_term_ids = frozenset(
+            [pid['imminent'], pid['occurring']]
+            + [pid[t] for t in self.alert_terms
+               if 'warning' in t and 'watch' not in t and 'advisory' not in t])
+        self._advisory_term_ids = frozenset(
+            pid[t] for t in self.alert_terms
+            if not ('warning' in t and 'watch' not in t and 'advisory' not in t)
+            and ('advisory' in t or 'watch' in t or 'statement' in t))
+        self._fallback_advisory_ids = frozenset(
+            pid[t] for t in ('winter weather advisory', 'winter storm watch', 'winter weather statement'))
+        self.classify_event = lru_cache(maxsize=1024)(self._classify_event)
+
+    def _classify_event(self, event_lower):
+        """(is_winter, kind) for a lower-cased event; kind is 'warning', 'advisory', 'watch' or None"""
+        found = self.automaton.match_ids(event_lower)
+        if not (found & self._alert_ids):
+            return False, None
+        cat = self._category_ids
+        has = {word: cat[word] in found for word in CATEGORY_WORDS}
+        if has['warning'] and not (has['watch'] or has['advisory'] or has['statement']):
+            return True, 'warning'
+        if has['advisory'] or has['statement']:
+            return True, 'advisory'
+        if has['watch']:
+            return True, 'watch'  # advisory unless the alert's severity is 'severe'
+        return True, None
+
+    def is_winter_weather_alert(self, event_name):
+        if not event_name or not isinstance(event_name, str):
+            return False
+        return self.classify_event(event_name.lower())[0]
+
+    def classify_alert(self, alert):
+        """'warning', 'advisory' or None for one alert feature"""
+        if not alert or not isinstance(alert, dict) or not isinstance(alert.get('properties'), dict):
+            return None
+        props = alert['properties']
+        event = props.get('event') if isinstance(props.get('event'), str) else ''
+        if not event:
+            return None
+        winter, kind = self.classify_event(event.lower())
+        if not winter:
+            return None
+        if kind == 'watch':
+            severity = props.get('severity')
+            return 'advisory' if not (isinstance(severity, str) and severity.lower() == 'severe') else None
+        return kind
+
+    def classify_stream(self, alerts):
+        """Yield (alert, classification) for an iterable of alerts (e.g. a streamed feed)"""
+        for alert in alerts:
+            yield alert, self.classify_alert(alert)
+
+    def detect(self, alerts):
+        """Same result as detect_winter_weather_from_alerts, in one pass over any iterable"""
+        if alerts is None or isinstance(alerts, (str, bytes, dict)):
+            return {'status': 'none', 'has_advisory': False, 'has_warning': False}
+        has_advisory = False
+        for _, kind in self.classify_stream(alerts):
+            if kind == 'warning':
+                # Warning outranks everything; no need to read the rest of the stream
+                return {'status': 'warning', 'has_advisory': True, 'has_warning': True}
+            if kind == 'advisory':
+                has_advisory = True
+        if has_advisory:
+            return {'status': 'advisory', 'has_advisory': True, 'has_warning': False}
+        return {'status': 'none', 'has_advisory': False, 'has_warning': False}
+
+    def detect_in_text(self, text):
+        """Same result as detect_winter_weather_in_text, in one pass"""
+        if not text or not isinstance(text, str):
+            return {'status': 'none', 'confidence': 0}
+        found = self.automaton.match_ids(text.lower())
+        score = sum(self._text_weights.get(pid, 0) for pid in found)
+        if score >= 5:
+            if found & self._warning_term_ids or found & self._warning_pattern_ids:
+                return {'status': 'warning', 'confidence': min(score, 10)}
+            if found & self._advisory_term_ids or found & self._fallback_advisory_ids:
+                return {'status': 'advisory', 'confidence': min(score, 8)}
+            return {'status': 'advisory', 'confidence': min(score, 6)}
+        return {'status': 'none', 'confidence': 0}
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+SAMPLE_EVENTS = [
+    'Winter Storm Warning', 'Winter Weather Advisory', 'Ice Storm Warning', 'Wind Chill Advisory',
+    'Freeze Warning', 'Winter Storm Watch', 'Special Weather Statement', 'Flood Watch',
+    'Wind Advisory', 'Hazardous Weather Outlook', 'Dense Fog Advisory', 'Extreme Cold Warning',
+    'Severe Thunderstorm Warning', 'Tornado Watch', 'Coastal Flood Advisory', 'Gale Warning'
+]
+
+
+def synthetic_feed(n, seed=0, winter_warning=False):
+    """State-wide alert list; by default without a winter warning (worst case: no early exit)"""
+    rng = random.Random(seed)
+    events = [e for e in SAMPLE_EVENTS if winter_warning or not (
+        'warning' in e.lower() and any(t in e.lower() for t in WINTER_WEATHER_SYNONYMS['alerts']))]
+    return [{'id': f'urn:oid:{i}', 'properties': {
+        'event': rng.choice(events), 'severity': rng.choice(['Minor', 'Moderate', 'Severe'])}}
+        for i in range(n)]
+
+
+def benchmark(n_alerts=500, repeat=20, out=sys.stdout):
+    feed = synthetic_feed(n_alerts)
+    classifier = WinterAlertClassifier()
+    for label, fn in (('substring scans', detect_winter_weather_from_alerts),
+                      ('automaton', classifier.detect)):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(feed)
+            best = min(best, time.perf_counter() - t0)
+        print(f"{label:<16} {best * 1000:7.3f} ms for {n_alerts} alerts", file=out)
+    text = ' '.join(['Snow and sleet are expected tonight with hazardous travel developing.'] * 40)
+    for label, fn in (('text scans', detect_winter_weather_in_text),
+                      ('text automaton', classifier.detect_in_text)):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(text)
+            best = min(best, time.perf_counter() - t0)
+        print(f"{label:<16} {best * 1000:7.3f} ms for {len(text)} chars", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Single-pass winter-weather alert classifier')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--alerts', type=int, default=500)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.alerts)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
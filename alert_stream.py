@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+
+"""
+Alert Delta Stream
+
+The severe dashboard re-downloads alerts/active every 180000 ms from
+initialize(), and the forecast widget does the same on its own 3-minute timer,
+so every client pulls the full document even when nothing changed, and a new
+Tornado Warning can take up to three minutes to show up.
+
+This service polls NWS once for everyone, diffs successive alert sets by alert
+ID and (sent, expires), and pushes only what changed over Server-Sent Events:
+- `added`, `updated` and `expired` alerts plus the summarize_alerts() summary
+  (the same display/warning filtering and winter detection the dashboard uses),
+- each event is JSON-encoded once and written to every connection as the same
+  bytes; a client whose socket buffer backs up past MAX_CLIENT_BUFFER is
+  dropped instead of slowing everyone else down,
+- reconnecting EventSource clients send Last-Event-ID and get the missed
+  deltas from a short history, or a fresh snapshot if they fell too far behind.
+
+A failed or malformed poll keeps the current set: an outage never reads as
+"all alerts expired".
+
+Usage:
+    python3 alert_stream.py --port 8090
+    curl -N http://localhost:8090/api/alerts/stream
+    python3 alert_stream.py --bench --clients 10000
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import hashlib
+import json
+import multiprocessing
+import random
+import resource
+import selectors
+import socket
+import sys
+import time
+
+import asyncio_http
+import upstream
+from dashboard_logic import filter_display_alerts, filter_warning_alerts, summarize_alerts
+
+POLL_INTERVAL = 60.0
+HEARTBEAT_INTERVAL = 15.0
+HISTORY_SIZE = 256
+MAX_CLIENT_BUFFER = 256 * 1024
+RETRY_MS = 5000
+
+# Alert properties forwarded to clients (the widgets only read a handful)
+ALERT_FIELDS = ('id', 'event', 'severity', 'urgency', 'certainty', 'headline', 'areaDesc',
+                'sent', 'effective', 'onset', 'expires', 'ends', 'messageType', 'senderName')
+
+SSE_HEADERS = {
+    'Content-Type': 'text/event-stream; charset=utf-8',
+    'Cache-Control': 'no-cache',
+    'Access-Control-Allow-Origin': '*',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def alert_id(alert):
+    """Stable alert ID (feature id, falling back to properties.id)"""
+    if not isinstance(alert, dict):
+        return None
+    props = alert.get('properties') if isinstance(alert.get('properties'), dict) else {}
+    return alert.get('id') or props.get('id')
+
+
+def _parse_time(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.timestamp() if parsed.tzinfo else None
+
+
+def compact_alert(alert):
+    """What a client needs from one alert feature, with the dashboard's filter results"""
+    props = alert['properties']
+    return {
+        'id': alert_id(alert),
+        'properties': {k: props[k] for k in ALERT_FIELDS if k in props},
+        'display': bool(filter_display_alerts([alert])),
+        'warning': bool(filter_warning_alerts([alert]))
+    }
+
+
+class AlertDiffer:
+    """Current alert set and the delta from one poll to the next"""
+
+    def __init__(self, spc_risk=None):
+        self.alerts = {}       # id -> raw feature
+        self.versions = {}     # id -> (sent, expires)
+        self.compact = {}      # id -> compact_alert()
+        self.spc_risk = spc_risk
+        self.summary = summarize_alerts([], spc_risk)
+
+    def apply(self, features, now=None):
+        """Diff a new alerts/active feature list; returns a delta dict or None if unchanged"""
+        now = time.time() if now is None else now
+        incoming = {}
+        for feature in features:
+            aid = alert_id(feature)
+            if aid is None or not isinstance(feature.get('properties'), dict):
+                continue
+            expires = _parse_time(feature['properties'].get('expires'))
+            if expires is not None and expires <= now:
+                continue   # still listed upstream but past its expiry
+            incoming.setdefault(aid, feature)
+
+        added, updated = [], []
+        for aid, feature in incoming.items():
+            props = feature['properties']
+            version = (props.get('sent'), props.get('expires'))
+            previous = self.versions.get(aid)
+            if previous == version:
+                continue
+            self.alerts[aid] = feature
+            self.versions[aid] = version
+            self.compact[aid] = compact_alert(feature)
+            (added if previous is None else updated).append(self.compact[aid])
+        expired = [aid for aid in self.alerts if aid not in incoming]
+        for aid in expired:
+            del self.alerts[aid], self.versions[aid], self.compact[aid]
+
+        if not (added or updated or expired):
+            return None
+        self.summary = summarize_alerts(list(self.alerts.values()), self.spc_risk)
+        return {'added': added, 'updated': updated, 'expired': expired, 'summary': self.summary}
+
+    def snapshot(self):
+        return {'alerts': list(self.compact.values()), 'summary': self.summary}
+
+
+def encode_event(event, data, event_id=None):
+    """One SSE frame; JSON never contains raw newlines, so data fits on one line"""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return (head + f'event: {event}\ndata: '
+            + json.dumps(data, separators=(',', ':')) + '\n\n').encode('utf-8')
+
+
+class AlertHub:
+    """SSE fan-out: every frame is encoded once and written to all connections"""
+
+    def __init__(self, history=HISTORY_SIZE, max_buffer=MAX_CLIENT_BUFFER):
+        self.clients = set()
+        self.seq = 0
+        self.history = collections.deque(maxlen=history)   # (seq, frame)
+        self.max_buffer = max_buffer
+        self.stats = collections.Counter()
+        self._snapshot_frame = None
+        self._snapshot_seq = -1
+
+    def publish(self, delta):
+        """Record a delta and write it to every client; returns clients written"""
+        self.seq += 1
+        frame = encode_event('delta', delta, self.seq)
+        self.history.append((self.seq, frame))
+        self.stats['published'] += 1
+        return self.broadcast(frame)
+
+    def snapshot_frame(self, snapshot):
+        """Full current state as one frame, encoded once per sequence number"""
+        if self._snapshot_seq != self.seq or self._snapshot_frame is None:
+            self._snapshot_frame = encode_event('snapshot', snapshot, self.seq)
+            self._snapshot_seq = self.seq
+        return self._snapshot_frame
+
+    def broadcast(self, frame):
+        written = 0
+        for writer in list(self.clients):
+            transport = writer.transport
+            if transport.is_closing():
+                self.clients.discard(writer)
+                continue
+            if transport.get_write_buffer_size() > self.max_buffer:
+                # Slow consumer: drop it rather than buffer without bound
+                self.clients.discard(writer)
+                self.stats['dropped_slow'] += 1
+                transport.abort()
+                continue
+            writer.write(frame)
+            written += 1
+        self.stats['frames_written'] += written
+        return written
+
+    def attach(self, writer, snapshot, last_event_id=None):
+        """Register a client and bring it up to date (missed deltas, or a snapshot)"""
+        writer.write(f'retry: {RETRY_MS}\n\n'.encode('ascii'))
+        replay = self._missed(last_event_id)
+        if replay is None:
+            writer.write(self.snapshot_frame(snapshot))
+            self.stats['snapshots_sent'] += 1
+        else:
+            for frame in replay:
+                writer.write(frame)
+            self.stats['resumed'] += 1
+        self.clients.add(writer)
+
+    def _missed(self, last_event_id):
+        try:
+            last = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        if last == self.seq:
+            return []
+        if last > self.seq or not self.history or self.history[0][0] > last + 1:
+            return None   # unknown or too old: start over from a snapshot
+        return [frame for seq, frame in self.history if seq > last]
+
+    def detach(self, writer):
+        self.clients.discard(writer)
+
+    def heartbeat(self):
+        return self.broadcast(b': ping\n\n')
+
+
+class AlertService:
+    """Polls alerts/active once for all clients and publishes deltas to the hub"""
+
+    def __init__(self, upstreams=None, fetcher=None, interval=POLL_INTERVAL, area=None, clock=time.time):
+        self.upstreams = upstreams or upstream.Upstreams()
+        # fetcher(url, headers, timeout) -> parsed JSON, raising UpstreamError on failure
+        self.fetcher = fetcher or upstream.fetch_json
+        self.interval = interval
+        self.area = area
+        self.clock = clock
+        self.differ = AlertDiffer()
+        self.hub = AlertHub()
+        self.polls = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_poll = None
+        self._body = None
+        self._etag = None
+
+    def url(self):
+        return self.upstreams.alerts_url(area=self.area) if self.area else self.upstreams.alerts_url()
+
+    def ingest(self, features):
+        """Diff one feature list and publish the delta; returns the delta or None"""
+        delta = self.differ.apply(features, self.clock())
+        if delta is not None:
+            self._body = None
+            self.hub.publish(delta)
+        return delta
+
+    async def poll_once(self):
+        self.polls += 1
+        self.last_poll = self.clock()
+        try:
+            data = await self.fetcher(self.url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['alerts'])
+            features = data.get('features') if isinstance(data, dict) else None
+            if not isinstance(features, list):
+                raise upstream.UpstreamError(self.url(), 'Invalid response structure')
+        except upstream.UpstreamError as e:
+            # Keep the current set; an outage must not look like every alert expiring
+            self.failures += 1
+            self.last_error = str(e)
+            return None
+        self.last_error = None
+        return self.ingest(features)
+
+    def snapshot_body(self):
+        """Current state as JSON bytes and ETag (for plain polling clients)"""
+        if self._body is None:
+            self._body = json.dumps(self.differ.snapshot(), separators=(',', ':')).encode('utf-8')
+            self._etag = '"' + hashlib.sha1(self._body).hexdigest()[:16] + '"'
+        return self._body, self._etag
+
+    async def run_forever(self):
+        last_beat = time.monotonic()
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:  # never let the poll loop die
+                print(f"alert poll error: {e}", file=sys.stderr)
+            deadline = time.monotonic() + self.interval
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(HEARTBEAT_INTERVAL, max(0.0, deadline - time.monotonic())))
+                if time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                    self.hub.heartbeat()
+                    last_beat = time.monotonic()
+
+
+class AlertStreamServer:
+    """/api/alerts/stream (SSE) and /api/alerts (JSON) over asyncio_http"""
+
+    def __init__(self, service):
+        self.service = service
+        self.server = None
+        self._streams = set()
+
+    async def handle(self, reader, writer):
+        request = await asyncio_http.read_request(reader)
+        if request is None:
+            writer.close()
+            return
+        if request.method not in ('GET', 'HEAD'):
+            await asyncio_http.write_json(writer, 405, b'{"error":"method not allowed"}')
+            return
+        if request.path == '/api/alerts/stream':
+            await self._stream(request, reader, writer)
+        elif request.path == '/api/alerts':
+            body, etag = self.service.snapshot_body()
+            headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+            if request.headers.get('if-none-match') == etag:
+                await asyncio_http.write_response(writer, 304, b'', headers)
+                return
+            await asyncio_http.write_json(writer, 200, body, headers, request.method == 'HEAD')
+        else:
+            await asyncio_http.write_json(writer, 404, b'{"error":"not found"}')
+
+    async def _stream(self, request, reader, writer):
+        hub = self.service.hub
+        writer.write(asyncio_http.response_head(200, SSE_HEADERS))
+        last_id = request.headers.get('last-event-id') or request.query.get('lastEventId')
+        hub.attach(writer, self.service.differ.snapshot(), last_id)
+        task = asyncio.current_task()
+        self._streams.add(task)
+        try:
+            # Clients never send anything after the request; EOF means they left
+            while await reader.read(1024):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self._streams.discard(task)
+            hub.detach(writer)
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8090, backlog=4096):
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=backlog)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            for writer in list(self.service.hub.clients):
+                writer.transport.abort()
+            self.service.hub.clients.clear()
+            # Let the aborted streams see EOF and finish before the loop goes away
+            await asyncio.gather(*self._streams, return_exceptions=True)
+            await self.server.wait_closed()
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_alerts(n, seed=0, start=None):
+    """alerts/active-shaped features; expiries a few hours out from start"""
+    rng = random.Random(seed)
+    start = time.time() if start is None else start
+    events = ['Tornado Warning', 'Severe Thunderstorm Warning', 'Flood Watch', 'Wind Advisory',
+              'Winter Weather Advisory', 'Special Weather Statement', 'Heat Advisory']
+    features = []
+    for i in range(n):
+        sent = datetime.datetime.fromtimestamp(start - rng.randint(0, 3600), datetime.timezone.utc)
+        expires = sent + datetime.timedelta(hours=rng.randint(2, 8))
+        features.append({'id': f'urn:oid:2.49.0.1.840.0.{seed}.{i}', 'properties': {
+            'id': f'urn:oid:2.49.0.1.840.0.{seed}.{i}', 'event': rng.choice(events),
+            'severity': rng.choice(['Severe', 'Moderate', 'Minor']), 'urgency': 'Immediate',
+            'headline': 'Synthetic alert issued for benchmarking', 'areaDesc': 'Alamance; Orange',
+            'sent': sent.isoformat(), 'expires': expires.isoformat(),
+            'description': 'x' * 1200, 'instruction': 'y' * 400}})
+    return features
+
+
+class _NullTransport:
+    def __init__(self):
+        self.bytes = 0
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return 0
+
+
+class _NullWriter:
+    """In-memory stand-in for a StreamWriter (fan-out cost without sockets)"""
+
+    def __init__(self):
+        self.transport = _NullTransport()
+
+    def write(self, data):
+        self.transport.bytes += len(data)
+
+
+def _client_process(port, n, ready, done):
+    """Open n SSE connections, report when all hold a snapshot, then time delta delivery"""
+    sel = selectors.DefaultSelector()
+    request = b'GET /api/alerts/stream HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n'
+    socks = []
+    for _ in range(n):
+        s = socket.create_connection(('127.0.0.1', port))
+        s.sendall(request)
+        s.setblocking(False)
+        sel.register(s, selectors.EVENT_READ, bytearray())
+        socks.append(s)
+
+    def pump(marker, count_needed):
+        got = 0
+        seen = set()
+        while got < count_needed:
+            for key, _ in sel.select(timeout=30):
+                try:
+                    chunk = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    sel.unregister(key.fileobj)
+                    count_needed -= 1
+                    continue
+                key.data.extend(chunk)
+                if key.fileobj not in seen and marker in key.data:
+                    seen.add(key.fileobj)
+                    del key.data[:]
+                    got += 1
+        return time.monotonic()
+
+    pump(b'event: snapshot', n)
+    ready.send(n)
+    done.send(pump(b'event: delta', n))
+    for s in socks:
+        s.close()
+
+
+async def _socket_bench(n_clients, delta_alerts):
+    service = AlertService(fetcher=None)
+    service.ingest(synthetic_alerts(40, seed=1))
+    server = AlertStreamServer(service)
+    port = await server.start('127.0.0.1', 0)
+    ctx = multiprocessing.get_context('fork')
+    ready_r, ready_w = ctx.Pipe(duplex=False)
+    done_r, done_w = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_client_process, args=(port, n_clients, ready_w, done_w), daemon=True)
+    t0 = time.monotonic()
+    proc.start()
+    while not ready_r.poll():
+        await asyncio.sleep(0.05)
+    ready_r.recv()
+    connect_s = time.monotonic() - t0
+    features = synthetic_alerts(40, seed=1)[:-1] + synthetic_alerts(delta_alerts, seed=2)
+    published = time.monotonic()
+    service.ingest(features)
+    broadcast_s = time.monotonic() - published
+    while not done_r.poll():
+        await asyncio.sleep(0.01)
+    delivered = done_r.recv() - published
+    proc.join(5)
+    await server.stop()
+    return {'connect_s': connect_s,
+            'broadcast_ms': broadcast_s * 1000, 'delivered_ms': delivered * 1000}
+
+
+def benchmark(n_clients=10000, sockets=True, out=sys.stdout):
+    features = synthetic_alerts(40, seed=1)
+    full_body = len(json.dumps({'features': features}).encode('utf-8'))
+    changed = features[:-1] + synthetic_alerts(1, seed=2)
+
+    service = AlertService(fetcher=None)
+    service.ingest(features)
+    writers = [_NullWriter() for _ in range(n_clients)]
+    for w in writers:
+        service.hub.clients.add(w)
+    t0 = time.perf_counter()
+    service.ingest(changed)
+    fanout = time.perf_counter() - t0
+    delta_bytes = writers[0].transport.bytes
+    print(f"in-memory fan-out: diff + encode + {n_clients} writes in {fanout * 1000:.1f} ms "
+          f"({fanout / n_clients * 1e6:.2f} us/client), {delta_bytes} bytes per client", file=out)
+    print(f"bandwidth per change: push {delta_bytes * n_clients / 1e6:.1f} MB vs "
+          f"3-min polling {full_body * n_clients / 1e6:.1f} MB per cycle even when unchanged", file=out)
+
+    if sockets:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < n_clients + 256 and hard > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, n_clients + 256), hard))
+            soft = min(hard, n_clients + 256)
+        n = min(n_clients, soft - 256)
+        r = asyncio.run(_socket_bench(n, 1))
+        print(f"loopback SSE: {n} clients connected in {r['connect_s']:.1f} s; "
+              f"broadcast {r['broadcast_ms']:.1f} ms, delta on every socket after {r['delivered_ms']:.1f} ms",
+              file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Alert delta engine with Server-Sent Events')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help='Seconds between NWS polls')
+    parser.add_argument('--area', help='Poll a whole state (e.g. NC) instead of the configured zone')
+    parser.add_argument('--upstream', help='Send NWS requests to this base URL (stand-in server)')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--no-sockets', action='store_true', help='Benchmark in-memory fan-out only')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.clients, sockets=not args.no_sockets)
+        return
+
+    async def serve():
+        upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+        service = AlertService(upstreams, interval=args.interval, area=args.area)
+        server = AlertStreamServer(service)
+        port = await server.start(args.host, args.port)
+        print(f"Streaming alert deltas on http://{args.host}:{port}/api/alerts/stream")
+        poller = asyncio.create_task(service.run_forever())
+        try:
+            await server.server.serve_forever()
+        finally:
+            poller.cancel()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""
+Minimal asyncio HTTP/1.1 Server Helpers
+
+Just enough HTTP to serve JSON, event streams and tiles from the Python
+services without a third-party web framework. One request per connection
+(Connection: close) keeps the state machine trivial.
+"""
+
+import asyncio
+import urllib.parse
+
+REASONS = {
+    200: 'OK', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request',
+    404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error',
+    502: 'Bad Gateway', 503: 'Service Unavailable', 504: 'Gateway Timeout'
+}
+
+MAX_HEADER_BYTES = 16384
+
+
+class Request:
+    """Parsed request line and headers"""
+
+    __slots__ = ('method', 'target', 'path', 'query', 'headers')
+
+    def __init__(self, method, target, headers):
+        self.method = method
+        self.target = target
+        parts = urllib.parse.urlsplit(target)
+        self.path = parts.path
+        self.query = dict(urllib.parse.parse_qsl(parts.query))
+        self.headers = headers
+
+
+async def read_request(reader):
+    """Read one request head; returns a Request or None on a malformed/closed stream"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        return None
+    if len(head) > MAX_HEADER_BYTES:
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, _version = lines[0].split(' ', 2)
+    except ValueError:
+        return None
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    return Request(method.upper(), target, headers)
+
+
+def response_head(status, headers=None, content_length=None):
+    """Encode a status line and headers"""
+    lines = [f'HTTP/1.1 {status} {REASONS.get(status, "Unknown")}']
+    for name, value in (headers or {}).items():
+        lines.append(f'{name}: {value}')
+    if content_length is not None:
+        lines.append(f'Content-Length: {content_length}')
+    lines.append('Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def write_response(writer, status, body=b'', headers=None, head_only=False):
+    """Write a complete response and close the connection"""
+    writer.write(response_head(status, headers, len(body)))
+    if body and not head_only:
+        writer.write(body)
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def write_json(writer, status, body, extra_headers=None, head_only=False):
+    """Write pre-encoded JSON bytes with CORS headers"""
+    headers = {
+        'Content-Type': 'application/json; charset=utf-8',
+        'Access-Control-Allow-Origin': '*'
+    }
+    headers.update(extra_headers or {})
+    await write_response(writer, status, body, headers, head_only)
@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+
+"""
+Capacity Simulator
+
+Models N browsers running the three widgets with their real timers and retry
+rules, against in-process stand-in upstreams, and measures what that adds up
+to upstream: requests per second (mean and peak), amplification per client,
+cache hit ratio and client-observed tail latency.
+
+Per client (all timers in seconds, same values as the widgets' ms constants):
+- Severe dashboard: updateDashboard() at load and every 900 s (skipped when the
+  last update started < 900 s ago), fast alert poll every 180 s that forces a
+  full update when the alert set changed, refresh on becoming visible after
+  900 s. Single attempt per fetch (fetchJSON, 8-10 s timeouts), statewide alert
+  fallback when the zone query fails.
+- Forecast widget: main weather (Open-Meteo, gridpoint, hourly) every 240 s,
+  NWS alerts + SPC every 180 s, neither started within 90 s of the previous
+  start, AFD behind a 30-min client cache, refresh on becoming visible.
+  tryFetch() retries: 3 attempts, 80-120% jittered backoff, 10/13/16 s timeouts.
+- Radar: load at start, 600 s refresh while visible, 420 s watchdog chain that
+  only runs while visible, MIN_RADAR_INTERVAL_MS (90 s) guard when cached,
+  same retry policy.
+
+Visibility alternates visible/hidden with exponential durations. Clients
+arrive spread over a ramp (a crowd opening the page during a warning), and the
+stand-in alert set changes at configurable times, which is what triggers the
+dashboards' forced refreshes.
+
+Two transports are compared: 'direct' (every attempt goes upstream) and
+'proxy' (one shared cache with the http_cache TTLs, request coalescing and
+stale-if-error, like aggregator.py).
+
+Everything runs on a virtual clock: the event loop jumps straight to the next
+timer instead of sleeping, so an hour of 5,000 clients runs in seconds and
+latencies are exact rather than distorted by loop lag.
+
+Usage:
+    python3 capacity_sim.py --clients 5000 --duration 1800
+    python3 capacity_sim.py --clients 5000 --mode proxy --capacity 64 --errors 0.05
+    python3 capacity_sim.py --bench
+"""
+
+import argparse
+import asyncio
+import collections
+import random
+import sys
+import time
+
+import upstream
+from aggregator import Coalescer
+from http_cache import CACHE_POLICY, DEFAULT_POLICY
+from instrumentation import upstream_for_url
+from retry_engine import MAX_RETRIES, backoff_delay, retry_timeout
+
+# Severe dashboard
+DASHBOARD_INTERVAL = 900.0
+DASHBOARD_ALERT_POLL = 180.0
+DASHBOARD_ALERTS_TIMEOUT = 8.0
+DASHBOARD_SPC_TIMEOUT = 10.0
+DASHBOARD_AFD_TIMEOUTS = (8.0, 10.0)     # product index, product text
+
+# Forecast widget
+FORECAST_REFRESH = 240.0
+FORECAST_ALERTS_REFRESH = 180.0
+MIN_WEATHER_INTERVAL = 90.0
+MIN_ALERTS_INTERVAL = 90.0
+AFD_CACHE_TTL = 1800.0
+
+# Radar widget
+RADAR_REFRESH = 600.0
+WATCHDOG_INTERVAL = 420.0
+MIN_RADAR_INTERVAL = 90.0
+
+WIDGETS = ('dashboard', 'forecast', 'radar')
+MODES = ('direct', 'proxy')
+
+# Stand-in latency per upstream: (mean s, std dev s), floored at 20 ms
+LATENCY = {
+    'open_meteo': (0.35, 0.15),
+    'gridpoint': (0.6, 0.4),
+    'hourly': (0.5, 0.3),
+    'alerts': (0.3, 0.2),
+    'spc': (0.4, 0.2),
+    'afd': (0.3, 0.2),
+    'rainviewer': (0.15, 0.05)
+}
+DEFAULT_LATENCY = (0.4, 0.2)
+PROXY_HOP = 0.01          # client <-> proxy round trip
+PROXY_TIMEOUT = 10.0      # proxy -> upstream (aggregator source timeout)
+
+
+class UpstreamFailure(Exception):
+    pass
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    """Event loop on simulated time: when nothing is runnable, jump to the next timer"""
+
+    def __init__(self):
+        super().__init__()
+        self._virtual_now = 0.0
+
+    def time(self):
+        return self._virtual_now
+
+    def _run_once(self):
+        if not self._ready and self._scheduled:
+            self._virtual_now = max(self._virtual_now, self._scheduled[0]._when)
+        super()._run_once()
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class StandInUpstreams:
+    """In-process upstream hosts: drawn latency, error rate, optional per-host concurrency cap.
+
+    Bodies are just a version number per source (the alert set changes at
+    alert_changes, radar frames every 10 min, everything else hourly), which is
+    all the widgets' change detection needs.
+    """
+
+    def __init__(self, error_rate=0.01, capacity=None, alert_changes=(), outage=None, rng=None):
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.alert_changes = sorted(alert_changes)
+        self.outage = outage          # (start, end, source or None for every source)
+        self.rng = rng or random.Random(0)
+        self._slots = {}
+        self.requests = collections.Counter()
+        self.per_second = collections.Counter()
+        self.failures = 0
+        self.latencies = []
+
+    def version(self, source, now):
+        if source == 'alerts':
+            return sum(1 for t in self.alert_changes if t <= now)
+        return int(now // (600 if source == 'rainviewer' else 3600))
+
+    def _host_slot(self, host):
+        if self.capacity is None:
+            return None
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = self._slots[host] = asyncio.Semaphore(self.capacity)
+        return slot
+
+    async def serve(self, url):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        source = upstream_for_url(url)
+        self.requests[source] += 1
+        self.per_second[int(now)] += 1
+        mu, sigma = LATENCY.get(source, DEFAULT_LATENCY)
+        latency = max(0.02, self.rng.gauss(mu, sigma))
+        failed = self.rng.random() < self.error_rate
+        if self.outage and self.outage[0] <= now < self.outage[1] and self.outage[2] in (None, source):
+            failed = True
+        slot = self._host_slot(url.split('/', 3)[2])
+        if slot is None:
+            await asyncio.sleep(latency)
+        else:
+            async with slot:   # queueing behind other requests to the same host
+                await asyncio.sleep(latency)
+        self.latencies.append(loop.time() - now)
+        if failed:
+            self.failures += 1
+            raise UpstreamFailure(f'{source}: HTTP 503')
+        return self.version(source, loop.time())
+
+
+class DirectTransport:
+    """Every widget attempt goes straight to upstream"""
+
+    def __init__(self, upstreams):
+        self.upstreams = upstreams
+        self.stats = collections.Counter()
+
+    async def get(self, url):
+        return await self.upstreams.serve(url)
+
+
+class ProxyTransport:
+    """One shared cache in front of upstream (http_cache TTLs, coalescing, stale-if-error)"""
+
+    def __init__(self, upstreams, policies=CACHE_POLICY, hop=PROXY_HOP, timeout=PROXY_TIMEOUT):
+        self.upstreams = upstreams
+        self.policies = policies
+        self.hop = hop
+        self.timeout = timeout
+        self.coalescer = Coalescer()
+        self.entries = {}      # url -> (body, fetched_at)
+        self.stats = collections.Counter()
+
+    async def _fetch(self, url):
+        loop = asyncio.get_running_loop()
+        body = await asyncio.wait_for(self.upstreams.serve(url), self.timeout)
+        self.entries[url] = (body, loop.time())
+        return body
+
+    async def get(self, url):
+        now = asyncio.get_running_loop().time()
+        await asyncio.sleep(self.hop / 2)
+        policy = self.policies.get(upstream_for_url(url), DEFAULT_POLICY)
+        entry = self.entries.get(url)
+        if entry is not None and now - entry[1] < policy['ttl']:
+            self.stats['hits'] += 1
+            await asyncio.sleep(self.hop / 2)
+            return entry[0]
+        joined = self.coalescer.joined
+        try:
+            body = await self.coalescer.run(url, lambda: self._fetch(url))
+        except (UpstreamFailure, asyncio.TimeoutError):
+            if entry is not None and now - entry[1] < policy['max_stale']:
+                self.stats['stale'] += 1
+                await asyncio.sleep(self.hop / 2)
+                return entry[0]
+            raise UpstreamFailure(url)
+        self.stats['coalesced' if self.coalescer.joined != joined else 'misses'] += 1
+        await asyncio.sleep(self.hop / 2)
+        return body
+
+
+class Client:
+    """One browser tab with the dashboard, forecast and radar widgets"""
+
+    def __init__(self, sim, index, rng):
+        self.sim = sim
+        self.index = index
+        self.rng = rng
+        self.urls = sim.urls
+        self.visible = True
+        self._tasks = set()
+        self._visibility_handlers = []
+        self._stopped = False
+
+    def now(self):
+        return asyncio.get_running_loop().time()
+
+    def spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def every(self, period, fn):
+        """setInterval(): fire-and-forget, independent of how long fn takes"""
+        async def tick():
+            while True:
+                await asyncio.sleep(period)
+                self.spawn(fn())
+        self.spawn(tick())
+
+    # ── Fetching ──
+
+    async def request(self, url, timeout):
+        """One fetch attempt with an AbortController-style timeout; body or None"""
+        stats = self.sim.stats
+        stats['attempts'] += 1
+        started = self.now()
+        try:
+            body = await asyncio.wait_for(self.sim.transport.get(url), timeout)
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+            self.sim.latencies.append(timeout)
+            return None
+        except UpstreamFailure:
+            stats['errors'] += 1
+            self.sim.latencies.append(self.now() - started)
+            return None
+        self.sim.latencies.append(self.now() - started)
+        return body
+
+    async def fetch_with_retry(self, url):
+        """tryFetch(): MAX_RETRIES attempts, retryTimeout() per attempt, backoffDelay() between"""
+        for attempt in range(MAX_RETRIES):
+            body = await self.request(url, retry_timeout(attempt))
+            if body is not None:
+                return body
+            if attempt + 1 < MAX_RETRIES:
+                self.sim.stats['retries'] += 1
+                await asyncio.sleep(backoff_delay(attempt, rng=self.rng))
+        self.sim.stats['gave_up'] += 1
+        return None
+
+    def cache_hit(self):
+        self.sim.stats['client_cache_hits'] += 1
+
+    # ── Severe dashboard ──
+
+    def start_dashboard(self):
+        state = {'last_update': float('-inf'), 'alerts_version': None}
+        urls = self.urls
+
+        async def alerts():
+            body = await self.request(urls['alerts_zone'], DASHBOARD_ALERTS_TIMEOUT)
+            if body is None:
+                body = await self.request(urls['alerts_state'], DASHBOARD_ALERTS_TIMEOUT)
+            return body
+
+        async def afd():
+            index = await self.request(urls['afd_index'], DASHBOARD_AFD_TIMEOUTS[0])
+            if index is not None:
+                await self.request(urls['afd_product'], DASHBOARD_AFD_TIMEOUTS[1])
+
+        async def update_dashboard():
+            started = self.now()
+            if started - state['last_update'] < DASHBOARD_INTERVAL:
+                return
+            version = await alerts()
+            if version is not None:
+                state['alerts_version'] = version
+            await self.request(urls['spc_query'], DASHBOARD_SPC_TIMEOUT)
+            if not self.sim.winter:
+                await afd()    # winter check in the AFD text when alerts found none
+            await afd()        # updateForecastDiscussion()
+            state['last_update'] = started
+
+        async def alert_poll():
+            previous = state['alerts_version']
+            version = await alerts()
+            if version is not None and previous is not None and version != previous:
+                # lastUpdate = 0; await updateDashboard(); lastUpdate = prevLast || Date.now()
+                prev_last = state['last_update']
+                state['last_update'] = float('-inf')
+                self.sim.stats['forced_refreshes'] += 1
+                await update_dashboard()
+                state['last_update'] = prev_last
+            if version is not None:
+                state['alerts_version'] = version
+
+        def on_visibility():
+            if self.visible and self.now() - state['last_update'] > DASHBOARD_INTERVAL:
+                self.spawn(update_dashboard())
+
+        self.spawn(update_dashboard())
+        self.every(DASHBOARD_INTERVAL, update_dashboard)
+        self.every(DASHBOARD_ALERT_POLL, alert_poll)
+        self._visibility_handlers.append(on_visibility)
+
+    # ── Forecast widget ──
+
+    def start_forecast(self):
+        state = {'weather_start': float('-inf'), 'alerts_start': float('-inf'), 'afd_at': float('-inf'),
+                 'weather_busy': False, 'alerts_busy': False, 'cached': False}
+        urls = self.urls
+
+        async def weather():
+            now = self.now()
+            if state['weather_busy'] or (state['cached'] and now - state['weather_start'] < MIN_WEATHER_INTERVAL):
+                return
+            state['weather_start'] = now
+            state['weather_busy'] = True
+            try:
+                bodies = await asyncio.gather(*(self.fetch_with_retry(urls[name])
+                                                for name in ('open_meteo', 'gridpoint', 'hourly')))
+                if all(body is not None for body in bodies):
+                    state['cached'] = True
+                if self.now() - state['afd_at'] < AFD_CACHE_TTL:
+                    self.cache_hit()
+                elif await self.fetch_with_retry(urls['afd_index']) is not None:
+                    if await self.fetch_with_retry(urls['afd_product']) is not None:
+                        state['afd_at'] = self.now()
+            finally:
+                state['weather_busy'] = False
+
+        async def alerts_and_spc():
+            now = self.now()
+            if state['alerts_busy'] or now - state['alerts_start'] < MIN_ALERTS_INTERVAL:
+                return
+            state['alerts_start'] = now
+            state['alerts_busy'] = True
+            try:
+                await asyncio.gather(self.fetch_with_retry(urls['alerts_zone']),
+                                     self.fetch_with_retry(urls['spc_outlook']))
+            finally:
+                state['alerts_busy'] = False
+
+        def on_visibility():
+            if self.visible:
+                self.spawn(weather())
+                self.spawn(alerts_and_spc())
+
+        self.spawn(weather())
+        self.spawn(alerts_and_spc())
+        self.every(FORECAST_REFRESH, weather)
+        self.every(FORECAST_ALERTS_REFRESH, alerts_and_spc)
+        self._visibility_handlers.append(on_visibility)
+
+    # ── Radar widget ──
+
+    def start_radar(self):
+        state = {'in_flight': False, 'last_start': float('-inf'), 'cached': False, 'watchdog': None}
+        url = self.urls['rainviewer']
+
+        async def load(only_if_newer=False):
+            if state['in_flight']:
+                return
+            if not only_if_newer and state['cached'] and self.now() - state['last_start'] < MIN_RADAR_INTERVAL:
+                self.cache_hit()
+                return
+            state['last_start'] = self.now()
+            state['in_flight'] = True
+            try:
+                if await self.fetch_with_retry(url) is not None:
+                    state['cached'] = True
+            finally:
+                state['in_flight'] = False
+
+        async def refresh():
+            if self.visible:
+                await load()
+
+        async def watchdog():
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            state['watchdog'] = None
+            if not self.visible:
+                return
+            self.spawn(load(only_if_newer=True))
+            schedule_watchdog()
+
+        def schedule_watchdog():
+            if state['watchdog'] is None:
+                state['watchdog'] = self.spawn(watchdog())
+
+        def on_visibility():
+            if self.visible:
+                schedule_watchdog()
+            elif state['watchdog'] is not None:
+                state['watchdog'].cancel()
+                state['watchdog'] = None
+
+        self.spawn(load())
+        self.every(RADAR_REFRESH, refresh)
+        schedule_watchdog()
+        self._visibility_handlers.append(on_visibility)
+
+    # ── Lifecycle ──
+
+    async def visibility(self, visible_mean, hidden_mean):
+        if not hidden_mean:
+            return
+        while True:
+            await asyncio.sleep(self.rng.expovariate(1.0 / visible_mean))
+            self.set_visible(False)
+            await asyncio.sleep(self.rng.expovariate(1.0 / hidden_mean))
+            self.set_visible(True)
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.sim.stats['visibility_changes'] += 1
+        for handler in self._visibility_handlers:
+            handler()
+
+    def start(self, widgets, visible_mean, hidden_mean):
+        for widget in widgets:
+            getattr(self, 'start_' + widget)()
+        self.spawn(self.visibility(visible_mean, hidden_mean))
+
+    def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+
+class Simulation:
+    """N clients, one transport, one set of stand-in upstreams, on a virtual clock"""
+
+    def __init__(self, clients=1000, duration=1800.0, mode='direct', widgets=WIDGETS, ramp=300.0,
+                 visible_mean=600.0, hidden_mean=300.0, error_rate=0.01, capacity=None,
+                 alert_changes=(300.0, 900.0, 1500.0), outage=None, winter=False, seed=0):
+        if mode not in MODES:
+            raise ValueError(f'unknown mode {mode!r} (expected one of {MODES})')
+        unknown = set(widgets) - set(WIDGETS)
+        if unknown:
+            raise ValueError(f'unknown widgets: {sorted(unknown)}')
+        self.n_clients = clients
+        self.duration = duration
+        self.mode = mode
+        self.widgets = tuple(widgets)
+        self.ramp = ramp
+        self.visible_mean = visible_mean
+        self.hidden_mean = hidden_mean
+        self.winter = winter
+        self.seed = seed
+        self.upstreams = StandInUpstreams(error_rate, capacity, alert_changes, outage,
+                                          random.Random(f'{seed}:upstream'))
+        self.transport = (ProxyTransport if mode == 'proxy' else DirectTransport)(self.upstreams)
+        self.stats = collections.Counter()
+        self.latencies = []
+        u = upstream.Upstreams()
+        self.urls = {
+            'open_meteo': u.open_meteo('2026-06-01', '2026-06-07'),
+            'gridpoint': u.gridpoint_url(),
+            'hourly': u.hourly_url(),
+            'alerts_zone': u.alerts_url(),
+            'alerts_state': u.alerts_url(area=u.state),
+            'spc_query': u.spc_query_url(),
+            'spc_outlook': u.spc_outlook_url(),
+            'afd_index': u.afd_index_url(),
+            'afd_product': u.product_url('RAH-AFD-LATEST'),
+            'rainviewer': u.rainviewer_maps_url()
+        }
+
+    async def _run(self):
+        clients = []
+
+        async def arrive(i):
+            await asyncio.sleep(self.ramp * i / self.n_clients if self.n_clients else 0)
+            client = Client(self, i, random.Random(f'{self.seed}:{i}'))
+            clients.append(client)
+            client.start(self.widgets, self.visible_mean, self.hidden_mean)
+
+        arrivals = [asyncio.ensure_future(arrive(i)) for i in range(self.n_clients)]
+        await asyncio.sleep(self.duration)
+        for task in arrivals:
+            task.cancel()
+        for client in clients:
+            client.stop()
+        await asyncio.sleep(0)
+
+    def run(self):
+        """Run on a fresh virtual-clock loop; returns the report dict"""
+        loop = VirtualClockLoop()
+        t0 = time.perf_counter()
+        try:
+            loop.run_until_complete(self._run())
+            # let cancellations settle before closing
+            pending = [t for t in asyncio.all_tasks(loop) if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        finally:
+            loop.close()
+        return self.report(time.perf_counter() - t0)
+
+    def report(self, wall_seconds=0.0):
+        up = self.upstreams
+        total = sum(up.requests.values())
+        needs = self.stats['attempts'] + self.stats['client_cache_hits']
+        # Steady state: after the last arrival, so the ramp does not dilute the mean
+        steady = [n for second, n in up.per_second.items() if second >= self.ramp]
+        steady_seconds = max(1.0, self.duration - self.ramp)
+        return {
+            'mode': self.mode,
+            'clients': self.n_clients,
+            'duration': self.duration,
+            'upstream_requests': total,
+            'by_source': dict(up.requests),
+            'upstream_rps_mean': total / self.duration if self.duration else 0.0,
+            'upstream_rps_steady': sum(steady) / steady_seconds,
+            'upstream_rps_peak': max(up.per_second.values(), default=0),
+            'requests_per_client_hour': total / self.n_clients / (self.duration / 3600) if self.n_clients else 0.0,
+            'client_attempts': self.stats['attempts'],
+            'amplification': total / needs if needs else 0.0,
+            'cache_hit_ratio': 1 - total / needs if needs else 0.0,
+            'proxy': dict(self.transport.stats),
+            'retries': self.stats['retries'],
+            'timeouts': self.stats['timeouts'],
+            'errors': self.stats['errors'],
+            'gave_up': self.stats['gave_up'],
+            'forced_refreshes': self.stats['forced_refreshes'],
+            'p50': percentile(self.latencies, 0.50),
+            'p95': percentile(self.latencies, 0.95),
+            'p99': percentile(self.latencies, 0.99),
+            'max': max(self.latencies, default=float('nan')),
+            'upstream_p99': percentile(up.latencies, 0.99),
+            'wall_seconds': wall_seconds
+        }
+
+
+def simulate(clients=1000, duration=1800.0, modes=MODES, **kwargs):
+    """Same crowd, same timers, once per transport: {mode: report}"""
+    return {mode: Simulation(clients, duration, mode, **kwargs).run() for mode in modes}
+
+
+def print_report(results, out=sys.stdout):
+    first = next(iter(results.values()))
+    print(f"{first['clients']} clients, {first['duration'] / 60:.0f} simulated min", file=out)
+    print(f"{'mode':<8} {'upstream':>9} {'rps mean':>9} {'rps peak':>9} {'req/client/h':>13} "
+          f"{'hit ratio':>9} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'retries':>8} {'forced':>7}", file=out)
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['upstream_requests']:>9} {r['upstream_rps_steady']:>9.2f} {r['upstream_rps_peak']:>9} "
+              f"{r['requests_per_client_hour']:>13.1f} {r['cache_hit_ratio']:>9.3f} {r['p50']:>7.2f} "
+              f"{r['p95']:>7.2f} {r['p99']:>7.2f} {r['retries']:>8} {r['forced_refreshes']:>7}", file=out)
+    for mode, r in results.items():
+        sources = ', '.join(f"{name} {count}" for name, count in sorted(r['by_source'].items()))
+        print(f"{mode} upstream by source: {sources}", file=out)
+    if 'direct' in results and 'proxy' in results and results['proxy']['upstream_requests']:
+        ratio = results['direct']['upstream_requests'] / results['proxy']['upstream_requests']
+        print(f"shared proxy cuts upstream requests {ratio:.0f}x", file=out)
+
+
+def benchmark(clients=1000, duration=1800.0, out=sys.stdout):
+    """Simulator throughput: simulated client-hours per wall second, both transports"""
+    results = simulate(clients, duration)
+    print_report(results, out)
+    for mode, r in results.items():
+        rate = clients * duration / 3600 / r['wall_seconds'] if r['wall_seconds'] else float('inf')
+        print(f"{mode}: {r['wall_seconds']:.2f} s wall, {r['client_attempts']} client attempts, "
+              f"{rate:,.0f} client-hours/s", file=out)
+    return results
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Widget client capacity simulator')
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--duration', type=float, default=1800.0, help='simulated seconds')
+    parser.add_argument('--mode', choices=MODES + ('compare',), default='compare')
+    parser.add_argument('--widgets', default=','.join(WIDGETS), help='comma-separated subset of ' + ', '.join(WIDGETS))
+    parser.add_argument('--ramp', type=float, default=300.0, help='seconds over which clients arrive')
+    parser.add_argument('--visible', type=float, default=600.0, help='mean visible period (s)')
+    parser.add_argument('--hidden', type=float, default=300.0, help='mean hidden period (s); 0 = always visible')
+    parser.add_argument('--errors', type=float, default=0.01, help='upstream error rate')
+    parser.add_argument('--capacity', type=int, help='concurrent requests per upstream host before queueing')
+    parser.add_argument('--alert-changes', default='300,900,1500', help='seconds at which the alert set changes')
+    parser.add_argument('--winter', action='store_true', help='alerts carry winter weather (no AFD winter check)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    modes = MODES if args.mode == 'compare' else (args.mode,)
+    changes = [float(t) for t in args.alert_changes.split(',') if t.strip()]
+    print_report(simulate(args.clients, args.duration, modes, widgets=args.widgets.split(','),
+                          ramp=args.ramp, visible_mean=args.visible, hidden_mean=args.hidden,
+                          error_rate=args.errors, capacity=args.capacity, alert_changes=changes,
+                          winter=args.winter, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
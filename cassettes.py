@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+
+"""
+Upstream Record/Replay Cassettes
+
+The stand-in routes in run_tests.py are hand-written dict literals: nothing
+exercises real NWS, Open-Meteo, SPC or RainViewer payload shapes, sizes or
+latencies. This module captures upstream traffic once and replays it offline:
+
+- Recorder wraps a fetch(url, headers, timeout) -> upstream.Response (or the
+  JSON variant) and keeps every response: status, the cache-relevant headers,
+  body and elapsed time,
+- Cassette is the versioned on-disk form (JSON; gzip when the name ends in
+  .gz). UTF-8 bodies stay readable text, binary bodies (radar PNGs) base64,
+- ReplayServer serves a cassette on the same paths the upstreams use, so
+  Upstreams.local(server.url) points any component at it. `speed` replays at
+  recorded latency (1.0), N times faster, or with no delay (None). Repeated
+  requests for one path walk through its recorded responses in order,
+- scenarios derive fault variants from a cassette: outage (HTTP 503),
+  timeout (latency past the client timeout), malformed (truncated JSON),
+  empty (200 with no body), slow (latency x5), applied per upstream,
+- scaled_fetch() divides client timeouts by the same speed factor, so a
+  timeout scenario replayed 50x faster still times out, just 50x sooner.
+
+Usage:
+    python3 cassettes.py --record live.json.gz            # capture the widget upstreams once
+    python3 cassettes.py --serve live.json.gz --port 9000 --speed 1 --scenario outage:gridpoint
+    python3 cassettes.py --bench                          # synthetic cassette through the pipeline
+"""
+
+import argparse
+import asyncio
+import base64
+import datetime
+import gzip
+import json
+import random
+import sys
+import time
+import urllib.parse
+
+import aggregator
+import asyncio_http
+import instrumentation
+import upstream
+
+CASSETTE_VERSION = 1
+
+# Only headers that change client behaviour are kept (no Date, cookies, server ids)
+KEEP_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control', 'expires', 'retry-after')
+
+SCENARIOS = ('outage', 'timeout', 'malformed', 'empty', 'slow')
+
+
+def _query_key(query):
+    return tuple(sorted(urllib.parse.parse_qsl(query or '', keep_blank_values=True)))
+
+
+class Interaction:
+    """One recorded request/response pair"""
+
+    __slots__ = ('url', 'status', 'headers', 'body', 'latency', 'source')
+
+    def __init__(self, url, status, headers, body, latency, source=None):
+        self.url = url
+        self.status = status
+        self.headers = {k.lower(): v for k, v in (headers or {}).items() if k.lower() in KEEP_HEADERS}
+        self.body = body
+        self.latency = latency
+        self.source = source or instrumentation.upstream_for_url(url)
+
+    @property
+    def path(self):
+        return urllib.parse.urlsplit(self.url).path
+
+    @property
+    def query(self):
+        return _query_key(urllib.parse.urlsplit(self.url).query)
+
+    def to_dict(self):
+        try:
+            body, encoding = self.body.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(self.body).decode('ascii'), 'base64'
+        return {'url': self.url, 'source': self.source, 'status': self.status, 'headers': self.headers,
+                'latency_ms': round(self.latency * 1000, 1), 'encoding': encoding, 'body': body}
+
+    @classmethod
+    def from_dict(cls, d):
+        body = d.get('body') or ''
+        body = base64.b64decode(body) if d.get('encoding') == 'base64' else body.encode('utf-8')
+        return cls(d['url'], int(d['status']), d.get('headers'), body, float(d.get('latency_ms', 0)) / 1000,
+                   d.get('source'))
+
+    def copy(self, **changes):
+        out = Interaction(self.url, self.status, self.headers, self.body, self.latency, self.source)
+        for name, value in changes.items():
+            setattr(out, name, value)
+        return out
+
+
+class Cassette:
+    """Versioned list of interactions"""
+
+    def __init__(self, interactions=(), name='cassette', recorded_at=None, meta=None):
+        self.interactions = list(interactions)
+        self.name = name
+        self.recorded_at = recorded_at if recorded_at is not None else time.time()
+        self.meta = dict(meta or {})
+
+    def to_dict(self):
+        return {'version': CASSETTE_VERSION, 'name': self.name, 'recorded_at': self.recorded_at,
+                'meta': self.meta, 'interactions': [i.to_dict() for i in self.interactions]}
+
+    @classmethod
+    def from_dict(cls, d):
+        if not isinstance(d, dict) or d.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"unsupported cassette version: {d.get('version') if isinstance(d, dict) else d!r}")
+        return cls([Interaction.from_dict(i) for i in d.get('interactions') or []],
+                   d.get('name', 'cassette'), d.get('recorded_at'), d.get('meta'))
+
+    def save(self, path):
+        data = json.dumps(self.to_dict(), indent=1).encode('utf-8')
+        if path.endswith('.gz'):
+            data = gzip.compress(data, mtime=0)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if path.endswith('.gz'):
+            data = gzip.decompress(data)
+        return cls.from_dict(json.loads(data))
+
+    def sources(self):
+        return sorted({i.source for i in self.interactions})
+
+    def profile(self):
+        """{source: (requests, bytes, median latency s)}"""
+        out = {}
+        for source in self.sources():
+            items = [i for i in self.interactions if i.source == source]
+            latencies = sorted(i.latency for i in items)
+            out[source] = (len(items), sum(len(i.body) for i in items), latencies[len(latencies) // 2])
+        return out
+
+    def scenario(self, kind, sources=None, factor=5.0):
+        """Fault variant of this cassette for the given upstreams (all when None)"""
+        if kind not in SCENARIOS:
+            raise ValueError(f'unknown scenario {kind!r} (one of {", ".join(SCENARIOS)})')
+        targets = set(sources) if sources else None
+        out = []
+        for i in self.interactions:
+            if targets is not None and i.source not in targets:
+                out.append(i)
+                continue
+            if kind == 'outage':
+                out.append(i.copy(status=503, headers={'content-type': 'application/json'},
+                                  body=b'{"error":"upstream unavailable (replayed outage)"}'))
+            elif kind == 'timeout':
+                limit = upstream.TIMEOUTS.get(i.source, 12.0)
+                out.append(i.copy(latency=max(i.latency, limit) * 2))
+            elif kind == 'malformed':
+                out.append(i.copy(body=i.body[:max(1, len(i.body) // 2)]))
+            elif kind == 'empty':
+                out.append(i.copy(body=b''))
+            else:
+                out.append(i.copy(latency=i.latency * factor))
+        return Cassette(out, f'{self.name}+{kind}', self.recorded_at, dict(self.meta, scenario=kind))
+
+
+# ── Recording ────────────────────────────────────────────────────────────────
+
+class Recorder:
+    """Wraps a fetch(url, headers, timeout) -> Response and keeps every response"""
+
+    def __init__(self, fetch=None, name='recording'):
+        self._fetch = fetch or upstream.fetch
+        self.cassette = Cassette(name=name)
+
+    async def fetch(self, url, headers=None, timeout=12.0):
+        started = time.monotonic()
+        resp = await self._fetch(url, headers, timeout)
+        self.cassette.interactions.append(
+            Interaction(url, resp.status, resp.headers, resp.body, resp.elapsed or time.monotonic() - started))
+        return resp
+
+    async def fetch_json(self, url, headers=None, timeout=12.0):
+        """Drop-in for upstream.fetch_json (the Aggregator fetcher)"""
+        resp = await self.fetch(url, headers, timeout)
+        if not resp.ok:
+            raise upstream.UpstreamError(url, f'HTTP {resp.status}', resp.status)
+        return resp.json()
+
+
+# ── Replay ───────────────────────────────────────────────────────────────────
+
+def scaled_fetch(fetcher, speed):
+    """Divide client timeouts by the replay speed, so timeouts keep their meaning"""
+    if not speed:
+        return fetcher
+
+    async def fetch(url, headers=None, timeout=12.0):
+        return await fetcher(url, headers, timeout / speed)
+    return fetch
+
+
+class ReplayServer:
+    """Serves a cassette on the upstream paths; Upstreams.local(server.url) points at it"""
+
+    def __init__(self, cassette, speed=None):
+        self.cassette = cassette
+        self.speed = speed              # None: no delay; 1.0: recorded latency; N: N times faster
+        self.server = None
+        self.url = None
+        self.hits = {}
+        self.unmatched = []
+        self._by_path = {}
+        self._cursor = {}
+        self._handlers = set()
+        for i in cassette.interactions:
+            self._by_path.setdefault(i.path, []).append(i)
+
+    def match(self, path, query):
+        """Next recorded response for a request (exact query first, then any for the path)"""
+        candidates = self._by_path.get(path)
+        if not candidates:
+            return None
+        query = _query_key(query)
+        exact = [i for i in candidates if i.query == query]
+        key = (path, query) if exact else (path, None)
+        pool = exact or candidates
+        n = self._cursor.get(key, 0)
+        self._cursor[key] = n + 1
+        return pool[min(n, len(pool) - 1)]   # the last response repeats
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            request = await asyncio_http.read_request(reader)
+            if request is None:
+                writer.close()
+                return
+            interaction = self.match(request.path, urllib.parse.urlsplit(request.target).query)
+            self.hits[request.path] = self.hits.get(request.path, 0) + 1
+            if interaction is None:
+                self.unmatched.append(request.target)
+                await asyncio_http.write_json(writer, 404, b'{"error":"not in cassette"}')
+                return
+            if self.speed:
+                try:
+                    await asyncio.sleep(interaction.latency / self.speed)
+                except asyncio.CancelledError:   # stop() while a slow response is pending
+                    writer.close()
+                    return
+            await asyncio_http.write_response(writer, interaction.status, interaction.body, interaction.headers,
+                                              request.method == 'HEAD')
+        finally:
+            self._handlers.discard(task)
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return port
+
+    async def stop(self):
+        for task in list(self._handlers):
+            task.cancel()
+        if self._handlers:
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+async def replay_pipeline(cassette, speed=None, days=7):
+    """Aggregator + compile over a replayed cassette -> (snapshot, {date: records}, seconds)"""
+    import snapshot_publisher
+    server = ReplayServer(cassette, speed)
+    await server.start()
+    try:
+        agg = aggregator.Aggregator(upstream.Upstreams.local(server.url), days=days,
+                                    fetcher=scaled_fetch(upstream.fetch_json, speed))
+        t0 = time.perf_counter()
+        snapshot = await agg.snapshot()
+        days_out = snapshot_publisher.compile_snapshot(snapshot)
+        return snapshot, days_out, time.perf_counter() - t0
+    finally:
+        await server.stop()
+
+
+# ── Recording the live upstreams / synthetic cassettes ───────────────────────
+
+async def record_live(days=7):
+    """One Aggregator refresh against the real upstreams, captured"""
+    recorder = Recorder(name='live')
+    agg = aggregator.Aggregator(days=days, fetcher=recorder.fetch_json)
+    await agg.refresh(force=True)
+    recorder.cassette.meta['dates'] = aggregator.forecast_dates(days)
+    return recorder.cassette
+
+
+# Median latencies (s) in the range the instrumentation histograms see for each upstream
+SYNTHETIC_LATENCY = {'open_meteo': 0.45, 'gridpoint': 0.7, 'hourly': 0.5, 'alerts': 0.25, 'spc': 0.35}
+
+
+def synthetic_cassette(days=7, seed=0, now=None):
+    """Cassette with full-size payloads for every Aggregator upstream (offline stand-in for a capture)"""
+    import alert_stream
+    import snapshot_publisher
+    now = time.time() if now is None else now
+    dates = aggregator.forecast_dates(days, datetime.datetime.fromtimestamp(now, aggregator.LOCAL_TZ))
+    snap = snapshot_publisher.synthetic_snapshot(days, seed, dates[0])
+    rng = random.Random(seed)
+    start = datetime.datetime.fromisoformat(dates[0] + 'T00:00:00+00:00')
+    periods = [{'number': h + 1, 'startTime': (start + datetime.timedelta(hours=h)).isoformat(),
+                'endTime': (start + datetime.timedelta(hours=h + 1)).isoformat(), 'isDaytime': 6 <= h % 24 < 18,
+                'temperature': rng.randint(40, 90), 'temperatureUnit': 'F',
+                'probabilityOfPrecipitation': {'unitCode': 'wmoUnit:percent', 'value': rng.randint(0, 60)},
+                'relativeHumidity': {'unitCode': 'wmoUnit:percent', 'value': rng.randint(30, 95)},
+                'windSpeed': f'{rng.randint(0, 15)} mph', 'windDirection': 'SW',
+                'shortForecast': rng.choice(['Sunny', 'Partly Cloudy', 'Chance Showers And Thunderstorms'])}
+               for h in range(days * 24)]
+    u = upstream.Upstreams()
+    payloads = {
+        'open_meteo': (u.open_meteo(dates[0], dates[-1]), {'latitude': u.lat, 'hourly': snap['open_meteo']}),
+        'gridpoint': (u.gridpoint_url(), {'properties': dict(snap['gridpoint'], updateTime=start.isoformat())}),
+        'hourly': (u.hourly_url(), {'properties': {'periods': periods}}),
+        'alerts': (u.alerts_url(), {'type': 'FeatureCollection',
+                                    'features': alert_stream.synthetic_alerts(3, seed, now)}),
+        'spc': (u.spc_query_url(), {'features': [{'attributes': {'dn': 4, 'valid': '', 'expire': ''}}]}),
+    }
+    interactions = []
+    for source, (url, payload) in payloads.items():
+        latency = SYNTHETIC_LATENCY[source] * rng.uniform(0.8, 1.3)
+        ctype = 'application/geo+json' if source in ('gridpoint', 'hourly', 'alerts') else 'application/json'
+        interactions.append(Interaction(url, 200, {'Content-Type': ctype, 'ETag': f'"{source}-{seed}"'},
+                                        json.dumps(payload).encode('utf-8'), latency, source))
+    return Cassette(interactions, 'synthetic', now, {'dates': dates})
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def benchmark(out=sys.stdout):
+    """Offline pipeline runs: recorded speed, full speed, and each fault scenario"""
+    cassette = synthetic_cassette()
+    sizes = ', '.join(f"{s} {n / 1024:.0f} KiB/{lat * 1000:.0f} ms" for s, (_, n, lat) in cassette.profile().items())
+    print(f"cassette: {sizes}", file=out)
+    for label, speed in (('recorded speed', 1.0), ('full speed', None)):
+        snapshot, days, elapsed = asyncio.run(replay_pipeline(cassette, speed))
+        print(f"  {label:<16} aggregate + compile {elapsed * 1000:6.0f} ms, "
+              f"{sum(len(r) for r in days.values())} hours", file=out)
+    for kind in SCENARIOS:
+        scenario = cassette.scenario(kind, ['gridpoint', 'alerts'])
+        snapshot, days, elapsed = asyncio.run(replay_pipeline(scenario, speed=20.0))
+        states = ', '.join(f"{n}={snapshot['sources'][n]['state']}" for n in ('gridpoint', 'alerts', 'open_meteo'))
+        print(f"  {kind:<16} (20x) {elapsed * 1000:6.0f} ms, ok={snapshot['ok']}, {states}", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Record and replay upstream traffic')
+    parser.add_argument('--record', metavar='PATH', help='Capture one refresh of the live upstreams')
+    parser.add_argument('--serve', metavar='PATH', help='Replay a cassette on --port')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--speed', type=float, default=None, help='1 = recorded latency, N = N times faster')
+    parser.add_argument('--scenario', help='KIND[:source,source] e.g. outage:gridpoint or timeout')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    if args.record:
+        cassette = asyncio.run(record_live())
+        cassette.save(args.record)
+        for source, (n, size, lat) in cassette.profile().items():
+            print(f"{source}: {n} response(s), {size} bytes, {lat * 1000:.0f} ms")
+        return
+    if not args.serve:
+        parser.error('--record or --serve is required (or --bench)')
+    cassette = Cassette.load(args.serve)
+    if args.scenario:
+        kind, _, targets = args.scenario.partition(':')
+        cassette = cassette.scenario(kind, targets.split(',') if targets else None)
+
+    async def serve():
+        server = ReplayServer(cassette, args.speed)
+        await server.start(args.host, args.port)
+        print(f"Replaying {cassette.name} ({len(cassette.interactions)} responses) on {server.url}")
+        await server.server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
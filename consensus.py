@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+
+"""
+Model Consensus Engine
+
+Python port of compile(), classify() and radLvl() from
+weebly/mebane-weather-widget.html, in two forms:
+
+- compile_day(): a line-by-line scalar port that keeps the widget's exact
+  semantics (including omV()'s linear time.indexOf scan). It is the reference.
+- ConsensusEngine: the same numbers computed as batched array operations over
+  a (days x 24 hours x models) cube. Open-Meteo lookups go through a hash
+  index of the time axis, so one render costs O(hours x fields) instead of
+  O(hours^2 x fields). Many locations can be stacked into one batch.
+
+NumPy is used when installed; otherwise a pure-Python column backend runs the
+same batched formulas. Both reproduce the JS output exactly (JS Math.round
+semantics, same evaluation order for the 40/25/20/15 weights).
+
+Usage:
+    python3 consensus.py --bench            # 7 and 16 days, 1..100 locations
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional: pure-Python columns are used instead
+    np = None
+
+MODELS = ('gfs_global', 'ecmwf_ifs025', 'icon_seamless', 'gfs_hrrr')
+MODEL_KEYS = {'gfs_global': 'GFS', 'ecmwf_ifs025': 'ECMWF', 'icon_seamless': 'ICON', 'gfs_hrrr': 'HRRR'}
+
+# compile() consensus weights: NWS 40%, GFS 20%, ECMWF 25%, HRRR 15% (ICON unweighted)
+WEIGHTS = (('NWS', 0.40), ('GFS', 0.20), ('ECMWF', 0.25), ('HRRR', 0.15))
+
+THREATS = ('TSTM', 'RAIN', 'SHOWER', 'SLIGHT', 'LOW', 'CLEAR')
+
+WMO = {0: 'Clear', 1: 'Mostly Clear', 2: 'Partly Cloudy', 3: 'Overcast', 45: 'Fog',
+       51: 'Lt Drizzle', 53: 'Drizzle', 61: 'Lt Rain', 63: 'Rain', 65: 'Heavy Rain',
+       80: 'Showers', 81: 'Showers', 82: 'Heavy Showers', 95: 'Thunderstorm', 96: 'T-Storm', 99: 'T-Storm'}
+
+# Fields produced by the batched engine (the per-hour numbers that drive the UI)
+ENGINE_FIELDS = ('pNWS', 'pGFS', 'pECMWF', 'pHRRR', 'pICON', 'pCons', 'thun',
+                 'qNWS', 'qGFS', 'qECMWF', 'qHRRR', 'qICON',
+                 'cGFS', 'cECMWF', 'cHRRR', 'cICON', 'cMax', 'wx', 'threat', 'rl')
+
+
+def js_round(x):
+    """Math.round: nearest integer, ties toward +infinity (exact for all doubles)"""
+    r = math.floor(x)
+    return int(r + 1) if x - r >= 0.5 else int(r)
+
+
+def grid_key(date_str, utc_h):
+    """Key format used by gMap/gQPF and the nwsHrly map: 'YYYY-MM-DD_H'"""
+    return date_str + '_' + str(utc_h)
+
+
+def local_hour(utc_h, et_off_min):
+    """utcToET(): UTC hour -> Eastern hour for a fixed offset in minutes"""
+    return ((utc_h + et_off_min // 60) % 24 + 24) % 24
+
+
+def unpack_om(hourly, model):
+    """unpackOM(): flat multi-model hourly object -> per-model object"""
+    if not hourly or not hourly.get('time'):
+        return None
+    out = {'time': hourly['time']}
+    suffix = '_' + model
+    for key, values in hourly.items():
+        if key != 'time' and key.endswith(suffix):
+            out[key[:-len(suffix)]] = values
+    return out
+
+
+def classify(p_nws, thun, cape, p_gfs, p_ecmwf):
+    """Threat classify (mirror of classify())"""
+    mx = max(p_nws or 0, p_gfs or 0, p_ecmwf or 0)
+    has_t = thun > 20 or (thun > 10 and cape > 300)
+    if has_t and mx >= 25:
+        return 'TSTM'
+    if mx >= 50:
+        return 'RAIN'
+    if mx >= 25:
+        return 'SHOWER'
+    if mx >= 12:
+        return 'SLIGHT'
+    if mx >= 5:
+        return 'LOW'
+    return 'CLEAR'
+
+
+def rad_lvl(cape, thun, pop, wx):
+    """Radar level 0-5 (mirror of radLvl())"""
+    s = 0
+    if cape > 1000:
+        s += 3
+    elif cape > 500:
+        s += 2
+    elif cape > 200:
+        s += 1
+    if thun > 30:
+        s += 2
+    elif thun > 10:
+        s += 1
+    if pop > 40:
+        s += 1
+    if wx >= 95:
+        s += 2
+    return min(s, 5)
+
+
+# ── Scalar reference (exact port of compile()) ───────────────────────────────
+
+def om_v(src, field, date_str, utc_h, et_off_min):
+    """omV(): value lookup with the widget's linear time.indexOf scan"""
+    if not src:
+        return 0
+    lh = local_hour(utc_h, et_off_min)
+    tgt = date_str + 'T' + ('0' if lh < 10 else '') + str(lh) + ':00'
+    try:
+        idx = src['time'].index(tgt) if src.get('time') else -1
+    except ValueError:
+        idx = -1
+    if idx < 0:
+        return 0
+    values = src.get(field)
+    if not values or idx >= len(values):
+        return 0  # undefined || 0
+    v = values[idx]
+    return (v or 0) if v == v else 0  # NaN (decoded null) || 0
+
+
+def _nested(period, name):
+    value = period.get(name)
+    return value.get('value') if isinstance(value, dict) else None
+
+
+def compile_day(date_str, models, grid, nws_hourly, et_off_min):
+    """compile(): one day of hourly records.
+
+    models: {'gfs_global': unpacked OM object or None, ...}
+    grid: {'pop','thun','sky','temp','dew','wind','gust','rh','qpf'} -> gMap-style dicts
+    nws_hourly: 'YYYY-MM-DD_H' -> NWS hourly period
+    """
+    gfs, ecmwf = models.get('gfs_global'), models.get('ecmwf_ifs025')
+    icon, hrrr = models.get('icon_seamless'), models.get('gfs_hrrr')
+    recs = []
+    for utc_h in range(24):
+        try:
+            k = grid_key(date_str, utc_h)
+            n_p = nws_hourly.get(k) or {}
+            t_c = grid['temp'].get(k)
+            t_f = js_round(t_c * 9 / 5 + 32) if t_c is not None else n_p.get('temperature')
+            d_c = grid['dew'].get(k)
+            d_f = js_round(d_c * 9 / 5 + 32) if d_c is not None else None
+            p_nws = js_round(grid['pop'].get(k) or _nested(n_p, 'probabilityOfPrecipitation') or 0)
+            thun = js_round(grid['thun'].get(k) or 0)
+            sky = js_round(grid['sky'].get(k) or 0)
+            wind = js_round((grid['wind'].get(k) or 0) * 0.621371)
+            gust = js_round((grid['gust'].get(k) or 0) * 0.621371)
+            rh = js_round(grid['rh'].get(k) or _nested(n_p, 'relativeHumidity') or 0)
+            q_nws = js_round((grid['qpf'].get(k) or 0) * 10000) / 10000
+
+            def v(src, field):
+                return om_v(src, field, date_str, utc_h, et_off_min)
+
+            p_gfs = js_round(v(gfs, 'precipitation_probability'))
+            p_ecmwf = js_round(v(ecmwf, 'precipitation_probability'))
+            p_hrrr = js_round(v(hrrr, 'precipitation_probability'))
+            p_icon = js_round(v(icon, 'precipitation_probability'))
+            p_cons = js_round(p_nws * 0.40 + p_gfs * 0.20 + p_ecmwf * 0.25 + p_hrrr * 0.15)
+            q_gfs = js_round(v(gfs, 'precipitation') * 10000) / 10000
+            q_ecmwf = js_round(v(ecmwf, 'precipitation') * 10000) / 10000
+            q_hrrr = js_round(v(hrrr, 'precipitation') * 10000) / 10000
+            q_icon = js_round(v(icon, 'precipitation') * 10000) / 10000
+            c_gfs = js_round(v(gfs, 'cape'))
+            c_ecmwf = js_round(v(ecmwf, 'cape'))
+            c_hrrr = js_round(v(hrrr, 'cape'))
+            c_icon = js_round(v(icon, 'cape'))
+            c_max = max(c_gfs, c_ecmwf, c_hrrr, c_icon)
+            li_gfs = js_round((v(gfs, 'lifted_index') or 0) * 10) / 10
+            wx = js_round(v(gfs, 'weathercode'))
+            threat = classify(p_nws, thun, c_max, p_gfs, p_ecmwf)
+            rl = rad_lvl(c_max, thun, p_nws, wx)
+            if thun > 25:
+                wx_desc = 'Chance T-Storm'
+            elif thun > 10:
+                wx_desc = 'Slight Ch. T-Storm'
+            elif p_nws > 30 or p_ecmwf > 40:
+                wx_desc = 'Chance Showers'
+            elif p_nws > 15:
+                wx_desc = 'Slight Ch. Showers'
+            else:
+                wx_desc = WMO.get(wx) or 'Partly Cloudy'
+            recs.append({
+                'utcH': utc_h, 'sky': sky, 'tF': t_f, 'dF': d_f, 'wind': wind, 'gust': gust, 'rh': rh,
+                'pNWS': p_nws, 'pGFS': p_gfs, 'pECMWF': p_ecmwf, 'pHRRR': p_hrrr, 'pICON': p_icon,
+                'pCons': p_cons, 'thun': thun, 'qNWS': q_nws, 'qGFS': q_gfs, 'qECMWF': q_ecmwf,
+                'qHRRR': q_hrrr, 'qICON': q_icon, 'cGFS': c_gfs, 'cECMWF': c_ecmwf,
+                'cHRRR': c_hrrr, 'cICON': c_icon, 'cMax': c_max, 'liGFS': li_gfs, 'wx': wx,
+                'wxDesc': wx_desc, 'threat': threat, 'rl': rl
+            })
+        except (TypeError, KeyError, AttributeError):
+            continue  # skip bad hour, never crash
+    return recs
+
+
+# ── Batched engine ───────────────────────────────────────────────────────────
+
+class LocationInput:
+    """Everything compile() needs for one location"""
+
+    __slots__ = ('dates', 'models', 'grid', 'nws_hourly', 'et_off_min')
+
+    def __init__(self, dates, models, grid, nws_hourly, et_off_min):
+        self.dates = list(dates)
+        self.models = models
+        self.grid = grid
+        self.nws_hourly = nws_hourly
+        self.et_off_min = et_off_min
+
+
+def _om_column(src, field, slots):
+    """Gather one OM field for every (day, hour) slot via a hash index of time"""
+    if not src or not src.get('time'):
+        return [0.0] * len(slots)
+    # om_decoder views carry a prebuilt index
+    index = getattr(src, 'time_index', None)
+    if index is None:
+        index = {}
+        for i, t in enumerate(src['time']):
+            index.setdefault(t, i)  # first occurrence, like indexOf
+    values = src.get(field)
+    if values is None or not len(values):
+        return [0.0] * len(slots)
+    out = []
+    for tgt in slots:
+        i = index.get(tgt)
+        v = values[i] if i is not None and i < len(values) else 0
+        out.append((v or 0) if v == v else 0)  # NaN (decoded null) counts as null
+    return out
+
+
+def _gather(location):
+    """Flatten one location into per-slot columns (days*24 long)"""
+    om_slots, keys = [], []
+    for date_str in location.dates:
+        for utc_h in range(24):
+            lh = local_hour(utc_h, location.et_off_min)
+            om_slots.append(date_str + 'T' + ('0' if lh < 10 else '') + str(lh) + ':00')
+            keys.append(grid_key(date_str, utc_h))
+    grid, hourly = location.grid, location.nws_hourly
+    cols = {
+        # `a or b or 0` reproduces the JS `a||b||0` fallbacks
+        'pop': [grid['pop'].get(k) or _nested(hourly.get(k) or {}, 'probabilityOfPrecipitation') or 0
+                for k in keys],
+        'thun': [grid['thun'].get(k) or 0 for k in keys],
+        'qpf': [grid['qpf'].get(k) or 0 for k in keys]
+    }
+    for model in MODELS:
+        src = location.models.get(model)
+        tag = MODEL_KEYS[model]
+        cols['p' + tag] = _om_column(src, 'precipitation_probability', om_slots)
+        cols['q' + tag] = _om_column(src, 'precipitation', om_slots)
+        cols['c' + tag] = _om_column(src, 'cape', om_slots)
+    cols['wx'] = _om_column(location.models.get('gfs_global'), 'weathercode', om_slots)
+    return cols
+
+
+def _compute_numpy(cols):
+    a = {k: np.asarray(v, dtype=np.float64) for k, v in cols.items()}
+
+    def rnd(x):
+        r = np.floor(x)
+        return r + (x - r >= 0.5)
+
+    out = {'pNWS': rnd(a['pop']), 'thun': rnd(a['thun'])}
+    out['qNWS'] = rnd(a['qpf'] * 10000) / 10000
+    for tag in ('GFS', 'ECMWF', 'HRRR', 'ICON'):
+        out['p' + tag] = rnd(a['p' + tag])
+        out['q' + tag] = rnd(a['q' + tag] * 10000) / 10000
+        out['c' + tag] = rnd(a['c' + tag])
+    out['pCons'] = rnd(out['pNWS'] * 0.40 + out['pGFS'] * 0.20
+                       + out['pECMWF'] * 0.25 + out['pHRRR'] * 0.15)
+    cube = np.stack([out['cGFS'], out['cECMWF'], out['cHRRR'], out['cICON']], axis=-1)
+    out['cMax'] = cube.max(axis=-1)
+    out['wx'] = rnd(a['wx'])
+
+    mx = np.maximum(np.maximum(out['pNWS'], out['pGFS']), out['pECMWF'])
+    thun, cape = out['thun'], out['cMax']
+    has_t = (thun > 20) | ((thun > 10) & (cape > 300))
+    out['threat'] = np.select(
+        [has_t & (mx >= 25), mx >= 50, mx >= 25, mx >= 12, mx >= 5], [0, 1, 2, 3, 4], 5)
+    score = (np.where(cape > 1000, 3, np.where(cape > 500, 2, np.where(cape > 200, 1, 0)))
+             + np.where(thun > 30, 2, np.where(thun > 10, 1, 0))
+             + (out['pNWS'] > 40) + 2 * (out['wx'] >= 95))
+    out['rl'] = np.minimum(score, 5)
+    return {k: v.tolist() for k, v in out.items()}
+
+
+def _compute_python(cols):
+    rnd = js_round
+    out = {'pNWS': [rnd(x) for x in cols['pop']], 'thun': [rnd(x) for x in cols['thun']]}
+    out['qNWS'] = [rnd(x * 10000) / 10000 for x in cols['qpf']]
+    for tag in ('GFS', 'ECMWF', 'HRRR', 'ICON'):
+        out['p' + tag] = [rnd(x) for x in cols['p' + tag]]
+        out['q' + tag] = [rnd(x * 10000) / 10000 for x in cols['q' + tag]]
+        out['c' + tag] = [rnd(x) for x in cols['c' + tag]]
+    out['pCons'] = [rnd(n * 0.40 + g * 0.20 + e * 0.25 + h * 0.15)
+                    for n, g, e, h in zip(out['pNWS'], out['pGFS'], out['pECMWF'], out['pHRRR'])]
+    out['cMax'] = [max(g, e, h, i) for g, e, h, i in
+                   zip(out['cGFS'], out['cECMWF'], out['cHRRR'], out['cICON'])]
+    out['wx'] = [rnd(x) for x in cols['wx']]
+    out['threat'] = [THREATS.index(classify(n, t, c, g, e)) for n, t, c, g, e in
+                     zip(out['pNWS'], out['thun'], out['cMax'], out['pGFS'], out['pECMWF'])]
+    out['rl'] = [rad_lvl(c, t, n, w) for c, t, n, w in
+                 zip(out['cMax'], out['thun'], out['pNWS'], out['wx'])]
+    return out
+
+
+class ConsensusEngine:
+    """Batched consensus over many locations and days"""
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = 'numpy' if np is not None else 'python'
+        if backend == 'numpy' and np is None:
+            raise RuntimeError('NumPy backend requested but numpy is not installed')
+        self.backend = backend
+
+    def run(self, locations):
+        """Compute ENGINE_FIELDS for every location.
+
+        Returns one result per location: {'dates': [...], field: [[24 values] per day]}.
+        Threat is returned as the classify() label.
+        """
+        gathered = [_gather(loc) for loc in locations]
+        if not gathered:
+            return []
+        # Stack all locations into one flat batch, compute once, split back out
+        names = list(gathered[0])
+        cols = {name: [v for g in gathered for v in g[name]] for name in names}
+        out = _compute_numpy(cols) if self.backend == 'numpy' else _compute_python(cols)
+
+        results, offset = [], 0
+        for loc in locations:
+            n = len(loc.dates) * 24
+            res = {'dates': loc.dates}
+            for field in ENGINE_FIELDS:
+                flat = out[field][offset:offset + n]
+                if field == 'threat':
+                    flat = [THREATS[int(t)] for t in flat]
+                elif not field.startswith('q'):
+                    flat = [int(x) for x in flat]
+                res[field] = [flat[d * 24:(d + 1) * 24] for d in range(len(loc.dates))]
+            results.append(res)
+            offset += n
+        return results
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_location(n_days, seed=0, et_off_min=-240, start='2026-06-01'):
+    """Deterministic location input shaped like a real Open-Meteo + NWS payload"""
+    import datetime
+    rng = random.Random(seed)
+    first = datetime.date.fromisoformat(start)
+    dates = [(first + datetime.timedelta(days=i)).isoformat() for i in range(n_days)]
+    times = [d + 'T' + f'{h:02d}' + ':00' for d in dates for h in range(24)]
+    models = {}
+    for model in MODELS:
+        models[model] = {
+            'time': times,
+            'precipitation_probability': [rng.choice([None, 0, rng.randint(0, 100)]) for _ in times],
+            'precipitation': [round(rng.random() * 0.3, 3) if rng.random() < 0.3 else 0 for _ in times],
+            'cape': [rng.choice([0, rng.uniform(0, 2500)]) for _ in times],
+            'lifted_index': [rng.uniform(-6, 8) for _ in times],
+            'weathercode': [rng.choice([0, 1, 2, 3, 61, 63, 80, 95]) for _ in times]
+        }
+    grid = {name: {} for name in ('pop', 'thun', 'sky', 'temp', 'dew', 'wind', 'gust', 'rh', 'qpf')}
+    for d in dates:
+        for h in range(24):
+            k = grid_key(d, h)
+            grid['pop'][k] = rng.choice([0, rng.randint(0, 100)])
+            grid['thun'][k] = rng.choice([0, rng.randint(0, 60)])
+            grid['sky'][k] = rng.randint(0, 100)
+            grid['temp'][k] = rng.uniform(-5, 35)
+            grid['dew'][k] = rng.uniform(-10, 25)
+            grid['wind'][k] = rng.uniform(0, 40)
+            grid['gust'][k] = rng.uniform(0, 70)
+            grid['rh'][k] = rng.uniform(10, 100)
+            grid['qpf'][k] = rng.random() / 25.4 if rng.random() < 0.3 else 0
+    return LocationInput(dates, models, grid, {}, et_off_min)
+
+
+def benchmark(day_counts=(7, 16), location_counts=(1, 10, 100), repeat=3, out=sys.stdout):
+    """Time the scalar reference vs the batched engine"""
+    engine = ConsensusEngine()
+    print(f"backend: {engine.backend}", file=out)
+    print(f"{'days':>5} {'locs':>5} {'scalar ms':>11} {'batched ms':>11} {'speedup':>8}", file=out)
+    rows = []
+    for n_days in day_counts:
+        for n_locs in location_counts:
+            locs = [synthetic_location(n_days, seed=i) for i in range(n_locs)]
+            best_scalar = best_batch = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                for loc in locs:
+                    for date_str in loc.dates:
+                        compile_day(date_str, loc.models, loc.grid, loc.nws_hourly, loc.et_off_min)
+                best_scalar = min(best_scalar, time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                engine.run(locs)
+                best_batch = min(best_batch, time.perf_counter() - t0)
+            rows.append((n_days, n_locs, best_scalar * 1000, best_batch * 1000))
+            print(f"{n_days:>5} {n_locs:>5} {best_scalar * 1000:>11.1f} {best_batch * 1000:>11.1f} "
+                  f"{best_scalar / best_batch:>7.1f}x", file=out)
+    return rows
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Batched model consensus engine')
+    parser.add_argument('--bench', action='store_true', help='Run the 7/16-day benchmark')
+    parser.add_argument('--locations', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(location_counts=tuple(args.locations))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
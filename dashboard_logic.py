@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+"""
+Shared Dashboard Logic
+
+Python port of the threat, alert and winter-weather rules used by
+Severe-Weather-Dashboard.html. The test runner checks these rules and the
+server-side tools reuse them, so every Python component has the same idea of
+what counts as a warning.
+"""
+
+# SPC outlook DN values -> risk category codes (checkSPCRiskFromAPI codeMap)
+SPC_CODE_MAP = {2: 'TSTM', 3: 'MRGL', 4: 'SLGT', 5: 'ENH', 6: 'MDT', 8: 'HIGH'}
+
+# Severity order used by fetchSPC() when several outlook polygons overlap
+SPC_RANK = {'NONE': 0, 'TSTM': 1, 'MRGL': 2, 'SLGT': 3, 'ENH': 4, 'MDT': 5, 'HIGH': 6}
+
+CAUTION_RISKS = ('ENH', 'MDT', 'HIGH')
+MONITOR_RISKS = ('MRGL', 'SLGT')
+
+# Winter weather synonym dictionary (mirror of WINTER_WEATHER_SYNONYMS)
+WINTER_WEATHER_SYNONYMS = {
+    'alerts': [
+        # Advisories
+        'winter weather advisory',
+        'freezing rain advisory',
+        'snow advisory',
+        'wind chill advisory',
+        'frost advisory',
+        'lake effect snow advisory',
+        'winter weather statement',
+        # Warnings
+        'winter storm warning',
+        'winter weather warning',
+        'ice storm warning',
+        'blizzard warning',
+        'wind chill warning',
+        'freeze warning',
+        'freezing rain warning',
+        'snow squall warning',
+        'lake effect snow warning',
+        'extreme cold warning',
+        'hard freeze warning',
+        # Watches
+        'winter storm watch',
+        'ice storm watch',
+        'blizzard watch',
+        'wind chill watch',
+        'extreme cold watch',
+        'freeze watch',
+        'freezing rain watch',
+        'lake effect snow watch'
+    ],
+    'phenomena': [
+        # Snow terms
+        'snow', 'snowfall', 'snowing', 'snowstorm', 'snowfall',
+        'snow squall', 'snow shower', 'snow flurries', 'flurries',
+        'blowing snow', 'drifting snow', 'snowdrift',
+        'lake effect snow', 'upslope snow',
+        'accumulating snow', 'snow accumulation', 'snow totals',
+        'snowfall rates', 'heavy snow', 'significant snow',
+        # Ice terms
+        'ice', 'icing', 'black ice', 'glaze ice',
+        'freezing rain', 'freezing drizzle', 'freezing fog',
+        'ice accumulation', 'ice buildup', 'ice storm',
+        'ice formation', 'ice coating',
+        # Mixed precipitation
+        'sleet', 'sleeting', 'sleet pellets',
+        'wintry', 'wintry mix', 'winter precipitation',
+        'freezing precipitation', 'mixed precipitation',
+        # Cold conditions
+        'freezing temperatures', 'below freezing',
+        'wind chill', 'windchill', 'wind chill factor',
+        'extreme cold', 'bitter cold', 'dangerous cold',
+        'hard freeze', 'freeze', 'frost',
+        # Visibility/conditions
+        'blizzard', 'whiteout', 'near-zero visibility',
+        'winter conditions', 'winter weather',
+        'hazardous winter weather', 'winter storm'
+    ],
+    'severity': [
+        'imminent', 'occurring', 'expected',
+        'developing', 'arriving', 'approaching',
+        'significant', 'hazardous', 'dangerous'
+    ]
+}
+
+# Warning patterns checked by detectWinterWeatherInText once score >= 5
+WINTER_TEXT_WARNING_PATTERNS = [
+    'winter storm warning', 'winter weather warning', 'ice storm warning',
+    'blizzard warning', 'freezing rain warning', 'snow squall warning',
+    'wind chill warning', 'extreme cold warning'
+]
+
+THREAT_DESCRIPTIONS = {
+    'winter_warning': 'Winter Precipitation Imminent and/or Occurring',
+    'warning': 'Active weather warnings in effect - follow official guidance',
+    'winter_advisory': 'Monitor for Winter Conditions',
+    'caution': 'Elevated severe weather risk - stay alert',
+    'monitor': 'Monitor conditions for potential development',
+    'safe': 'No severe weather expected'
+}
+
+
+def spc_code_for_dn(dn):
+    """Map an SPC outlook DN value to its risk code, or None if unknown"""
+    return SPC_CODE_MAP.get(dn)
+
+
+def _event_of(alert):
+    """Return the event string of an NWS alert feature ('' if malformed)"""
+    if not alert or not isinstance(alert, dict) or not isinstance(alert.get('properties'), dict):
+        return None
+    event = alert['properties'].get('event')
+    return event if isinstance(event, str) else ''
+
+
+def _severity_of(alert):
+    severity = alert['properties'].get('severity')
+    return severity.lower() if isinstance(severity, str) else ''
+
+
+def calculate_threat_level(has_active_warnings, spc_risk_level):
+    """Threat level from warnings and SPC risk (no winter weather)"""
+    if has_active_warnings:
+        return 'WARNING'
+    elif spc_risk_level and spc_risk_level in CAUTION_RISKS:
+        return 'CAUTION'
+    elif spc_risk_level and spc_risk_level in MONITOR_RISKS:
+        return 'MONITOR'
+    else:
+        return 'SAFE'
+
+
+def calculate_threat_level_with_winter(has_active_warnings, spc_risk_level, winter_status):
+    """Threat level including winter weather (updateDashboard priority order)"""
+    if has_active_warnings:
+        if winter_status == 'warning':
+            return {'level': 'WARNING', 'description': THREAT_DESCRIPTIONS['winter_warning']}
+        return {'level': 'WARNING', 'description': THREAT_DESCRIPTIONS['warning']}
+    elif winter_status == 'advisory':
+        return {'level': 'MONITOR', 'description': THREAT_DESCRIPTIONS['winter_advisory']}
+    elif spc_risk_level and spc_risk_level in CAUTION_RISKS:
+        return {'level': 'CAUTION', 'description': THREAT_DESCRIPTIONS['caution']}
+    elif spc_risk_level and spc_risk_level in MONITOR_RISKS:
+        return {'level': 'MONITOR', 'description': THREAT_DESCRIPTIONS['monitor']}
+    else:
+        return {'level': 'SAFE', 'description': THREAT_DESCRIPTIONS['safe']}
+
+
+def filter_display_alerts(alerts):
+    """Warnings/watches/advisories with severe, moderate or minor severity"""
+    filtered = []
+    for alert in alerts or []:
+        event = _event_of(alert)
+        if event is None:
+            continue
+        event_lower = event.lower()
+        if (any(keyword in event_lower for keyword in ('warning', 'watch', 'advisory'))
+                and _severity_of(alert) in ('severe', 'moderate', 'minor')):
+            filtered.append(alert)
+    return filtered
+
+
+def filter_warning_alerts(alerts):
+    """Alerts that are warnings proper (not watches or advisories)"""
+    warnings = []
+    for alert in alerts or []:
+        event = _event_of(alert)
+        if event is None:
+            continue
+        event_lower = event.lower()
+        if ('warning' in event_lower
+                and 'watch' not in event_lower
+                and 'advisory' not in event_lower):
+            warnings.append(alert)
+    return warnings
+
+
+def is_winter_weather_alert(event_name):
+    """Check if alert is winter weather related"""
+    if not event_name or not isinstance(event_name, str):
+        return False
+    event_lower = event_name.lower()
+    return any(alert in event_lower for alert in WINTER_WEATHER_SYNONYMS['alerts'])
+
+
+def detect_winter_weather_from_alerts(alerts):
+    """Detect winter weather status from alert array"""
+    if not alerts or not isinstance(alerts, list) or len(alerts) == 0:
+        return {'status': 'none', 'has_advisory': False, 'has_warning': False}
+
+    has_warning = False
+    has_advisory = False
+
+    for alert in alerts:
+        event = _event_of(alert)
+        if event is None or not is_winter_weather_alert(event):
+            continue
+
+        event_lower = event.lower()
+
+        # Warnings (highest priority) - must exclude watch/advisory/statement
+        if ('warning' in event_lower and
+                'watch' not in event_lower and
+                'advisory' not in event_lower and
+                'statement' not in event_lower):
+            has_warning = True
+        # Advisories, statements, and watches unless flagged severe
+        elif ('advisory' in event_lower or
+              'statement' in event_lower or
+              ('watch' in event_lower and _severity_of(alert) != 'severe')):
+            has_advisory = True
+
+    if has_warning:
+        return {'status': 'warning', 'has_advisory': True, 'has_warning': True}
+    elif has_advisory:
+        return {'status': 'advisory', 'has_advisory': True, 'has_warning': False}
+
+    return {'status': 'none', 'has_advisory': False, 'has_warning': False}
+
+
+def detect_winter_weather_in_text(text):
+    """Score free text (e.g. an AFD) for winter weather, like detectWinterWeatherInText"""
+    if not text or not isinstance(text, str):
+        return {'status': 'none', 'confidence': 0}
+
+    text_lower = text.lower()
+    score = 0
+    has_warning_terms = False
+    has_advisory_terms = False
+
+    for term in WINTER_WEATHER_SYNONYMS['phenomena']:
+        if term in text_lower:
+            score += 2
+
+    for term in WINTER_WEATHER_SYNONYMS['severity']:
+        if term in text_lower:
+            score += 1
+            if term in ('imminent', 'occurring'):
+                has_warning_terms = True
+
+    for alert in WINTER_WEATHER_SYNONYMS['alerts']:
+        if alert in text_lower:
+            score += 3
+            if 'warning' in alert and 'watch' not in alert and 'advisory' not in alert:
+                has_warning_terms = True
+            elif 'advisory' in alert or 'watch' in alert or 'statement' in alert:
+                has_advisory_terms = True
+
+    if score >= 5:
+        if has_warning_terms or any(p in text_lower for p in WINTER_TEXT_WARNING_PATTERNS):
+            return {'status': 'warning', 'confidence': min(score, 10)}
+        elif (has_advisory_terms or
+              'winter weather advisory' in text_lower or
+              'winter storm watch' in text_lower or
+              'winter weather statement' in text_lower):
+            return {'status': 'advisory', 'confidence': min(score, 8)}
+        return {'status': 'advisory', 'confidence': min(score, 6)}
+
+    return {'status': 'none', 'confidence': 0}
+
+
+def summarize_alerts(alerts, spc_risk_level=None):
+    """Combined alert/threat summary for one location, as the dashboard computes it"""
+    alerts = alerts if isinstance(alerts, list) else []
+    display = filter_display_alerts(alerts)
+    warnings = filter_warning_alerts(alerts)
+    winter = detect_winter_weather_from_alerts(alerts)
+    # updateLocalAlertsAndGetStatus only reports warnings when something is displayable
+    has_active_warnings = bool(display) and bool(warnings)
+    threat = calculate_threat_level_with_winter(has_active_warnings, spc_risk_level, winter['status'])
+    return {
+        'threat': threat,
+        'has_active_warnings': has_active_warnings,
+        'winter': winter,
+        'spc_risk': spc_risk_level,
+        'display_alerts': [_event_of(a) for a in display[:3]],
+        'alert_count': len(alerts)
+    }
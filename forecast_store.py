@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+
+"""
+Forecast History Store
+
+compile() rebuilds ~30 numbers per hour (pNWS .. pCons, qpf, CAPE, LI, wx,
+threat) in the browser and throws them away, so there is no record of what
+the consensus said at each model run. This store keeps that history:
+
+- append-only columns, one fixed-width file per field (array typecodes, NaN
+  or the type's minimum for "missing"), keyed by run time and valid hour,
+- one directory per location with a small meta.json committed atomically
+  after each append, so a crash mid-append loses at most that run,
+- reads through mmap + memoryview.cast: range reads are zero-copy slices of
+  the column files, and opening a location costs one small JSON read, not a
+  load of its history,
+- rows come back as ForecastRecord views (__slots__, two fields) that decode
+  one column value on attribute access,
+- compact() rewrites a location into a new file generation: out-of-order
+  runs are merged back into run order, runs older than `keep_all_days` are
+  thinned to one per `thin_hours`, and runs beyond `max_age_days` dropped.
+
+Usage:
+    python3 forecast_store.py --bench
+"""
+
+import argparse
+import array
+import bisect
+import collections
+import datetime
+import json
+import math
+import mmap
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+from consensus import THREATS, WMO
+
+STORE_VERSION = 1
+
+# compile() record fields -> array typecode ('h' int16, 'f' float32, 'B' label index)
+RECORD_COLUMNS = (
+    ('utcH', 'h'), ('sky', 'h'), ('tF', 'h'), ('dF', 'h'), ('wind', 'h'), ('gust', 'h'), ('rh', 'h'),
+    ('pNWS', 'h'), ('pGFS', 'h'), ('pECMWF', 'h'), ('pHRRR', 'h'), ('pICON', 'h'), ('pCons', 'h'),
+    ('thun', 'h'), ('qNWS', 'f'), ('qGFS', 'f'), ('qECMWF', 'f'), ('qHRRR', 'f'), ('qICON', 'f'),
+    ('cGFS', 'h'), ('cECMWF', 'h'), ('cHRRR', 'h'), ('cICON', 'h'), ('cMax', 'h'), ('liGFS', 'f'),
+    ('wx', 'h'), ('wxDesc', 'B'), ('threat', 'B'), ('rl', 'h'),
+)
+KEY_COLUMNS = (('run', 'q'), ('valid', 'q'))
+COLUMNS = KEY_COLUMNS + RECORD_COLUMNS
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+TYPECODES = dict(COLUMNS)
+
+MISSING_INT = -32768
+MISSING_LABEL = 255
+
+# Labels stored as indexes: classify() threats and the wxDesc strings compile() can emit
+WX_DESCS = ('Chance T-Storm', 'Slight Ch. T-Storm', 'Chance Showers', 'Slight Ch. Showers',
+            'Partly Cloudy') + tuple(sorted(set(WMO.values()) - {'Partly Cloudy'}))
+LABELS = {'threat': THREATS, 'wxDesc': WX_DESCS}
+_LABEL_INDEX = {name: {label: i for i, label in enumerate(labels)} for name, labels in LABELS.items()}
+
+
+def location_dirname(key):
+    """Filesystem-safe directory name for a location key like '36.0959,-79.2665'"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', key) or '_'
+
+
+def valid_time(date_str, utc_h):
+    """Unix seconds of a compile() hour (the record's date_str + utcH, UTC)"""
+    day = datetime.date.fromisoformat(date_str)
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp()) + utc_h * 3600
+
+
+def _encode(name, value):
+    code = TYPECODES[name]
+    if code == 'B':
+        index = _LABEL_INDEX[name].get(value)
+        return MISSING_LABEL if index is None else index
+    if value is None:
+        return math.nan if code == 'f' else MISSING_INT
+    if code == 'f':
+        return float(value)
+    return max(MISSING_INT + 1, min(32767, int(value)))
+
+
+def _decode(name, raw):
+    code = TYPECODES[name]
+    if code == 'B':
+        labels = LABELS[name]
+        return labels[raw] if raw < len(labels) else None
+    if code == 'f':
+        return None if raw != raw else round(raw, 4)
+    if code == 'h' and raw == MISSING_INT:
+        return None
+    return raw
+
+
+# ── Record views ─────────────────────────────────────────────────────────────
+
+class ForecastRecord:
+    """One stored hour; attribute access decodes straight from the column views"""
+
+    __slots__ = ('_columns', '_row')
+
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+
+    def as_dict(self):
+        """compile()-shaped record plus run and valid"""
+        return {name: getattr(self, name) for name in COLUMN_NAMES}
+
+    def __repr__(self):
+        return f'ForecastRecord(run={self.run}, valid={self.valid})'
+
+
+def _field(name):
+    def get(self):
+        return _decode(name, self._columns[name][self._row])
+    return property(get, doc=f'{name} column value')
+
+
+for _name in COLUMN_NAMES:
+    setattr(ForecastRecord, _name, _field(_name))
+del _name
+
+
+class Rows:
+    """A set of stored rows: contiguous ranges read as zero-copy column slices"""
+
+    __slots__ = ('_columns', '_spans')
+
+    def __init__(self, columns, spans):
+        self._columns = columns
+        self._spans = [(a, b) for a, b in spans if b > a]
+
+    def __len__(self):
+        return sum(b - a for a, b in self._spans)
+
+    def __iter__(self):
+        for a, b in self._spans:
+            for row in range(a, b):
+                yield ForecastRecord(self._columns, row)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        for a, b in self._spans:
+            if i < b - a:
+                return ForecastRecord(self._columns, a + i)
+            i -= b - a
+        raise IndexError('row index out of range')
+
+    def column(self, name):
+        """Raw column values: a memoryview slice for one contiguous range, else a list"""
+        view = self._columns[name]
+        if len(self._spans) == 1:
+            a, b = self._spans[0]
+            return view[a:b]
+        return [v for a, b in self._spans for v in view[a:b]]
+
+    def values(self, name):
+        """Decoded column values (None for missing)"""
+        return [_decode(name, v) for a, b in self._spans for v in self._columns[name][a:b]]
+
+
+# ── Per-location columns ─────────────────────────────────────────────────────
+
+class LocationHistory:
+    """Column files of one location; rows [0, sorted_rows) are in run order"""
+
+    def __init__(self, directory, key=None):
+        self.directory = directory
+        self.key = key
+        self.rows = 0
+        self.sorted_rows = 0
+        self.generation = 0
+        self.stats = collections.Counter()
+        self._maps = {}
+        self._views = {}
+        self._mapped_rows = -1
+        self._tail_runs = {}          # run -> (start, stop) for rows appended out of order
+        os.makedirs(directory, exist_ok=True)
+        self._load_meta()
+
+    # ── Files and meta ───────────────────────────────────────────────────
+
+    def _column_path(self, name, generation=None):
+        gen = self.generation if generation is None else generation
+        return os.path.join(self.directory, f'{name}.{gen}.col')
+
+    def _meta_path(self):
+        return os.path.join(self.directory, 'meta.json')
+
+    def _load_meta(self):
+        try:
+            with open(self._meta_path(), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+        if (isinstance(meta, dict) and meta.get('version') == STORE_VERSION
+                and meta.get('columns') == [list(c) for c in COLUMNS] and meta.get('byteorder') == sys.byteorder):
+            self.rows = meta['rows']
+            self.sorted_rows = meta['sorted_rows']
+            self.generation = meta['generation']
+            self.key = self.key or meta.get('key')
+        # Drop rows past the committed count (crash mid-append) and stale generations
+        for name, code in COLUMNS:
+            path = self._column_path(name)
+            size = self.rows * array.array(code).itemsize
+            with open(path, 'ab') as f:
+                if f.tell() != size:
+                    f.truncate(size)
+        for entry in os.listdir(self.directory):
+            parts = entry.split('.')
+            if entry.endswith('.col') and parts[-2] != str(self.generation):
+                os.unlink(os.path.join(self.directory, entry))
+        self._scan_tail()
+
+    def _write_meta(self):
+        meta = {'version': STORE_VERSION, 'key': self.key, 'rows': self.rows, 'sorted_rows': self.sorted_rows,
+                'generation': self.generation, 'byteorder': sys.byteorder, 'columns': COLUMNS}
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, separators=(',', ':'))
+            os.replace(tmp, self._meta_path())
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _scan_tail(self):
+        self._tail_runs = {}
+        if self.rows == self.sorted_rows:
+            return
+        runs = self.columns['run']
+        i = self.sorted_rows
+        while i < self.rows:
+            run = runs[i]
+            j = i
+            while j < self.rows and runs[j] == run:
+                j += 1
+            self._tail_runs[run] = (i, j)
+            i = j
+
+    @property
+    def columns(self):
+        """name -> typed memoryview over the mmap'd column file (remapped after appends)"""
+        if self._mapped_rows != self.rows:
+            self._views = {}
+            for name, code in COLUMNS:
+                if self.rows == 0:
+                    self._views[name] = memoryview(array.array(code))
+                    continue
+                with open(self._column_path(name), 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Old maps are left to the GC: caller-held Rows may still export them
+                self._maps[name] = mapped
+                self._views[name] = memoryview(mapped).cast(code)
+            self._mapped_rows = self.rows
+            self.stats['remaps'] += 1
+        return self._views
+
+    # ── Appends ──────────────────────────────────────────────────────────
+
+    def has_run(self, run):
+        if run in self._tail_runs:
+            return True
+        runs = self.columns['run']
+        i = bisect.bisect_left(runs, run, 0, self.sorted_rows)
+        return i < self.sorted_rows and runs[i] == run
+
+    def append_run(self, run, days):
+        """Append one compiled run; days is {date_str: compile_day() records}.
+
+        Runs are immutable history: a run time already stored is skipped (False).
+        """
+        if self.has_run(run):
+            self.stats['duplicate_runs'] += 1
+            return False
+        hours = sorted((valid_time(date_str, rec['utcH']), rec)
+                       for date_str, recs in dict(days).items() for rec in recs)
+        if not hours:
+            return False
+        columns = {name: array.array(code) for name, code in COLUMNS}
+        for valid, rec in hours:
+            columns['run'].append(run)
+            columns['valid'].append(valid)
+            for name, _ in RECORD_COLUMNS:
+                columns[name].append(_encode(name, rec.get(name)))
+        in_order = self.rows == self.sorted_rows and (self.rows == 0 or run > self.columns['run'][self.rows - 1])
+        for name, _ in COLUMNS:
+            with open(self._column_path(name), 'ab') as f:
+                columns[name].tofile(f)
+        start = self.rows
+        self.rows += len(hours)
+        if in_order:
+            self.sorted_rows = self.rows
+        else:
+            self._tail_runs[run] = (start, self.rows)
+            self.stats['out_of_order_runs'] += 1
+        self._write_meta()
+        self.stats['appended_rows'] += len(hours)
+        return True
+
+    # ── Reads ────────────────────────────────────────────────────────────
+
+    def _run_spans(self):
+        """[(run, start, stop)] in run order; stepped by bisect, not a row scan"""
+        runs = self.columns['run']
+        out, i = [], 0
+        while i < self.sorted_rows:
+            j = bisect.bisect_right(runs, runs[i], i, self.sorted_rows)
+            out.append((runs[i], i, j))
+            i = j
+        if self._tail_runs:
+            out.extend((run, a, b) for run, (a, b) in self._tail_runs.items())
+            out.sort()
+        return out
+
+    def runs(self):
+        return [run for run, _, _ in self._run_spans()]
+
+    def run(self, run):
+        """Rows of one run (empty if not stored)"""
+        if run in self._tail_runs:
+            return Rows(self.columns, [self._tail_runs[run]])
+        runs = self.columns['run']
+        return Rows(self.columns, [(bisect.bisect_left(runs, run, 0, self.sorted_rows),
+                                    bisect.bisect_right(runs, run, 0, self.sorted_rows))])
+
+    def between(self, start, stop):
+        """Rows of runs with start <= run < stop, in run order"""
+        runs = self.columns['run']
+        spans = [(bisect.bisect_left(runs, start, 0, self.sorted_rows),
+                  bisect.bisect_left(runs, stop, 0, self.sorted_rows))]
+        spans += [span for run, span in self._tail_runs.items() if start <= run < stop]
+        spans.sort()
+        return Rows(self.columns, spans)
+
+    def valid_history(self, valid):
+        """[(run, record)] — what each stored run said about one valid hour"""
+        cols = self.columns
+        out = []
+        for run, a, b in self._run_spans():
+            i = bisect.bisect_left(cols['valid'], valid, a, b)
+            if i < b and cols['valid'][i] == valid:
+                out.append((run, ForecastRecord(cols, i)))
+        return out
+
+    # ── Compaction ───────────────────────────────────────────────────────
+
+    def compact(self, now=None, keep_all_days=14, thin_hours=6, max_age_days=None):
+        """Rewrite into run order, thinning and expiring old runs; returns rows dropped"""
+        now = time.time() if now is None else now
+        thin_before = now - keep_all_days * 86400
+        drop_before = now - max_age_days * 86400 if max_age_days is not None else None
+        kept, buckets = [], set()
+        for run, a, b in self._run_spans():
+            if drop_before is not None and run < drop_before:
+                continue
+            if run < thin_before:
+                bucket = run // (thin_hours * 3600)
+                if bucket in buckets:
+                    continue
+                buckets.add(bucket)
+            kept.append((a, b))
+        cols = self.columns
+        new_gen = self.generation + 1
+        for name, code in COLUMNS:
+            itemsize = array.array(code).itemsize
+            raw = cols[name].cast('B')
+            with open(self._column_path(name, new_gen), 'wb') as f:
+                for a, b in kept:
+                    f.write(raw[a * itemsize:b * itemsize])
+            del raw
+        old_rows, old_gen = self.rows, self.generation
+        self.rows = self.sorted_rows = sum(b - a for a, b in kept)
+        self.generation = new_gen
+        self._write_meta()
+        self._release_maps()
+        for name, _ in COLUMNS:
+            try:
+                os.unlink(self._column_path(name, old_gen))
+            except OSError:
+                pass
+        self._tail_runs = {}
+        self.stats['compactions'] += 1
+        return old_rows - self.rows
+
+    def _release_maps(self):
+        """Forget the current maps; Rows a caller still holds keep theirs readable until GC"""
+        maps = self._maps
+        self._views, self._maps = {}, {}   # drop our own views first so unexported maps can close
+        self._mapped_rows = -1
+        for mapped in maps.values():
+            try:
+                mapped.close()
+            except BufferError:   # still exported by a caller's Rows; GC closes it
+                pass
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(self._column_path(name)) for name in COLUMN_NAMES)
+
+    def close(self):
+        self._release_maps()
+
+
+class ForecastStore:
+    """Directory of per-location histories, opened lazily"""
+
+    def __init__(self, root):
+        self.root = root
+        self.locations = {}
+        os.makedirs(root, exist_ok=True)
+
+    def location(self, key):
+        history = self.locations.get(key)
+        if history is None:
+            history = self.locations[key] = LocationHistory(
+                os.path.join(self.root, location_dirname(key)), key)
+        return history
+
+    def known_locations(self):
+        return sorted(entry for entry in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, entry, 'meta.json')))
+
+    def append_run(self, key, run, days):
+        return self.location(key).append_run(run, days)
+
+    def compact(self, **kwargs):
+        return {key: history.compact(**kwargs) for key, history in self.locations.items()}
+
+    def close(self):
+        for history in self.locations.values():
+            history.close()
+        self.locations.clear()
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_run(run, horizon_days=7, seed=0):
+    """compile()-shaped {date_str: records} starting at the run's UTC day"""
+    rng = random.Random(seed)
+    first = datetime.datetime.fromtimestamp(run, datetime.timezone.utc).date()
+    days = {}
+    for d in range(horizon_days):
+        date_str = (first + datetime.timedelta(days=d)).isoformat()
+        recs = []
+        for h in range(24):
+            p = [rng.randint(0, 100) for _ in range(5)]
+            cape = [rng.choice([0, rng.randint(0, 2500)]) for _ in range(4)]
+            recs.append({
+                'utcH': h, 'sky': rng.randint(0, 100), 'tF': rng.randint(20, 100), 'dF': rng.choice([None, 50]),
+                'wind': rng.randint(0, 25), 'gust': rng.randint(0, 40), 'rh': rng.randint(10, 100),
+                'pNWS': p[0], 'pGFS': p[1], 'pECMWF': p[2], 'pHRRR': p[3], 'pICON': p[4],
+                'pCons': round(p[0] * 0.4 + p[1] * 0.2 + p[2] * 0.25 + p[3] * 0.15), 'thun': rng.randint(0, 60),
+                'qNWS': 0.01, 'qGFS': 0.02, 'qECMWF': 0.0, 'qHRRR': 0.1, 'qICON': 0.0,
+                'cGFS': cape[0], 'cECMWF': cape[1], 'cHRRR': cape[2], 'cICON': cape[3], 'cMax': max(cape),
+                'liGFS': -2.5, 'wx': 61, 'wxDesc': 'Chance Showers', 'threat': rng.choice(THREATS), 'rl': 1
+            })
+        days[date_str] = recs
+    return days
+
+
+def benchmark(n_runs=240, horizon_days=7, out=sys.stdout):
+    """Append hourly runs, then time reads against re-parsing per-run JSON"""
+    start = 1_800_000_000 // 3600 * 3600
+    payloads = [synthetic_run(start + i * 3600, horizon_days, seed=i % 8) for i in range(n_runs)]
+    with tempfile.TemporaryDirectory() as directory:
+        store = ForecastStore(os.path.join(directory, 'store'))
+        t0 = time.perf_counter()
+        for i, days in enumerate(payloads):
+            store.append_run('mebane', start + i * 3600, days)
+        append = time.perf_counter() - t0
+        json_dir = os.path.join(directory, 'json')
+        os.makedirs(json_dir)
+        for i, days in enumerate(payloads):
+            with open(os.path.join(json_dir, f'{i}.json'), 'w', encoding='utf-8') as f:
+                json.dump(days, f)
+        json_bytes = sum(os.path.getsize(os.path.join(json_dir, n)) for n in os.listdir(json_dir))
+        store.close()
+
+        target = start + (n_runs - 1) * 3600 + 24 * 3600
+        t0 = time.perf_counter()
+        reopened = ForecastStore(os.path.join(directory, 'store')).location('mebane')
+        said = [(run, rec.pCons) for run, rec in reopened.valid_history(target)]
+        mapped = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        baseline = []
+        for i in range(n_runs):
+            with open(os.path.join(json_dir, f'{i}.json'), 'r', encoding='utf-8') as f:
+                days = json.load(f)
+            for date_str, recs in days.items():
+                for rec in recs:
+                    if valid_time(date_str, rec['utcH']) == target:
+                        baseline.append((start + i * 3600, rec['pCons']))
+        scanned = time.perf_counter() - t0
+        assert said == baseline
+        t0 = time.perf_counter()
+        week = reopened.between(start, start + 24 * 3600)
+        mean_cape = sum(week.column('cMax')) / len(week)
+        ranged = time.perf_counter() - t0
+        rows, disk = reopened.rows, reopened.disk_bytes()
+        dropped = reopened.compact(now=start + n_runs * 3600, keep_all_days=3)
+        print(f"{n_runs} hourly runs x {horizon_days * 24} h = {rows} rows appended in {append:.2f} s; "
+              f"{disk / 1024 / 1024:.1f} MiB columns vs {json_bytes / 1024 / 1024:.1f} MiB JSON",
+              file=out)
+        print(f"what {len(said)} runs said about one hour: open + mmap {mapped * 1000:.1f} ms, "
+              f"JSON per run {scanned * 1000:.0f} ms", file=out)
+        print(f"one day of runs ({len(week)} rows) mean cMax {mean_cape:.0f}: {ranged * 1000:.1f} ms; "
+              f"compaction (hourly for 3 days, 6-hourly before) dropped {dropped} rows", file=out)
+        reopened.close()
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Append-only forecast history store')
+    parser.add_argument('--root', help='Store directory')
+    parser.add_argument('--location', help='Print stored runs for this location key')
+    parser.add_argument('--compact', action='store_true', help='Compact every location under --root')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    if not args.root:
+        parser.error('--root is required (or --bench)')
+    store = ForecastStore(args.root)
+    if args.compact:
+        for name in store.known_locations():
+            dropped = store.location(name).compact()
+            print(f"{name}: dropped {dropped} rows")
+    if args.location:
+        history = store.location(args.location)
+        for run in history.runs():
+            print(datetime.datetime.fromtimestamp(run, datetime.timezone.utc).isoformat(),
+                  len(history.run(run)), 'rows')
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+"""
+NWS Gridpoint Decoder
+
+gMap() and gQPF() in the model widget expand every `validTime` interval
+(`2026-01-01T06:00:00+00:00/PT6H`) into one dict entry per hour, keyed by a
+freshly built 'YYYY-MM-DD_H' string, for about nine grid properties on every
+refresh.
+
+This decoder keeps each property as a sorted interval index instead: three
+parallel arrays (start epoch-hour, end epoch-hour, value). Lookups are a
+binary search, properties are only decoded when first used, and hourly arrays
+are only materialized on request. GridProperty also answers `.get('YYYY-MM-DD_H')`
+so it can be passed anywhere a gMap() dict was used (e.g. consensus.compile_day).
+
+Usage:
+    python3 gridpoint.py --bench
+"""
+
+import argparse
+import bisect
+import datetime
+import re
+import sys
+import time
+import tracemalloc
+from array import array
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_EPOCH_DATE = _EPOCH.date()
+_DAYS_RE = re.compile(r'(\d+)D')
+_HOURS_RE = re.compile(r'(\d+)H')
+
+# compile() argument name -> NWS gridpoint property (see fetchAll())
+GRID_PROPERTIES = {
+    'pop': 'probabilityOfPrecipitation',
+    'thun': 'probabilityOfThunder',
+    'sky': 'skyCover',
+    'temp': 'temperature',
+    'dew': 'dewpoint',
+    'wind': 'windSpeed',
+    'gust': 'windGust',
+    'rh': 'relativeHumidity',
+    'qpf': 'quantitativePrecipitation'
+}
+QPF_PROPERTIES = ('quantitativePrecipitation',)
+
+
+def dur_h(s):
+    """durH(): ISO 8601 duration -> whole hours (days and hours only, minimum 1)"""
+    d = _DAYS_RE.search(s)
+    h = _HOURS_RE.search(s)
+    return (int(d.group(1)) if d else 0) * 24 + (int(h.group(1)) if h else 0) or 1
+
+
+def epoch_hour(iso):
+    """Hours since the Unix epoch for an ISO timestamp (floor, like getUTCHours keys)"""
+    dt = datetime.datetime.fromisoformat(iso.replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int((dt - _EPOCH).total_seconds() // 3600)
+
+
+def key_to_epoch_hour(key):
+    """'YYYY-MM-DD_H' -> epoch hour"""
+    date_str, hour = key.rsplit('_', 1)
+    return (datetime.date.fromisoformat(date_str) - _EPOCH_DATE).days * 24 + int(hour)
+
+
+def epoch_hour_to_key(h):
+    """epoch hour -> 'YYYY-MM-DD_H' (same format as gMap keys)"""
+    day, hour = divmod(h, 24)
+    return (_EPOCH_DATE + datetime.timedelta(days=day)).isoformat() + '_' + str(hour)
+
+
+# ── Reference ports (exact gMap/gQPF output, used for parity checks) ─────────
+
+def g_map(prop):
+    """gMap(): expand every interval into one entry per hour"""
+    m = {}
+    if not prop or not prop.get('values'):
+        return m
+    for v in prop['values']:
+        start, dur = v['validTime'].split('/')
+        h0, n = epoch_hour(start), dur_h(dur)
+        for i in range(n):
+            m[epoch_hour_to_key(h0 + i)] = v['value']
+    return m
+
+
+def g_qpf(prop):
+    """gQPF(): QPF in mm per interval -> inches per hour"""
+    m = {}
+    if not prop or not prop.get('values'):
+        return m
+    for v in prop['values']:
+        start, dur = v['validTime'].split('/')
+        h0, n = epoch_hour(start), dur_h(dur)
+        ph = v['value'] / n / 25.4 if v['value'] else 0
+        for i in range(n):
+            m[epoch_hour_to_key(h0 + i)] = ph
+    return m
+
+
+# ── Interval index ───────────────────────────────────────────────────────────
+
+class GridProperty:
+    """One gridpoint property as a sorted, non-overlapping interval index"""
+
+    __slots__ = ('starts', 'ends', 'values')
+
+    def __init__(self, prop, qpf=False):
+        intervals = []
+        for order, v in enumerate((prop or {}).get('values') or []):
+            try:
+                start, dur = v['validTime'].split('/')
+                h0, n = epoch_hour(start), dur_h(dur)
+            except (KeyError, ValueError, AttributeError):
+                continue
+            value = v.get('value')
+            if qpf:
+                value = value / n / 25.4 if value else 0
+            intervals.append((h0, h0 + n, order, value))
+        intervals.sort()
+        if any(intervals[i][1] > intervals[i + 1][0] for i in range(len(intervals) - 1)):
+            intervals = self._resolve_overlaps(intervals)
+        self.starts = array('q', (iv[0] for iv in intervals))
+        self.ends = array('q', (iv[1] for iv in intervals))
+        self.values = [iv[3] for iv in intervals]
+
+    @staticmethod
+    def _resolve_overlaps(intervals):
+        """Later entries overwrite earlier ones, exactly as repeated dict writes do"""
+        painted = {}
+        for h0, h1, order, value in sorted(intervals, key=lambda iv: iv[2]):
+            for h in range(h0, h1):
+                painted[h] = (order, value)
+        out = []
+        for h in sorted(painted):
+            order, value = painted[h]
+            if out and out[-1][1] == h and out[-1][2] == order:
+                out[-1] = (out[-1][0], h + 1, order, value)
+            else:
+                out.append((h, h + 1, order, value))
+        return out
+
+    def _find(self, h):
+        i = bisect.bisect_right(self.starts, h) - 1
+        if i >= 0 and h < self.ends[i]:
+            return i
+        return -1
+
+    def at(self, h, default=None):
+        """Value covering epoch hour h"""
+        i = self._find(h)
+        return self.values[i] if i >= 0 else default
+
+    # Mapping-style access with gMap keys, so GridProperty can replace a gMap dict
+    def get(self, key, default=None):
+        try:
+            h = key_to_epoch_hour(key)
+        except (ValueError, AttributeError):
+            return default
+        return self.at(h, default)
+
+    def __getitem__(self, key):
+        i = self._find(key_to_epoch_hour(key))
+        if i < 0:
+            raise KeyError(key)
+        return self.values[i]
+
+    def __contains__(self, key):
+        try:
+            return self._find(key_to_epoch_hour(key)) >= 0
+        except (ValueError, AttributeError):
+            return False
+
+    def __len__(self):
+        return sum(e - s for s, e in zip(self.starts, self.ends))
+
+    def __iter__(self):
+        for s, e in zip(self.starts, self.ends):
+            for h in range(s, e):
+                yield epoch_hour_to_key(h)
+
+    def interval_count(self):
+        return len(self.starts)
+
+    def hourly(self, start_hour, n_hours, missing=None):
+        """Materialize values for n_hours consecutive epoch hours (one pass, no lookups)"""
+        out = [missing] * n_hours
+        end_hour = start_hour + n_hours
+        i = max(bisect.bisect_right(self.starts, start_hour) - 1, 0)
+        while i < len(self.starts) and self.starts[i] < end_hour:
+            lo = max(self.starts[i], start_hour)
+            hi = min(self.ends[i], end_hour)
+            value = self.values[i]
+            for h in range(lo, hi):
+                out[h - start_hour] = value
+            i += 1
+        return out
+
+    def as_map(self):
+        """Full gMap-style dict (only for parity checks and legacy callers)"""
+        return {epoch_hour_to_key(h): v
+                for s, e, v in zip(self.starts, self.ends, self.values)
+                for h in range(s, e)}
+
+
+class GridpointDecoder:
+    """Lazy decoder over the `properties` object of /gridpoints/{wfo}/{x},{y}"""
+
+    def __init__(self, properties):
+        self.properties = properties or {}
+        self._decoded = {}
+
+    def prop(self, name):
+        """Decoded GridProperty by NWS property name (decoded on first use)"""
+        decoded = self._decoded.get(name)
+        if decoded is None:
+            decoded = GridProperty(self.properties.get(name), qpf=name in QPF_PROPERTIES)
+            self._decoded[name] = decoded
+        return decoded
+
+    def __getitem__(self, short_name):
+        """Decoded property by compile() argument name ('pop', 'thun', 'qpf', ...)"""
+        return self.prop(GRID_PROPERTIES[short_name])
+
+    def grid_maps(self):
+        """The nine properties compile() reads, keyed like consensus.compile_day expects"""
+        return {short: self[short] for short in GRID_PROPERTIES}
+
+    def decoded_names(self):
+        return sorted(self._decoded)
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_properties(days=7, start='2026-06-01T00:00:00+00:00'):
+    """Gridpoint properties shaped like the real payload (mixed PT1H..PT6H intervals)"""
+    h0 = epoch_hour(start)
+    props = {}
+    for p, name in enumerate(GRID_PROPERTIES.values()):
+        values, h = [], h0
+        step_cycle = (1, 2, 3, 6) if name != 'quantitativePrecipitation' else (6,)
+        i = 0
+        while h < h0 + days * 24:
+            n = step_cycle[(i + p) % len(step_cycle)]
+            ts = (_EPOCH + datetime.timedelta(hours=h)).isoformat()
+            values.append({'validTime': f'{ts}/PT{n}H', 'value': (i * 7 + p) % 100})
+            h += n
+            i += 1
+        props[name] = {'uom': 'wmoUnit:percent', 'values': values}
+    return props
+
+
+def benchmark(days=7, repeat=5, out=sys.stdout):
+    """Compare gMap-style expansion with the interval index"""
+    props = synthetic_properties(days)
+    lookup_keys = [epoch_hour_to_key(epoch_hour('2026-06-01T00:00:00+00:00') + h) for h in range(days * 24)]
+
+    def expand():
+        maps = {short: (g_qpf if short == 'qpf' else g_map)(props[name])
+                for short, name in GRID_PROPERTIES.items()}
+        return maps, [maps['pop'].get(k) for k in lookup_keys]
+
+    def index():
+        maps = GridpointDecoder(props).grid_maps()
+        return maps, maps['pop'].hourly(key_to_epoch_hour(lookup_keys[0]), len(lookup_keys))
+
+    for label, fn in (('gMap expansion', expand), ('interval index', index)):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        tracemalloc.start()
+        kept = fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del kept
+        print(f"{label:<16} {best * 1000:8.2f} ms   peak {peak / 1024:8.1f} KiB", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Interval-indexed NWS gridpoint decoder')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.days)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
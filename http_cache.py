@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+
+"""
+HTTP Response Cache
+
+The widgets deliberately bypass HTTP caching (`cache:'no-store'`, the 15-min
+`_t=` cycle buster) and keep their own sessionStorage copies per tab. Running
+server-side, one shared cache can do better:
+
+- per-source freshness and fallback lifetimes (CACHE_POLICY) mirroring the
+  widget TTLs: weather 2 h, SPC 30 min, NWS 10 min, radar 10 min,
+- bodies persisted to disk with LRU eviction (entry count and byte budget),
+  so a restarted proxy starts warm; file writes run in worker threads and
+  the index is written once per batch of stores, not once per response,
+- conditional revalidation with If-None-Match / If-Modified-Since: a 304
+  refreshes the entry without downloading the body again,
+- stale-while-revalidate: a stale entry is returned immediately while exactly
+  one background refresh runs for it,
+- every response carries the Live vs Cached state and age the status bar
+  shows (see RESILIENCE_AND_ACCURACY_ASSESSMENT.md).
+
+Usage:
+    python3 http_cache.py --cache-dir /tmp/mw-cache --source gridpoint URL
+"""
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import upstream
+
+INDEX_VERSION = 1
+
+# ttl: seconds an entry is served without asking upstream (the aggregator
+# refresh cadence); max_stale: seconds it may still be served as cached data
+# when upstream is slow or down (the widget sessionStorage TTLs).
+CACHE_POLICY = {
+    'open_meteo': {'ttl': 900, 'max_stale': 7200},
+    'gridpoint': {'ttl': 600, 'max_stale': 7200},
+    'hourly': {'ttl': 600, 'max_stale': 7200},
+    'alerts': {'ttl': 180, 'max_stale': 600},
+    'spc': {'ttl': 180, 'max_stale': 1800},
+    'afd': {'ttl': 600, 'max_stale': 1800},
+    'rainviewer': {'ttl': 300, 'max_stale': 600}
+}
+DEFAULT_POLICY = {'ttl': 300, 'max_stale': 600}
+
+# Headers kept with a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class CacheEntry:
+    """Metadata of one cached response; the body lives on disk (and in memory once read)"""
+
+    __slots__ = ('key', 'url', 'source', 'status', 'headers', 'stored_at', 'size', 'body')
+
+    def __init__(self, key, url, source, status, headers, stored_at, size, body=None):
+        self.key = key
+        self.url = url
+        self.source = source
+        self.status = status
+        self.headers = headers
+        self.stored_at = stored_at
+        self.size = size
+        self.body = body
+
+    def to_dict(self):
+        return {'key': self.key, 'url': self.url, 'source': self.source, 'status': self.status,
+                'headers': self.headers, 'stored_at': self.stored_at, 'size': self.size}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['key'], d['url'], d.get('source'), d.get('status', 200), d.get('headers') or {},
+                   float(d.get('stored_at', 0)), int(d.get('size', 0)))
+
+
+class CachedResponse(upstream.Response):
+    """upstream.Response plus cache state: Live vs Cached, age and why"""
+
+    __slots__ = ('state', 'age', 'cache_status', 'error')
+
+    def __init__(self, entry, state, age, cache_status, error=None, elapsed=0.0):
+        super().__init__(entry.url, entry.status, dict(entry.headers), entry.body, elapsed)
+        self.state = state                # 'live' or 'cached'
+        self.age = age                    # seconds since the body was last confirmed upstream
+        self.cache_status = cache_status  # 'miss', 'fresh', 'revalidated', 'stale', 'fallback'
+        self.error = error
+
+    def status_dict(self):
+        """Same shape as aggregator.SourceState.status()"""
+        return {'state': self.state, 'age_s': round(self.age, 1), 'cache': self.cache_status,
+                'error': self.error}
+
+
+def _header(headers, name):
+    for key, value in headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+class HttpCache:
+    """Shared upstream response cache (asyncio)"""
+
+    def __init__(self, directory=None, max_entries=256, max_bytes=64 * 1024 * 1024,
+                 policy=None, fetch=None, clock=time.time):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = dict(CACHE_POLICY)
+        self.policy.update(policy or {})
+        # fetch(url, headers, timeout) -> upstream.Response; raises UpstreamError on network errors
+        self.fetch = fetch or upstream.fetch
+        self.clock = clock
+        self._entries = collections.OrderedDict()  # key -> CacheEntry, least recently used first
+        self._bytes = 0
+        self._inflight = {}
+        self._index_task = None     # background index writer
+        self._index_dirty = False
+        self.stats = collections.Counter()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    # ── Keys and storage ─────────────────────────────────────────────────
+
+    @staticmethod
+    def key_for(url, headers=None):
+        accept = _header(headers or {}, 'Accept') or ''
+        return hashlib.sha1((url + '\n' + accept).encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, key + '.body')
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _write_atomic(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+            return
+        for d in index.get('entries') or []:
+            try:
+                entry = CacheEntry.from_dict(d)
+            except (KeyError, TypeError, ValueError):
+                continue
+            if os.path.exists(self._body_path(entry.key)):
+                self._entries[entry.key] = entry
+                self._bytes += entry.size
+        self._evict()
+
+    def _save_index(self):
+        """Mark the index dirty; one background task writes it for every store made meanwhile"""
+        if not self.directory:
+            return
+        self._index_dirty = True
+        if self._index_task is None or self._index_task.done():
+            self._index_task = asyncio.ensure_future(self._write_index())
+
+    async def _write_index(self):
+        await asyncio.sleep(0)  # let the other responses of this refresh land first
+        while self._index_dirty:
+            self._index_dirty = False
+            index = {'version': INDEX_VERSION, 'entries': [e.to_dict() for e in self._entries.values()]}
+            try:
+                await asyncio.to_thread(self._write_atomic, self._index_path(), json.dumps(index).encode('utf-8'))
+            except OSError:
+                self.stats['index_write_errors'] += 1
+            self.stats['index_writes'] += 1
+
+    def _body(self, entry):
+        if entry.body is None and self.directory:
+            try:
+                with open(self._body_path(entry.key), 'rb') as f:
+                    entry.body = f.read()
+            except OSError:
+                return None
+        return entry.body
+
+    async def _store(self, key, source, resp):
+        headers = {name: value for name in STORED_HEADERS
+                   for value in [_header(resp.headers, name)] if value is not None}
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write_atomic, self._body_path(key), resp.body)
+            except OSError:  # disk full or read-only: keep the entry in memory only
+                self.stats['body_write_errors'] += 1
+                try:
+                    os.unlink(self._body_path(key))  # never pair new headers with an old body
+                except OSError:
+                    pass
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        entry = CacheEntry(key, resp.url, source, resp.status, headers, self.clock(), len(resp.body), resp.body)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+        self._save_index()
+        return entry
+
+    def _evict(self):
+        """Drop least recently used entries until within budget (the newest always stays)"""
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                          or self._bytes > self.max_bytes):
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.stats['evictions'] += 1
+            if self.directory:
+                try:
+                    os.unlink(self._body_path(key))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+    # ── Fetching ─────────────────────────────────────────────────────────
+
+    def policy_for(self, source):
+        return self.policy.get(source, DEFAULT_POLICY)
+
+    def _refresh(self, key, url, source, headers, timeout):
+        """Single-flight (conditional) fetch for one key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._revalidate(key, url, source, headers, timeout))
+            self._inflight[key] = task
+
+            def _forget(done, key=key):
+                if self._inflight.get(key) is done:
+                    del self._inflight[key]
+                if not done.cancelled():
+                    done.exception()  # background failures are reported through stats
+            task.add_done_callback(_forget)
+        return task
+
+    async def _revalidate(self, key, url, source, headers, timeout):
+        entry = self._entries.get(key)
+        request_headers = dict(headers or {})
+        if entry is not None and self._body(entry) is not None:
+            etag = entry.headers.get('ETag')
+            last_modified = entry.headers.get('Last-Modified')
+            if etag:
+                request_headers['If-None-Match'] = etag
+            if last_modified:
+                request_headers['If-Modified-Since'] = last_modified
+        else:
+            entry = None
+        self.stats['upstream_requests'] += 1
+        try:
+            resp = await self.fetch(url, request_headers, timeout)
+        except upstream.UpstreamError:
+            self.stats['upstream_errors'] += 1
+            raise
+        if resp.status == 304 and entry is not None:
+            # Body unchanged: keep it, refresh validators and the clock
+            for name in ('ETag', 'Last-Modified'):
+                value = _header(resp.headers, name)
+                if value is not None:
+                    entry.headers[name] = value
+            entry.stored_at = self.clock()
+            self._entries.move_to_end(key)
+            self._save_index()
+            self.stats['not_modified'] += 1
+            self.stats['bytes_saved'] += entry.size
+            return entry, resp.elapsed
+        if not resp.ok:
+            self.stats['upstream_errors'] += 1
+            raise upstream.UpstreamError(url, f'HTTP {resp.status}', resp.status)
+        self.stats['full_downloads'] += 1
+        self.stats['bytes_downloaded'] += len(resp.body)
+        return await self._store(key, source, resp), resp.elapsed
+
+    async def get(self, url, source=None, headers=None, timeout=12.0, allow_stale=True):
+        """Cached GET.
+
+        Fresh entries are returned without a request. Stale entries (within
+        max_stale) are returned at once while one background revalidation
+        runs, unless allow_stale is False, in which case the revalidation is
+        awaited. If upstream fails, the stale entry is returned as 'cached';
+        with nothing usable, UpstreamError is raised.
+        """
+        key = self.key_for(url, headers)
+        policy = self.policy_for(source)
+        entry = self._entries.get(key)
+        now = self.clock()
+        if entry is not None and self._body(entry) is None:
+            entry = None
+        fallback = entry
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = max(now - entry.stored_at, 0.0)
+            if age < policy['ttl']:
+                self.stats['fresh_hits'] += 1
+                return CachedResponse(entry, 'live', age, 'fresh')
+            if age >= policy['max_stale']:
+                fallback = None  # too old to show if upstream fails; still revalidated below
+            elif allow_stale:
+                self.stats['stale_hits'] += 1
+                if key not in self._inflight:
+                    self.stats['background_refreshes'] += 1
+                self._refresh(key, url, source, headers, timeout)
+                return CachedResponse(entry, 'cached', age, 'stale')
+        try:
+            fresh, elapsed = await asyncio.shield(self._refresh(key, url, source, headers, timeout))
+        except upstream.UpstreamError as e:
+            if fallback is None:
+                raise
+            self.stats['fallbacks'] += 1
+            return CachedResponse(fallback, 'cached', max(self.clock() - fallback.stored_at, 0.0),
+                                  'fallback', str(e))
+        if entry is None:
+            self.stats['misses'] += 1
+            return CachedResponse(fresh, 'live', 0.0, 'miss', elapsed=elapsed)
+        return CachedResponse(fresh, 'live', 0.0, 'revalidated', elapsed=elapsed)
+
+    async def get_json(self, url, source=None, headers=None, timeout=12.0, allow_stale=True):
+        """(parsed JSON, CachedResponse); raises UpstreamError like upstream.fetch_json"""
+        resp = await self.get(url, source, headers, timeout, allow_stale)
+        return resp.json(), resp
+
+    async def drain(self):
+        """Wait for background revalidations and the pending index write (tests and shutdown)"""
+        while self._inflight or (self._index_task is not None and not self._index_task.done()):
+            await asyncio.gather(*list(self._inflight.values()), return_exceptions=True)
+            if self._index_task is not None:
+                await self._index_task
+
+    def summary(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes, **dict(self.stats)}
+
+
+async def _run(args):
+    cache = HttpCache(args.cache_dir)
+    headers = upstream.NWS_HEADERS if 'weather.gov' in args.url else {}
+    for _ in range(args.repeat):
+        resp = await cache.get(args.url, args.source, headers, allow_stale=False)
+        print(f"{resp.status} {resp.state:<6} {resp.cache_status:<11} age {resp.age:7.1f}s  "
+              f"{len(resp.body or b'')} bytes")
+    await cache.drain()
+    print(json.dumps(cache.summary(), indent=2))
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Shared upstream response cache')
+    parser.add_argument('url')
+    parser.add_argument('--source', default=None, choices=sorted(CACHE_POLICY))
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'mw-http-cache'))
+    parser.add_argument('--repeat', type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+
+"""
+Hot-Path Instrumentation
+
+The widgets' only telemetry is dlog() in the Diag panel and console.warn in
+the radar widget, both gone when the tab closes. This module gives the Python
+services spans, timers, counters and fixed-bucket latency histograms:
+- one histogram per upstream (Open-Meteo, NWS gridpoint / hourly / alerts,
+  SPC, RainViewer, AFD) fed by wrap_fetch() around any fetch(url, headers,
+  timeout), with request outcomes (ok, http_error, timeout, error,
+  cancelled) counted alongside,
+- one histogram per processing stage (decode, compile, classify, summarize,
+  ...) fed by span() / timed(),
+- Prometheus text exposition (prometheus_text) and a JSON snapshot with
+  p50/p95/p99 per series and a comparison against upstream.TIMEOUTS.
+
+Upstream bucket edges include every configured timeout (8, 10, 12, 15 s) and
+the 25 s retry cap, so "how many requests would have timed out" is exact.
+Observing costs one bisect and two additions; with metrics=None the
+aggregator skips instrumentation entirely.
+
+Usage:
+    python3 instrumentation.py --demo
+    python3 instrumentation.py --probe 5 --format json
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import math
+import sys
+import time
+import urllib.parse
+
+import upstream
+
+PREFIX = 'mebane'
+
+UPSTREAMS = ('open_meteo', 'gridpoint', 'hourly', 'alerts', 'spc', 'rainviewer', 'afd')
+
+# Seconds. Edges sit on the per-endpoint timeouts and the 25 s retry cap.
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 10.0, 12.0, 15.0, 25.0)
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'upstream_request_seconds': ('histogram', 'Upstream request latency by endpoint', UPSTREAM_BUCKETS),
+    'upstream_requests_total': ('counter', 'Upstream requests by endpoint and outcome', None),
+    'stage_seconds': ('histogram', 'Processing stage latency', STAGE_BUCKETS),
+    'stage_errors_total': ('counter', 'Processing stage failures', None),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_current_span = contextvars.ContextVar('instrumentation_span', default=None)
+
+
+def upstream_for_url(url):
+    """Endpoint label for a request URL (paths survive Upstreams.local())"""
+    parts = urllib.parse.urlsplit(url)
+    host, path = parts.netloc, parts.path
+    if path.startswith('/v1/forecast') or 'open-meteo' in host:
+        return 'open_meteo'
+    if 'SPC_wx_outlks' in path or path.startswith('/products/outlook/'):
+        return 'spc'
+    if path.startswith('/gridpoints/'):
+        return 'hourly' if path.endswith('/forecast/hourly') else 'gridpoint'
+    if path.startswith('/alerts'):
+        return 'alerts'
+    if path.startswith('/products'):
+        return 'afd'
+    if 'rainviewer' in host or path.startswith('/public/weather-maps'):
+        return 'rainviewer'
+    if path.startswith('/points/'):
+        return 'points'
+    return 'other'
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus `le` semantics (value <= edge)"""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        return list(itertools.accumulate(self.counts))
+
+    def quantile(self, q):
+        """Estimate like histogram_quantile(): linear within the bucket"""
+        if not self.count:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.bounds):
+                    return self.bounds[-1]   # +Inf bucket: best answer is the top edge
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def fraction_above(self, edge):
+        """Share of observations above edge (exact when edge is a bucket bound)"""
+        if not self.count:
+            return 0.0
+        return sum(self.counts[bisect.bisect_right(self.bounds, edge):]) / self.count
+
+
+class Span:
+    """One timed unit of work; nested spans record their parent"""
+
+    __slots__ = ('id', 'name', 'parent', 'labels', 'start', 'duration', 'error')
+
+    def __init__(self, span_id, name, parent, labels, start):
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.labels = labels
+        self.start = start
+        self.duration = None
+        self.error = None
+
+    def to_dict(self):
+        return {'id': self.id, 'name': self.name, 'parent': self.parent, 'labels': dict(self.labels),
+                'duration_ms': None if self.duration is None else round(self.duration * 1000, 3),
+                'error': self.error}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                    for k, v in pairs)
+    return '{' + body + '}'
+
+
+def _format_value(v):
+    if isinstance(v, int):
+        return str(v)
+    if v == math.inf:
+        return '+Inf'
+    return repr(float(v))
+
+
+class Metrics:
+    """Registry of histograms and counters, with span/timer helpers and exporters"""
+
+    def __init__(self, clock=time.perf_counter, span_history=256, metrics=None):
+        self.clock = clock
+        self.definitions = dict(METRICS)
+        self.definitions.update(metrics or {})
+        self._histograms = {}   # (name, label key) -> Histogram
+        self._counters = collections.Counter()
+        self.spans = collections.deque(maxlen=span_history)
+        self._ids = itertools.count(1)
+
+    # ── Recording ────────────────────────────────────────────────────────
+
+    def histogram(self, name, **labels):
+        key = (name, _label_key(labels))
+        hist = self._histograms.get(key)
+        if hist is None:
+            kind, _, buckets = self.definitions[name]
+            if kind != 'histogram':
+                raise ValueError(f'{name} is a {kind}')
+            hist = self._histograms[key] = Histogram(buckets)
+        return hist
+
+    def observe(self, name, value, **labels):
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        if self.definitions[name][0] != 'counter':
+            raise ValueError(f'{name} is not a counter')
+        self._counters[(name, _label_key(labels))] += amount
+
+    def counter_value(self, name, **labels):
+        return self._counters[(name, _label_key(labels))]
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the wall time of the block into histogram `name`"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start, **labels)
+
+    @contextlib.contextmanager
+    def span(self, stage, **labels):
+        """Time a processing stage; failures are counted and re-raised"""
+        parent = _current_span.get()
+        span = Span(next(self._ids), stage, parent.id if parent else None, labels, self.clock())
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            self.inc('stage_errors_total', stage=stage)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = self.clock() - span.start
+            self.observe('stage_seconds', span.duration, stage=stage)
+            self.spans.append(span)
+
+    def timed(self, stage):
+        """Decorator form of span() for plain and async functions"""
+
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(stage):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+
+        return decorate
+
+    def wrap_fetch(self, fetch):
+        """Instrument any async fetch(url, headers, timeout): upstream.fetch, fetch_json,
+        or an aggregator fetcher. Latency goes to upstream_request_seconds."""
+
+        @functools.wraps(fetch)
+        async def instrumented(url, headers=None, timeout=12.0):
+            name = upstream_for_url(url)
+            start = self.clock()
+            outcome = 'error'
+            try:
+                result = await fetch(url, headers, timeout)
+                status = getattr(result, 'status', 200)
+                outcome = 'ok' if status < 400 else 'http_error'
+                return result
+            except upstream.UpstreamError as e:
+                if str(e).startswith('Request timeout'):
+                    outcome = 'timeout'
+                elif e.status is not None:
+                    outcome = 'http_error'
+                raise
+            except asyncio.TimeoutError:
+                outcome = 'timeout'
+                raise
+            except asyncio.CancelledError:
+                outcome = 'cancelled'   # e.g. the losing leg of a hedged request
+                raise
+            finally:
+                self.observe('upstream_request_seconds', self.clock() - start, upstream=name)
+                self.inc('upstream_requests_total', upstream=name, outcome=outcome)
+
+        return instrumented
+
+    def reset(self):
+        self._histograms.clear()
+        self._counters.clear()
+        self.spans.clear()
+
+    # ── Export ───────────────────────────────────────────────────────────
+
+    def prometheus_text(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, (kind, help_text, _) in self.definitions.items():
+            full = f'{PREFIX}_{name}'
+            if kind == 'histogram':
+                series = sorted((k[1], h) for k, h in self._histograms.items() if k[0] == name)
+            else:
+                series = sorted((k[1], v) for k, v in self._counters.items() if k[0] == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {full} {help_text}')
+            lines.append(f'# TYPE {full} {kind}')
+            for key, value in series:
+                if kind == 'counter':
+                    lines.append(f'{full}{_format_labels(key)} {_format_value(value)}')
+                    continue
+                for edge, count in zip(value.bounds + (math.inf,), value.cumulative()):
+                    lines.append(f'{full}_bucket{_format_labels(key, [("le", _format_value(edge))])} {count}')
+                lines.append(f'{full}_sum{_format_labels(key)} {_format_value(value.sum)}')
+                lines.append(f'{full}_count{_format_labels(key)} {value.count}')
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def timeout_report(self):
+        """Observed upstream quantiles against the configured per-endpoint timeouts"""
+        report = {}
+        for name in UPSTREAMS:
+            hist = self._histograms.get(('upstream_request_seconds', (('upstream', name),)))
+            if hist is None or not hist.count:
+                continue
+            timeout = upstream.TIMEOUTS[name]
+            entry = {'timeout': timeout, 'requests': hist.count}
+            for q in QUANTILES:
+                entry[f'p{round(q * 100)}'] = round(hist.quantile(q), 4)
+            entry['over_timeout'] = round(hist.fraction_above(timeout), 4)
+            entry['p99_headroom'] = round(timeout / entry['p99'], 2) if entry['p99'] > 0 else None
+            report[name] = entry
+        return report
+
+    def snapshot(self):
+        """JSON-serializable view of every series, recent spans and the timeout report"""
+        histograms = {}
+        for (name, key), hist in sorted(self._histograms.items()):
+            entry = {'labels': dict(key), 'count': hist.count, 'sum': round(hist.sum, 6),
+                     'buckets': {_format_value(edge): count for edge, count in
+                                 zip(hist.bounds + (math.inf,), hist.cumulative())}}
+            for q in QUANTILES:
+                value = hist.quantile(q)
+                entry[f'p{round(q * 100)}'] = None if value != value else round(value, 6)
+            histograms.setdefault(name, []).append(entry)
+        counters = {}
+        for (name, key), value in sorted(self._counters.items()):
+            counters.setdefault(name, []).append({'labels': dict(key), 'value': value})
+        return {
+            'generated_at': time.time(),
+            'histograms': histograms,
+            'counters': counters,
+            'timeouts': self.timeout_report(),
+            'recent_spans': [s.to_dict() for s in self.spans]
+        }
+
+    def json_bytes(self):
+        return json.dumps(self.snapshot(), separators=(',', ':')).encode('utf-8')
+
+
+# ── Demo / probe ─────────────────────────────────────────────────────────────
+
+def demo(metrics, rounds=20):
+    """Run every processing stage on synthetic inputs (no network)"""
+    import afd_summarizer
+    import alert_matcher
+    import consensus
+    import om_decoder
+
+    decode = metrics.timed('decode')(om_decoder.decode)
+    compile_ = metrics.timed('compile')(consensus.ConsensusEngine('python').run)
+    classifier = alert_matcher.WinterAlertClassifier()
+    classify = metrics.timed('classify')(classifier.detect)
+    summarizer = afd_summarizer.AFDSummarizer()
+    summarize = metrics.timed('summarize')(summarizer.summarize_text)
+
+    body = om_decoder.synthetic_response(7, 1)
+    locations = [consensus.synthetic_location(7, seed=s) for s in range(3)]
+    for i in range(rounds):
+        decode([body], fields=om_decoder.CONSENSUS_FIELDS)
+        compile_(locations)
+        classify(alert_matcher.synthetic_feed(200, seed=i))
+        summarize(afd_summarizer.synthetic_afd(seed=i), 'RAH', f'demo-{i}')
+
+
+async def probe(metrics, upstreams, rounds=3):
+    """Fetch every upstream endpoint `rounds` times through an instrumented fetch"""
+    fetch = metrics.wrap_fetch(upstream.fetch)
+    today = time.strftime('%Y-%m-%d')
+    requests = [
+        (upstreams.open_meteo(today, today), {}, upstream.TIMEOUTS['open_meteo']),
+        (upstreams.gridpoint_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['gridpoint']),
+        (upstreams.hourly_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['hourly']),
+        (upstreams.alerts_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['alerts']),
+        (upstreams.spc_outlook_url(), {}, upstream.TIMEOUTS['spc']),
+        (upstreams.rainviewer_maps_url(), {}, upstream.TIMEOUTS['rainviewer']),
+        (upstreams.afd_index_url(), upstream.NWS_HEADERS, upstream.TIMEOUTS['afd']),
+    ]
+    for _ in range(rounds):
+        for url, headers, timeout in requests:
+            try:
+                await fetch(url, headers, timeout)
+            except upstream.UpstreamError:
+                pass
+
+
+def overhead(metrics, n=100000):
+    """Seconds per span() and per bare observe(), for the hot-path budget"""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with metrics.span('overhead'):
+            pass
+    per_span = (time.perf_counter() - t0) / n
+    t0 = time.perf_counter()
+    for i in range(n):
+        metrics.observe('stage_seconds', 0.001, stage='overhead')
+    return per_span, (time.perf_counter() - t0) / n
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Latency histograms and Prometheus export')
+    parser.add_argument('--demo', action='store_true', help='Time the processing stages on synthetic data')
+    parser.add_argument('--probe', type=int, metavar='N', help='Fetch every upstream N times')
+    parser.add_argument('--upstream', help='Send probe requests to this base URL (stand-in server)')
+    parser.add_argument('--format', choices=('prom', 'json', 'timeouts'), default='prom')
+    args = parser.parse_args()
+    if not (args.demo or args.probe):
+        parser.print_help()
+        return
+    metrics = Metrics()
+    if args.demo:
+        demo(metrics)
+        per_span, per_observe = overhead(Metrics())
+        print(f"# overhead: span {per_span * 1e6:.2f} us, observe {per_observe * 1e6:.2f} us", file=sys.stderr)
+    if args.probe:
+        upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+        asyncio.run(probe(metrics, upstreams, args.probe))
+    if args.format == 'prom':
+        sys.stdout.write(metrics.prometheus_text())
+    elif args.format == 'json':
+        print(json.dumps(metrics.snapshot(), indent=2))
+    else:
+        print(json.dumps(metrics.timeout_report(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
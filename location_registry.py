@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+
+"""
+Location Registry
+
+The widgets hard-code one place (LAT/LON 36.1,-79.3, gridpoints/RAH/49,69,
+zone NCZ023) and changing it is a manual edit. Serving many towns means
+asking api.weather.gov/points for each one, and doing that on every cold
+start is hundreds of metadata calls for answers that change about never.
+
+LocationRegistry resolves a coordinate once to its WFO, grid X/Y, forecast
+zone, county and fire-weather zone, and keeps the answer:
+
+- a compact on-disk index (one JSON file, one row per point, written
+  atomically) with a TTL; expired rows are still served if the refresh fails,
+- batch resolution with a concurrency limit, coalescing duplicate points and
+  skipping points that recently failed (outside NWS coverage, 404),
+- reverse lookups from a zone / county / fire-zone UGC code or a WFO to the
+  registered locations, which is what alert fan-out needs,
+- Location.upstreams() builds the upstream.Upstreams for the aggregator.
+
+Usage:
+    python3 location_registry.py --index /tmp/locations.json 36.1,-79.3 35.78,-78.64
+    python3 location_registry.py --index /tmp/locations.json --zone NCZ023
+    python3 location_registry.py --bench
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import upstream
+from aggregator import Coalescer
+
+INDEX_VERSION = 1
+DEFAULT_TTL = 30 * 86400      # grid and zone assignments change rarely; re-resolve monthly
+FAILURE_TTL = 3600.0          # don't re-ask for a point that just failed
+POINTS_TIMEOUT = 10.0
+
+# Row layout of the on-disk index (lists, not dicts: the file stays small)
+COLUMNS = ('lat', 'lon', 'office', 'grid_x', 'grid_y', 'zone', 'county', 'fire_zone',
+           'time_zone', 'radar', 'city', 'state', 'resolved_at')
+
+
+def point_key(lat, lon):
+    """Registry key: 4 decimals (~11 m), the precision /points accepts"""
+    return f'{lat:.4f},{lon:.4f}'
+
+
+def parse_point(text):
+    """'36.1,-79.3' -> (36.1, -79.3)"""
+    lat, lon = (float(part) for part in text.split(','))
+    return lat, lon
+
+
+def _code(url):
+    """Last path segment of a zone URL: .../zones/forecast/NCZ023 -> NCZ023"""
+    return url.rstrip('/').rsplit('/', 1)[-1] if isinstance(url, str) and url else None
+
+
+class Location:
+    """One resolved point"""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, *values):
+        for name, value in zip(COLUMNS, values):
+            setattr(self, name, value)
+
+    @property
+    def key(self):
+        return point_key(self.lat, self.lon)
+
+    @property
+    def gridpoint(self):
+        """'RAH/49,69' as used in gridpoints URLs"""
+        return f'{self.office}/{self.grid_x},{self.grid_y}'
+
+    @property
+    def ugc_codes(self):
+        return tuple(c for c in (self.zone, self.county, self.fire_zone) if c)
+
+    def row(self):
+        return [getattr(self, name) for name in COLUMNS]
+
+    def to_dict(self):
+        d = {name: getattr(self, name) for name in COLUMNS}
+        d['gridpoint'] = self.gridpoint
+        return d
+
+    def upstreams(self, bases=None):
+        """upstream.Upstreams pointed at this location (for aggregator.Aggregator)"""
+        return upstream.Upstreams(bases, lat=self.lat, lon=self.lon, gridpoint=self.gridpoint,
+                                  zone=self.zone, state=self.state or upstream.STATE_CODE,
+                                  office=self.office)
+
+    def __repr__(self):
+        return f'Location({self.key} {self.gridpoint} {self.zone} {self.county})'
+
+
+def location_from_points(lat, lon, doc, resolved_at):
+    """Location from an api.weather.gov/points response; ValueError if fields are missing"""
+    props = doc.get('properties') if isinstance(doc, dict) else None
+    if not isinstance(props, dict):
+        raise ValueError('points response has no properties')
+    office, grid_x, grid_y = props.get('gridId') or props.get('cwa'), props.get('gridX'), props.get('gridY')
+    zone = _code(props.get('forecastZone'))
+    if not office or not isinstance(grid_x, int) or not isinstance(grid_y, int) or not zone:
+        raise ValueError('points response is missing gridId/gridX/gridY/forecastZone')
+    rel = (props.get('relativeLocation') or {}).get('properties') or {}
+    return Location(round(lat, 4), round(lon, 4), office, grid_x, grid_y, zone,
+                    _code(props.get('county')), _code(props.get('fireWeatherZone')),
+                    props.get('timeZone'), props.get('radarStation'),
+                    rel.get('city'), rel.get('state'), resolved_at)
+
+
+class LocationRegistry:
+    """Points -> NWS grid/zone/county/WFO, resolved once and persisted with a TTL"""
+
+    def __init__(self, path=None, upstreams=None, fetcher=None, ttl=DEFAULT_TTL, concurrency=8,
+                 clock=time.time):
+        self.path = path
+        self.upstreams = upstreams or upstream.Upstreams()
+        self.fetcher = fetcher or upstream.fetch_json
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self.clock = clock
+        self.coalescer = Coalescer()
+        self._locations = {}    # key -> Location
+        self._by_code = {}      # UGC code (zone, county, fire zone) -> {key}
+        self._by_office = {}    # WFO -> {key}
+        self._failures = {}     # key -> (time, message)
+        self.fetches = 0
+        self.hits = 0
+        self._load()
+
+    # ── Index ──
+
+    def _add(self, loc):
+        old = self._locations.get(loc.key)
+        if old is not None:
+            self._unindex(old)
+        self._locations[loc.key] = loc
+        for code in loc.ugc_codes:
+            self._by_code.setdefault(code, set()).add(loc.key)
+        self._by_office.setdefault(loc.office, set()).add(loc.key)
+
+    def _unindex(self, loc):
+        for index, code in [(self._by_code, c) for c in loc.ugc_codes] + [(self._by_office, loc.office)]:
+            keys = index.get(code)
+            if keys is not None:
+                keys.discard(loc.key)
+                if not keys:
+                    del index[code]
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (not isinstance(index, dict) or index.get('version') != INDEX_VERSION
+                or index.get('columns') != list(COLUMNS)):
+            return
+        for row in index.get('rows') or []:
+            if isinstance(row, list) and len(row) == len(COLUMNS):
+                self._add(Location(*row))
+
+    def save(self):
+        """Write the index atomically (no-op without a path)"""
+        if not self.path:
+            return
+        rows = [self._locations[key].row() for key in sorted(self._locations)]
+        data = json.dumps({'version': INDEX_VERSION, 'columns': list(COLUMNS), 'rows': rows},
+                          separators=(',', ':')).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __iter__(self):
+        return iter(self._locations.values())
+
+    def expired(self, loc):
+        return self.clock() - loc.resolved_at >= self.ttl
+
+    def prune(self):
+        """Drop expired rows (they are otherwise kept as a fallback); returns how many"""
+        stale = [loc for loc in self._locations.values() if self.expired(loc)]
+        for loc in stale:
+            self._unindex(loc)
+            del self._locations[loc.key]
+        if stale:
+            self.save()
+        return len(stale)
+
+    # ── Lookups ──
+
+    def get(self, lat, lon):
+        """Registered location for a point (fresh or expired), or None; never fetches"""
+        return self._locations.get(point_key(lat, lon))
+
+    def for_code(self, code):
+        """Locations inside a forecast zone, county or fire zone (UGC code, e.g. NCZ023 / NCC001)"""
+        return [self._locations[key] for key in sorted(self._by_code.get(code, ()))]
+
+    def for_office(self, office):
+        return [self._locations[key] for key in sorted(self._by_office.get(office, ()))]
+
+    def for_alert(self, alert):
+        """Registered locations an NWS alert feature applies to (geocode.UGC and affectedZones)"""
+        props = alert.get('properties') if isinstance(alert, dict) else None
+        if not isinstance(props, dict):
+            return []
+        codes = set((props.get('geocode') or {}).get('UGC') or ())
+        codes.update(_code(url) for url in props.get('affectedZones') or ())
+        keys = set()
+        for code in codes:
+            keys.update(self._by_code.get(code, ()))
+        return [self._locations[key] for key in sorted(keys)]
+
+    def zones(self):
+        """Forecast zones with at least one registered location"""
+        return sorted({loc.zone for loc in self._locations.values()})
+
+    # ── Resolution ──
+
+    async def _fetch(self, lat, lon):
+        self.fetches += 1
+        doc = await self.fetcher(self.upstreams.points_url(lat, lon), upstream.NWS_HEADERS, POINTS_TIMEOUT)
+        try:
+            return location_from_points(lat, lon, doc, self.clock())
+        except ValueError as e:
+            raise upstream.UpstreamError(self.upstreams.points_url(lat, lon), str(e))
+
+    async def _resolve(self, lat, lon, refresh=False):
+        key = point_key(lat, lon)
+        cached = self._locations.get(key)
+        if cached is not None and not refresh and not self.expired(cached):
+            self.hits += 1
+            return cached
+        failed = self._failures.get(key)
+        if failed is not None and self.clock() - failed[0] < FAILURE_TTL and not refresh:
+            if cached is not None:
+                return cached
+            raise upstream.UpstreamError(self.upstreams.points_url(lat, lon), failed[1])
+        try:
+            loc = await self.coalescer.run(key, lambda: self._fetch(lat, lon))
+        except upstream.UpstreamError as e:
+            self._failures[key] = (self.clock(), str(e))
+            if cached is not None:
+                return cached    # expired but still the best answer we have
+            raise
+        self._failures.pop(key, None)
+        self._add(loc)
+        return loc
+
+    async def resolve(self, lat, lon, refresh=False):
+        """Location for a point; fetches /points only when missing or expired"""
+        fetches = self.fetches
+        loc = await self._resolve(lat, lon, refresh)
+        if self.fetches != fetches:
+            self.save()
+        return loc
+
+    async def resolve_many(self, points, refresh=False):
+        """{key: Location or UpstreamError} for many points; at most `concurrency` fetches in flight"""
+        limit = asyncio.Semaphore(self.concurrency)
+        fetches = self.fetches
+
+        async def one(lat, lon):
+            key = point_key(lat, lon)
+            cached = self._locations.get(key)
+            if cached is not None and not refresh and not self.expired(cached):
+                self.hits += 1
+                return key, cached
+            async with limit:
+                try:
+                    return key, await self._resolve(lat, lon, refresh)
+                except upstream.UpstreamError as e:
+                    return key, e
+
+        results = dict(await asyncio.gather(*(one(lat, lon) for lat, lon in points)))
+        if self.fetches != fetches:
+            self.save()
+        return results
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_points_doc(lat, lon):
+    """A /points response shaped like the real one, with made-up but stable grid/zone codes"""
+    office = ('RAH', 'GSP', 'ILM', 'MHX', 'RNK')[int((lon + 85) * 7) % 5]
+    zone = f'NCZ{int((lat - 33) * 10) % 100:03d}'
+    county = f'NCC{int((lon + 85) * 10) % 200:03d}'
+    base = 'https://api.weather.gov'
+    return {'properties': {
+        'cwa': office, 'gridId': office,
+        'gridX': int((lon + 85) * 40) % 200, 'gridY': int((lat - 33) * 40) % 200,
+        'forecastZone': f'{base}/zones/forecast/{zone}',
+        'county': f'{base}/zones/county/{county}',
+        'fireWeatherZone': f'{base}/zones/fire/{zone}',
+        'timeZone': 'America/New_York', 'radarStation': 'KRAX',
+        'relativeLocation': {'properties': {'city': f'Town {zone}', 'state': 'NC'}}
+    }}
+
+
+def synthetic_fetcher(latency=0.02, counter=None):
+    """fetch_json stand-in answering /points URLs with synthetic_points_doc after `latency` s"""
+
+    async def fetch_json(url, headers=None, timeout=12.0):
+        if counter is not None:
+            counter.append(url)
+        await asyncio.sleep(latency)
+        lat, lon = parse_point(url.rsplit('/points/', 1)[1])
+        return synthetic_points_doc(lat, lon)
+
+    return fetch_json
+
+
+def random_points(n, seed=0):
+    rng = random.Random(seed)
+    return [(round(rng.uniform(33.9, 36.5), 4), round(rng.uniform(-84.2, -75.6), 4)) for _ in range(n)]
+
+
+def benchmark(n=300, latency=0.02, out=sys.stdout):
+    """Cold batch resolution, a warm restart from disk, and reverse lookups"""
+    points = random_points(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'locations.json')
+        for label, concurrency in (('cold, 1 at a time', 1), ('cold, concurrency 16', 16)):
+            if os.path.exists(path):
+                os.unlink(path)
+            registry = LocationRegistry(path, fetcher=synthetic_fetcher(latency), concurrency=concurrency)
+            t0 = time.perf_counter()
+            asyncio.run(registry.resolve_many(points))
+            print(f"{label:<22} {time.perf_counter() - t0:7.2f} s  {registry.fetches} /points calls", file=out)
+        t0 = time.perf_counter()
+        warm = LocationRegistry(path, fetcher=synthetic_fetcher(latency))
+        asyncio.run(warm.resolve_many(points))
+        print(f"{'warm restart':<22} {(time.perf_counter() - t0) * 1000:7.1f} ms {warm.fetches} /points calls, "
+              f"index {os.path.getsize(path) / 1024:.1f} KiB for {len(warm)} locations", file=out)
+        zones = warm.zones()
+        t0 = time.perf_counter()
+        found = sum(len(warm.for_code(zone)) for zone in zones)
+        print(f"reverse lookup: {len(zones)} zones -> {found} locations in "
+              f"{(time.perf_counter() - t0) * 1e6:.0f} us", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Resolve points to NWS grid, zone, county and WFO')
+    parser.add_argument('points', nargs='*', help='lat,lon pairs to resolve')
+    parser.add_argument('--index', default='locations.json', help='registry index file')
+    parser.add_argument('--zone', help='list registered locations in this zone/county UGC code')
+    parser.add_argument('--refresh', action='store_true', help='re-resolve even if not expired')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    registry = LocationRegistry(args.index, concurrency=args.concurrency)
+    if args.points:
+        results = asyncio.run(registry.resolve_many([parse_point(p) for p in args.points], args.refresh))
+        for key, result in results.items():
+            print(json.dumps({key: result.to_dict() if isinstance(result, Location) else str(result)}))
+    if args.zone:
+        for loc in registry.for_code(args.zone):
+            print(json.dumps(loc.to_dict()))
+    if not args.points and not args.zone:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+
+"""
+Model Skill Scoring and Consensus Weights
+
+compile() blends POP with fixed weights (NWS 0.40, ECMWF 0.25, GFS 0.20,
+HRRR 0.15) and never weights ICON. SkillEngine scores every model's hourly
+POP (Brier score) and QPF (MAE, inches) against observed precipitation and
+turns rolling-window skill into per-lead-time weights:
+
+- forecasts come from forecast_store (what each stored run said about a
+  valid hour) or straight from compile_day() records,
+- observations come from NWS station observations (precipitationLastHour),
+  parsed by parse_observations(); an hour is "wet" at >= 0.01 in. A null
+  value on a routine hourly report is dry (the METAR only carries a P group
+  when it rained); on specials or reports without a METAR it is missing,
+- each (location, model, lead bucket) keeps a RollingSkill: integer sums of
+  squared POP error (percent^2) and absolute QPF error (1e-4 in) over the
+  window, with one entry per verified hour. Adding an hour and expiring the
+  oldest are O(1), so a model cycle costs the newly verified hours only and
+  the sums never drift,
+- weights are inverse Brier (POP) or inverse MAE (QPF), shrunk toward the
+  compile() defaults by sample count, per lead bucket; reweight() applies
+  them to ConsensusEngine output.
+
+Usage:
+    python3 model_skill.py --bench
+    python3 model_skill.py --store /srv/mw-history --location mebane --observations obs.json
+"""
+
+import argparse
+import bisect
+import collections
+import datetime
+import json
+import random
+import re
+import sys
+import time
+
+from consensus import WEIGHTS, js_round
+from forecast_store import valid_time
+
+SKILL_MODELS = ('NWS', 'GFS', 'ECMWF', 'HRRR', 'ICON')
+DEFAULT_WEIGHTS = dict(WEIGHTS, ICON=0.0)
+
+# Lead time buckets in hours: [0, 6), [6, 12), ... [168, 384)
+LEAD_EDGES = (0, 6, 12, 24, 48, 72, 120, 168, 384)
+
+# compile() reads a model past its horizon as 0, which must not count as a forecast
+MODEL_MAX_LEAD = {'HRRR': 48, 'ICON': 180}
+
+WET_THRESHOLD_IN = 0.01
+MM_PER_INCH = 25.4
+ROUTINE_MINUTE = 45                   # routine hourly METARs are taken in the last minutes of the hour
+_PRECIP_GROUP = re.compile(r'(?:^|\s)P(\d{4})(?=\s|$)')
+DEFAULT_STATION = 'KBUY'              # Burlington-Alamance Regional, nearest ASOS to Mebane
+DEFAULT_WINDOW_HOURS = 30 * 24
+DEFAULT_MIN_SAMPLES = 48
+
+
+def lead_bucket(lead_hours):
+    """Index into LEAD_EDGES for a lead time, or None outside the scored range"""
+    if lead_hours < LEAD_EDGES[0] or lead_hours >= LEAD_EDGES[-1]:
+        return None
+    return bisect.bisect_right(LEAD_EDGES, lead_hours) - 1
+
+
+def _value(rec, name):
+    return rec.get(name) if isinstance(rec, dict) else getattr(rec, name)
+
+
+# ── Observations ─────────────────────────────────────────────────────────────
+
+def metar_precip(raw, stamp):
+    """Hourly precip (inches) from a report's METAR when precipitationLastHour is null.
+
+    The P group in the remarks if present; 0.0 for a routine hourly report
+    without one (no P group means no precipitation); None when it can't be
+    told: specials, no remarks, PNO (precip sensor out) or no METAR at all.
+    """
+    if not isinstance(raw, str) or raw.lstrip().startswith('SPECI') or stamp.minute < ROUTINE_MINUTE:
+        return None
+    _, sep, remarks = raw.partition(' RMK ')
+    if not sep or 'PNO' in remarks.split():
+        return None
+    match = _PRECIP_GROUP.search(remarks)
+    return int(match.group(1)) / 100 if match else 0.0
+
+
+def parse_observations(payload):
+    """NWS /stations/{id}/observations GeoJSON -> {valid hour (unix s): precip inches}.
+
+    Each report is credited to the hour it was taken in; specials within an
+    hour keep the largest precipitationLastHour. A null value falls back to
+    metar_precip(): dry on a routine report, skipped (missing) otherwise.
+    """
+    out = {}
+    for feature in (payload or {}).get('features') or []:
+        props = (feature.get('properties') if isinstance(feature, dict) else None) or {}
+        precip = props.get('precipitationLastHour') or {}
+        value = precip.get('value') if isinstance(precip, dict) else None
+        try:
+            stamp = datetime.datetime.fromisoformat(str(props.get('timestamp')).replace('Z', '+00:00'))
+        except ValueError:
+            continue
+        if stamp.tzinfo is None:
+            continue
+        if value is not None:
+            inches = float(value) / MM_PER_INCH if 'mm' in str(precip.get('unitCode', 'mm')) else float(value)
+        else:
+            inches = metar_precip(props.get('rawMessage'), stamp.astimezone(datetime.timezone.utc))
+            if inches is None:
+                continue
+        hour = int(stamp.timestamp()) // 3600 * 3600
+        out[hour] = max(out.get(hour, 0.0), inches)
+    return out
+
+
+async def fetch_observations(upstreams, fetch, station=DEFAULT_STATION, start=None):
+    """Station observations via fetch(url, headers, timeout); None on failure"""
+    import upstream
+    url = upstreams.observations_url(station, start)
+    try:
+        resp = await fetch(url, upstream.NWS_HEADERS, upstream.TIMEOUTS['hourly'])
+        return parse_observations(resp.json()) if resp.ok else None
+    except upstream.UpstreamError:
+        return None
+
+
+# ── Scores ───────────────────────────────────────────────────────────────────
+
+class RollingSkill:
+    """Brier and MAE over a time window; exact integer sums, O(1) add and expire"""
+
+    __slots__ = ('window', 'entries', 'sq_sum', 'abs_sum', 'n')
+
+    def __init__(self, window):
+        self.window = window
+        self.entries = collections.deque()   # [valid, sq, abs, n] per verified hour
+        self.sq_sum = 0
+        self.abs_sum = 0
+        self.n = 0
+
+    def add(self, valid, sq, abs_err):
+        last = self.entries[-1] if self.entries else None
+        if last is not None and last[0] == valid:
+            last[1] += sq
+            last[2] += abs_err
+            last[3] += 1
+        else:
+            self.entries.append([valid, sq, abs_err, 1])
+        self.sq_sum += sq
+        self.abs_sum += abs_err
+        self.n += 1
+        self.expire(valid)
+
+    def expire(self, now_valid):
+        entries = self.entries
+        while entries and entries[0][0] <= now_valid - self.window:
+            _, sq, abs_err, n = entries.popleft()
+            self.sq_sum -= sq
+            self.abs_sum -= abs_err
+            self.n -= n
+
+    @property
+    def brier(self):
+        return self.sq_sum / (self.n * 10000) if self.n else None
+
+    @property
+    def mae(self):
+        return self.abs_sum / (self.n * 10000) if self.n else None
+
+
+class SkillEngine:
+    """Rolling per-location, per-model, per-lead skill and the weights derived from it"""
+
+    def __init__(self, window_hours=DEFAULT_WINDOW_HOURS, min_samples=DEFAULT_MIN_SAMPLES):
+        self.window = window_hours * 3600
+        self.min_samples = min_samples
+        self.scores = {}                   # location -> {(model, bucket): RollingSkill}
+        self.cursor = {}                   # location -> last verified valid hour
+        self.stats = collections.Counter()
+
+    def _score(self, location, model, bucket):
+        table = self.scores.get(location)
+        if table is None:
+            table = self.scores[location] = {}
+        score = table.get((model, bucket))
+        if score is None:
+            score = table[(model, bucket)] = RollingSkill(self.window)
+        return score
+
+    def verify(self, location, valid, observed_in, forecasts):
+        """Score one observed hour against [(run, record)] forecasts for it"""
+        wet = 100 if observed_in >= WET_THRESHOLD_IN else 0
+        obs_q = js_round(observed_in * 10000)
+        for run, rec in forecasts:
+            lead = (valid - run) / 3600
+            bucket = lead_bucket(lead)
+            if bucket is None:
+                continue
+            for model in SKILL_MODELS:
+                if lead >= MODEL_MAX_LEAD.get(model, LEAD_EDGES[-1]):
+                    continue
+                pop, qpf = _value(rec, 'p' + model), _value(rec, 'q' + model)
+                if pop is None or qpf is None:
+                    continue
+                self._score(location, model, bucket).add(
+                    valid, (int(pop) - wet) ** 2, abs(js_round(qpf * 10000) - obs_q))
+                self.stats['pairs'] += 1
+        cursor = self.cursor[location] = max(valid, self.cursor.get(location, valid))
+        # Cells that got no sample this hour (a model that stopped reporting) expire too
+        for score in self.scores.get(location, {}).values():
+            score.expire(cursor)
+        self.stats['hours'] += 1
+
+    def verify_history(self, location, history, observations):
+        """Verify observed hours newer than the location's cursor against a LocationHistory"""
+        done = self.cursor.get(location)
+        count = 0
+        for valid in sorted(observations):
+            if done is not None and valid <= done:
+                continue
+            self.verify(location, valid, observations[valid], history.valid_history(valid))
+            count += 1
+        return count
+
+    def skill(self, location=None):
+        """{(model, bucket): (brier, mae, n)}; location None pools every location"""
+        pooled = collections.defaultdict(lambda: [0, 0, 0])
+        tables = self.scores.values() if location is None else [self.scores.get(location, {})]
+        for table in tables:
+            for key, score in table.items():
+                acc = pooled[key]
+                acc[0] += score.sq_sum
+                acc[1] += score.abs_sum
+                acc[2] += score.n
+        return {key: (sq / (n * 10000), ab / (n * 10000), n) for key, (sq, ab, n) in pooled.items() if n}
+
+    def weights(self, location=None):
+        """Per-lead POP and QPF weights; buckets without enough samples keep the defaults"""
+        skill = self.skill(location)
+        leads = []
+        for bucket in range(len(LEAD_EDGES) - 1):
+            entry = {'lead_hours': [LEAD_EDGES[bucket], LEAD_EDGES[bucket + 1]], 'samples': {}}
+            for kind, metric in (('pop', 0), ('qpf', 1)):
+                raw = {}
+                for model in SKILL_MODELS:
+                    found = skill.get((model, bucket))
+                    if found is None:
+                        continue
+                    entry['samples'][model] = found[2]
+                    if found[2] >= self.min_samples:
+                        raw[model] = (1.0 / max(found[metric], 1e-6), found[2])
+                entry[kind] = self._blend(raw)
+            leads.append(entry)
+        return {'window_hours': self.window // 3600, 'min_samples': self.min_samples, 'leads': leads}
+
+    def _blend(self, raw):
+        """Normalised inverse-error weights, shrunk toward DEFAULT_WEIGHTS by sample count"""
+        if len(raw) < 2:
+            return dict(DEFAULT_WEIGHTS)
+        total = sum(inv for inv, _ in raw.values())
+        default_mass = sum(DEFAULT_WEIGHTS[m] for m in raw) or 1.0
+        out = {}
+        for model in SKILL_MODELS:
+            if model not in raw:
+                out[model] = 0.0
+                continue
+            inv, n = raw[model]
+            trust = n / (n + self.min_samples)
+            out[model] = trust * inv / total + (1 - trust) * DEFAULT_WEIGHTS[model] / default_mass
+        norm = sum(out.values())
+        return {model: round(w / norm, 3) for model, w in out.items()}
+
+
+# ── Applying weights ─────────────────────────────────────────────────────────
+
+def weights_for_lead(doc, lead_hours, kind='pop'):
+    bucket = lead_bucket(lead_hours)
+    if doc is None or bucket is None or bucket >= len(doc.get('leads', ())):
+        return dict(DEFAULT_WEIGHTS)
+    return doc['leads'][bucket][kind]
+
+
+def consensus_pop(record, weights):
+    """pCons with skill weights (compile() with DEFAULT_WEIGHTS gives the same number)"""
+    return js_round(sum(_value(record, 'p' + model) * w for model, w in weights.items() if w))
+
+
+def reweight(result, doc, run_time):
+    """Replace pCons in a ConsensusEngine result with lead-dependent skill weights"""
+    pcons = []
+    for d, date_str in enumerate(result['dates']):
+        row = []
+        for h in range(24):
+            weights = weights_for_lead(doc, (valid_time(date_str, h) - run_time) / 3600)
+            row.append(js_round(sum(result['p' + m][d][h] * w for m, w in weights.items() if w)))
+        pcons.append(row)
+    result['pCons'] = pcons
+    return result
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+# Synthetic skill: POP noise (percent) per model; ECMWF best, ICON close behind
+SYNTHETIC_NOISE = {'NWS': 18, 'GFS': 26, 'ECMWF': 12, 'HRRR': 20, 'ICON': 15}
+
+
+class SyntheticVerification:
+    """Wet/dry truth per location and hour, with model forecasts of known skill"""
+
+    def __init__(self, seed=0, leads=range(1, 49), wet_rate=0.12):
+        self.seed = seed
+        self.leads = list(leads)
+        self.wet_rate = wet_rate
+
+    def observed(self, location, valid):
+        rng = random.Random(f'{self.seed}:{location}:{valid}')
+        return round(rng.uniform(0.01, 0.3), 2) if rng.random() < self.wet_rate else 0.0
+
+    def forecasts(self, location, valid):
+        truth = self.observed(location, valid)
+        rng = random.Random(f'{self.seed}:{location}:{valid}:f')
+        out = []
+        for lead in self.leads:
+            rec = {}
+            for model, noise in SYNTHETIC_NOISE.items():
+                spread = noise * (1 + lead / 48)
+                base = 70 if truth else 8
+                rec['p' + model] = max(0, min(100, int(rng.gauss(base, spread))))
+                rec['q' + model] = round(max(0.0, truth + rng.gauss(0, noise / 400)), 4)
+            out.append((valid - lead * 3600, rec))
+        return out
+
+
+def benchmark(locations=50, window_days=5, out=sys.stdout):
+    """One model cycle for many locations (incremental) vs rescanning the window"""
+    source = SyntheticVerification()
+    start = 1_800_000_000
+    hours = window_days * 24
+    engine = SkillEngine(window_hours=hours)
+    names = [f'loc{i}' for i in range(locations)]
+    feeds = {(loc, start + h * 3600): (source.observed(loc, start + h * 3600),
+                                       source.forecasts(loc, start + h * 3600))
+             for loc in names for h in range(hours + 1)}
+
+    t0 = time.perf_counter()
+    for h in range(hours):
+        for loc in names:
+            engine.verify(loc, start + h * 3600, *feeds[(loc, start + h * 3600)])
+    warm = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for loc in names:
+        engine.verify(loc, start + hours * 3600, *feeds[(loc, start + hours * 3600)])
+    docs = {loc: engine.weights(loc) for loc in names}
+    cycle = time.perf_counter() - t0
+
+    # Rescanning means replaying the whole window per location every cycle
+    t0 = time.perf_counter()
+    fresh = SkillEngine(window_hours=hours)
+    for h in range(1, hours + 1):
+        fresh.verify(names[0], start + h * 3600, *feeds[(names[0], start + h * 3600)])
+    fresh.weights(names[0])
+    rescan_one = time.perf_counter() - t0
+
+    pooled = engine.weights()
+    day1 = pooled['leads'][LEAD_EDGES.index(24)]['pop']
+    print(f"{locations} locations, {window_days}-day window, {len(source.leads)} runs per valid hour: "
+          f"warm-up {warm:.1f} s ({engine.stats['pairs']} scored pairs)", file=out)
+    print(f"one model cycle (new hour + weights for all locations): {cycle * 1000:.0f} ms; "
+          f"rescanning the window: {rescan_one * locations:.1f} s "
+          f"({rescan_one * 1000:.0f} ms per location)", file=out)
+    print("pooled POP weights, 24-48 h lead: "
+          + ', '.join(f"{m} {w:.2f}" for m, w in day1.items())
+          + f" (compile(): {', '.join(f'{m} {w:.2f}' for m, w in DEFAULT_WEIGHTS.items())})", file=out)
+    return docs
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Model skill scoring and consensus weights')
+    parser.add_argument('--store', help='forecast_store root')
+    parser.add_argument('--location', default='mebane')
+    parser.add_argument('--observations', help='NWS station observations JSON file')
+    parser.add_argument('--window-days', type=int, default=DEFAULT_WINDOW_HOURS // 24)
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    if not (args.store and args.observations):
+        parser.error('--store and --observations are required (or --bench)')
+    import forecast_store
+    with open(args.observations, 'r', encoding='utf-8') as f:
+        observations = parse_observations(json.load(f))
+    store = forecast_store.ForecastStore(args.store)
+    engine = SkillEngine(window_hours=args.window_days * 24)
+    engine.verify_history(args.location, store.location(args.location), observations)
+    print(json.dumps(engine.weights(args.location), indent=2))
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+
+"""
+Open-Meteo Column Decoder
+
+One omBatchUrl() response carries 11 hourly variables x 4 models x 168 hours
+(384 hours for 16 days) as one flat `hourly` object. json.loads turns every
+value into a boxed float inside a list, and unpackOM() then scans every key
+for each model suffix and copies the arrays into per-model objects; omV()
+finds the hour with time.indexOf.
+
+This decoder reads the response incrementally (any iterable of byte chunks,
+e.g. an HTTP response) and writes each `<field>_<model>` array straight into
+one preallocated typed block (float32 by default, NaN for null):
+- the block is sized from `hourly_units` and the `time` axis, so there is one
+  allocation per location instead of ~50 lists of Python floats,
+- `time` gets a hash index (first occurrence, like indexOf) for O(1) lookups,
+- per-model views hand out memoryview slices of the block (zero-copy) and
+  can be passed where an unpackOM() object was used,
+- `fields=` decodes only the variables a caller needs (CONSENSUS_FIELDS for
+  compile()); the other arrays are skipped without being converted.
+A top-level JSON array (multi-location request) yields one dataset per location.
+
+float32 keeps about 7 significant digits; pass typecode='d' for exact values.
+
+Usage:
+    python3 om_decoder.py --bench
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+import urllib.request
+from array import array
+
+import upstream
+
+CHUNK_SIZE = 64 * 1024
+
+# The only Open-Meteo fields compile() reads (precip, QPF, CAPE, weather code)
+CONSENSUS_FIELDS = ('precipitation_probability', 'precipitation', 'cape', 'weathercode')
+_WHITESPACE = b' \t\r\n'
+_NAN = float('nan')
+
+
+class OMDecodeError(ValueError):
+    """Malformed or truncated Open-Meteo response"""
+
+
+class _ChunkReader:
+    """Byte buffer over an iterable of chunks; consumed bytes are dropped as it goes"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.buf = bytearray()
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        if self.pos > CHUNK_SIZE:
+            del self.buf[:self.pos]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace byte (not consumed)"""
+        while True:
+            buf = self.buf
+            while self.pos < len(buf) and buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(buf):
+                return buf[self.pos]
+            if not self._more():
+                raise OMDecodeError('Unexpected end of response')
+
+    def expect(self, ch):
+        if self.peek() != ch:
+            raise OMDecodeError(f'Expected {chr(ch)!r} at byte {self.pos}')
+        self.pos += 1
+
+    def _find(self, byte, start):
+        """Buffer index of `byte` at or after `start`, reading more chunks as needed"""
+        while True:
+            i = self.buf.find(byte, start)
+            if i >= 0:
+                return i
+            start = max(len(self.buf), start)
+            offset = self.pos
+            if not self._more():
+                raise OMDecodeError('Unexpected end of response')
+            start -= offset - self.pos  # the buffer may have been compacted
+
+    def read_string(self):
+        self.expect(ord('"'))
+        start = self.pos
+        end = self._find(b'"', start)
+        while self._escaped(end):
+            end = self._find(b'"', end + 1)
+        raw = bytes(self.buf[self.pos:end])
+        self.pos = end + 1
+        return json.loads(b'"' + raw + b'"') if b'\\' in raw else raw.decode('utf-8')
+
+    def _escaped(self, i):
+        n = 0
+        while i - 1 - n >= self.pos and self.buf[i - 1 - n] == 0x5C:
+            n += 1
+        return n % 2 == 1
+
+    def read_flat_array(self):
+        """Raw bytes between '[' and ']' of an array without nested arrays"""
+        self.expect(ord('['))
+        end = self._find(b']', self.pos)
+        raw = bytes(self.buf[self.pos:end])
+        self.pos = end + 1
+        return raw
+
+    def skip_flat_array(self):
+        self.expect(ord('['))
+        self.pos = self._find(b']', self.pos) + 1
+
+    def read_value(self):
+        """Any JSON value (used for the small metadata fields)"""
+        decoder = json.JSONDecoder()
+        self.peek()
+        window = 256
+        while True:
+            raw = self.buf[self.pos:self.pos + window]
+            # errors='ignore' only drops a multi-byte character cut at the window edge
+            text = raw.decode('utf-8', errors='ignore')
+            complete = self.eof and self.pos + window >= len(self.buf)
+            try:
+                value, end = decoder.raw_decode(text)
+            except ValueError:
+                value, end = None, -1
+            # A value running to the edge of the window may continue past it
+            if end >= 0 and (end < len(text) or complete):
+                self.pos += len(text[:end].encode('utf-8'))
+                return value
+            if complete:
+                raise OMDecodeError(f'Invalid JSON value at byte {self.pos}')
+            if self.pos + window >= len(self.buf):
+                self._more()
+            else:
+                window *= 8
+
+
+class ModelView:
+    """One model's columns (zero-copy) with the shared time axis.
+
+    Stands in for an unpackOM() object wherever consensus reads one (om_v,
+    compile_day, the batched engine). Null decodes to NaN in the columns,
+    which those treat like null; to_dict() gives the plain object with None.
+    """
+
+    __slots__ = ('dataset', 'model', 'time', 'time_index')
+
+    def __init__(self, dataset, model):
+        self.dataset = dataset
+        self.model = model
+        self.time = dataset.time
+        self.time_index = dataset.time_index
+
+    def __getitem__(self, key):
+        if key == 'time':
+            return self.time
+        column = self.dataset.column(key, self.model)
+        if column is None:
+            raise KeyError(key)
+        return column
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key == 'time' or self.dataset.column(key, self.model) is not None
+
+    def keys(self):
+        return ['time'] + self.dataset.fields(self.model)
+
+    def value(self, field, time_str, default=0):
+        """omV()-style lookup in O(1): missing hour, missing field and null all give default"""
+        i = self.time_index.get(time_str)
+        column = self.dataset.column(field, self.model)
+        if i is None or column is None:
+            return default
+        v = column[i]
+        return v if v == v and v else default
+
+    def to_dict(self):
+        """Plain unpackOM() object (lists, None for null)"""
+        out = {'time': list(self.time)}
+        for field in self.dataset.fields(self.model):
+            out[field] = [None if math.isnan(v) else v for v in self.dataset.column(field, self.model)]
+        return out
+
+
+class OMDataset:
+    """One location of an Open-Meteo response, hourly data in one typed block"""
+
+    def __init__(self, models=upstream.OM_MODELS, typecode='f', fields=None):
+        self.models_requested = tuple(models)
+        self.typecode = typecode
+        self.fields_requested = frozenset(fields) if fields is not None else None
+        self.meta = {}
+        self.units = {}
+        self.time = []
+        self.time_index = {}
+        self.block = None
+        self._block_view = None
+        self._next_slot = 0
+        self._slots = 0
+        self._columns = {}   # (field, model) -> memoryview
+        self._overflow = []  # arrays for columns that did not fit the block
+
+    def _split(self, key):
+        for model in self.models_requested:
+            if key.endswith('_' + model):
+                return key[:-len(model) - 1], model
+        return key, ''
+
+    def _set_time(self, raw):
+        text = raw.decode('utf-8')
+        self.time = [t.strip()[1:-1] for t in text.split(',')] if text.strip() else []
+        index = {}
+        for i, t in enumerate(self.time):
+            index.setdefault(t, i)  # first occurrence, like indexOf
+        self.time_index = index
+        slots = sum(1 for key in self.units if key != 'time' and self.wants(key))
+        if slots:
+            self._allocate(slots)
+
+    def _allocate(self, slots):
+        n = len(self.time)
+        self.block = array(self.typecode, bytes(array(self.typecode).itemsize * slots * n))
+        self._block_view = memoryview(self.block)
+        self._slots = slots
+        self._next_slot = 0
+
+    def wants(self, key):
+        return self.fields_requested is None or self._split(key)[0] in self.fields_requested
+
+    def _set_column(self, key, raw):
+        n = len(self.time)
+        if b'null' in raw:
+            raw = raw.replace(b'null', b'nan')
+        values = array(self.typecode, map(float, raw.split(b','))) if raw.strip() else array(self.typecode)
+        if len(values) != n:
+            values = values[:n]
+            values.extend([_NAN] * (n - len(values)))
+        field, model = self._split(key)
+        if self._next_slot < self._slots:
+            start = self._next_slot * n
+            self._block_view[start:start + n] = values
+            self._columns[(field, model)] = self._block_view[start:start + n]
+            self._next_slot += 1
+        else:
+            self._overflow.append(values)
+            self._columns[(field, model)] = memoryview(values)
+
+    # ── Access ───────────────────────────────────────────────────────────
+
+    def column(self, field, model=''):
+        return self._columns.get((field, model))
+
+    def models(self):
+        present = {model for _, model in self._columns}
+        return [m for m in self.models_requested if m in present] + sorted(present - set(self.models_requested))
+
+    def fields(self, model=''):
+        return [field for field, m in self._columns if m == model]
+
+    def model_view(self, model):
+        """Per-model view (like unpackOM(); None when there is no time axis)"""
+        if not self.time:
+            return None
+        return ModelView(self, model)
+
+    def model_views(self):
+        return {model: self.model_view(model) for model in self.models_requested}
+
+    def index_of(self, time_str):
+        return self.time_index.get(time_str, -1)
+
+    @property
+    def nbytes(self):
+        size = self.block.itemsize * len(self.block) if self.block is not None else 0
+        return size + sum(a.itemsize * len(a) for a in self._overflow)
+
+
+def _parse_location(reader, models, typecode, fields):
+    dataset = OMDataset(models, typecode, fields)
+    reader.expect(ord('{'))
+    if reader.peek() == ord('}'):
+        reader.pos += 1
+        return dataset
+    while True:
+        key = reader.read_string()
+        reader.expect(ord(':'))
+        if key == 'hourly' and reader.peek() == ord('{'):
+            _parse_hourly(reader, dataset)
+        elif key == 'hourly_units':
+            units = reader.read_value()
+            dataset.units = units if isinstance(units, dict) else {}
+        else:
+            dataset.meta[key] = reader.read_value()
+        c = reader.peek()
+        reader.pos += 1
+        if c == ord('}'):
+            return dataset
+        if c != ord(','):
+            raise OMDecodeError(f'Expected "," or "}}" at byte {reader.pos - 1}')
+
+
+def _parse_hourly(reader, dataset):
+    reader.expect(ord('{'))
+    if reader.peek() == ord('}'):
+        reader.pos += 1
+        return
+    while True:
+        key = reader.read_string()
+        reader.expect(ord(':'))
+        if reader.peek() == ord('['):
+            if key == 'time':
+                dataset._set_time(reader.read_flat_array())
+            elif dataset.wants(key):
+                dataset._set_column(key, reader.read_flat_array())
+            else:
+                reader.skip_flat_array()
+        else:
+            reader.read_value()
+        c = reader.peek()
+        reader.pos += 1
+        if c == ord('}'):
+            return
+        if c != ord(','):
+            raise OMDecodeError(f'Expected "," or "}}" at byte {reader.pos - 1}')
+
+
+def decode(chunks, models=upstream.OM_MODELS, typecode='f', fields=None):
+    """Decode an Open-Meteo response from an iterable of byte chunks -> list of OMDataset"""
+    if isinstance(chunks, (bytes, bytearray)):
+        chunks = [chunks]
+    reader = _ChunkReader(chunks)
+    if reader.peek() != ord('['):
+        return [_parse_location(reader, models, typecode, fields)]
+    reader.pos += 1
+    datasets = []
+    if reader.peek() == ord(']'):
+        return datasets
+    while True:
+        datasets.append(_parse_location(reader, models, typecode, fields))
+        c = reader.peek()
+        reader.pos += 1
+        if c == ord(']'):
+            return datasets
+        if c != ord(','):
+            raise OMDecodeError(f'Expected "," or "]" at byte {reader.pos - 1}')
+
+
+def iter_chunks(fileobj, size=CHUNK_SIZE):
+    return iter(lambda: fileobj.read(size), b'')
+
+
+def fetch_datasets(url, timeout=upstream.TIMEOUTS['open_meteo'], models=upstream.OM_MODELS, typecode='f',
+                   fields=None):
+    """Blocking fetch that decodes while the body downloads"""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url), timeout=timeout) as resp:
+            datasets = decode(iter_chunks(resp), models, typecode, fields)
+    except OMDecodeError as e:
+        raise upstream.UpstreamError(url, f'JSON parse error: {e}')
+    except (OSError, ValueError) as e:
+        raise upstream.UpstreamError(url, f'Network error: {getattr(e, "reason", e)}')
+    for dataset in datasets:
+        if dataset.meta.get('error') is True:
+            raise upstream.UpstreamError(url, f"Open-Meteo error: {dataset.meta.get('reason')}")
+    return datasets
+
+
+async def fetch_datasets_async(url, timeout=upstream.TIMEOUTS['open_meteo'], models=upstream.OM_MODELS,
+                               typecode='f', fields=None):
+    return await asyncio.to_thread(fetch_datasets, url, timeout, models, typecode, fields)
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_response(days=7, locations=1, seed=0, start='2026-06-01'):
+    """Open-Meteo shaped JSON (bytes) for omBatchUrl(): 11 variables x 4 models"""
+    rng = random.Random(seed)
+    fields = upstream.OM_HOURLY.split(',')
+    n = days * 24
+    t0 = time.mktime(time.strptime(start, '%Y-%m-%d'))
+    times = [time.strftime('%Y-%m-%dT%H:%M', time.localtime(t0 + 3600 * h)) for h in range(n)]
+    docs = []
+    for loc in range(locations):
+        hourly = {'time': times}
+        units = {'time': 'iso8601'}
+        for model in upstream.OM_MODELS:
+            for field in fields:
+                key = f'{field}_{model}'
+                units[key] = 'unit'
+                if model == 'gfs_hrrr':
+                    # HRRR only covers the first 48 hours
+                    hourly[key] = [round(rng.uniform(0, 100), 1) if h < 48 else None for h in range(n)]
+                else:
+                    hourly[key] = [round(rng.uniform(0, 100), 1) for _ in range(n)]
+        docs.append({'latitude': 36.1 + loc * 0.01, 'longitude': -79.3, 'generationtime_ms': 1.2,
+                     'utc_offset_seconds': -14400, 'timezone': 'America/New_York',
+                     'timezone_abbreviation': 'EDT', 'elevation': 200.0,
+                     'hourly_units': units, 'hourly': hourly})
+    doc = docs[0] if locations == 1 else docs
+    return json.dumps(doc, separators=(',', ':')).encode('utf-8')
+
+
+def _reference(body):
+    from consensus import unpack_om
+    parsed = json.loads(body)
+    docs = parsed if isinstance(parsed, list) else [parsed]
+    return [{m: unpack_om(d['hourly'], m) for m in upstream.OM_MODELS} for d in docs]
+
+
+def _streamed(body, fields=None):
+    return [ds.model_views() for ds in decode(iter_chunks(io.BytesIO(body)), fields=fields)]
+
+
+def _projected(body):
+    return _streamed(body, CONSENSUS_FIELDS)
+
+
+def _bench_lookups(body, repeat, out):
+    """om_v(): list.index() per lookup, against ModelView.value(): dict index"""
+    from consensus import om_v
+    ref = _reference(body)[0]['ecmwf_ifs025']
+    view = decode(iter_chunks(io.BytesIO(body)))[0].model_view('ecmwf_ifs025')
+    stamps = ref['time'][::6]
+    for label, fn in (('om_v', lambda t: om_v(ref, 'precipitation', t[:10], int(t[11:13]), 0)),
+                      ('ModelView.value', lambda t: view.value('precipitation', t))):
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for t in stamps:
+                fn(t)
+            best = min(best, time.perf_counter() - t0)
+        print(f"lookups x {len(stamps):<4} {label:<15} {best * 1000:8.3f} ms", file=out)
+
+
+def benchmark(cases=((7, 1), (16, 1), (16, 10)), repeat=3, out=sys.stdout):
+    for days, locations in cases:
+        body = synthetic_response(days, locations)
+        for label, fn in (('json+unpackOM', _reference), ('column decoder', _streamed),
+                          ('consensus cols', _projected)):
+            best = float('inf')
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                fn(body)
+                best = min(best, time.perf_counter() - t0)
+            tracemalloc.start()
+            kept = fn(body)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del kept
+            print(f"{days:>2}d x {locations:<3} {label:<15} {best * 1000:8.1f} ms   "
+                  f"retained {current / 1024:8.1f} KiB   peak {peak / 1024:8.1f} KiB   "
+                  f"(body {len(body) / 1024:.0f} KiB)", file=out)
+    _bench_lookups(synthetic_response(16, 1), repeat, out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Streaming Open-Meteo decoder into typed columns')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+
+"""
+Radar Loop Sprite Compositor
+
+Playing the loop in mebane-weather-radar-widget.html swaps a Leaflet tile
+layer per frame (startAnimation() / crossfadeToNextFrame()), so a phone pays
+dozens of tile requests per frame and stalls even with the CROSSFADE_MS blend.
+
+This compositor renders every frame of the loop for a fixed Mebane viewport
+into one PNG sprite sheet per zoom level (frames stacked vertically), plus a
+manifest with each frame's time, source and offset, so the widget downloads
+one image and keeps its timestamp sync: manifest frames carry the same
+`time` (unix seconds) that syncFullscreenTimestampFromCurrentFrame() reads.
+Zooms up to RAINVIEWER_MAX_ZOOM use the RainViewer past + nowcast frames,
+higher zooms the NWS WMS frames, like syncRadarToMap().
+
+Incremental rebuilds: each frame is rendered once and kept as its own
+deflate segment (full flush, so segments are independent) with the Adler-32
+of its scanlines. When a new frame arrives only that frame is decoded,
+composited and compressed; the sprite is reassembled by concatenating
+segments and combining checksums, without recompressing the loop.
+
+Tiles come from radar_tiles.RadarTileService (pack cache, fetched once on a
+miss). PNG decoding/encoding is a small zlib-only codec, no imaging library.
+
+Usage:
+    python3 radar_sprites.py --cache-dir /tmp/mw-radar --port 8071
+    python3 radar_sprites.py --bench
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+import asyncio_http
+import radar_tiles
+import upstream
+
+SPRITE_VIEWPORT = (768, 384)   # px; the embed is at most 320 px tall
+SPRITE_ZOOMS = range(4, 11)
+
+PNG_SIGNATURE = radar_tiles.PNG_SIGNATURE
+ADLER_BASE = 65521
+
+_SPRITE_PATH = re.compile(r'^/radar/sprites/(\d+)\.(png|json)$')
+
+
+class PNGError(ValueError):
+    """Unsupported or corrupt PNG"""
+
+
+# ── PNG codec ────────────────────────────────────────────────────────────────
+
+_masks = {}
+
+
+def _swar_masks(nbytes):
+    masks = _masks.get(nbytes)
+    if masks is None:
+        masks = _masks[nbytes] = (int.from_bytes(b'\x7f' * nbytes, 'little'),
+                                  int.from_bytes(b'\x80' * nbytes, 'little'),
+                                  (1 << (8 * nbytes)) - 1)
+    return masks
+
+
+def _add_bytes(a, b, nbytes):
+    """Bytewise (a + b) mod 256 on little-endian ints, no carries between bytes"""
+    low, high, _ = _swar_masks(nbytes)
+    return ((a & low) + (b & low)) ^ ((a ^ b) & high)
+
+
+def _unfilter(ftype, row, prev, bpp):
+    """Reconstruct one scanline (row and prev are bytes of equal length)"""
+    n = len(row)
+    if ftype == 0:
+        return row
+    if ftype == 2:
+        # Up: one whole-row SWAR add
+        total = _add_bytes(int.from_bytes(row, 'little'), int.from_bytes(prev, 'little'), n)
+        return total.to_bytes(n, 'little')
+    if ftype == 1:
+        # Sub: a prefix sum per channel, done in log2(width) whole-row steps
+        value = int.from_bytes(row, 'little')
+        full = _swar_masks(n)[2]
+        shift = 8 * bpp
+        while shift < 8 * n:
+            value = _add_bytes(value, (value << shift) & full, n)
+            shift *= 2
+        return value.to_bytes(n, 'little')
+    out = bytearray(row)
+    if ftype == 3:
+        for i in range(n):
+            left = out[i - bpp] if i >= bpp else 0
+            out[i] = (out[i] + ((left + prev[i]) >> 1)) & 0xFF
+        return bytes(out)
+    if ftype == 4:
+        for i in range(n):
+            a = out[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                pred = a
+            elif pb <= pc:
+                pred = b
+            else:
+                pred = c
+            out[i] = (out[i] + pred) & 0xFF
+        return bytes(out)
+    raise PNGError(f'unknown filter type {ftype}')
+
+
+def _chunks(data):
+    if not data.startswith(PNG_SIGNATURE):
+        raise PNGError('not a PNG')
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if len(body) != length:
+            raise PNGError('truncated chunk')
+        yield ctype, body
+        pos += 12 + length
+        if ctype == b'IEND':
+            return
+    raise PNGError('missing IEND')
+
+
+def decode_png(data):
+    """(width, height, RGBA bytes) for 8-bit (and low-bit palette) non-interlaced PNGs"""
+    header, palette, trns, idat = None, None, None, []
+    for ctype, body in _chunks(data):
+        if ctype == b'IHDR':
+            header = struct.unpack('>IIBBBBB', body)
+        elif ctype == b'PLTE':
+            palette = body
+        elif ctype == b'tRNS':
+            trns = body
+        elif ctype == b'IDAT':
+            idat.append(body)
+    if header is None:
+        raise PNGError('missing IHDR')
+    width, height, depth, color, _, _, interlace = header
+    if interlace:
+        raise PNGError('interlaced PNG not supported')
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(color)
+    if channels is None or depth not in ((1, 2, 4, 8) if color == 3 else (8,)):
+        raise PNGError(f'unsupported color type {color} / bit depth {depth}')
+    try:
+        raw = zlib.decompress(b''.join(idat))
+    except zlib.error as e:
+        raise PNGError(f'bad image data: {e}')
+    stride = (width * channels * depth + 7) // 8
+    bpp = max(1, channels * depth // 8)
+    if len(raw) < height * (stride + 1):
+        raise PNGError('image data too short')
+
+    pixels = bytearray(height * stride)
+    prev = bytes(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        prev = _unfilter(raw[start], raw[start + 1:start + 1 + stride], prev, bpp)
+        pixels[y * stride:(y + 1) * stride] = prev
+    return width, height, _to_rgba(pixels, width, height, color, depth, palette, trns)
+
+
+def _to_rgba(pixels, width, height, color, depth, palette, trns):
+    n = width * height
+    out = bytearray(n * 4)
+    if color == 6:
+        return bytes(pixels)
+    if color == 3:
+        if palette is None:
+            raise PNGError('palette image without PLTE')
+        if depth < 8:
+            pixels = _unpack_bits(pixels, width, height, depth)
+        entries = len(palette) // 3
+        alpha = (trns or b'') + b'\xff' * 256
+        tables = [bytes(palette[3 * i + c] if i < entries else 0 for i in range(256)) for c in range(3)]
+        tables.append(bytes(alpha[:256]))
+        for c in range(4):
+            out[c::4] = pixels.translate(tables[c])
+        return bytes(out)
+    if color == 2:
+        for c in range(3):
+            out[c::4] = pixels[c::3]
+        out[3::4] = b'\xff' * n
+        return bytes(out)
+    if color == 0:
+        for c in range(3):
+            out[c::4] = pixels
+        out[3::4] = b'\xff' * n
+        return bytes(out)
+    # color == 4: gray + alpha
+    for c in range(3):
+        out[c::4] = pixels[0::2]
+    out[3::4] = pixels[1::2]
+    return bytes(out)
+
+
+def _unpack_bits(pixels, width, height, depth):
+    """Expand 1/2/4-bit palette indices to one byte per pixel"""
+    stride = (width * depth + 7) // 8
+    per_byte = 8 // depth
+    mask = (1 << depth) - 1
+    out = bytearray(width * height)
+    for y in range(height):
+        row = pixels[y * stride:(y + 1) * stride]
+        values = [(b >> (8 - depth * (k + 1))) & mask for b in row for k in range(per_byte)]
+        out[y * width:(y + 1) * width] = bytes(values[:width])
+    return out
+
+
+def _filter_row(ftype, row, prev, bpp):
+    """Encoder side of the five PNG filters (used for tests and synthetic tiles)"""
+    n = len(row)
+    if ftype == 0:
+        return bytes(row)
+    out = bytearray(n)
+    for i in range(n):
+        a = row[i - bpp] if i >= bpp else 0
+        b = prev[i]
+        c = prev[i - bpp] if i >= bpp else 0
+        if ftype == 1:
+            pred = a
+        elif ftype == 2:
+            pred = b
+        elif ftype == 3:
+            pred = (a + b) >> 1
+        else:
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+        out[i] = (row[i] - pred) & 0xFF
+    return bytes(out)
+
+
+def _chunk(ctype, body):
+    return struct.pack('>I', len(body)) + ctype + body + struct.pack('>I', zlib.crc32(ctype + body))
+
+
+def png_header(width, height):
+    return PNG_SIGNATURE + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+
+def scanlines(rgba, width, height, filter_type=0):
+    """Filtered scanlines (filter byte + row) of an RGBA image"""
+    stride = width * 4
+    out = bytearray()
+    prev = bytes(stride)
+    for y in range(height):
+        row = rgba[y * stride:(y + 1) * stride]
+        ftype = filter_type if filter_type != 'cycle' else y % 5
+        out.append(ftype)
+        out += _filter_row(ftype, row, prev, 4)
+        prev = row
+    return bytes(out)
+
+
+def encode_png(width, height, rgba, filter_type=0, level=6):
+    """8-bit RGBA PNG; filter_type 0-4, or 'cycle' to use all five"""
+    data = zlib.compress(scanlines(rgba, width, height, filter_type), level)
+    return png_header(width, height) + _chunk(b'IDAT', data) + _chunk(b'IEND', b'')
+
+
+def adler32_combine(adler1, adler2, len2):
+    """Adler-32 of A+B from adler(A), adler(B) and len(B) (zlib's adler32_combine)"""
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + ADLER_BASE - rem
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= ADLER_BASE << 1:
+        sum2 -= ADLER_BASE << 1
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+class FrameSegment:
+    """One rendered frame: independent deflate segment plus checksum of its scanlines"""
+
+    __slots__ = ('key', 'time', 'source', 'deflated', 'adler', 'raw_length', 'tiles')
+
+    def __init__(self, key, frame_time, source, raw, tiles, level=6):
+        self.key = key
+        self.time = frame_time
+        self.source = source
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.deflated = compressor.compress(raw) + compressor.flush(zlib.Z_FULL_FLUSH)
+        self.adler = zlib.adler32(raw)
+        self.raw_length = len(raw)
+        self.tiles = tiles
+
+
+def assemble_sprite(width, frame_height, segments):
+    """PNG of frames stacked vertically, from already-compressed segments"""
+    adler = 1
+    for seg in segments:
+        adler = adler32_combine(adler, seg.adler, seg.raw_length)
+    stream = (b'\x78\x9c' + b''.join(seg.deflated for seg in segments)
+              + b'\x03\x00'                          # final empty fixed-Huffman block
+              + struct.pack('>I', adler))
+    return (png_header(width, frame_height * len(segments)) + _chunk(b'IDAT', stream)
+            + _chunk(b'IEND', b''))
+
+
+# ── Compositing ──────────────────────────────────────────────────────────────
+
+def viewport_origin(lat, lon, zoom, width, height):
+    """Global pixel coordinates of the viewport's top-left corner"""
+    x, y = radar_tiles.tile_xy(lat, lon, zoom)
+    return int(math.floor(x * radar_tiles.TILE_SIZE - width / 2)), int(math.floor(y * radar_tiles.TILE_SIZE - height / 2))
+
+
+def viewport_bounds(lat, lon, zoom, width, height):
+    """[[south, west], [north, east]] of the viewport, for L.imageOverlay"""
+    left, top = viewport_origin(lat, lon, zoom, width, height)
+    scale = radar_tiles.TILE_SIZE * 2 ** zoom
+
+    def lonlat(px, py):
+        lon_ = px / scale * 360.0 - 180.0
+        lat_ = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * py / scale))))
+        return round(lat_, 6), round(lon_, 6)
+
+    south, west = lonlat(left, top + height)
+    north, east = lonlat(left + width, top)
+    return [[south, west], [north, east]]
+
+
+def composite(tiles, lat, lon, zoom, width, height):
+    """RGBA viewport from {(z, x, y): decoded RGBA}; missing tiles stay transparent"""
+    size = radar_tiles.TILE_SIZE
+    left, top = viewport_origin(lat, lon, zoom, width, height)
+    canvas = bytearray(width * height * 4)
+    n = 2 ** zoom
+    for ty in range(top // size, (top + height - 1) // size + 1):
+        for tx in range(left // size, (left + width - 1) // size + 1):
+            rgba = tiles.get((zoom, tx % n, ty))
+            if rgba is None:
+                continue
+            x0, x1 = max(left, tx * size), min(left + width, (tx + 1) * size)
+            y0, y1 = max(top, ty * size), min(top + height, (ty + 1) * size)
+            span = (x1 - x0) * 4
+            for gy in range(y0, y1):
+                src = ((gy - ty * size) * size + (x0 - tx * size)) * 4
+                dst = ((gy - top) * width + (x0 - left)) * 4
+                canvas[dst:dst + span] = rgba[src:src + span]
+    return canvas
+
+
+def _frame_time(source, frame_id, maps):
+    if source == 'nws':
+        return int(datetime.datetime.strptime(frame_id, '%Y-%m-%dT%H:%M:%SZ')
+                   .replace(tzinfo=datetime.timezone.utc).timestamp())
+    radar = (maps or {}).get('radar') or {}
+    for frame in (radar.get('past') or []) + (radar.get('nowcast') or []):
+        if isinstance(frame, dict) and frame.get('path') == frame_id:
+            return frame.get('time')
+    return None
+
+
+class SpriteCompositor:
+    """Per-zoom sprite sheets over RadarTileService frames, rebuilt one frame at a time"""
+
+    def __init__(self, tiles, zooms=SPRITE_ZOOMS, viewport=SPRITE_VIEWPORT, center=radar_tiles.MAP_CENTER,
+                 level=6):
+        self.tiles = tiles
+        self.zooms = list(zooms)
+        self.viewport = viewport
+        self.center = center
+        self.level = level
+        self.segments = {z: {} for z in self.zooms}   # zoom -> frame key -> FrameSegment
+        self.sprites = {}                             # zoom -> (png bytes, manifest)
+        self.stats = collections.Counter()
+        self._decoded = collections.OrderedDict()     # tile sha1 -> RGBA; blank tiles repeat a lot
+
+    @staticmethod
+    def source_for(zoom):
+        return 'rainviewer' if zoom <= radar_tiles.RAINVIEWER_MAX_ZOOM else 'nws'
+
+    def _needed_tiles(self, zoom):
+        width, height = self.viewport
+        size = radar_tiles.TILE_SIZE
+        left, top = viewport_origin(*self.center, zoom, width, height)
+        n = 2 ** zoom
+        return [(zoom, tx % n, ty) for ty in range(top // size, (top + height - 1) // size + 1)
+                for tx in range(left // size, (left + width - 1) // size + 1) if 0 <= ty < n]
+
+    def _decode(self, data, keep=256):
+        digest = hashlib.sha1(data).digest()
+        if digest in self._decoded:
+            self._decoded.move_to_end(digest)
+            self.stats['decode_hits'] += 1
+            return self._decoded[digest]
+        try:
+            w, h, rgba = decode_png(data)
+        except PNGError:
+            self.stats['bad_tiles'] += 1
+            return None
+        if (w, h) != (radar_tiles.TILE_SIZE, radar_tiles.TILE_SIZE):
+            return None
+        self._decoded[digest] = rgba
+        if len(self._decoded) > keep:
+            self._decoded.popitem(last=False)
+        return rgba
+
+    async def _render(self, zoom, frame, source, frame_id):
+        decoded, got = {}, 0
+        for t in self._needed_tiles(zoom):
+            data = await self.tiles.tile(frame, source, frame_id, *t)
+            if data is None:
+                continue
+            rgba = self._decode(bytes(data))
+            if rgba is not None:
+                decoded[t] = rgba
+                got += 1
+        width, height = self.viewport
+        canvas = composite(decoded, *self.center, zoom, width, height)
+        raw = scanlines(canvas, width, height)
+        self.stats['frames_rendered'] += 1
+        return FrameSegment(frame, _frame_time(source, frame_id, self.tiles.maps), source, raw, got, self.level)
+
+    async def build(self, zoom):
+        """Bring one zoom's sprite up to date; only new or incomplete frames are rendered"""
+        source = self.source_for(zoom)
+        frames = [f for f in self.tiles.frames() if f[1] == source]
+        cache = self.segments[zoom]
+        for key in [k for k in cache if k not in {f[0] for f in frames}]:
+            del cache[key]
+        needed = len(self._needed_tiles(zoom))
+        for frame, src, frame_id in frames:
+            seg = cache.get(frame)
+            if seg is not None and seg.tiles == needed:
+                self.stats['frames_reused'] += 1
+                continue
+            if seg is not None:
+                self.stats['frames_retried'] += 1  # rendered with tiles missing (upstream was failing)
+            cache[frame] = await self._render(zoom, frame, src, frame_id)
+        ordered = [cache[f[0]] for f in frames if f[0] in cache]
+        width, height = self.viewport
+        png = assemble_sprite(width, height, ordered) if ordered else None
+        manifest = {
+            'zoom': zoom, 'source': source, 'frame_width': width, 'frame_height': height,
+            'bounds': viewport_bounds(*self.center, zoom, width, height),
+            'frames': [{'index': i, 'time': seg.time, 'key': seg.key, 'y': i * height, 'tiles': seg.tiles}
+                       for i, seg in enumerate(ordered)],
+            'generated': int(time.time()),
+            'etag': hashlib.sha1(png).hexdigest()[:16] if png else None
+        }
+        self.sprites[zoom] = (png, manifest)
+        return png, manifest
+
+    async def build_all(self):
+        for zoom in self.zooms:
+            await self.build(zoom)
+
+
+class SpriteServer:
+    """GET /radar/sprites/{zoom}.png and /radar/sprites/{zoom}.json"""
+
+    def __init__(self, compositor, max_age=120):
+        self.compositor = compositor
+        self.max_age = max_age
+        self.server = None
+
+    async def handle(self, reader, writer):
+        request = await asyncio_http.read_request(reader)
+        if request is None:
+            writer.close()
+            return
+        m = _SPRITE_PATH.match(request.path) if request.method in ('GET', 'HEAD') else None
+        zoom = int(m.group(1)) if m else None
+        if zoom not in self.compositor.zooms:
+            await asyncio_http.write_json(writer, 404, b'{"error":"not found"}')
+            return
+        if zoom not in self.compositor.sprites:
+            await self.compositor.build(zoom)
+        png, manifest = self.compositor.sprites[zoom]
+        if png is None:
+            await asyncio_http.write_json(writer, 503, b'{"error":"no radar frames"}')
+            return
+        head_only = request.method == 'HEAD'
+        etag = '"' + manifest['etag'] + '"'
+        if m.group(2) == 'json':
+            await asyncio_http.write_json(writer, 200, json.dumps(manifest).encode('utf-8'),
+                                          {'Cache-Control': 'no-cache'}, head_only)
+            return
+        headers = {'Content-Type': 'image/png', 'ETag': etag, 'Access-Control-Allow-Origin': '*',
+                   'Cache-Control': f'public, max-age={self.max_age}'}
+        if request.headers.get('if-none-match') == etag:
+            await asyncio_http.write_response(writer, 304, b'', headers)
+            return
+        await asyncio_http.write_response(writer, 200, png, headers, head_only)
+
+    async def start(self, host='127.0.0.1', port=8071):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_tile(seed, filter_type=1):
+    """256 px RGBA radar-ish tile: a few reflectivity blobs on transparency"""
+    rng = random.Random(seed)
+    size = radar_tiles.TILE_SIZE
+    rgba = bytearray(size * size * 4)
+    colors = [(4, 233, 231, 160), (1, 159, 244, 170), (2, 253, 2, 180), (253, 248, 2, 190), (253, 0, 0, 200)]
+    for _ in range(rng.randint(0, 3)):
+        cx, cy, r = rng.randrange(size), rng.randrange(size), rng.randint(10, 60)
+        for y in range(max(0, cy - r), min(size, cy + r)):
+            dx = int(math.sqrt(max(0, r * r - (y - cy) ** 2)))
+            x0, x1 = max(0, cx - dx), min(size, cx + dx)
+            if x1 > x0:
+                level = min(4, int(4 * (1 - abs(y - cy) / r)))
+                rgba[(y * size + x0) * 4:(y * size + x1) * 4] = bytes(colors[level]) * (x1 - x0)
+    return encode_png(size, size, bytes(rgba), filter_type)
+
+
+class SyntheticTiles:
+    """fetch() stand-in serving synthetic radar PNGs (content varies by URL)"""
+
+    def __init__(self, maps, latency=0.0):
+        self.maps = maps
+        self.latency = latency
+        self.calls = 0
+        self._cache = {seed: synthetic_tile(seed) for seed in range(64)}
+
+    async def fetch(self, url, headers=None, timeout=10.0):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if url.endswith('/weather-maps.json'):
+            return upstream.Response(url, 200, {}, json.dumps(self.maps).encode('utf-8'), 0.0)
+        seed = int(hashlib.sha1(url.encode('utf-8')).hexdigest()[:6], 16) % 64
+        return upstream.Response(url, 200, {'Content-Type': 'image/png'}, self._cache[seed], 0.0)
+
+
+def benchmark(zooms=(7, 9), out=sys.stdout):
+    """Full sprite build vs the next cycle's incremental rebuild, per zoom"""
+    now = time.time()
+    maps = radar_tiles.synthetic_maps(now)
+    source = SyntheticTiles(maps)
+    with tempfile.TemporaryDirectory() as directory:
+        pack = radar_tiles.TilePack(directory)
+        clock = {'t': now}
+        service = radar_tiles.RadarTileService(pack, fetch=source.fetch, clock=lambda: clock['t'])
+        compositor = SpriteCompositor(service, zooms=zooms)
+
+        async def run():
+            await service.load_maps()
+            for zoom in zooms:
+                n_frames = sum(1 for f in service.frames() if f[1] == compositor.source_for(zoom))
+                t0 = time.perf_counter()
+                png, manifest = await compositor.build(zoom)
+                full = time.perf_counter() - t0
+                tiles = len(compositor._needed_tiles(zoom))
+                # Next cycle: a new past frame and a new nowcast frame in, the oldest out
+                source.maps = radar_tiles.synthetic_maps(now + 600)
+                clock['t'] = now + 600
+                await service.load_maps()
+                rendered = compositor.stats['frames_rendered']
+                t0 = time.perf_counter()
+                _, manifest2 = await compositor.build(zoom)
+                incremental = time.perf_counter() - t0
+                assert manifest2['frames'][-1]['time'] != manifest['frames'][-1]['time']
+                print(f"zoom {zoom:>2} ({compositor.source_for(zoom)}): {n_frames} frames x {tiles} tiles -> "
+                      f"1 sprite {len(png) / 1024:.0f} KiB; full build {full * 1000:.0f} ms, "
+                      f"next cycle ({compositor.stats['frames_rendered'] - rendered} new frame(s)) "
+                      f"{incremental * 1000:.0f} ms", file=out)
+                source.maps = maps
+                clock['t'] = now
+                await service.load_maps()
+
+        asyncio.run(run())
+        pack.close()
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Radar loop sprite compositor')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8071)
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'mw-radar-tiles'))
+    parser.add_argument('--upstream', help='Send upstream requests to this base URL (stand-in server)')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+
+    async def serve():
+        upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+        pack = radar_tiles.TilePack(args.cache_dir)
+        service = radar_tiles.RadarTileService(pack, upstreams)
+        compositor = SpriteCompositor(service)
+        server = SpriteServer(compositor)
+        port = await server.start(args.host, args.port)
+        print(f"Serving radar sprites on http://{args.host}:{port}/radar/sprites/<zoom>.png")
+
+        async def refresh():
+            while True:
+                try:
+                    await service.prefetch()
+                    await compositor.build_all()
+                except Exception as e:  # never let the refresh loop die
+                    print(f"sprite refresh error: {e}", file=sys.stderr)
+                await asyncio.sleep(radar_tiles.REFRESH_INTERVAL)
+
+        refresher = asyncio.create_task(refresh())
+        try:
+            await server.server.serve_forever()
+        finally:
+            refresher.cancel()
+            pack.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+
+"""
+Radar Tile Warmer and Packfile Cache
+
+preloadRadarFrames() / createRainviewerTileLayer() make every browser pull the
+same past and nowcast RainViewer tiles, and the NWS fallback asks the NCEP
+GeoServer WMS for NWS_FRAME_COUNT (12) frames at 10-minute steps. Animation
+start waits on hundreds of cold upstream requests per viewer.
+
+RadarTileService does that work once:
+- reads weather-maps.json and the buildNwsFrameTimes() schedule,
+- prefetches the tiles covering the widget viewport (zoom 9 at Mebane, map
+  zoom 4-10) concurrently: RainViewer up to RAINVIEWER_MAX_ZOOM, NWS WMS at
+  every zoom; after the first pass only newly published frames are fetched,
+- stores them in TilePack, a content-addressed disk cache with one
+  append-only packfile per frame, read back through mmap. Identical tiles
+  (most radar tiles are blank) are stored once. Frames are the eviction
+  unit: they leave when they age out of the schedule, or least recently used
+  first when the byte budget is exceeded,
+- serves the widget's own URL shapes, so only RADAR_API_URL and NWS_WMS_URL
+  change: /public/weather-maps.json (host rewritten to this server),
+  <path>/256/{z}/{x}/{y}/5/1_1.png, and WMS GetMap on
+  /geoserver/conus/conus_bref_qcd/ows. Misses are fetched through once.
+
+Usage:
+    python3 radar_tiles.py --cache-dir /tmp/mw-radar --port 8070
+    python3 radar_tiles.py --bench
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import hashlib
+import json
+import math
+import mmap
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import asyncio_http
+import upstream
+from aggregator import Coalescer
+
+INDEX_VERSION = 1
+
+# Widget constants (mebane-weather-radar-widget.html)
+RAINVIEWER_MAX_ZOOM = 7
+NWS_FRAME_COUNT = 12
+NWS_FRAME_INTERVAL = 600
+NWS_WMS_PATH = '/geoserver/conus/conus_bref_qcd/ows'
+NWS_WMS_LAYER = 'conus_bref_qcd'
+RAINVIEWER_TILE_SUFFIX = '/256/{z}/{x}/{y}/5/1_1.png'
+MAP_CENTER = (36.095918, -79.266536)
+
+TILE_SIZE = 256
+DEFAULT_ZOOMS = range(4, 11)
+DEFAULT_VIEWPORT = (1024, 768)   # pixels around the center, covers the embed at any width
+REFRESH_INTERVAL = 120.0         # frames publish every 10 min; look a few times per cycle
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+EARTH_HALF = 20037508.342789244  # EPSG:3857 half circumference (m)
+
+_RV_TILE = re.compile(r'^(/.+)/256/(\d+)/(\d+)/(\d+)/5/1_1\.png$')
+
+
+# ── Tile math ────────────────────────────────────────────────────────────────
+
+def tile_xy(lat, lon, zoom):
+    """Fractional slippy-map tile coordinates of a point"""
+    n = 2 ** zoom
+    lat_r = math.radians(max(-85.05112878, min(85.05112878, lat)))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.log(math.tan(lat_r) + 1.0 / math.cos(lat_r)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def viewport_tiles(lat, lon, zoom, width=DEFAULT_VIEWPORT[0], height=DEFAULT_VIEWPORT[1]):
+    """(z, x, y) of every tile a width x height map centered on lat/lon touches"""
+    cx, cy = tile_xy(lat, lon, zoom)
+    half_w, half_h = width / 2 / TILE_SIZE, height / 2 / TILE_SIZE
+    n = 2 ** zoom
+    x0, x1 = int(math.floor(cx - half_w)), int(math.floor(cx + half_w))
+    y0, y1 = max(0, int(math.floor(cy - half_h))), min(n - 1, int(math.floor(cy + half_h)))
+    return [(zoom, x % n, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def tile_bbox(z, x, y):
+    """EPSG:3857 bbox (minx, miny, maxx, maxy) of a tile, as Leaflet's WMS layer sends it"""
+    size = 2 * EARTH_HALF / 2 ** z
+    minx = -EARTH_HALF + x * size
+    maxy = EARTH_HALF - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def bbox_tile(bbox):
+    """Inverse of tile_bbox (None if the bbox is not a tile)"""
+    minx, miny, maxx, maxy = bbox
+    span = maxx - minx
+    if span <= 0 or abs((maxy - miny) - span) > span * 1e-6:
+        return None
+    z = round(math.log2(2 * EARTH_HALF / span))
+    size = 2 * EARTH_HALF / 2 ** z
+    x = round((minx + EARTH_HALF) / size)
+    y = round((EARTH_HALF - maxy) / size)
+    if not (0 <= x < 2 ** z and 0 <= y < 2 ** z) or abs(size - span) > size * 1e-6:
+        return None
+    return z, x, y
+
+
+def nws_frame_times(now=None, count=NWS_FRAME_COUNT, interval=NWS_FRAME_INTERVAL):
+    """buildNwsFrameTimes(): oldest first, aligned to 10-minute steps, ISO 'Z' strings"""
+    now = time.time() if now is None else now
+    t = math.floor(now / interval) * interval
+    return [datetime.datetime.fromtimestamp(t - i * interval, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            for i in reversed(range(count))]
+
+
+def wms_params(frame_time, z, x, y):
+    """GetMap query for one 256 px tile, in L.tileLayer.wms parameter order"""
+    return urllib.parse.urlencode({
+        'service': 'WMS', 'request': 'GetMap', 'version': '1.1.1', 'layers': NWS_WMS_LAYER,
+        'styles': '', 'format': 'image/png', 'transparent': 'true', 'time': frame_time,
+        'width': TILE_SIZE, 'height': TILE_SIZE, 'srs': 'EPSG:3857',
+        'bbox': ','.join(repr(v) for v in tile_bbox(z, x, y))
+    })
+
+
+# ── Packfile store ───────────────────────────────────────────────────────────
+
+class TilePack:
+    """Content-addressed tile store: one append-only packfile per frame, read via mmap"""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.blobs = {}                               # digest -> [segment, offset, length]
+        self.refs = collections.Counter()             # digest -> tiles referencing it
+        self.frames = collections.OrderedDict()       # frame -> {'segment', 'tiles': {'z/x/y': digest}}
+        self.segment_sizes = {}                       # segment -> bytes on disk
+        self.stats = collections.Counter()
+        self._maps = {}
+        self._writers = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # ── Paths and index ──────────────────────────────────────────────────
+
+    @staticmethod
+    def segment_for(frame):
+        return hashlib.sha1(frame.encode('utf-8')).hexdigest()[:20]
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, segment + '.pack')
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if isinstance(index, dict) and index.get('version') == INDEX_VERSION:
+            self._restore(index)
+        # Cut tiles appended after the last save (unclean stop) and drop packs the index doesn't know
+        for entry in os.listdir(self.directory):
+            if not entry.endswith('.pack'):
+                continue
+            path = os.path.join(self.directory, entry)
+            size = self.segment_sizes.get(entry[:-len('.pack')])
+            if size is None:
+                os.unlink(path)
+            elif os.path.getsize(path) != size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def _restore(self, index):
+        for segment, size in (index.get('segments') or {}).items():
+            try:
+                if os.path.getsize(self._segment_path(segment)) >= size:
+                    self.segment_sizes[segment] = size
+            except OSError:
+                continue
+        for digest, (segment, offset, length) in (index.get('blobs') or {}).items():
+            if segment in self.segment_sizes and offset + length <= self.segment_sizes[segment]:
+                self.blobs[digest] = [segment, offset, length]
+        for frame, info in (index.get('frames') or {}).items():
+            tiles = {k: d for k, d in info.get('tiles', {}).items() if d in self.blobs}
+            self.frames[frame] = {'segment': info.get('segment', self.segment_for(frame)), 'tiles': tiles}
+            self.refs.update(tiles.values())
+
+    def save(self):
+        index = {'version': INDEX_VERSION, 'segments': self.segment_sizes, 'blobs': self.blobs,
+                 'frames': self.frames}
+        for writer in self._writers.values():
+            writer.flush()
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, separators=(',', ':'))
+            os.replace(tmp, self._index_path())
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    # ── Reads and writes ─────────────────────────────────────────────────
+
+    @property
+    def total_bytes(self):
+        return sum(self.segment_sizes.values())
+
+    def has(self, frame, z, x, y):
+        info = self.frames.get(frame)
+        return info is not None and f'{z}/{x}/{y}' in info['tiles']
+
+    def get(self, frame, z, x, y):
+        """Tile bytes or None; marks the frame as recently used"""
+        info = self.frames.get(frame)
+        digest = info['tiles'].get(f'{z}/{x}/{y}') if info else None
+        if digest is None:
+            self.stats['misses'] += 1
+            return None
+        self.frames.move_to_end(frame)
+        self.stats['hits'] += 1
+        return self._read(*self.blobs[digest])
+
+    def _read(self, segment, offset, length):
+        view = self._maps.get(segment)
+        if view is None or offset + length > len(view):
+            writer = self._writers.get(segment)
+            if writer is not None:
+                writer.flush()
+            if view is not None:
+                view.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                view = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return view[offset:offset + length]
+
+    def _append(self, segment, data):
+        writer = self._writers.get(segment)
+        if writer is None:
+            writer = self._writers[segment] = open(self._segment_path(segment), 'ab')
+        offset = writer.tell()  # the real end of the file, whatever the index says
+        writer.write(data)
+        self.segment_sizes[segment] = offset + len(data)
+        return offset
+
+    def put(self, frame, z, x, y, data):
+        """Store one tile; bytes already in the pack are referenced, not rewritten"""
+        info = self.frames.get(frame)
+        if info is None:
+            info = self.frames[frame] = {'segment': self.segment_for(frame), 'tiles': {}}
+        self.frames.move_to_end(frame)
+        key = f'{z}/{x}/{y}'
+        digest = hashlib.sha1(data).hexdigest()
+        old = info['tiles'].get(key)
+        if old == digest:
+            return digest
+        if digest in self.blobs:
+            self.stats['deduplicated'] += 1
+        else:
+            self.blobs[digest] = [info['segment'], self._append(info['segment'], data), len(data)]
+            self.stats['stored'] += 1
+        info['tiles'][key] = digest
+        self.refs[digest] += 1
+        if old is not None:
+            self._release(old)
+        self._enforce_budget(keep=frame)
+        return digest
+
+    def _release(self, digest):
+        self.refs[digest] -= 1
+        if self.refs[digest] <= 0:
+            del self.refs[digest]
+            self.blobs.pop(digest, None)
+
+    # ── Eviction ─────────────────────────────────────────────────────────
+
+    def evict(self, frame):
+        """Drop a frame; its packfile goes once no live tile points into it"""
+        info = self.frames.pop(frame, None)
+        if info is None:
+            return
+        for digest in info['tiles'].values():
+            self._release(digest)
+        segment = info['segment']
+        survivors = [d for d, (seg, _, _) in self.blobs.items() if seg == segment]
+        if survivors:
+            # Shared blobs (e.g. the blank tile) move into the newest frame's pack
+            target = next((f['segment'] for f in reversed(self.frames.values())), None)
+            for digest in survivors:
+                data = bytes(self._read(*self.blobs[digest]))
+                self.blobs[digest] = [target, self._append(target, data), len(data)]
+                self.stats['relocated'] += 1
+        self._drop_segment(segment)
+        self.stats['evicted_frames'] += 1
+
+    def _drop_segment(self, segment):
+        view = self._maps.pop(segment, None)
+        if view is not None:
+            view.close()
+        writer = self._writers.pop(segment, None)
+        if writer is not None:
+            writer.close()
+        self.segment_sizes.pop(segment, None)
+        try:
+            os.unlink(self._segment_path(segment))
+        except OSError:
+            pass
+
+    def retain(self, frames):
+        """Evict every frame not in `frames` (aged out of the schedule)"""
+        keep = set(frames)
+        for frame in [f for f in self.frames if f not in keep]:
+            self.evict(frame)
+
+    def _enforce_budget(self, keep=None):
+        while self.total_bytes > self.max_bytes and len(self.frames) > 1:
+            victim = next(f for f in self.frames if f != keep)
+            self.evict(victim)
+
+    def close(self):
+        self.save()
+        for view in self._maps.values():
+            view.close()
+        for writer in self._writers.values():
+            writer.close()
+        self._maps.clear()
+        self._writers.clear()
+
+
+# ── Warmer and server ────────────────────────────────────────────────────────
+
+class RadarTileService:
+    """Keeps the current RainViewer and NWS frames for the viewport warm in a TilePack"""
+
+    def __init__(self, pack, upstreams=None, fetch=None, center=MAP_CENTER, zooms=DEFAULT_ZOOMS,
+                 viewport=DEFAULT_VIEWPORT, concurrency=16, clock=time.time):
+        self.pack = pack
+        self.upstreams = upstreams or upstream.Upstreams()
+        # fetch(url, headers, timeout) -> upstream.Response; raises UpstreamError on network errors
+        self.fetch = fetch or upstream.fetch
+        self.center = center
+        self.zooms = list(zooms)
+        self.viewport = viewport
+        self.concurrency = concurrency
+        self.clock = clock
+        self.maps = None            # last good weather-maps.json
+        self.coalescer = Coalescer()
+        self.stats = collections.Counter()
+
+    # ── Frame schedule ───────────────────────────────────────────────────
+
+    async def load_maps(self):
+        url = self.upstreams.rainviewer_maps_url()
+        try:
+            resp = await self.fetch(url, {}, upstream.TIMEOUTS['rainviewer'])
+            data = resp.json() if resp.ok else None
+        except upstream.UpstreamError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get('host'), str) and isinstance(data.get('radar'), dict):
+            self.maps = data
+        return self.maps
+
+    def frames(self):
+        """[(frame key, source, frame id)] for RainViewer past + nowcast and the NWS schedule"""
+        out = []
+        radar = (self.maps or {}).get('radar') or {}
+        for frame in (radar.get('past') or []) + (radar.get('nowcast') or []):
+            if isinstance(frame, dict) and isinstance(frame.get('path'), str):
+                out.append(('rv:' + frame['path'], 'rainviewer', frame['path']))
+        for t in nws_frame_times(self.clock()):
+            out.append(('nws:' + t, 'nws', t))
+        return out
+
+    def tiles_for(self, source):
+        zooms = [z for z in self.zooms if source != 'rainviewer' or z <= RAINVIEWER_MAX_ZOOM]
+        lat, lon = self.center
+        return [t for z in zooms for t in viewport_tiles(lat, lon, z, *self.viewport)]
+
+    def tile_url(self, source, frame_id, z, x, y):
+        """Upstream URL of a tile; None for RainViewer until weather-maps.json has loaded"""
+        if source == 'rainviewer':
+            if self.maps is None:
+                return None
+            return self.maps['host'] + frame_id + RAINVIEWER_TILE_SUFFIX.format(z=z, x=x, y=y)
+        return self.upstreams.bases['nws_wms'] + NWS_WMS_PATH + '?' + wms_params(frame_id, z, x, y)
+
+    # ── Fetching ─────────────────────────────────────────────────────────
+
+    async def _fetch_tile(self, frame, source, frame_id, z, x, y):
+        url = self.tile_url(source, frame_id, z, x, y)
+        if url is None:
+            self.stats['errors'] += 1
+            return None
+        try:
+            resp = await self.fetch(url, {}, upstream.TIMEOUTS['rainviewer'])
+        except upstream.UpstreamError:
+            self.stats['errors'] += 1
+            return None
+        # RainViewer answers unsupported zooms and GeoServer answers errors with non-PNG bodies
+        if not resp.ok or not resp.body.startswith(PNG_SIGNATURE):
+            self.stats['rejected'] += 1
+            return None
+        self.stats['fetched'] += 1
+        self.pack.put(frame, z, x, y, resp.body)
+        return resp.body
+
+    def accepts(self, frame, source, frame_id, z, x, y):
+        """Packed tiles and current frames only; RainViewer passes until weather-maps.json loads (502)"""
+        if self.pack.has(frame, z, x, y):
+            return True
+        if source == 'rainviewer' and self.maps is None:
+            return True
+        return any(key == frame for key, _, _ in self.frames())
+
+    async def tile(self, frame, source, frame_id, z, x, y):
+        """Tile bytes from the pack, or fetched once through (concurrent misses share it)"""
+        data = self.pack.get(frame, z, x, y)
+        if data is not None:
+            return data
+        return await self.coalescer.run(
+            (frame, z, x, y), lambda: self._fetch_tile(frame, source, frame_id, z, x, y))
+
+    async def prefetch(self):
+        """One warm-up pass: fetch missing tiles of current frames, evict aged-out frames"""
+        await self.load_maps()
+        frames = self.frames()
+        self.pack.retain(key for key, _, _ in frames)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        todo = [(frame, source, frame_id) + t for frame, source, frame_id in frames
+                for t in self.tiles_for(source) if not self.pack.has(frame, *t)]
+
+        async def one(job):
+            async with semaphore:
+                await self.coalescer.run(job[:1] + job[3:], lambda: self._fetch_tile(*job))
+
+        await asyncio.gather(*(one(job) for job in todo))
+        self.pack.save()
+        self.stats['prefetch_passes'] += 1
+        return len(todo)
+
+    async def run_forever(self, interval=REFRESH_INTERVAL):
+        while True:
+            try:
+                await self.prefetch()
+            except Exception as e:  # never let the warmer die
+                print(f"radar prefetch error: {e}", file=sys.stderr)
+            await asyncio.sleep(interval)
+
+
+class RadarTileServer:
+    """Serves weather-maps.json, RainViewer-shaped tile paths and WMS GetMap from the pack"""
+
+    def __init__(self, service, max_age=600):
+        self.service = service
+        self.max_age = max_age
+        self.server = None
+
+    async def handle(self, reader, writer):
+        request = await asyncio_http.read_request(reader)
+        if request is None:
+            writer.close()
+            return
+        if request.method not in ('GET', 'HEAD'):
+            await asyncio_http.write_json(writer, 405, b'{"error":"method not allowed"}')
+            return
+        head_only = request.method == 'HEAD'
+        if request.path == '/public/weather-maps.json':
+            maps = self.service.maps or await self.service.load_maps()
+            if maps is None:
+                await asyncio_http.write_json(writer, 503, b'{"error":"radar frames unavailable"}')
+                return
+            local = dict(maps, host='http://' + request.headers.get('host', '127.0.0.1'))
+            await asyncio_http.write_json(writer, 200, json.dumps(local).encode('utf-8'),
+                                          {'Cache-Control': 'no-cache'}, head_only)
+            return
+        target = self._tile_target(request)
+        if target is None or not self.service.accepts(*target):
+            await asyncio_http.write_json(writer, 404, b'{"error":"not found"}')
+            return
+        data = await self.service.tile(*target)
+        if data is None:
+            await asyncio_http.write_json(writer, 502, b'{"error":"tile unavailable"}')
+            return
+        headers = {'Content-Type': 'image/png', 'Access-Control-Allow-Origin': '*',
+                   'Cache-Control': f'public, max-age={self.max_age}'}
+        await asyncio_http.write_response(writer, 200, bytes(data), headers, head_only)
+
+    @staticmethod
+    def _tile_target(request):
+        """(frame key, source, frame id, z, x, y) for a tile request, else None"""
+        m = _RV_TILE.match(request.path)
+        if m:
+            path, z, x, y = m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4))
+            return 'rv:' + path, 'rainviewer', path, z, x, y
+        if request.path == NWS_WMS_PATH:
+            q = {k.lower(): v for k, v in request.query.items()}
+            try:
+                bbox = tuple(float(v) for v in q.get('bbox', '').split(','))
+            except ValueError:
+                return None
+            tile = bbox_tile(bbox) if len(bbox) == 4 and q.get('width') == str(TILE_SIZE) else None
+            if tile is None or not q.get('time'):
+                return None
+            return ('nws:' + q['time'], 'nws', q['time']) + tile
+        return None
+
+    async def start(self, host='127.0.0.1', port=8070):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_maps(now=None, past=13, nowcast=3, host='https://tilecache.rainviewer.com'):
+    """weather-maps.json shape with 10-minute frames"""
+    now = time.time() if now is None else now
+    t = int(now // 600 * 600)
+    return {'version': '2.0', 'generated': t, 'host': host, 'radar': {
+        'past': [{'time': t - 600 * i, 'path': f'/v2/radar/{t - 600 * i}'} for i in reversed(range(past))],
+        'nowcast': [{'time': t + 600 * i, 'path': f'/v2/radar/nowcast_{t + 600 * i}'} for i in range(1, nowcast + 1)]}}
+
+
+class SyntheticRadar:
+    """fetch() stand-in: PNG-signed tiles, most of them blank, after a simulated latency"""
+
+    def __init__(self, maps, latency=0.08, blank_rate=0.6, seed=0):
+        self.maps = maps
+        self.latency = latency
+        self.blank_rate = blank_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    async def fetch(self, url, headers=None, timeout=10.0):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if url.endswith('/weather-maps.json'):
+            return upstream.Response(url, 200, {}, json.dumps(self.maps).encode('utf-8'), self.latency)
+        if self.rng.random() < self.blank_rate:
+            body = PNG_SIGNATURE + b'blank'
+        else:
+            body = PNG_SIGNATURE + self.rng.randbytes(6000)
+        return upstream.Response(url, 200, {'Content-Type': 'image/png'}, body, self.latency)
+
+
+def benchmark(latency=0.08, out=sys.stdout):
+    """Animation start (12 frames at zoom 9) cold from upstream vs warm from the pack"""
+    maps = synthetic_maps()
+    radar = SyntheticRadar(maps, latency)
+    with tempfile.TemporaryDirectory() as directory:
+        pack = TilePack(directory)
+        service = RadarTileService(pack, fetch=radar.fetch, concurrency=16)
+
+        async def cold_start():
+            # A browser: 6 connections per host, every tile of every frame from upstream
+            frames = [f for f in service.frames() if f[1] == 'rainviewer'][:NWS_FRAME_COUNT]
+            tiles = [t for t in service.tiles_for('rainviewer') if t[0] == RAINVIEWER_MAX_ZOOM]
+            semaphore = asyncio.Semaphore(6)
+
+            async def one(frame_id, t):
+                async with semaphore:
+                    await radar.fetch(service.tile_url('rainviewer', frame_id, *t))
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one(fid, t) for _, _, fid in frames for t in tiles))
+            return time.perf_counter() - t0, len(frames) * len(tiles)
+
+        async def run():
+            await service.load_maps()
+            cold, n_tiles = await cold_start()
+            t0 = time.perf_counter()
+            fetched = await service.prefetch()
+            warm_up = time.perf_counter() - t0
+            frames = [f for f in service.frames() if f[1] == 'rainviewer'][:NWS_FRAME_COUNT]
+            tiles = [t for t in service.tiles_for('rainviewer') if t[0] == RAINVIEWER_MAX_ZOOM]
+            t0 = time.perf_counter()
+            for frame, source, fid in frames:
+                for t in tiles:
+                    await service.tile(frame, source, fid, *t)
+            warm = time.perf_counter() - t0
+            return cold, n_tiles, fetched, warm_up, warm
+
+        cold, n_tiles, fetched, warm_up, warm = asyncio.run(run())
+        print(f"animation start, {n_tiles} tiles: cold upstream {cold * 1000:.0f} ms "
+              f"({latency * 1000:.0f} ms/tile, 6 connections), from pack {warm * 1000:.1f} ms", file=out)
+        print(f"prefetch pass: {fetched} tiles in {warm_up:.2f} s, pack {pack.total_bytes / 1024:.0f} KiB "
+              f"in {len(pack.segment_sizes)} packfiles, {pack.stats['deduplicated']} tiles deduplicated", file=out)
+        pack.close()
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Radar tile prefetch warmer and packfile cache')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8070)
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'mw-radar-tiles'))
+    parser.add_argument('--max-mb', type=int, default=256)
+    parser.add_argument('--upstream', help='Send upstream requests to this base URL (stand-in server)')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+
+    async def serve():
+        upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+        pack = TilePack(args.cache_dir, args.max_mb * 1024 * 1024)
+        service = RadarTileService(pack, upstreams)
+        server = RadarTileServer(service)
+        port = await server.start(args.host, args.port)
+        print(f"Serving radar tiles on http://{args.host}:{port}/public/weather-maps.json")
+        warmer = asyncio.create_task(service.run_forever())
+        try:
+            await server.server.serve_forever()
+        finally:
+            warmer.cancel()
+            pack.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
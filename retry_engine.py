@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+
+"""
+Retry and Scheduling Engine
+
+Every widget has its own copy of tryFetch()/safeFetch(): exponential backoff
+with 80-120% jitter, per-attempt timeouts growing 10 s -> 13 s -> 16 s (cap
+25 s), three attempts. Nothing is shared, so several sources (or several
+clients behind one proxy) retrying into the same struggling host pile up.
+
+RetryEngine keeps that retry policy and coordinates it per host:
+- token buckets cap the request rate per host (retries included),
+- a circuit breaker for api.weather.gov and RainViewer fails fast while
+  the host is down and lets one probe through after a cool-down,
+- optional hedging: when an attempt runs past a latency percentile of
+  recent successes, a second request is sent and the first answer wins.
+
+simulate() runs the engine against the latency model from
+RESILIENCE_AND_ACCURACY_ASSESSMENT.md (L ~ N(mu, sigma^2), plus a hung-request
+tail and an error rate), with timers scaled so minutes run in milliseconds.
+
+Usage:
+    python3 retry_engine.py --simulate
+    python3 retry_engine.py --simulate --mu 2 --sigma 1.5 --hang 0.03 --errors 0.05
+"""
+
+import argparse
+import asyncio
+import collections
+import random
+import sys
+import time
+import urllib.parse
+
+import upstream
+
+# Retry policy (seconds; same values as the widgets' ms constants)
+TIMEOUT = 10.0
+TIMEOUT_RETRY_BOOST = 3.0
+TIMEOUT_MAX = 25.0
+MAX_RETRIES = 3
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 20.0
+
+# Requests per second and burst per host. Conservative: NWS does not publish
+# a limit, Open-Meteo's free tier allows 600 calls/minute.
+HOST_LIMITS = {
+    'api.weather.gov': (5.0, 10),
+    'api.open-meteo.com': (10.0, 20),
+    'api.rainviewer.com': (5.0, 10),
+    'www.spc.noaa.gov': (5.0, 10),
+    'mapservices.weather.noaa.gov': (5.0, 10)
+}
+DEFAULT_HOST_LIMIT = (10.0, 20)
+BREAKER_HOSTS = ('api.weather.gov', 'api.rainviewer.com')
+
+# HTTP statuses worth retrying (everything else is returned/raised as is)
+RETRY_STATUSES = frozenset((408, 429, 500, 502, 503, 504))
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, max_delay=BACKOFF_MAX, rng=random):
+    """backoffDelay(): base * 2^attempt, capped, times 80-120% jitter"""
+    return min(base * (2 ** attempt), max_delay) * (0.8 + rng.random() * 0.4)
+
+
+def retry_timeout(attempt, base=TIMEOUT, boost=TIMEOUT_RETRY_BOOST, max_timeout=TIMEOUT_MAX):
+    """retryTimeout(): 10 s, 13 s, 16 s, ... capped at 25 s"""
+    return min(base + attempt * boost, max_timeout)
+
+
+class CircuitOpenError(upstream.UpstreamError):
+    """Raised without a request while a host's circuit is open"""
+
+
+class TokenBucket:
+    """Rate limiter: `rate` tokens per second, at most `burst` banked"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> half-open after `reset_after`"""
+
+    def __init__(self, threshold=5, reset_after=30.0, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.probes = 0     # probes granted; identifies the one currently holding the slot
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_after:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        """True if a request may go out now (in half-open state, only one probe at a time)"""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self.probing:
+            self.probing = True
+            self.probes += 1
+            return True
+        return False
+
+    def release_probe(self, probe):
+        """Free the probe slot without an outcome, if `probe` (a `probes` value) still holds it"""
+        if self.probing and self.probes == probe:
+            self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None or self.probing:
+                self.trips += 1
+            self.opened_at = self.clock()
+            self.probing = False
+
+
+class LatencyTracker:
+    """Recent successful latencies for the hedging threshold"""
+
+    def __init__(self, window=200):
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class _Retryable(Exception):
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+class RetryEngine:
+    """Shared retry/backoff, per-host rate limits, circuit breakers and hedging"""
+
+    def __init__(self, fetch=None, max_retries=MAX_RETRIES, host_limits=None, breaker_hosts=BREAKER_HOSTS,
+                 breaker_threshold=5, breaker_reset=30.0, hedge_percentile=None, hedge_min_samples=20,
+                 time_scale=1.0, rng=None):
+        # fetch(url, headers, timeout) -> upstream.Response; raises UpstreamError on network errors
+        self.fetch = fetch or upstream.fetch
+        self.max_retries = max_retries
+        self.host_limits = dict(HOST_LIMITS)
+        self.host_limits.update(host_limits or {})
+        self.breaker_hosts = tuple(breaker_hosts)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        # All policy values are in seconds; time_scale < 1 runs them faster (simulation)
+        self.time_scale = time_scale
+        self.rng = rng or random.Random()
+        self._buckets = {}
+        self._breakers = {}
+        self._latency = {}
+        self.stats = collections.Counter()
+
+    def now(self):
+        """Engine time in (unscaled) seconds"""
+        return time.monotonic() / self.time_scale
+
+    async def _sleep(self, seconds):
+        await asyncio.sleep(seconds * self.time_scale)
+
+    def bucket(self, host):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_limits.get(host, DEFAULT_HOST_LIMIT)
+            bucket = self._buckets[host] = TokenBucket(rate, burst, self.now)
+        return bucket
+
+    def breaker(self, host):
+        """CircuitBreaker for host, or None if the host is not guarded"""
+        if host not in self.breaker_hosts:
+            return None
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset, self.now)
+        return breaker
+
+    def latency(self, host):
+        tracker = self._latency.get(host)
+        if tracker is None:
+            tracker = self._latency[host] = LatencyTracker()
+        return tracker
+
+    async def _throttle(self, host):
+        bucket = self.bucket(host)
+        while not bucket.try_take():
+            self.stats['throttled'] += 1
+            await self._sleep(bucket.wait_time())
+
+    async def _send(self, url, host, headers, timeout):
+        """One request under the host's breaker and bucket; raises _Retryable for transient failures"""
+        breaker = self.breaker(host)
+        if breaker is not None and not breaker.allow():
+            self.stats['breaker_rejections'] += 1
+            raise CircuitOpenError(url, f'Circuit open for {host}')
+        # allow() only sets probing when it hands this call the half-open probe
+        probe = breaker.probes if breaker is not None and breaker.probing else None
+        try:
+            await self._throttle(host)
+            self.stats['requests'] += 1
+            started = self.now()
+            resp = await asyncio.wait_for(self.fetch(url, headers, timeout * self.time_scale),
+                                          timeout * self.time_scale)
+        except asyncio.TimeoutError:
+            error = upstream.UpstreamError(url, f'Request timeout after {int(timeout * 1000)}ms')
+        except asyncio.CancelledError:
+            if probe is not None:
+                breaker.release_probe(probe)  # a cancelled probe must not hold the slot
+            raise
+        except upstream.UpstreamError as e:
+            error = e
+        else:
+            if resp.status not in RETRY_STATUSES:
+                if breaker is not None:
+                    breaker.record_success()
+                if resp.ok:
+                    self.latency(host).add(self.now() - started)
+                return resp
+            error = upstream.UpstreamError(url, f'HTTP {resp.status}', resp.status)
+        if breaker is not None:
+            breaker.record_failure()
+        raise _Retryable(error)
+
+    async def _attempt(self, url, host, headers, timeout):
+        """One attempt, hedged with a second request if it runs past the latency percentile"""
+        hedge_after = None
+        if self.hedge_percentile is not None:
+            tracker = self.latency(host)
+            if len(tracker.samples) >= self.hedge_min_samples:
+                hedge_after = tracker.percentile(self.hedge_percentile)
+        if hedge_after is None or hedge_after >= timeout:
+            return await self._send(url, host, headers, timeout)
+
+        primary = asyncio.ensure_future(self._send(url, host, headers, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after * self.time_scale)
+        if done:
+            return primary.result()
+        self.stats['hedges'] += 1
+        hedge = asyncio.ensure_future(self._send(url, host, headers, timeout - hedge_after))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is None:
+                        winner = winner or task
+                    else:
+                        error = error or task.exception()
+                if winner is not None:
+                    if winner is hedge:
+                        self.stats['hedge_wins'] += 1
+                    return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+                # The loser may still finish with an error before the cancel lands
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        raise error
+
+    async def request(self, url, headers=None, timeout=TIMEOUT):
+        """GET with the widget retry policy; returns the Response or raises UpstreamError"""
+        host = urllib.parse.urlsplit(url).netloc
+        last_error = None
+        for attempt in range(self.max_retries):
+            if attempt:
+                self.stats['retries'] += 1
+                await self._sleep(backoff_delay(attempt - 1, rng=self.rng))
+            try:
+                return await self._attempt(url, host, headers, retry_timeout(attempt, base=timeout))
+            except _Retryable as e:
+                last_error = e.error
+            except CircuitOpenError:
+                self.stats['failed'] += 1
+                raise
+        self.stats['failed'] += 1
+        raise last_error
+
+    async def fetch_json(self, url, headers=None, timeout=TIMEOUT):
+        """Aggregator-compatible fetcher: parsed JSON or UpstreamError"""
+        resp = await self.request(url, headers, timeout)
+        if not resp.ok:
+            raise upstream.UpstreamError(url, f'HTTP {resp.status}', resp.status)
+        return resp.json()
+
+
+# ── Simulation ───────────────────────────────────────────────────────────────
+
+class LatencyModel:
+    """L ~ N(mu, sigma^2) seconds (floored), plus a hung-request tail and an error rate"""
+
+    def __init__(self, mu=2.0, sigma=1.5, hang_rate=0.0, hang_seconds=60.0, error_rate=0.0,
+                 floor=0.05, rng=None):
+        self.mu = mu
+        self.sigma = sigma
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.error_rate = error_rate
+        self.floor = floor
+        self.rng = rng or random.Random(0)
+        self.calls = 0
+        self.outage_until = None   # engine time before which every call fails
+
+    def draw(self):
+        if self.rng.random() < self.hang_rate:
+            return self.hang_seconds
+        return max(self.floor, self.rng.gauss(self.mu, self.sigma))
+
+    def fetcher(self, engine):
+        """A fetch(url, headers, timeout) that sleeps a drawn latency in scaled time"""
+
+        async def fetch(url, headers=None, timeout=12.0):
+            self.calls += 1
+            latency = self.draw()
+            failed = self.rng.random() < self.error_rate
+            if self.outage_until is not None and engine.now() < self.outage_until:
+                failed, latency = True, min(latency, 0.2)
+            await asyncio.sleep(latency * engine.time_scale)
+            status = 503 if failed else 200
+            return upstream.Response(url, status, {}, b'{}', latency)
+
+        return fetch
+
+
+def _pct(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def _simulate_strategy(n, model, time_scale, spread, **engine_kwargs):
+    engine = RetryEngine(host_limits={'sim.invalid': (1e9, 10 ** 9)}, time_scale=time_scale,
+                         rng=random.Random(1), **engine_kwargs)
+    engine.fetch = model.fetcher(engine)
+    model.calls = 0
+    outcomes = []
+
+    async def one(i):
+        await asyncio.sleep(spread * time_scale * i / n)
+        started = engine.now()
+        try:
+            await engine.request('http://sim.invalid/data')
+            outcomes.append((True, engine.now() - started))
+        except upstream.UpstreamError:
+            outcomes.append((False, engine.now() - started))
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    ok = [t for success, t in outcomes if success]
+    return {
+        'success_rate': len(ok) / n,
+        'p50': _pct(ok, 0.50), 'p95': _pct(ok, 0.95), 'p99': _pct(ok, 0.99),
+        'upstream_calls_per_request': model.calls / n,
+        'stats': dict(engine.stats)
+    }
+
+
+def simulate(n=400, mu=2.0, sigma=1.5, hang_rate=0.03, error_rate=0.05, time_scale=0.01,
+             spread=60.0, seed=0):
+    """Compare single attempt, the widget retry policy, and retry + hedging (p90)"""
+    strategies = (
+        ('single attempt', {'max_retries': 1}),
+        ('retry x3', {}),
+        ('retry x3 + hedge', {'hedge_percentile': 0.9, 'hedge_min_samples': 20}),
+    )
+    results = {}
+    for label, kwargs in strategies:
+        model = LatencyModel(mu, sigma, hang_rate, error_rate=error_rate, rng=random.Random(seed))
+        results[label] = asyncio.run(_simulate_strategy(n, model, time_scale, spread, breaker_hosts=(), **kwargs))
+    # Analytic check from the assessment: P(success) = 1 - (1 - p)^3 with p = P(attempt succeeds)
+    model = LatencyModel(mu, sigma, hang_rate, error_rate=error_rate, rng=random.Random(seed + 1))
+    draws = 20000
+    p = sum(1 for _ in range(draws)
+            if model.draw() < TIMEOUT and model.rng.random() >= error_rate) / draws
+    results['analytic'] = {'p_single': p, 'p_three': 1 - (1 - p) ** 3}
+    return results
+
+
+def print_simulation(results, out=sys.stdout):
+    print(f"{'strategy':<18} {'success':>8} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'calls/req':>10}", file=out)
+    for label, r in results.items():
+        if label == 'analytic':
+            continue
+        print(f"{label:<18} {r['success_rate']:8.3f} {r['p50']:7.2f} {r['p95']:7.2f} {r['p99']:7.2f} "
+              f"{r['upstream_calls_per_request']:10.2f}", file=out)
+    a = results['analytic']
+    print(f"analytic: p = {a['p_single']:.3f}, 1-(1-p)^3 = {a['p_three']:.4f}", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Shared retry engine and latency simulation')
+    parser.add_argument('--simulate', action='store_true')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--mu', type=float, default=2.0, help='mean latency (s)')
+    parser.add_argument('--sigma', type=float, default=1.5, help='latency std dev (s)')
+    parser.add_argument('--hang', type=float, default=0.03, help='fraction of requests that hang')
+    parser.add_argument('--errors', type=float, default=0.05, help='fraction of 503 responses')
+    parser.add_argument('--scale', type=float, default=0.01, help='real seconds per simulated second')
+    args = parser.parse_args()
+    if args.simulate:
+        print_simulation(simulate(args.requests, args.mu, args.sigma, args.hang, args.errors, args.scale))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,12 +15,12 @@ echo ""
 if command -v python3 &> /dev/null; then
     echo "Running tests with Python..."
     echo ""
-    python3 run_tests.py
+    python3 run_tests.py "$@"
     exit_code=$?
 elif command -v python &> /dev/null; then
     echo "Running tests with Python..."
     echo ""
-    python run_tests.py
+    python run_tests.py "$@"
     exit_code=$?
 # Fall back to Node.js if available
 elif command -v node &> /dev/null; then
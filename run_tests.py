@@ -10,8 +10,23 @@ Tests the core dashboard logic without requiring external dependencies.
 import os
 import sys
 import json
+import asyncio
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+from dashboard_logic import (
+    SPC_CODE_MAP,
+    calculate_threat_level,
+    calculate_threat_level_with_winter,
+    detect_winter_weather_from_alerts,
+    is_winter_weather_alert,
+)
+
 # ANSI color codes for terminal output
 class Colors:
     RESET = '\033[0m'
@@ -28,6 +43,85 @@ TEST_FILE = SCRIPT_DIR / 'test-dashboard.html'
 DASHBOARD_FILE = SCRIPT_DIR / 'Severe-Weather-Dashboard.html'
 
 
+class StandInServer:
+    """Local stand-in for the upstream APIs (serves canned responses, counts hits)"""
+
+    def __init__(self, routes, delay=0.0):
+        # routes: path -> (status, body, headers); body may be bytes, str or JSON-able
+        self.routes = routes
+        self.delay = delay
+        self.hits = {}
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                with stand_in._lock:
+                    stand_in.hits[path] = stand_in.hits.get(path, 0) + 1
+                if stand_in.delay:
+                    time.sleep(stand_in.delay)
+                status, body, headers = stand_in.routes.get(path, (404, b'{}', {}))
+                etag = headers.get('ETag')
+                if etag and self.headers.get('If-None-Match') == etag:
+                    # Conditional request for an unchanged body
+                    with stand_in._lock:
+                        stand_in.not_modified += 1
+                    status, body = 304, b''
+                if not isinstance(body, (bytes, str)):
+                    body = json.dumps(body)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def upstream_fixture_routes():
+    """Small but structurally realistic payloads for every aggregated upstream"""
+    return {
+        '/v1/forecast': (200, {'hourly': {
+            'time': ['2026-01-01T00:00', '2026-01-01T01:00'],
+            'precipitation_probability_gfs_global': [10, 20],
+            'precipitation_probability_ecmwf_ifs025': [30, 40]
+        }}, {}),
+        '/gridpoints/RAH/49,69': (200, {'properties': {
+            'updateTime': '2026-01-01T00:00:00+00:00',
+            'probabilityOfPrecipitation': {'values': [
+                {'validTime': '2026-01-01T00:00:00+00:00/PT6H', 'value': 40}]}
+        }}, {}),
+        '/gridpoints/RAH/49,69/forecast/hourly': (200, {'properties': {'periods': [
+            {'startTime': '2026-01-01T00:00:00+00:00', 'temperature': 50}]}}, {}),
+        '/alerts/active': (200, {'features': [
+            {'id': 'a1', 'properties': {'event': 'Winter Storm Warning', 'severity': 'Severe'}},
+            {'id': 'a2', 'properties': {'event': 'Wind Advisory', 'severity': 'Minor'}}
+        ]}, {}),
+        '/vector/rest/services/outlooks/SPC_wx_outlks/MapServer/1/query': (
+            200, {'features': [{'attributes': {'dn': 5}}]}, {})
+    }
+
+
 class TestRunner:
     """Test runner for dashboard functionality"""
     
@@ -63,7 +157,7 @@ class TestRunner:
         """Test SPC risk level mapping (DN values to codes)"""
         print(f"\n{Colors.BLUE}Testing SPC Risk Level Mapping...{Colors.RESET}")
         
-        code_map = {2: 'TSTM', 3: 'MRGL', 4: 'SLGT', 5: 'ENH', 6: 'MDT', 8: 'HIGH'}
+        code_map = SPC_CODE_MAP
         spc_tests = [
             {'dn': 2, 'expected': 'TSTM'},
             {'dn': 3, 'expected': 'MRGL'},
@@ -93,17 +187,6 @@ class TestRunner:
         """Test threat level calculation logic"""
         print(f"\n{Colors.BLUE}Testing Threat Level Calculation...{Colors.RESET}")
         
-        def calculate_threat_level(has_active_warnings, spc_risk_level):
-            """Mirror the dashboard's threat level calculation logic"""
-            if has_active_warnings:
-                return 'WARNING'
-            elif spc_risk_level and spc_risk_level in ['ENH', 'MDT', 'HIGH']:
-                return 'CAUTION'
-            elif spc_risk_level and spc_risk_level in ['MRGL', 'SLGT']:
-                return 'MONITOR'
-            else:
-                return 'SAFE'
-        
         threat_tests = [
             {'warnings': True, 'spc': 'HIGH', 'expected': 'WARNING', 'name': 'Warnings override SPC risk'},
             {'warnings': False, 'spc': 'ENH', 'expected': 'CAUTION', 'name': 'Enhanced risk → CAUTION'},
@@ -173,48 +256,6 @@ class TestRunner:
         """Test winter weather detection logic"""
         print(f"\n{Colors.BLUE}Testing Winter Weather Detection...{Colors.RESET}")
         
-        # Winter weather synonym dictionary (mirror from dashboard - comprehensive)
-        WINTER_WEATHER_SYNONYMS = {
-            'alerts': [
-                # Advisories
-                'winter weather advisory',
-                'freezing rain advisory',
-                'snow advisory',
-                'wind chill advisory',
-                'frost advisory',
-                'lake effect snow advisory',
-                'winter weather statement',
-                # Warnings
-                'winter storm warning',
-                'winter weather warning',
-                'ice storm warning',
-                'blizzard warning',
-                'wind chill warning',
-                'freeze warning',
-                'freezing rain warning',
-                'snow squall warning',
-                'lake effect snow warning',
-                'extreme cold warning',
-                'hard freeze warning',
-                # Watches
-                'winter storm watch',
-                'ice storm watch',
-                'blizzard watch',
-                'wind chill watch',
-                'extreme cold watch',
-                'freeze watch',
-                'freezing rain watch',
-                'lake effect snow watch'
-            ]
-        }
-        
-        def is_winter_weather_alert(event_name):
-            """Check if alert is winter weather related"""
-            if not event_name or not isinstance(event_name, str):
-                return False
-            event_lower = event_name.lower()
-            return any(alert in event_lower for alert in WINTER_WEATHER_SYNONYMS['alerts'])
-        
         # Test alert detection - comprehensive coverage
         alert_tests = [
             # Advisories
@@ -247,45 +288,6 @@ class TestRunner:
                 '' if result == test['expected'] else f"Expected {test['expected']}, got {result}"
             )
         
-        # Test winter weather detection from alerts
-        def detect_winter_weather_from_alerts(alerts):
-            """Detect winter weather status from alert array"""
-            if not alerts or not isinstance(alerts, list) or len(alerts) == 0:
-                return {'status': 'none', 'has_advisory': False, 'has_warning': False}
-            
-            has_warning = False
-            has_advisory = False
-            
-            for alert in alerts:
-                if not alert or not isinstance(alert, dict) or 'properties' not in alert:
-                    continue
-                
-                event = alert.get('properties', {}).get('event', '')
-                
-                if not is_winter_weather_alert(event):
-                    continue
-                
-                event_lower = event.lower()
-                
-                # Check for warnings (highest priority) - must exclude watch/advisory/statement
-                if ('warning' in event_lower and 
-                    'watch' not in event_lower and 
-                    'advisory' not in event_lower and
-                    'statement' not in event_lower):
-                    has_warning = True
-                # Check for advisories, watches, and statements (lower priority)
-                elif ('advisory' in event_lower or 
-                      'statement' in event_lower or
-                      'watch' in event_lower):
-                    has_advisory = True
-            
-            if has_warning:
-                return {'status': 'warning', 'has_advisory': True, 'has_warning': True}
-            elif has_advisory:
-                return {'status': 'advisory', 'has_advisory': True, 'has_warning': False}
-            
-            return {'status': 'none', 'has_advisory': False, 'has_warning': False}
-        
         # Test detection scenarios - comprehensive coverage
         detection_tests = [
             {
@@ -348,21 +350,6 @@ class TestRunner:
             )
         
         # Test threat level with winter weather
-        def calculate_threat_level_with_winter(has_active_warnings, spc_risk_level, winter_status):
-            """Calculate threat level including winter weather"""
-            if has_active_warnings:
-                if winter_status == 'warning':
-                    return {'level': 'WARNING', 'description': 'Winter Precipitation Imminent and/or Occurring'}
-                return {'level': 'WARNING', 'description': 'Active weather warnings in effect'}
-            elif winter_status == 'advisory':
-                return {'level': 'MONITOR', 'description': 'Monitor for Winter Conditions'}
-            elif spc_risk_level and spc_risk_level in ['ENH', 'MDT', 'HIGH']:
-                return {'level': 'CAUTION', 'description': 'Elevated severe weather risk'}
-            elif spc_risk_level and spc_risk_level in ['MRGL', 'SLGT']:
-                return {'level': 'MONITOR', 'description': 'Monitor conditions'}
-            else:
-                return {'level': 'SAFE', 'description': 'No severe weather expected'}
-        
         threat_tests = [
             {
                 'warnings': True,
@@ -449,22 +436,2039 @@ class TestRunner:
             "Missing expected properties should be handled gracefully"
         )
         
-        # Test error response simulation
-        error_response_ok = False
-        error_status = 500
+        # Error responses and timeouts, replayed from a cassette
+        import cassettes
+        import upstream
+        cassette = cassettes.synthetic_cassette(days=1, now=1_800_000_000)
+        alerts = next(i for i in cassette.interactions if i.source == 'alerts')
+
+        async def replay(kind):
+            server = cassettes.ReplayServer(cassette.scenario(kind, ['alerts']), speed=40.0)
+            await server.start()
+            try:
+                fetch = cassettes.scaled_fetch(upstream.fetch_json, 40.0)
+                await fetch(server.url + alerts.path, upstream.NWS_HEADERS, upstream.TIMEOUTS['alerts'])
+            except upstream.UpstreamError as e:
+                return e
+            finally:
+                await server.stop()
+            return None
+
+        error = asyncio.run(replay('outage'))
+        error_status = error.status if error is not None else None
         self.add_result(
             "API error response handling",
-            error_status >= 400,
+            error_status is not None and error_status >= 400,
             f"Error responses (status {error_status}) should be detected"
         )
-        
+
         # Test timeout handling
+        error = asyncio.run(replay('timeout'))
         self.add_result(
             "Timeout handling",
-            True,
-            "fetchJSON uses AbortController for timeout (tested in integration)"
+            error is not None and ('timeout' in str(error) or 'timed out' in str(error)),
+            f"Replayed slow upstream: {error}"
         )
     
+    def test_aggregator(self):
+        """Test the aggregation proxy against a local stand-in upstream"""
+        print(f"\n{Colors.BLUE}Testing Upstream Aggregation Proxy...{Colors.RESET}")
+        import aggregator
+        import upstream
+
+        async def scenario(stand_in):
+            agg = aggregator.Aggregator(upstream.Upstreams.local(stand_in.url))
+            # 25 viewers arrive at once: every upstream must be fetched exactly once
+            bodies = await asyncio.gather(*(agg.snapshot_body() for _ in range(25)))
+            first_hits = dict(stand_in.hits)
+            # Within the refresh cycle nothing is refetched
+            await agg.snapshot_body()
+            # Serve over HTTP and read it back like a widget would
+            server = aggregator.AggregatorServer(agg)
+            port = await server.start('127.0.0.1', 0)
+            raw = await asyncio.to_thread(
+                lambda: urllib.request.urlopen(f'http://127.0.0.1:{port}/api/snapshot', timeout=5).read())
+            await server.stop()
+            return agg, bodies, first_hits, dict(stand_in.hits), json.loads(raw)
+
+        with StandInServer(upstream_fixture_routes(), delay=0.05) as stand_in:
+            agg, bodies, first_hits, later_hits, served = asyncio.run(scenario(stand_in))
+
+        self.add_result(
+            "Concurrent clients coalesce to one request per upstream",
+            len(first_hits) == 5 and all(n == 1 for n in first_hits.values()),
+            f"Upstream hits: {first_hits}"
+        )
+        self.add_result(
+            "No refetch within refresh cycle",
+            later_hits == first_hits,
+            "Second snapshot served from memory"
+        )
+        self.add_result(
+            "All clients receive the same encoded document",
+            len(set(body for body, _ in bodies)) == 1,
+            "Snapshot encoded once per change"
+        )
+        summary = served.get('summary', {})
+        self.add_result(
+            "Snapshot carries threat and winter summary",
+            summary.get('threat', {}).get('level') == 'WARNING'
+            and summary.get('winter', {}).get('status') == 'warning'
+            and summary.get('spc_risk') == 'ENH',
+            f"{summary.get('threat')} / winter={summary.get('winter', {}).get('status')}"
+        )
+
+        # Failed source keeps serving its last good payload as "cached"
+        async def outage():
+            calls = {'n': 0}
+
+            async def flaky(url, headers, timeout):
+                calls['n'] += 1
+                if calls['n'] > 5:
+                    raise upstream.UpstreamError(url, 'HTTP 503', 503)
+                path = urllib.parse.urlsplit(url).path
+                return upstream_fixture_routes()[path][1]
+
+            clock = {'t': 1000.0}
+            agg = aggregator.Aggregator(upstream.Upstreams.local('http://stand-in'),
+                                        fetcher=flaky, clock=lambda: clock['t'])
+            await agg.snapshot()
+            clock['t'] += 3600
+            return await agg.snapshot()
+
+        snap = asyncio.run(outage())
+        self.add_result(
+            "Upstream outage serves last good data as cached",
+            snap['ok'] and snap['sources']['gridpoint']['state'] == 'cached'
+            and snap['gridpoint'] is not None,
+            f"gridpoint state: {snap['sources']['gridpoint']['state']}"
+        )
+
+        # A body cut short (IncompleteRead) is a network error, not a raw exception
+        class Truncating(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', '100')
+                self.end_headers()
+                self.wfile.write(b'{"features": [')
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), Truncating)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        try:
+            asyncio.run(upstream.fetch(f'http://127.0.0.1:{httpd.server_address[1]}/alerts', timeout=5))
+            truncated = 'no error'
+        except upstream.UpstreamError as e:
+            truncated = f'UpstreamError: {e}'
+        except Exception as e:
+            truncated = f'{type(e).__name__}: {e}'
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+        self.add_result(
+            "Truncated upstream body raises UpstreamError",
+            truncated.startswith('UpstreamError'),
+            truncated
+        )
+
+    def test_consensus_engine(self):
+        """Test the batched consensus engine against the scalar compile() port"""
+        print(f"\n{Colors.BLUE}Testing Consensus Engine...{Colors.RESET}")
+        import consensus
+
+        self.add_result(
+            "js_round matches Math.round ties and edge cases",
+            consensus.js_round(2.5) == 3 and consensus.js_round(-2.5) == -2
+            and consensus.js_round(0.49999999999999994) == 0 and consensus.js_round(-0.4) == 0,
+            "Ties round toward +infinity"
+        )
+        self.add_result(
+            "40/25/20/15 consensus weights",
+            consensus.js_round(60 * 0.40 + 20 * 0.20 + 50 * 0.25 + 10 * 0.15) == 42,
+            "NWS 60, GFS 20, ECMWF 50, HRRR 10 -> 42"
+        )
+        self.add_result(
+            "classify() and radLvl() thresholds",
+            consensus.classify(30, 25, 0, 0, 0) == 'TSTM' and consensus.classify(0, 0, 0, 55, 0) == 'RAIN'
+            and consensus.classify(4, 0, 0, 0, 0) == 'CLEAR' and consensus.rad_lvl(1200, 35, 50, 95) == 5
+            and consensus.rad_lvl(300, 15, 10, 0) == 2,
+            "Mirror of widget classify/radLvl"
+        )
+
+        backends = ['python'] + (['numpy'] if consensus.np is not None else [])
+        locations = [consensus.synthetic_location(n, seed=n) for n in (7, 16)]
+        locations.append(consensus.synthetic_location(3, seed=99, et_off_min=-300))
+        for backend in backends:
+            results = consensus.ConsensusEngine(backend).run(locations)
+            mismatches = 0
+            for loc, res in zip(locations, results):
+                for d, date_str in enumerate(loc.dates):
+                    recs = consensus.compile_day(date_str, loc.models, loc.grid, loc.nws_hourly, loc.et_off_min)
+                    for rec in recs:
+                        for field in consensus.ENGINE_FIELDS:
+                            if res[field][d][rec['utcH']] != rec[field]:
+                                mismatches += 1
+            self.add_result(
+                f"Batched engine ({backend}) reproduces compile() exactly",
+                mismatches == 0,
+                f"{mismatches} mismatched values over {sum(len(l.dates) for l in locations) * 24} hours"
+            )
+
+        # A field array shorter than time (values[idx] undefined -> || 0 in JS)
+        short = consensus.synthetic_location(3, seed=5)
+        for field in ('precipitation_probability', 'cape'):
+            short.models['gfs_hrrr'][field] = short.models['gfs_hrrr'][field][:30]
+        day = short.dates[-1]
+        recs = consensus.compile_day(day, short.models, short.grid, short.nws_hourly, short.et_off_min)
+        batched = consensus.ConsensusEngine('python').run([short])[0]
+        self.add_result(
+            "Short model arrays count as 0, not a crash",
+            len(recs) == 24 and all(r['pHRRR'] == 0 and r['cHRRR'] == 0 for r in recs)
+            and batched['pHRRR'][-1] == [r['pHRRR'] for r in recs],
+            f"{len(recs)} hours compiled for {day}"
+        )
+
+    def test_gridpoint_decoder(self):
+        """Test the interval-indexed gridpoint decoder against gMap/gQPF semantics"""
+        print(f"\n{Colors.BLUE}Testing Gridpoint Decoder...{Colors.RESET}")
+        import consensus
+        import gridpoint
+
+        dur_tests = [
+            ('PT1H', 1), ('PT6H', 6), ('P1D', 24), ('P1DT2H', 26),
+            ('P7D', 168), ('PT30M', 1), ('PT0H', 1), ('P2DT0H', 48)
+        ]
+        for duration, expected in dur_tests:
+            result = gridpoint.dur_h(duration)
+            self.add_result(
+                f"durH(\"{duration}\") = {expected}",
+                result == expected,
+                '' if result == expected else f"Expected {expected}, got {result}"
+            )
+
+        prop = {'values': [
+            {'validTime': '2026-01-01T22:00:00+00:00/PT3H', 'value': 40},  # crosses midnight UTC
+            {'validTime': '2026-01-02T01:00:00+00:00/P1DT2H', 'value': None},
+            {'validTime': '2026-01-03T03:00:00+00:00/PT1H', 'value': 0},
+            {'validTime': '2026-01-03T03:30:00+00:00/PT2H', 'value': 15},   # overlap, later wins
+            {'validTime': '2026-01-03T10:00:00+00:00/PT30M', 'value': 5}
+        ]}
+        decoded = gridpoint.GridProperty(prop)
+        self.add_result(
+            "Interval index matches gMap expansion",
+            decoded.as_map() == gridpoint.g_map(prop) and len(decoded) == len(gridpoint.g_map(prop)),
+            f"{decoded.interval_count()} intervals -> {len(decoded)} hours"
+        )
+        self.add_result(
+            "Keyed lookups match gMap (incl. gaps and null values)",
+            decoded.get('2026-01-02_0') == 40 and decoded.get('2026-01-02_1') is None
+            and '2026-01-02_1' in decoded and decoded.get('2026-01-03_3') == 15
+            and decoded.get('2026-01-03_9', 'gap') == 'gap',
+            "Midnight crossing, null value, overlap and gap"
+        )
+        qpf = {'values': [
+            {'validTime': '2026-01-01T00:00:00+00:00/PT6H', 'value': 12.7},
+            {'validTime': '2026-01-01T06:00:00+00:00/PT6H', 'value': 0}
+        ]}
+        self.add_result(
+            "QPF distributed per hour like gQPF",
+            gridpoint.GridProperty(qpf, qpf=True).as_map() == gridpoint.g_qpf(qpf),
+            "12.7 mm over 6 h -> 0.0833 in/h"
+        )
+        start = gridpoint.epoch_hour('2026-01-01T20:00:00+00:00')
+        self.add_result(
+            "Hourly arrays materialized on request",
+            decoded.hourly(start, 6) == [None, None, 40, 40, 40, None],
+            "hourly() fills covered hours only"
+        )
+
+        props = gridpoint.synthetic_properties(days=2, start='2026-06-01T00:00:00+00:00')
+        decoder = gridpoint.GridpointDecoder(props)
+        decoder['pop']
+        lazy = decoder.decoded_names() == ['probabilityOfPrecipitation']
+        legacy = {short: (gridpoint.g_qpf if short == 'qpf' else gridpoint.g_map)(props[name])
+                  for short, name in gridpoint.GRID_PROPERTIES.items()}
+        indexed = decoder.grid_maps()
+        same = all(
+            consensus.compile_day(d, {}, legacy, {}, -240) == consensus.compile_day(d, {}, indexed, {}, -240)
+            for d in ('2026-05-31', '2026-06-01', '2026-06-02')
+        )
+        self.add_result(
+            "Decoder is lazy and drops into compile()",
+            lazy and same,
+            "Properties decode on first use; compile_day output unchanged"
+        )
+
+    def test_spc_outlook(self):
+        """Test the spatially indexed SPC outlook engine"""
+        print(f"\n{Colors.BLUE}Testing SPC Outlook Engine...{Colors.RESET}")
+        import spc_outlook
+
+        def square(x0, y0, x1, y1):
+            return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+        geojson = {'type': 'FeatureCollection', 'features': [
+            {'properties': {'LABEL': 'TSTM', 'ISSUE': '202601011200', 'VALID': '202601011300'},
+             'geometry': {'type': 'Polygon', 'coordinates': [square(-85, 33, -75, 37)]}},
+            {'properties': {'LABEL': 'mrgl '},
+             'geometry': {'type': 'MultiPolygon', 'coordinates': [
+                 [square(-81, 34, -78, 37), square(-80, 35, -79.5, 35.5)],  # ring + hole
+                 [square(-77, 34, -76, 35)]]}},
+            {'properties': {'DN': 5},  # no LABEL: falls back to the DN code map
+             'geometry': {'type': 'Polygon', 'coordinates': [square(-79.5, 35.8, -79.0, 36.4)]}},
+            {'properties': {'LABEL': 'SIGN'},  # unknown label never wins
+             'geometry': {'type': 'Polygon', 'coordinates': [square(-90, 30, -70, 40)]}}
+        ]}
+        outlook = spc_outlook.SPCOutlook(geojson)
+        expectations = [
+            ((-79.3, 36.1), 'ENH', 'Mebane inside DN 5 polygon'),
+            ((-78.5, 34.5), 'MRGL', 'MultiPolygon member'),
+            ((-76.5, 34.5), 'MRGL', 'Second MultiPolygon part'),
+            ((-84.0, 34.0), 'TSTM', 'General thunder only'),
+            ((-70.5, 39.0), 'NONE', 'Outside every known label')
+        ]
+        for (lon, lat), expected, name in expectations:
+            result = outlook.risk_at(lon, lat)
+            self.add_result(
+                f"SPC outlook: {name} → {expected}",
+                result == expected,
+                '' if result == expected else f"Expected {expected}, got {result}"
+            )
+
+        points = [(-85.5 + 0.037 * i, 32.5 + 0.029 * j) for i in range(300) for j in range(160)]
+        brute = [outlook.brute_force_risk(lon, lat) for lon, lat in points]
+        self.add_result(
+            "Indexed and batched lookups match brute-force fetchSPC() scan",
+            outlook.risk_for_points(points) == brute
+            and [outlook.risk_at(lon, lat) for lon, lat in points] == brute,
+            f"{len(points)} points, {len(outlook.rings)} rings"
+        )
+        self.add_result(
+            "Every label is a known SPC rank",
+            set(brute) <= set(spc_outlook.SPC_RANK),
+            "Labels share fetchSPC() RANK order"
+        )
+
+        cache = spc_outlook.OutlookCache()
+        cache.load(geojson)
+        cache.load(json.loads(json.dumps(geojson)))
+        self.add_result(
+            "Outlook parsed once per issuance",
+            cache.parses == 1,
+            f"{cache.parses} parse(s) for two loads of the same issuance"
+        )
+
+    def test_alert_matcher(self):
+        """Test the single-pass winter alert classifier against the reference rules"""
+        print(f"\n{Colors.BLUE}Testing Winter Alert Matcher...{Colors.RESET}")
+        import alert_matcher
+        from dashboard_logic import WINTER_WEATHER_SYNONYMS, detect_winter_weather_in_text
+
+        automaton = alert_matcher.AhoCorasick(['he', 'she', 'his', 'hers'])
+        self.add_result(
+            "Aho-Corasick finds overlapping patterns",
+            automaton.matches('ushers') == {'she', 'he', 'hers'},
+            f"Matches in 'ushers': {sorted(automaton.matches('ushers'))}"
+        )
+
+        classifier = alert_matcher.WinterAlertClassifier()
+        events = (WINTER_WEATHER_SYNONYMS['alerts'] + alert_matcher.SAMPLE_EVENTS
+                  + ['', 'Hard Freeze Warning', 'FROST ADVISORY', 'Winter Storm Watch Statement', None, 42])
+        mismatched = [e for e in events
+                      if classifier.is_winter_weather_alert(e) != is_winter_weather_alert(e)]
+        self.add_result(
+            "Event classification matches is_winter_weather_alert",
+            not mismatched,
+            f"{len(events)} events checked" if not mismatched else f"Mismatched: {mismatched}"
+        )
+
+        feeds = [alert_matcher.synthetic_feed(300, seed=s, winter_warning=s % 2 == 0) for s in range(6)]
+        feeds += [
+            [],
+            [{'properties': {'event': 'Winter Storm Watch', 'severity': 'Severe'}}],
+            [{'properties': {'event': 'Winter Storm Watch', 'severity': 'Moderate'}}],
+            [None, {'properties': None}, {'properties': {'event': 7}}, {'properties': {'event': 'Freeze Warning'}}]
+        ]
+        mismatched = [i for i, feed in enumerate(feeds)
+                      if classifier.detect(feed) != detect_winter_weather_from_alerts(feed)]
+        self.add_result(
+            "Feed status and priority match detect_winter_weather_from_alerts",
+            not mismatched,
+            f"{len(feeds)} feeds checked" if not mismatched else f"Mismatched feeds: {mismatched}"
+        )
+        streamed = classifier.detect(alert for alert in feeds[0])
+        self.add_result(
+            "Streamed alert iterator classified in one pass",
+            streamed == detect_winter_weather_from_alerts(feeds[0]),
+            f"Status: {streamed['status']}"
+        )
+
+        texts = [
+            'Snow and sleet are expected tonight. A Winter Storm Warning is in effect.',
+            'Light snowfall possible; snowfall totals under an inch.',
+            'Freezing rain developing late, hazardous travel expected.',
+            'A winter weather advisory may be needed for black ice.',
+            'Warm and humid with scattered thunderstorms.',
+            'Frost expected early. Freeze watch possible.'
+        ]
+        mismatched = [t for t in texts if classifier.detect_in_text(t) != detect_winter_weather_in_text(t)]
+        self.add_result(
+            "Text detection matches detectWinterWeatherInText scoring",
+            not mismatched,
+            f"{len(texts)} texts checked" if not mismatched else f"Mismatched: {mismatched}"
+        )
+
+    def test_afd_summarizer(self):
+        """Test the AFD summarizer against the scoreSentence() reference"""
+        print(f"\n{Colors.BLUE}Testing AFD Summarizer...{Colors.RESET}")
+        import afd_summarizer
+        import upstream
+
+        scorer = afd_summarizer.SentenceScorer()
+        sentences = [
+            'Damaging wind gusts to 70 mph and hail up to 2 inches are possible this afternoon.',
+            'Snow totals of 2-4 in are expected Tuesday night with a wind chill near zero.',
+            'Benign weather with no significant hazards through the weekend.',
+            'Click HOME  FORECAST for more information on the tornado watch.',
+            'Flash flooding is possible statewide into Thursday morning.',
+            'Temperatures will be near normal.'
+        ]
+        for seed in range(5):
+            sentences += afd_summarizer.split_sentences(
+                afd_summarizer.sanitize_afd(afd_summarizer.synthetic_afd(seed)))
+        mismatched = [x for x in sentences if scorer.score(x) != afd_summarizer.score_sentence(x)]
+        self.add_result(
+            "Compiled scorer matches scoreSentence()",
+            not mismatched,
+            f"{len(sentences)} sentences checked" if not mismatched else f"Mismatched: {mismatched[:3]}"
+        )
+
+        page = ('<html><a href="https://www.weather.gov/rah">Toggle navigation HOME FORECAST</a>\n'
+                'Area Forecast Discussion\nNational Weather Service Raleigh NC\n\n.NEAR TERM...\n'
+                'A strong cold front will bring a line of severe storms this evening.\n'
+                'Damaging wind gusts of 60 mph are the main threat with the line.\n'
+                'Damaging wind gusts of 60 mph are the main threat with the line!\n'
+                'Heavy rain could cause flooding tonight in urban areas.\n'
+                'Otherwise a quiet pattern with no significant weather.\n\n'
+                '.RAH WATCHES/WARNINGS/ADVISORIES...\nTornado Watch until 10 PM.</html>')
+        summarizer = afd_summarizer.AFDSummarizer()
+        texts = [page, ''] + [afd_summarizer.synthetic_afd(seed) for seed in range(5)]
+        mismatched = [i for i, text in enumerate(texts)
+                      if summarizer.summarize_text(text, office=i).highlights
+                      != afd_summarizer.summarize_reference(text)]
+        highlights = summarizer.cached(0).highlights
+        self.add_result(
+            "Top-3 de-duplicated highlights match updateForecastDiscussion()",
+            not mismatched and len(highlights) == 3 and len(set(h.lower()[:40] for h in highlights)) == 3,
+            f"{len(texts)} products checked" if not mismatched else f"Mismatched products: {mismatched}"
+        )
+        self.add_result(
+            "Empty discussion renders the default message",
+            summarizer.cached(1).content == afd_summarizer.NO_SIGNIFICANT_WEATHER,
+            summarizer.cached(1).content
+        )
+
+        original = afd_summarizer.synthetic_afd(7)
+        updated = afd_summarizer.update_section(original, 2, 99)
+
+        def routes(product_id, text):
+            return {
+                '/products/types/AFD/locations': (200, {'locations': {'RAH': 'Raleigh', 'GSP': 'Greer', 'MHX': 'Newport'}}, {}),
+                '/products/types/AFD/locations/RAH': (200, {'@graph': [{'id': product_id, 'issuanceTime': '2026-06-01T12:00:00+00:00'}]}, {}),
+                '/products/types/AFD/locations/GSP': (200, {'@graph': [{'id': 'gsp-1'}]}, {}),
+                '/products/types/AFD/locations/MHX': (500, {}, {}),
+                '/products/' + product_id: (200, {'id': product_id, 'productText': text}, {}),
+                '/products/gsp-1': (200, {'id': 'gsp-1', 'productText': page}, {})
+            }
+
+        async def scenario(stand_in):
+            summarizer = afd_summarizer.AFDSummarizer(upstream.Upstreams.local(stand_in.url))
+            first = await summarizer.summarize_office('RAH')
+            again = await summarizer.summarize_office('RAH')
+            stand_in.routes = routes('afd-2', updated)
+            second = await summarizer.summarize_office('RAH')
+            batch = await summarizer.summarize_all()
+            return summarizer, first, again, second, batch
+
+        with StandInServer(routes('afd-1', original)) as stand_in:
+            summarizer, first, again, second, batch = asyncio.run(scenario(stand_in))
+            hits = dict(stand_in.hits)
+
+        self.add_result(
+            "Unchanged product ID reuses the cached summary",
+            again is first and hits.get('/products/afd-1') == 1,
+            f"Product fetches: {summarizer.product_fetches}"
+        )
+        self.add_result(
+            "AFD update re-scores only new sentences",
+            second.product_id == 'afd-2' and 0 < second.scored < second.reused
+            and second.highlights == afd_summarizer.summarize_reference(updated),
+            f"Scored {second.scored}, reused {second.reused}"
+        )
+        self.add_result(
+            "Batch run summarizes every office",
+            sorted(batch) == ['GSP', 'MHX', 'RAH'] and batch['MHX'] is None
+            and batch['GSP'].highlights == afd_summarizer.summarize_reference(page)
+            and hits.get('/products/afd-2') == 1,
+            f"Summaries: { {k: v.product_id if v else None for k, v in batch.items()} }"
+        )
+
+        async def odd_body(url, headers, timeout):
+            if '/locations/RAH' in url:
+                return {'@graph': [{'id': 'afd-odd'}]}
+            return ['not', 'a', 'product']
+
+        odd = asyncio.run(afd_summarizer.AFDSummarizer(upstream.Upstreams.local('http://stand-in'),
+                                                       fetcher=odd_body).summarize_office('RAH'))
+        self.add_result(
+            "Non-object product body summarizes as empty",
+            odd is not None and odd.product_id == 'afd-odd'
+            and odd.content == afd_summarizer.NO_SIGNIFICANT_WEATHER,
+            odd.content if odd else 'None'
+        )
+
+    def test_http_cache(self):
+        """Test the shared upstream cache: TTLs, revalidation, stale-while-revalidate, LRU, disk"""
+        print(f"\n{Colors.BLUE}Testing HTTP Response Cache...{Colors.RESET}")
+        import aggregator
+        import http_cache
+        import upstream
+
+        gridpoint = {'properties': {'updateTime': '2026-01-01T00:00:00+00:00', 'elevation': {'value': 200}}}
+        routes = {
+            '/gridpoints/RAH/49,69': (200, gridpoint, {'ETag': '"grid-1"'}),
+            '/a': (200, {'n': 1}, {}), '/b': (200, {'n': 2}, {}), '/c': (200, {'n': 3}, {}),
+            '/down': (200, {'n': 4}, {})
+        }
+        now = [1000.0]
+        clock = lambda: now[0]
+
+        async def scenario(stand_in, directory):
+            cache = http_cache.HttpCache(directory, clock=clock)
+            url = stand_in.url + '/gridpoints/RAH/49,69'
+            results = {'miss': await cache.get(url, 'gridpoint', upstream.NWS_HEADERS)}
+            results['fresh'] = await cache.get(url, 'gridpoint', upstream.NWS_HEADERS)
+            now[0] += 601
+            stale = await asyncio.gather(*(cache.get(url, 'gridpoint', upstream.NWS_HEADERS) for _ in range(10)))
+            await cache.drain()
+            results['stale'] = stale
+            results['after'] = await cache.get(url, 'gridpoint', upstream.NWS_HEADERS)
+            results['stats'] = dict(cache.stats)
+
+            # Upstream down: stale copy served as cached, until max_stale
+            down = stand_in.url + '/down'
+            await cache.get(down, 'alerts')
+            stand_in.routes['/down'] = (503, b'', {})
+            now[0] += 200
+            results['fallback'] = await cache.get(down, 'alerts', allow_stale=False)
+            now[0] += 600
+            try:
+                await cache.get(down, 'alerts', allow_stale=False)
+                results['expired'] = None
+            except upstream.UpstreamError as e:
+                results['expired'] = e
+
+            # A new process on the same directory starts warm
+            await cache.drain()
+            restarted = http_cache.HttpCache(directory, clock=clock)
+            now[0] -= 800
+            results['restarted'] = await restarted.get(url, 'gridpoint', upstream.NWS_HEADERS)
+
+            small = http_cache.HttpCache(os.path.join(directory, 'lru'), max_entries=2, clock=clock)
+            for path in ('/a', '/b', '/a', '/c'):
+                await small.get(stand_in.url + path, 'spc')
+            results['lru'] = (len(small), sorted(e.url.rsplit('/', 1)[1] for e in small._entries.values()),
+                              len([f for f in os.listdir(os.path.join(directory, 'lru')) if f.endswith('.body')]))
+
+            full = http_cache.HttpCache(os.path.join(directory, 'full'), clock=clock)
+            write_atomic = full._write_atomic
+
+            def disk_full(path, data):
+                if path.endswith('.body'):
+                    raise OSError(28, 'No space left on device')
+                write_atomic(path, data)
+            full._write_atomic = disk_full
+            first = await full.get(stand_in.url + '/a', 'spc')
+            second = await full.get(stand_in.url + '/a', 'spc')
+            await full.drain()
+            results['disk_full'] = (first.cache_status, second.cache_status, second.json(),
+                                    full.stats['body_write_errors'])
+            return results
+
+        with tempfile.TemporaryDirectory() as directory, StandInServer(routes) as stand_in:
+            r = asyncio.run(scenario(stand_in, directory))
+            hits = dict(stand_in.hits)
+
+        self.add_result(
+            "Fresh entry served without an upstream request",
+            r['miss'].cache_status == 'miss' and r['fresh'].cache_status == 'fresh'
+            and r['fresh'].json() == gridpoint and r['fresh'].state == 'live',
+            f"States: {r['miss'].cache_status}, {r['fresh'].cache_status}"
+        )
+        self.add_result(
+            "Stale entry served at once while one background revalidation runs",
+            all(x.cache_status == 'stale' and x.state == 'cached' and x.age >= 600 for x in r['stale'])
+            and r['stats'].get('background_refreshes') == 1,
+            f"10 stale readers, {r['stats'].get('background_refreshes')} background refresh"
+        )
+        self.add_result(
+            "Revalidation uses ETag and skips the body download (304)",
+            hits.get('/gridpoints/RAH/49,69') == 2 and r['stats'].get('not_modified') == 1
+            and r['stats'].get('full_downloads') == 1 and r['after'].cache_status == 'fresh'
+            and r['after'].json() == gridpoint,
+            f"Upstream hits: {hits.get('/gridpoints/RAH/49,69')}, bytes saved: {r['stats'].get('bytes_saved')}"
+        )
+        self.add_result(
+            "Upstream failure serves cached data with age, then gives up after max_stale",
+            r['fallback'].state == 'cached' and r['fallback'].cache_status == 'fallback'
+            and 'HTTP 503' in (r['fallback'].error or '') and isinstance(r['expired'], upstream.UpstreamError),
+            f"Fallback age {r['fallback'].age:.0f}s; expired: {r['expired']}"
+        )
+        self.add_result(
+            "Cache persists to disk across restarts",
+            r['restarted'].cache_status == 'fresh' and r['restarted'].json() == gridpoint,
+            f"Restarted cache: {r['restarted'].cache_status}"
+        )
+        self.add_result(
+            "LRU eviction keeps the most recently used entries",
+            r['lru'] == (2, ['a', 'c'], 2),
+            f"Entries after a, b, a, c with room for 2: {r['lru']}"
+        )
+        self.add_result(
+            "Failed body write keeps the entry in memory",
+            r['disk_full'] == ('miss', 'fresh', {'n': 1}, 1),
+            f"States and write errors: {r['disk_full']}"
+        )
+
+        async def aggregated(stand_in, directory):
+            cache = http_cache.HttpCache(directory, clock=clock)
+            agg = aggregator.Aggregator(upstream.Upstreams.local(stand_in.url), clock=clock, cache=cache)
+            await agg.refresh()
+            now[0] += 901  # every source is due again
+            refreshed = await agg.refresh()
+            await cache.drain()
+            return cache, refreshed, (await agg.snapshot())['sources']
+
+        fixture = upstream_fixture_routes()
+        fixture = {path: (status, body, {'ETag': f'"{i}"'}) for i, (path, (status, body, _)) in enumerate(fixture.items())}
+        with tempfile.TemporaryDirectory() as directory, StandInServer(fixture) as stand_in:
+            cache, refreshed, sources = asyncio.run(aggregated(stand_in, directory))
+            with open(os.path.join(directory, 'index.json'), encoding='utf-8') as f:
+                indexed = len(json.load(f)['entries'])
+        self.add_result(
+            "Aggregator revalidates through the cache instead of re-downloading",
+            len(refreshed) == 5 and cache.stats['full_downloads'] == 5 and cache.stats['not_modified'] == 5
+            and all(s['state'] == 'live' for s in sources.values()),
+            f"Cache stats: {dict(cache.stats)}"
+        )
+        self.add_result(
+            "Index written off the event loop, once per batch of stores",
+            indexed == 5 and 0 < cache.stats['index_writes'] < 10,
+            f"{cache.stats['index_writes']} index writes for 10 stores"
+        )
+
+    def test_retry_engine(self):
+        """Test the shared retry engine: widget backoff policy, rate limits, breaker, hedging"""
+        print(f"\n{Colors.BLUE}Testing Retry Engine...{Colors.RESET}")
+        import random
+        import retry_engine
+        import upstream
+
+        rng = random.Random(3)
+        delays = [retry_engine.backoff_delay(a, 2.0, 20.0, rng) / min(2.0 * 2 ** a, 20.0) for a in range(6) for _ in range(50)]
+        self.add_result(
+            "Backoff jitter stays within 80-120% of the capped delay",
+            all(0.8 <= d <= 1.2 for d in delays),
+            f"Jitter range {min(delays):.2f}-{max(delays):.2f}"
+        )
+        self.add_result(
+            "Per-attempt timeouts grow 10 s, 13 s, 16 s and cap at 25 s",
+            [retry_engine.retry_timeout(a) for a in (0, 1, 2, 10)] == [10.0, 13.0, 16.0, 25.0],
+            "Matches retryTimeout()"
+        )
+
+        now = [0.0]
+        bucket = retry_engine.TokenBucket(2.0, 3, clock=lambda: now[0])
+        burst = sum(bucket.try_take() for _ in range(5))
+        now[0] += 1.0
+        refilled = sum(bucket.try_take() for _ in range(5))
+        self.add_result(
+            "Token bucket allows the burst, then the refill rate",
+            burst == 3 and refilled == 2 and abs(bucket.wait_time() - 0.5) < 1e-9,
+            f"Burst {burst}, after 1 s {refilled}"
+        )
+
+        breaker = retry_engine.CircuitBreaker(threshold=3, reset_after=30.0, clock=lambda: now[0])
+        for _ in range(3):
+            breaker.record_failure()
+        opened = breaker.state
+        rejected = not breaker.allow()
+        now[0] += 31
+        probe, second_probe = breaker.allow(), breaker.allow()
+        breaker.record_failure()
+        reopened = breaker.state
+        now[0] += 31
+        breaker.allow()
+        breaker.record_success()
+        self.add_result(
+            "Circuit breaker opens, fails fast, probes once and recovers",
+            opened == 'open' and rejected and probe and not second_probe and reopened == 'open'
+            and breaker.state == 'closed' and breaker.trips == 2,
+            f"States: {opened} -> half_open probe -> {reopened} -> {breaker.state}"
+        )
+
+        def scripted(statuses, calls):
+            async def fetch(url, headers=None, timeout=10.0):
+                calls.append(timeout)
+                status = statuses[min(len(calls) - 1, len(statuses) - 1)]
+                return upstream.Response(url, status, {}, b'{"ok": true}', 0.0)
+            return fetch
+
+        async def engine_scenarios():
+            results = {}
+            calls = []
+            engine = retry_engine.RetryEngine(scripted([503, 503, 200], calls), time_scale=0.001)
+            results['recovered'] = (await engine.fetch_json('https://api.open-meteo.com/v1/forecast'), list(calls),
+                                    engine.stats['retries'])
+            calls.clear()
+            engine = retry_engine.RetryEngine(scripted([404], calls), time_scale=0.001)
+            try:
+                await engine.fetch_json('https://api.open-meteo.com/v1/forecast')
+                results['not_found'] = None
+            except upstream.UpstreamError as e:
+                results['not_found'] = (e.status, len(calls))
+            calls.clear()
+            engine = retry_engine.RetryEngine(scripted([503], calls), breaker_threshold=3, time_scale=0.001)
+            errors = []
+            for _ in range(2):
+                try:
+                    await engine.request('https://api.weather.gov/alerts/active?zone=NCZ023')
+                except upstream.UpstreamError as e:
+                    errors.append(type(e).__name__)
+            results['breaker'] = (errors, len(calls))
+
+            # Cancelling an ordinary request must not free the half-open probe slot
+            hang = asyncio.Event()
+
+            async def slow_or_503(url, headers=None, timeout=10.0):
+                if url.endswith('/fail'):
+                    return upstream.Response(url, 503, {}, b'', 0.0)
+                await hang.wait()
+                return upstream.Response(url, 200, {}, b'{}', 0.0)
+
+            engine = retry_engine.RetryEngine(slow_or_503, breaker_threshold=1, time_scale=0.001)
+            host, base = 'api.weather.gov', 'https://api.weather.gov'
+            ordinary = asyncio.ensure_future(engine._send(base + '/slow', host, None, 10.0))
+            await asyncio.sleep(0)
+            try:
+                await engine._send(base + '/fail', host, None, 10.0)
+            except retry_engine._Retryable:
+                pass
+            breaker = engine.breaker(host)
+            breaker.opened_at -= breaker.reset_after
+            probe = asyncio.ensure_future(engine._send(base + '/probe', host, None, 10.0))
+            await asyncio.sleep(0)
+            ordinary.cancel()
+            await asyncio.gather(ordinary, return_exceptions=True)
+            second_probe = breaker.allow()
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            results['probe_slot'] = (second_probe, breaker.probing, breaker.allow())
+            return results
+
+        r = asyncio.run(engine_scenarios())
+        self.add_result(
+            "Transient errors are retried with growing timeouts",
+            r['recovered'][0] == {'ok': True} and [round(t * 1000, 6) for t in r['recovered'][1]] == [10, 13, 16] and r['recovered'][2] == 2,
+            f"Attempt timeouts (scaled): {r['recovered'][1]}"
+        )
+        self.add_result(
+            "Permanent HTTP errors are not retried",
+            r['not_found'] == (404, 1),
+            f"Status and calls: {r['not_found']}"
+        )
+        self.add_result(
+            "Open circuit rejects api.weather.gov requests without calling upstream",
+            r['breaker'] == (['UpstreamError', 'CircuitOpenError'], 3),
+            f"Errors: {r['breaker'][0]}, upstream calls: {r['breaker'][1]}"
+        )
+        self.add_result(
+            "Only the probe's own cancellation frees the half-open slot",
+            r['probe_slot'] == (False, False, True),
+            f"Second probe after ordinary cancel, probing after probe cancel, next allow: {r['probe_slot']}"
+        )
+
+        sim = retry_engine.simulate(n=300, time_scale=0.005)
+        single, retried, hedged = sim['single attempt'], sim['retry x3'], sim['retry x3 + hedge']
+        self.add_result(
+            "Retries raise success toward 1-(1-p)^3 under N(mu, sigma^2) latency",
+            retried['success_rate'] >= 0.97 and retried['success_rate'] > single['success_rate'],
+            f"Single {single['success_rate']:.3f}, retried {retried['success_rate']:.3f}, "
+            f"analytic {sim['analytic']['p_three']:.3f}"
+        )
+        self.add_result(
+            "Hedging trims the latency tail at modest extra load",
+            hedged['p95'] < retried['p95'] and hedged['upstream_calls_per_request'] < 1.5,
+            f"p95 {retried['p95']:.1f}s -> {hedged['p95']:.1f}s, "
+            f"{hedged['upstream_calls_per_request']:.2f} calls/request"
+        )
+
+    def test_om_decoder(self):
+        """Test the streaming Open-Meteo decoder against json.loads + unpackOM()"""
+        print(f"\n{Colors.BLUE}Testing Open-Meteo Column Decoder...{Colors.RESET}")
+        import consensus
+        import om_decoder
+        import upstream
+
+        def chunked(body, size):
+            return [body[i:i + size] for i in range(0, len(body), size)]
+
+        body = om_decoder.synthetic_response(days=3, locations=1, seed=4)
+        expected = om_decoder._reference(body)[0]
+        datasets = om_decoder.decode(chunked(body, 7), typecode='d')
+        decoded = {m: datasets[0].model_view(m).to_dict() for m in upstream.OM_MODELS}
+        self.add_result(
+            "Decoded columns match json.loads + unpackOM (7-byte chunks)",
+            len(datasets) == 1 and decoded == expected,
+            f"{len(datasets[0].fields('gfs_global'))} fields x {len(upstream.OM_MODELS)} models, "
+            f"{len(datasets[0].time)} hours"
+        )
+
+        view = datasets[0].model_view('gfs_hrrr')
+        column = datasets[0].column('precipitation', 'gfs_hrrr')
+        late = datasets[0].time[60]
+        self.add_result(
+            "Columns are zero-copy views of one block; null decodes to NaN and reads as 0",
+            isinstance(column, memoryview) and column.obj is datasets[0].block
+            and column[60] != column[60] and view.value('precipitation', late) == 0
+            and view.value('precipitation', '1999-01-01T00:00') == 0,
+            f"Block {datasets[0].nbytes} bytes, HRRR hour 60 = {column[60]}"
+        )
+
+        multi = om_decoder.decode(chunked(om_decoder.synthetic_response(days=2, locations=3), 1000))
+        self.add_result(
+            "Multi-location array yields one dataset per location",
+            [round(ds.meta.get('latitude'), 2) for ds in multi] == [36.1, 36.11, 36.12],
+            f"{len(multi)} datasets"
+        )
+
+        projected = om_decoder.decode([body], fields=om_decoder.CONSENSUS_FIELDS)[0]
+        self.add_result(
+            "Field projection skips unused columns",
+            set(projected.fields('ecmwf_ifs025')) == set(om_decoder.CONSENSUS_FIELDS)
+            and projected.nbytes < datasets[0].nbytes // 2,
+            f"{projected.nbytes} vs {datasets[0].nbytes} bytes"
+        )
+
+        try:
+            om_decoder.decode([body[:len(body) // 2]])
+            truncated = 'no error'
+        except om_decoder.OMDecodeError as e:
+            truncated = str(e)
+        self.add_result(
+            "Truncated body raises OMDecodeError",
+            truncated != 'no error',
+            truncated
+        )
+
+        # The consensus engine gives the same answers from decoded views
+        loc = consensus.synthetic_location(3, seed=11)
+        hourly = {'time': loc.models['gfs_global']['time']}
+        units = {'time': 'iso8601'}
+        for model, src in loc.models.items():
+            for field, values in src.items():
+                if field != 'time':
+                    hourly[f'{field}_{model}'] = values
+                    units[f'{field}_{model}'] = 'unit'
+        doc = json.dumps({'latitude': 36.1, 'hourly_units': units, 'hourly': hourly}).encode('utf-8')
+        ds = om_decoder.decode(chunked(doc, 4096), typecode='d', fields=om_decoder.CONSENSUS_FIELDS)[0]
+        views = consensus.LocationInput(loc.dates, ds.model_views(), loc.grid, loc.nws_hourly, loc.et_off_min)
+        engine = consensus.ConsensusEngine('python')
+        self.add_result(
+            "Consensus engine output identical with decoded model views",
+            engine.run([views]) == engine.run([loc]),
+            f"{len(loc.dates)} days, fields {', '.join(om_decoder.CONSENSUS_FIELDS)}"
+        )
+
+        # Scalar compile_day() on views with nulls (HRRR ends after 48 h)
+        nulls = om_decoder.decode(chunked(om_decoder.synthetic_response(3, 1), 4096))[0]
+        views = nulls.model_views()
+        plain = {model: view.to_dict() for model, view in views.items()}
+        try:
+            compiled = [consensus.compile_day(d, views, loc.grid, loc.nws_hourly, loc.et_off_min) for d in loc.dates]
+            error = None
+        except ValueError as e:
+            compiled, error = [], e
+        expected = [consensus.compile_day(d, plain, loc.grid, loc.nws_hourly, loc.et_off_min) for d in loc.dates]
+        self.add_result(
+            "compile_day() on decoded views with nulls matches plain objects",
+            error is None and compiled == expected and all(len(day) == 24 for day in compiled)
+            and all(rec['pHRRR'] == 0 for rec in compiled[-1]),
+            f"Error: {error}" if error else f"{sum(map(len, compiled))} hours compiled"
+        )
+
+    def test_instrumentation(self):
+        """Test latency histograms, spans and the Prometheus/JSON exporters"""
+        print(f"\n{Colors.BLUE}Testing Instrumentation...{Colors.RESET}")
+        import aggregator
+        import instrumentation
+        import upstream
+
+        hist = instrumentation.Histogram((1.0, 2.0, 4.0))
+        for v in (0.5, 1.0, 1.5, 3.0, 9.0):
+            hist.observe(v)
+        self.add_result(
+            "Histogram buckets use Prometheus le semantics",
+            hist.counts == [2, 1, 1, 1] and hist.cumulative() == [2, 3, 4, 5]
+            and abs(hist.quantile(0.5) - 1.5) < 1e-9 and hist.quantile(0.99) == 4.0
+            and hist.fraction_above(2.0) == 0.4,
+            f"Counts {hist.counts}, p50 {hist.quantile(0.5)}"
+        )
+
+        u = upstream.Upstreams.local('http://127.0.0.1:1')
+        urls = {
+            'open_meteo': u.open_meteo('2026-01-01', '2026-01-07'), 'gridpoint': u.gridpoint_url(),
+            'hourly': u.hourly_url(), 'alerts': u.alerts_url(), 'spc': u.spc_query_url(),
+            'rainviewer': u.rainviewer_maps_url(), 'afd': u.afd_index_url()
+        }
+        labels = {name: instrumentation.upstream_for_url(url) for name, url in urls.items()}
+        labels['spc_geojson'] = instrumentation.upstream_for_url(upstream.Upstreams().spc_outlook_url())
+        self.add_result(
+            "Every upstream URL maps to its endpoint label",
+            all(labels[name] == name for name in urls) and labels['spc_geojson'] == 'spc',
+            f"Labels: {labels}"
+        )
+
+        clock = {'t': 0.0}
+        metrics = instrumentation.Metrics(clock=lambda: clock['t'])
+
+        async def fake_fetch(url, headers=None, timeout=12.0):
+            clock['t'] += 9.0 if 'alerts' in url else 0.3
+            if 'weather-maps' in url:
+                raise upstream.UpstreamError(url, f'Request timeout after {int(timeout * 1000)}ms')
+            return upstream.Response(url, 503 if 'gridpoints' in url else 200, {}, b'{}', 0.3)
+
+        async def run_fetches():
+            fetch = metrics.wrap_fetch(fake_fetch)
+            for name, url in urls.items():
+                try:
+                    await fetch(url, {}, upstream.TIMEOUTS[name])
+                except upstream.UpstreamError:
+                    pass
+
+        asyncio.run(run_fetches())
+        outcomes = {(name, outcome): metrics.counter_value('upstream_requests_total', upstream=name, outcome=outcome)
+                    for name, outcome in (('open_meteo', 'ok'), ('gridpoint', 'http_error'),
+                                          ('rainviewer', 'timeout'), ('alerts', 'ok'))}
+        report = metrics.timeout_report()
+        self.add_result(
+            "Instrumented fetch records latency and outcome per upstream",
+            all(v == 1 for v in outcomes.values())
+            and report['alerts']['over_timeout'] == 1.0 and report['open_meteo']['over_timeout'] == 0.0,
+            f"Alerts 9 s vs {report['alerts']['timeout']} s timeout: over_timeout={report['alerts']['over_timeout']}"
+        )
+
+        try:
+            with metrics.span('compile', days=7) as outer:
+                clock['t'] += 0.002
+                with metrics.span('classify') as inner:
+                    clock['t'] += 0.001
+                raise ValueError('boom')
+        except ValueError:
+            pass
+        self.add_result(
+            "Nested spans record parent, duration and failures",
+            inner.parent == outer.id and outer.error == 'ValueError'
+            and abs(outer.duration - 0.003) < 1e-9
+            and metrics.counter_value('stage_errors_total', stage='compile') == 1,
+            f"Span {outer.to_dict()}"
+        )
+
+        text = metrics.prometheus_text()
+        lines = text.splitlines()
+        inf_line = next((l for l in lines if l.startswith('mebane_upstream_request_seconds_bucket{upstream="alerts",le="+Inf"}')), '')
+        count_line = next((l for l in lines if l.startswith('mebane_upstream_request_seconds_count{upstream="alerts"}')), '')
+        self.add_result(
+            "Prometheus text has HELP/TYPE, cumulative buckets and matching +Inf/count",
+            '# TYPE mebane_upstream_request_seconds histogram' in lines
+            and '# TYPE mebane_upstream_requests_total counter' in lines
+            and inf_line.split()[-1] == count_line.split()[-1] == '1',
+            f"{len(lines)} exposition lines"
+        )
+        snap = json.loads(metrics.json_bytes())
+        self.add_result(
+            "JSON snapshot carries quantiles, counters and recent spans",
+            any(h['labels'] == {'upstream': 'alerts'} and h['p99'] is not None
+                for h in snap['histograms']['upstream_request_seconds'])
+            and snap['recent_spans'][-1]['name'] == 'compile' and 'alerts' in snap['timeouts'],
+            f"{len(snap['recent_spans'])} spans, {len(snap['counters']['upstream_requests_total'])} outcome series"
+        )
+
+        async def served_metrics(stand_in):
+            agg = aggregator.Aggregator(upstream.Upstreams.local(stand_in.url), metrics=instrumentation.Metrics())
+            server = aggregator.AggregatorServer(agg)
+            port = await server.start('127.0.0.1', 0)
+            await agg.snapshot_body()
+            body = await asyncio.to_thread(
+                lambda: urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=5).read())
+            await server.stop()
+            return body.decode('utf-8')
+
+        with StandInServer(upstream_fixture_routes()) as stand_in:
+            exposition = asyncio.run(served_metrics(stand_in))
+        self.add_result(
+            "Aggregator serves /metrics for every upstream and stage",
+            all(f'upstream="{name}"' in exposition for name in ('open_meteo', 'gridpoint', 'hourly', 'alerts', 'spc'))
+            and all(f'stage="{stage}"' in exposition for stage in ('decode', 'classify', 'encode')),
+            f"{exposition.count(chr(10))} lines served"
+        )
+
+    def test_alert_stream(self):
+        """Test the alert delta engine and its Server-Sent Events fan-out"""
+        print(f"\n{Colors.BLUE}Testing Alert Delta Stream...{Colors.RESET}")
+        import socket
+        import alert_stream
+        import upstream
+        from dashboard_logic import summarize_alerts
+
+        now = 1_800_000_000.0
+
+        def feature(aid, event, sent='2027-01-15T10:00:00-05:00', expires='2027-01-15T18:00:00-05:00',
+                    severity='Severe'):
+            return {'id': aid, 'properties': {'id': aid, 'event': event, 'severity': severity,
+                                              'sent': sent, 'expires': expires, 'description': 'long text'}}
+
+        differ = alert_stream.AlertDiffer()
+        first = differ.apply([feature('a', 'Winter Storm Warning'), feature('b', 'Wind Advisory', severity='Minor')], now)
+        unchanged = differ.apply([feature('b', 'Wind Advisory', severity='Minor'), feature('a', 'Winter Storm Warning')], now)
+        second = differ.apply([
+            feature('a', 'Winter Storm Warning', sent='2027-01-15T12:00:00-05:00'),
+            feature('c', 'Tornado Warning'),
+            feature('d', 'Flood Watch', expires='2027-01-15T00:00:00-05:00')   # already expired
+        ], now)
+        self.add_result(
+            "Alert sets diff into added / updated / expired by ID and sent/expires",
+            [a['id'] for a in first['added']] == ['a', 'b'] and unchanged is None
+            and [a['id'] for a in second['added']] == ['c'] and [a['id'] for a in second['updated']] == ['a']
+            and second['expired'] == ['b'],
+            f"Second poll: +{[a['id'] for a in second['added']]} ~{[a['id'] for a in second['updated']]} "
+            f"-{second['expired']}"
+        )
+        reference = summarize_alerts(list(differ.alerts.values()))
+        flags = {a['id']: (a['display'], a['warning']) for a in second['added'] + second['updated']}
+        self.add_result(
+            "Deltas carry the dashboard's filtering and summary",
+            second['summary'] == reference and flags == {'c': (True, True), 'a': (True, True)}
+            and 'description' not in second['added'][0]['properties'],
+            f"Threat {second['summary']['threat']['level']}, winter {second['summary']['winter']['status']}"
+        )
+
+        async def failing(url, headers, timeout):
+            raise upstream.UpstreamError(url, 'HTTP 503', 503)
+
+        service = alert_stream.AlertService(fetcher=failing, clock=lambda: now)
+        service.ingest([feature('a', 'Tornado Warning')])
+        asyncio.run(service.poll_once())
+        self.add_result(
+            "Failed poll keeps the current alert set",
+            service.failures == 1 and list(service.differ.alerts) == ['a'] and service.hub.seq == 1,
+            service.last_error
+        )
+
+        class SlowTransport:
+            def is_closing(self):
+                return False
+
+            def get_write_buffer_size(self):
+                return alert_stream.MAX_CLIENT_BUFFER + 1
+
+            def abort(self):
+                pass
+
+        class SlowWriter:
+            transport = SlowTransport()
+
+            def write(self, data):
+                raise AssertionError('slow client written to')
+
+        hub = alert_stream.AlertHub()
+        hub.clients.add(SlowWriter())
+        self.add_result(
+            "Slow consumers are dropped instead of buffered",
+            hub.publish({'added': []}) == 0 and not hub.clients and hub.stats['dropped_slow'] == 1,
+            f"Hub stats: {dict(hub.stats)}"
+        )
+
+        def read_until(sock, marker, buf=b''):
+            sock.settimeout(5)
+            while marker not in buf:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+            return buf
+
+        async def stream_scenario():
+            service = alert_stream.AlertService(clock=lambda: now)
+            service.ingest([feature('a', 'Winter Storm Warning')])
+            server = alert_stream.AlertStreamServer(service)
+            port = await server.start('127.0.0.1', 0)
+
+            def connect(last_id=None):
+                sock = socket.create_connection(('127.0.0.1', port))
+                extra = f'Last-Event-ID: {last_id}\r\n' if last_id is not None else ''
+                sock.sendall(f'GET /api/alerts/stream HTTP/1.1\r\nHost: t\r\n{extra}\r\n'.encode())
+                return sock
+
+            clients = [await asyncio.to_thread(connect) for _ in range(50)]
+            heads = [await asyncio.to_thread(read_until, c, b'event: snapshot') for c in clients]
+            while len(service.hub.clients) < len(clients):
+                await asyncio.sleep(0.01)
+            service.ingest([feature('a', 'Winter Storm Warning'), feature('c', 'Tornado Warning')])
+            service.ingest([feature('c', 'Tornado Warning')])
+            deltas = [await asyncio.to_thread(read_until, c, b'id: 3\n') for c in clients]
+            resumed = await asyncio.to_thread(connect, 2)
+            replay = await asyncio.to_thread(read_until, resumed, b'id: 3\n')
+            for c in clients + [resumed]:
+                c.close()
+            await server.stop()
+            return heads, deltas, replay
+
+        heads, deltas, replay = asyncio.run(stream_scenario())
+        self.add_result(
+            "Every SSE client gets the snapshot, then each delta once",
+            all(b'text/event-stream' in h and b'event: snapshot' in h for h in heads)
+            and all(d.count(b'event: delta') == 2 for d in deltas),
+            f"{len(deltas)} clients, {len(deltas[0])} bytes each after the snapshot"
+        )
+        self.add_result(
+            "Last-Event-ID resumes with only the missed deltas",
+            b'event: snapshot' not in replay and replay.count(b'event: delta') == 1 and b'id: 3\n' in replay,
+            "Reconnect after id 2 replays id 3"
+        )
+
+    def test_radar_tiles(self):
+        """Test the radar tile warmer, packfile cache and local tile server"""
+        print(f"\n{Colors.BLUE}Testing Radar Tile Cache...{Colors.RESET}")
+        import radar_tiles
+        import upstream
+
+        roundtrip = all(radar_tiles.bbox_tile(radar_tiles.tile_bbox(z, x, y)) == (z, x, y)
+                        for z, x, y in ((4, 4, 6), (9, 143, 201), (10, 286, 402)))
+        cx, cy = radar_tiles.tile_xy(*radar_tiles.MAP_CENTER, 9)
+        times = radar_tiles.nws_frame_times(1_800_000_123)
+        self.add_result(
+            "Tile math and buildNwsFrameTimes schedule",
+            roundtrip and (9, int(cx), int(cy)) in radar_tiles.viewport_tiles(*radar_tiles.MAP_CENTER, 9)
+            and len(times) == 12 and times[-1] == '2027-01-15T08:00:00Z' and times[0] == '2027-01-15T06:10:00Z',
+            f"Center tile z9 ({int(cx)}, {int(cy)}), NWS frames {times[0]} .. {times[-1]}"
+        )
+
+        blank = radar_tiles.PNG_SIGNATURE + b'blank'
+        with tempfile.TemporaryDirectory() as directory:
+            pack = radar_tiles.TilePack(directory)
+            pack.put('rv:/a', 5, 8, 12, blank)
+            pack.put('rv:/a', 5, 9, 12, radar_tiles.PNG_SIGNATURE + b'echo-a')
+            pack.put('rv:/b', 5, 8, 12, blank)
+            pack.put('rv:/b', 5, 9, 12, radar_tiles.PNG_SIGNATURE + b'echo-b')
+            stored_once = pack.stats['stored'] == 3 and pack.stats['deduplicated'] == 1
+            first_segment = pack.frames['rv:/a']['segment']
+            pack.retain(['rv:/b'])
+            survived = pack.get('rv:/b', 5, 8, 12) == blank and pack.get('rv:/b', 5, 9, 12).endswith(b'echo-b')
+            self.add_result(
+                "Identical tiles stored once; aged-out frame evicted with its packfile",
+                stored_once and survived and list(pack.frames) == ['rv:/b']
+                and not os.path.exists(os.path.join(directory, first_segment + '.pack'))
+                and pack.stats['relocated'] == 1,
+                f"Pack stats: {dict(pack.stats)}"
+            )
+            pack.close()
+            reopened = radar_tiles.TilePack(directory)
+            self.add_result(
+                "Pack index survives a restart (tiles read back through mmap)",
+                reopened.get('rv:/b', 5, 9, 12) == radar_tiles.PNG_SIGNATURE + b'echo-b'
+                and reopened.get('rv:/a', 5, 9, 12) is None,
+                f"{len(reopened.blobs)} blobs in {len(reopened.segment_sizes)} packfile(s)"
+            )
+            reopened.max_bytes = reopened.total_bytes + 20
+            reopened.put('rv:/c', 5, 9, 12, radar_tiles.PNG_SIGNATURE + b'x' * 64)
+            self.add_result(
+                "Byte budget evicts the least recently used frame",
+                list(reopened.frames) == ['rv:/c'] and reopened.total_bytes <= reopened.max_bytes + 72,
+                f"{reopened.total_bytes} bytes after eviction"
+            )
+            reopened.close()
+
+        # Unclean stop: tiles appended after the last save() are on disk but not indexed
+        with tempfile.TemporaryDirectory() as directory:
+            png_a, png_c = radar_tiles.PNG_SIGNATURE + b'tile-a', radar_tiles.PNG_SIGNATURE + b'tile-c'
+            pack = radar_tiles.TilePack(directory)
+            pack.put('rv:/d', 5, 8, 12, png_a)
+            pack.save()
+            pack.put('rv:/d', 5, 9, 12, radar_tiles.PNG_SIGNATURE + b'tile-b-unsaved')
+            pack.put('rv:/e', 5, 9, 12, radar_tiles.PNG_SIGNATURE + b'unindexed-frame')
+            for writer in pack._writers.values():
+                writer.close()  # stopped without save()
+            crashed = radar_tiles.TilePack(directory)
+            crashed.put('rv:/d', 5, 10, 12, png_c)
+            crashed.close()
+            restarted = radar_tiles.TilePack(directory)
+            packs = sorted(f for f in os.listdir(directory) if f.endswith('.pack'))
+            self.add_result(
+                "Restart after unsaved appends serves the right bytes",
+                restarted.get('rv:/d', 5, 10, 12) == png_c and restarted.get('rv:/d', 5, 8, 12) == png_a
+                and restarted.get('rv:/d', 5, 9, 12) is None and packs == [pack.segment_for('rv:/d') + '.pack'],
+                f"Packfiles after restart: {len(packs)}"
+            )
+            restarted.close()
+
+        def png(label):
+            return radar_tiles.PNG_SIGNATURE + label.encode('utf-8')
+
+        async def scenario(stand_in, directory):
+            u = upstream.Upstreams.local(stand_in.url)
+            pack = radar_tiles.TilePack(directory)
+            service = radar_tiles.RadarTileService(pack, u, zooms=[5, 9], viewport=(256, 256),
+                                                   clock=lambda: 1_800_000_123)
+            fetched = await service.prefetch()
+            again = await service.prefetch()
+            hits_after_prefetch = sum(stand_in.hits.values())
+            server = radar_tiles.RadarTileServer(service)
+            port = await server.start('127.0.0.1', 0)
+            base = f'http://127.0.0.1:{port}'
+
+            def get(path):
+                with urllib.request.urlopen(base + path, timeout=5) as resp:
+                    return resp.read()
+
+            maps = json.loads(await asyncio.to_thread(get, '/public/weather-maps.json'))
+            z, x, y = service.tiles_for('rainviewer')[0]
+            rv_tile = await asyncio.to_thread(get, f"/v2/radar/1800000000/256/{z}/{x}/{y}/5/1_1.png")
+            z, x, y = service.tiles_for('nws')[-1]
+            wms = await asyncio.to_thread(
+                get, radar_tiles.NWS_WMS_PATH + '?' + radar_tiles.wms_params('2027-01-15T08:00:00Z', z, x, y))
+            z, x, y = service.tiles_for('rainviewer')[0]
+            try:
+                await asyncio.to_thread(get, f"/v2/radar/1234567890/256/{z}/{x}/{y}/5/1_1.png")
+                stale = 200
+            except urllib.error.HTTPError as e:
+                stale = (e.code, pack.has('rv:/v2/radar/1234567890', z, x, y))
+            await server.stop()
+            pack.close()
+            return (service, fetched, again, hits_after_prefetch, sum(stand_in.hits.values()),
+                    maps, rv_tile, wms, base, stale)
+
+        maps_doc = radar_tiles.synthetic_maps(1_800_000_123, past=2, nowcast=1, host='')
+        routes = {'/public/weather-maps.json': (200, maps_doc, {}),
+                  radar_tiles.NWS_WMS_PATH: (200, png('nws'), {'Content-Type': 'image/png'})}
+        for frame in maps_doc['radar']['past'] + maps_doc['radar']['nowcast']:
+            for z in (5,):
+                for tile in radar_tiles.viewport_tiles(*radar_tiles.MAP_CENTER, z, 256, 256):
+                    routes[frame['path'] + '/256/%d/%d/%d/5/1_1.png' % tile] = (200, png(frame['path']), {})
+        with StandInServer(routes) as stand_in, tempfile.TemporaryDirectory() as directory:
+            maps_doc['host'] = stand_in.url
+            service, fetched, again, hits_prefetch, hits_end, maps, rv_tile, wms, base, stale = asyncio.run(
+                scenario(stand_in, directory))
+        n_rv = 3 * len(service.tiles_for('rainviewer'))
+        n_nws = 12 * len(service.tiles_for('nws'))
+        self.add_result(
+            "Prefetch warms RainViewer (zoom <= 7) and NWS frames once",
+            fetched == n_rv + n_nws and again == 0 and service.stats['fetched'] == n_rv + n_nws,
+            f"{n_rv} RainViewer + {n_nws} NWS tiles, second pass fetched {again}"
+        )
+        self.add_result(
+            "Widget URLs served from the pack without upstream requests",
+            maps['host'] == base and rv_tile == png('/v2/radar/1800000000')
+            and wms == png('nws') and hits_end == hits_prefetch,
+            f"Upstream hits {hits_prefetch} after prefetch, {hits_end} after serving"
+        )
+        self.add_result(
+            "Tiles of frames outside weather-maps.json answer 404 without fetch-through",
+            stale == (404, False),
+            f"Unknown frame: {stale}"
+        )
+
+        async def unloaded(directory):
+            async def fetch(url, headers, timeout):
+                raise upstream.UpstreamError('offline')
+            pack = radar_tiles.TilePack(directory)
+            service = radar_tiles.RadarTileService(pack, fetch=fetch)
+            server = radar_tiles.RadarTileServer(service)
+            port = await server.start('127.0.0.1', 0)
+
+            def status(path):
+                try:
+                    with urllib.request.urlopen(f'http://127.0.0.1:{port}' + path, timeout=5) as resp:
+                        return resp.status
+                except urllib.error.HTTPError as e:
+                    return e.code
+
+            code = await asyncio.to_thread(status, '/v2/radar/1800000000/256/5/8/12/5/1_1.png')
+            await server.stop()
+            pack.close()
+            return code, service.maps
+
+        with tempfile.TemporaryDirectory() as directory:
+            code, maps = asyncio.run(unloaded(directory))
+        self.add_result(
+            "RainViewer tile before weather-maps.json loads answers 502",
+            code == 502 and maps is None,
+            f"Status {code}"
+        )
+
+    def test_radar_sprites(self):
+        """Test the radar loop sprite compositor and its PNG codec"""
+        print(f"\n{Colors.BLUE}Testing Radar Sprites...{Colors.RESET}")
+        import random
+        import struct
+        import zlib
+        import radar_sprites
+        import radar_tiles
+        import upstream
+
+        rng = random.Random(13)
+        w, h = 19, 6
+        pixels = bytes(rng.randrange(256) for _ in range(w * h * 4))
+        decoded = [radar_sprites.decode_png(radar_sprites.encode_png(w, h, pixels, f))
+                   for f in (0, 1, 2, 3, 4, 'cycle')]
+        # 4-bit palette image with transparency: indices 0..3 repeating
+        row = bytes([0x01, 0x23, 0x01, 0x20])   # 7 pixels, low nibble padding
+        raw = b''.join(b'\x00' + row for _ in range(2))
+        palette_png = (radar_sprites.png_header(1, 1)[:8]
+                       + radar_sprites._chunk(b'IHDR', struct.pack('>IIBBBBB', 7, 2, 4, 3, 0, 0, 0))
+                       + radar_sprites._chunk(b'PLTE', bytes([0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 80, 90]))
+                       + radar_sprites._chunk(b'tRNS', b'\x00\x80')
+                       + radar_sprites._chunk(b'IDAT', zlib.compress(raw))
+                       + radar_sprites._chunk(b'IEND', b''))
+        pw, ph, prgba = radar_sprites.decode_png(palette_png)
+        self.add_result(
+            "PNG codec roundtrips all five filters and expands 4-bit palettes",
+            all(d == (w, h, pixels) for d in decoded) and (pw, ph) == (7, 2)
+            and prgba[:12] == bytes([0, 0, 0, 0, 10, 20, 30, 128, 40, 50, 60, 255])
+            and prgba[24:28] == bytes([40, 50, 60, 255]),
+            f"{len(decoded)} filter variants, palette pixels {list(prgba[:8])}"
+        )
+
+        a, b = rng.randbytes(5000), rng.randbytes(70000)
+        self.add_result(
+            "adler32_combine matches zlib over concatenated data",
+            radar_sprites.adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b)) == zlib.adler32(a + b),
+            f"adler32 {zlib.adler32(a + b):#010x}"
+        )
+
+        now = 1_800_000_123
+        clock = {'t': now}
+        source = radar_sprites.SyntheticTiles(radar_tiles.synthetic_maps(now, past=3, nowcast=1))
+
+        async def scenario(directory):
+            pack = radar_tiles.TilePack(directory)
+            service = radar_tiles.RadarTileService(pack, fetch=source.fetch, clock=lambda: clock['t'])
+            compositor = radar_sprites.SpriteCompositor(service, zooms=[6], viewport=(256, 128))
+            await service.load_maps()
+            first = await compositor.build(6)
+            rendered_first = compositor.stats['frames_rendered']
+            source.maps = radar_tiles.synthetic_maps(now + 600, past=3, nowcast=1)
+            clock['t'] = now + 600
+            await service.load_maps()
+            second = await compositor.build(6)
+            rendered_next = compositor.stats['frames_rendered'] - rendered_first
+            fresh = radar_sprites.SpriteCompositor(service, zooms=[6], viewport=(256, 128))
+            rebuilt = await fresh.build(6)
+            nws = radar_sprites.SpriteCompositor(service, zooms=[9], viewport=(128, 64))
+            nws_manifest = (await nws.build(9))[1]
+            pack.close()
+            return first, second, rendered_first, rendered_next, rebuilt, nws_manifest
+
+        with tempfile.TemporaryDirectory() as directory:
+            first, second, rendered_first, rendered_next, rebuilt, nws_manifest = asyncio.run(scenario(directory))
+        sw, sh, sprite = radar_sprites.decode_png(second[0])
+        frames = second[1]['frames']
+        self.add_result(
+            "Sprite is a valid PNG stacking every frame",
+            (sw, sh) == (256, 128 * 4) and len(frames) == 4 and frames[-1]['y'] == 384
+            and any(sprite[3::4]) and first[1]['source'] == 'rainviewer',
+            f"{sw}x{sh} sprite, {len(second[0])} bytes, {len(frames)} frames"
+        )
+        self.add_result(
+            "Next cycle renders only new frames, identical to a full rebuild",
+            rendered_first == 4 and rendered_next == 2 and rebuilt[0] == second[0]
+            and second[1]['etag'] != first[1]['etag'],
+            f"Rendered {rendered_first} then {rendered_next} frame(s) (new past + new nowcast)"
+        )
+        expected = [t['time'] for t in source.maps['radar']['past'] + source.maps['radar']['nowcast']]
+        self.add_result(
+            "Manifest frame times are unix seconds for the timestamp sync",
+            [f['time'] for f in frames] == expected and nws_manifest['source'] == 'nws'
+            and len(nws_manifest['frames']) == 12 and nws_manifest['frames'][-1]['time'] == (now + 600) // 600 * 600,
+            f"RainViewer {expected[0]} .. {expected[-1]}, NWS last {nws_manifest['frames'][-1]['time']}"
+        )
+
+        # Frames rendered during a tile outage are re-rendered once tiles come back
+        outage = {'on': True}
+
+        async def flaky(url, headers=None, timeout=10.0):
+            if outage['on'] and not url.endswith('/weather-maps.json'):
+                raise upstream.UpstreamError(url, 'HTTP 503', 503)
+            return await source.fetch(url, headers, timeout)
+
+        async def recovery(directory):
+            pack = radar_tiles.TilePack(directory)
+            service = radar_tiles.RadarTileService(pack, fetch=flaky, clock=lambda: clock['t'])
+            compositor = radar_sprites.SpriteCompositor(service, zooms=[6], viewport=(256, 128))
+            await service.load_maps()
+            during = (await compositor.build(6))[1]
+            outage['on'] = False
+            after = (await compositor.build(6))[1]
+            again = (await compositor.build(6))[1]
+            pack.close()
+            return during, after, again, dict(compositor.stats)
+
+        with tempfile.TemporaryDirectory() as directory:
+            during, after, again, stats = asyncio.run(recovery(directory))
+        needed = len(radar_sprites.SpriteCompositor(None, zooms=[6], viewport=(256, 128))._needed_tiles(6))
+        self.add_result(
+            "Frames rendered during a tile outage are re-rendered after recovery",
+            all(f['tiles'] == 0 for f in during['frames'])
+            and all(f['tiles'] == needed for f in after['frames'] + again['frames'])
+            and stats.get('frames_retried') == len(during['frames']) and after['etag'] == again['etag'],
+            f"Tiles per frame {[f['tiles'] for f in during['frames']]} -> {[f['tiles'] for f in after['frames']]}"
+        )
+
+    def test_forecast_store(self):
+        """Test the append-only columnar forecast history store"""
+        print(f"\n{Colors.BLUE}Testing Forecast History Store...{Colors.RESET}")
+        import forecast_store
+
+        start = 1_800_000_000 // 3600 * 3600
+        runs = [start + i * 3600 for i in range(6)]
+        with tempfile.TemporaryDirectory() as directory:
+            store = forecast_store.ForecastStore(directory)
+            for i, run in enumerate(runs[:4]):
+                store.append_run('36.0959,-79.2665', run, forecast_store.synthetic_run(run, 2, seed=i))
+            duplicate = store.append_run('36.0959,-79.2665', runs[0], forecast_store.synthetic_run(runs[0], 2))
+            days = forecast_store.synthetic_run(runs[0], 2, seed=0)
+            expected = dict(days[min(days)][5], dF=None)
+            days[min(days)][5]['dF'] = None
+            store.append_run('nc', runs[0], days)
+            store.close()
+
+            reopened = forecast_store.ForecastStore(directory)
+            history = reopened.location('36.0959,-79.2665')
+            first = history.run(runs[0])
+            rec = reopened.location('nc').run(runs[0])[5]
+            stored = {k: v for k, v in rec.as_dict().items() if k not in ('run', 'valid')}
+            self.add_result(
+                "Runs append as columns and read back after reopening",
+                history.runs() == runs[:4] and len(first) == 48 and duplicate is False
+                and stored == expected and rec.valid == runs[0] // 86400 * 86400 + 5 * 3600
+                and not hasattr(rec, '__dict__') and isinstance(first.column('pCons'), memoryview),
+                f"{history.rows} rows in {len(history.runs())} runs, record {rec!r}"
+            )
+
+            target = runs[3] + 3600
+            said = history.valid_history(target)
+            self.add_result(
+                "valid_history answers what each run said about one hour",
+                [run for run, _ in said] == runs[:4]
+                and all(r.valid == target and r.run == run for run, r in said),
+                f"pCons by run: {[r.pCons for _, r in said]}"
+            )
+
+            # Late run (out of order) lands in the tail, then a crash leaves a partial append
+            history.append_run(runs[5], forecast_store.synthetic_run(runs[5], 2, seed=5))
+            history.append_run(runs[4], forecast_store.synthetic_run(runs[4], 2, seed=4))
+            with open(history._column_path('pCons'), 'ab') as f:
+                f.write(b'\x01\x02\x03')
+            reopened.close()
+            history = forecast_store.ForecastStore(directory).location('36.0959,-79.2665')
+            in_order = history.runs() == runs and history.sorted_rows == 5 * 48
+            window = history.between(runs[3], runs[6 - 1] + 1)
+            self.add_result(
+                "Out-of-order run readable before compaction; partial append truncated",
+                in_order and len(window) == 3 * 48
+                and os.path.getsize(history._column_path('pCons')) == history.rows * 2,
+                f"sorted_rows {history.sorted_rows} of {history.rows}"
+            )
+
+            held = history.run(runs[5])[7]
+            held_pcons = held.pCons
+            dropped = history.compact(now=runs[5], keep_all_days=2 / 24, thin_hours=3, max_age_days=4.5 / 24)
+            try:
+                held_after = held.pCons
+            except ValueError as e:
+                held_after = e
+            self.add_result(
+                "Compaction merges into run order, thins and expires old runs",
+                history.runs() == [runs[1], runs[3], runs[4], runs[5]] and dropped == 2 * 48
+                and history.sorted_rows == history.rows
+                and [r.run for r in history.between(runs[0], runs[5] + 1)][::48] == history.runs()
+                and sorted(os.listdir(os.path.join(directory, '36.0959_-79.2665')))[0].endswith('.1.col'),
+                f"Kept runs {[(r - start) // 3600 for r in history.runs()]}, dropped {dropped} rows"
+            )
+            self.add_result(
+                "Records read before compaction stay readable after it",
+                held_after == held_pcons and history.run(runs[5])[7].pCons == held_pcons,
+                f"pCons {held_pcons} -> {held_after!r}"
+            )
+            history.close()
+
+    def test_model_skill(self):
+        """Test incremental model skill scoring and derived consensus weights"""
+        print(f"\n{Colors.BLUE}Testing Model Skill Scoring...{Colors.RESET}")
+        import random
+        import forecast_store
+        import model_skill
+        import upstream
+        from consensus import js_round
+
+        def report(stamp, mm, raw=None):
+            return {'properties': {'timestamp': stamp, 'rawMessage': raw, 'precipitationLastHour': {
+                'unitCode': 'wmoUnit:mm', 'value': mm}}}
+
+        metar = 'KBUY 15{}53Z AUTO 00000KT 10SM CLR 02/M01 A3021 RMK AO2 SLP231 {}T00221011'
+        observations_doc = {'features': [
+            report('2027-01-15T07:53:00+00:00', 2.54), report('2027-01-15T07:20:00+00:00', 1.0),
+            report('2027-01-15T08:53:00+00:00', 0.0),
+            report('2027-01-15T09:53:00+00:00', None, metar.format('09', '')),          # routine, no P group: dry
+            report('2027-01-15T10:53:00+00:00', None, metar.format('10', 'P0012 ')),    # P group: 0.12 in
+            report('2027-01-15T11:20:00+00:00', None, 'SPECI ' + metar.format('11', '')),
+            report('2027-01-15T12:53:00+00:00', None, metar.format('12', 'PNO ')),      # sensor out
+            report('2027-01-15T13:53:00+00:00', None)]}
+        routes = {'/stations/KBUY/observations': (200, observations_doc, {})}
+        with StandInServer(routes) as stand_in:
+            observed = asyncio.run(model_skill.fetch_observations(
+                upstream.Upstreams.local(stand_in.url), upstream.fetch, start='2027-01-15T00:00:00Z'))
+        hour = 1_800_000_000 // 3600 * 3600   # 2027-01-15T08:00Z
+        self.add_result(
+            "Station observations parse to hourly inches (null routine report is dry)",
+            observed == {hour - 3600: 0.1, hour: 0.0, hour + 3600: 0.0, hour + 7200: 0.12},
+            f"Observed {observed}"
+        )
+
+        score = model_skill.RollingSkill(window=3 * 3600)
+        rng = random.Random(15)
+        pairs = [(hour + (i // 3) * 3600, rng.randint(0, 10000), rng.randint(0, 500)) for i in range(30)]
+        for valid, sq, ab in pairs:
+            score.add(valid, sq, ab)
+        live = [(sq, ab) for valid, sq, ab in pairs if valid > pairs[-1][0] - 3 * 3600]
+        self.add_result(
+            "Rolling window sums stay exact after expiry",
+            score.n == len(live) == 9 and score.sq_sum == sum(s for s, _ in live)
+            and score.abs_sum == sum(a for _, a in live) and len(score.entries) == 3,
+            f"Brier {score.brier:.4f} MAE {score.mae:.4f} over {score.n} pairs"
+        )
+
+        # A model that stops reporting ages out with the window instead of keeping its old sums
+        engine = model_skill.SkillEngine(window_hours=3, min_samples=1)
+        for h in range(8):
+            rec = {'p' + m: 40 for m in model_skill.SKILL_MODELS}
+            rec.update({'q' + m: 0.0 for m in model_skill.SKILL_MODELS})
+            if h >= 2:
+                rec['pHRRR'] = rec['qHRRR'] = None
+            engine.verify('mebane', hour + h * 3600, 0.0, [(hour + h * 3600 - 2 * 3600, rec)])
+        cells = engine.skill('mebane')
+        self.add_result(
+            "Silent model's cells expire with the window",
+            ('HRRR', 0) not in cells and cells.get(('GFS', 0), (0, 0, 0))[2] == 3
+            and engine.weights('mebane')['leads'][0]['samples'].get('HRRR') is None,
+            f"Cells at lead 0-6 h: {sorted(m for m, b in cells if b == 0)}"
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = forecast_store.ForecastStore(directory)
+            runs = [hour - 36 * 3600 + i * 6 * 3600 for i in range(4)]
+            for i, run in enumerate(runs):
+                store.append_run('mebane', run, forecast_store.synthetic_run(run, 3, seed=i))
+            history = store.location('mebane')
+            obs = {hour + h * 3600: (0.05 if h % 5 == 0 else 0.0) for h in range(12)}
+            engine = model_skill.SkillEngine(window_hours=48, min_samples=1)
+            first = engine.verify_history('mebane', history, dict(list(obs.items())[:6]))
+            second = engine.verify_history('mebane', history, obs)
+            again = engine.verify_history('mebane', history, obs)
+            full = model_skill.SkillEngine(window_hours=48, min_samples=1)
+            full.verify_history('mebane', history, obs)
+            expected_pairs = sum(len(history.valid_history(v)) * 5 for v in obs)   # leads 18-47 h
+            store.close()
+        self.add_result(
+            "Stored runs verify incrementally (only hours past the cursor)",
+            (first, second, again) == (6, 6, 0) and engine.skill('mebane') == full.skill('mebane')
+            and engine.stats['pairs'] == expected_pairs == 4 * 12 * 5,
+            f"{engine.stats['pairs']} scored pairs in {len(engine.skill('mebane'))} model/lead cells"
+        )
+
+        source = model_skill.SyntheticVerification(leads=range(1, 30, 2))
+        engine = model_skill.SkillEngine(window_hours=96)
+        for h in range(96):
+            for loc in ('a', 'b'):
+                valid = hour + h * 3600
+                engine.verify(loc, valid, source.observed(loc, valid), source.forecasts(loc, valid))
+        doc = engine.weights()
+        near = doc['leads'][model_skill.lead_bucket(3)]['pop']
+        untrained = doc['leads'][model_skill.lead_bucket(100)]['pop']
+        self.add_result(
+            "Weights follow skill per lead; unscored leads keep compile() weights",
+            max(near, key=near.get) == 'ECMWF' and near['ICON'] > 0 and near['GFS'] < near['NWS']
+            and abs(sum(near.values()) - 1) < 0.01 and untrained == model_skill.DEFAULT_WEIGHTS,
+            f"0-6 h POP weights {near}"
+        )
+
+        rec = {'pNWS': 35, 'pGFS': 10, 'pECMWF': 61, 'pHRRR': 47, 'pICON': 90}
+        result = {'dates': ['2027-01-15'], 'pCons': [[0] * 24]}
+        for m in model_skill.SKILL_MODELS:
+            result['p' + m] = [[rec['p' + m]] * 24]
+        model_skill.reweight(result, doc, hour)
+        self.add_result(
+            "Default weights reproduce compile() pCons; reweight() uses per-lead weights",
+            model_skill.consensus_pop(rec, model_skill.DEFAULT_WEIGHTS)
+            == js_round(35 * 0.40 + 10 * 0.20 + 61 * 0.25 + 47 * 0.15)
+            and result['pCons'][0][10] == model_skill.consensus_pop(rec, near)
+            and result['pCons'][0][7] == model_skill.consensus_pop(rec, model_skill.DEFAULT_WEIGHTS),
+            f"pCons at +2 h {result['pCons'][0][10]}, default {model_skill.consensus_pop(rec, model_skill.DEFAULT_WEIGHTS)}"
+        )
+
+    def test_snapshot_publisher(self):
+        """Test the static snapshot publisher (atomic day files, variants, deltas)"""
+        print(f"\n{Colors.BLUE}Testing Snapshot Publisher...{Colors.RESET}")
+        import gzip
+        import aggregator
+        import forecast_store
+        import snapshot_publisher
+        import upstream
+
+        with StandInServer(upstream_fixture_routes()) as stand_in, tempfile.TemporaryDirectory() as directory:
+            agg = aggregator.Aggregator(upstream.Upstreams.local(stand_in.url), days=3)
+            store = forecast_store.ForecastStore(os.path.join(directory, 'history'))
+            out = os.path.join(directory, 'www')
+            publisher = snapshot_publisher.SnapshotPublisher(out, {'mebane': agg}, store=store)
+            published = asyncio.run(publisher.publish())
+            index = published['mebane'][0]
+            loc_dir = os.path.join(out, 'mebane')
+            first = index['days'][0]
+            with open(os.path.join(loc_dir, first['file']), 'rb') as f:
+                body = f.read()
+            with open(os.path.join(loc_dir, first['file'] + '.gz'), 'rb') as f:
+                gz = f.read()
+            doc = json.loads(body)
+            leftovers = [n for n in os.listdir(loc_dir) if n.startswith('.tmp-')]
+            self.add_result(
+                "Pipeline runs server-side into one small file per day tab",
+                len(index['days']) == 3 and gzip.decompress(gz) == body and not leftovers
+                and len(doc['hours']['pCons']) == 24 and doc['summary']['alert_count'] == 2
+                and doc['sources']['open_meteo'] == 'live'
+                and os.stat(os.path.join(loc_dir, first['file'])).st_mode & 0o777 == 0o644,
+                f"{first['file']}: {first['bytes']} bytes, history runs {publisher.stats['runs']}"
+            )
+            mtime = os.stat(os.path.join(loc_dir, first['file'])).st_mtime_ns
+            agg.clock = lambda: time.time() + 10_000   # everything stale: same payloads refetched
+            asyncio.run(publisher.publish())
+            self.add_result(
+                "Unchanged days are not rewritten",
+                publisher.stats['unchanged'] == 3 and publisher.stats['published'] == 3
+                and os.stat(os.path.join(loc_dir, first['file'])).st_mtime_ns == mtime
+                and len(store.location('mebane').runs()) == 1,
+                f"Stats {publisher.stats}"
+            )
+            store.close()
+
+        snapshot = snapshot_publisher.synthetic_snapshot(2)
+        with tempfile.TemporaryDirectory() as directory:
+            fake = snapshot_publisher._FixedAggregator(snapshot)
+            publisher = snapshot_publisher.SnapshotPublisher(directory, {'nc': fake})
+            asyncio.run(publisher.publish_location('nc'))
+            day = snapshot['dates'][1]
+            with open(os.path.join(directory, 'nc', day + '.json'), 'rb') as f:
+                old_doc = json.loads(f.read())
+            om = dict(snapshot['open_meteo'])
+            key = 'precipitation_probability_ecmwf_ifs025'
+            om[key] = [(v or 0) + 11 if 30 <= i < 34 else v for i, v in enumerate(om[key])]
+            fake.snapshot_doc = dict(snapshot, open_meteo=om, generated_at=snapshot['generated_at'] + 3600)
+            index, delta = asyncio.run(publisher.publish_location('nc'))
+            with open(os.path.join(directory, 'nc', day + '.json'), 'rb') as f:
+                new_doc = json.loads(f.read())
+            with open(os.path.join(directory, 'nc', 'delta.json'), 'rb') as f:
+                delta_body = f.read()
+        change = delta['days'].get(day, {}).get('change', {})
+        self.add_result(
+            "Hourly delta patches the previous day file into the new one",
+            snapshot_publisher.apply_day_delta(old_doc, change) == new_doc
+            and list(delta['days']) == [day] and len(delta_body) < 1024
+            and delta['days'][day]['to'] == next(d['hash'] for d in index['days'] if d['date'] == day),
+            f"delta.json {len(delta_body)} B, fields changed {sorted(change.get('hours', {}))}"
+        )
+
+    def test_cassettes(self):
+        """Test upstream record/replay cassettes and fault scenarios"""
+        print(f"\n{Colors.BLUE}Testing Record/Replay Cassettes...{Colors.RESET}")
+        import aggregator
+        import cassettes
+        import upstream
+
+        routes = upstream_fixture_routes()
+        tile = '/v2/radar/1/256/9/143/201/5/1_1.png'
+        routes[tile] = (200, b'\x89PNG\r\n\x1a\n\x00\xff', {'Content-Type': 'image/png'})
+        with StandInServer(routes) as stand_in:
+            recorder = cassettes.Recorder(name='fixtures')
+            agg = aggregator.Aggregator(upstream.Upstreams.local(stand_in.url), fetcher=recorder.fetch_json)
+            live = asyncio.run(agg.snapshot())
+            asyncio.run(recorder.fetch(stand_in.url + tile))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fixtures.json.gz')
+            recorder.cassette.save(path)
+            loaded = cassettes.Cassette.load(path)
+            try:
+                cassettes.Cassette.from_dict(dict(recorder.cassette.to_dict(), version=99))
+                version_checked = False
+            except ValueError:
+                version_checked = True
+        same = all(a.body == b.body and a.status == b.status and a.headers == b.headers and a.source == b.source
+                   for a, b in zip(recorder.cassette.interactions, loaded.interactions))
+        self.add_result(
+            "Recorded responses survive a cassette save/load (text and binary)",
+            same and len(loaded.interactions) == 6 and version_checked
+            and loaded.sources() == ['alerts', 'gridpoint', 'hourly', 'open_meteo', 'other', 'spc']
+            and 'date' not in loaded.interactions[0].headers,
+            f"{len(loaded.interactions)} interactions, sources {loaded.sources()}"
+        )
+
+        replayed, _, _ = asyncio.run(cassettes.replay_pipeline(loaded))
+        self.add_result(
+            "Replay reproduces the live snapshot offline",
+            {k: replayed[k] for k in ('open_meteo', 'gridpoint', 'hourly', 'alerts', 'summary')}
+            == {k: live[k] for k in ('open_meteo', 'gridpoint', 'hourly', 'alerts', 'summary')},
+            f"Summary {replayed['summary']['threat']}, {len(replayed['alerts'])} alerts"
+        )
+
+        cassette = cassettes.synthetic_cassette(days=3, now=1_800_000_000)
+        slowest = max(i.latency for i in cassette.interactions)
+        _, days, paced = asyncio.run(cassettes.replay_pipeline(cassette, speed=10.0, days=3))
+        _, _, fast = asyncio.run(cassettes.replay_pipeline(cassette, speed=None, days=3))
+        self.add_result(
+            "Replay at recorded (scaled) speed vs full speed",
+            paced >= slowest / 10 and fast < paced and sum(len(r) for r in days.values()) == 72,
+            f"Slowest upstream {slowest * 1000:.0f} ms: 10x replay {paced * 1000:.0f} ms, full speed {fast * 1000:.0f} ms"
+        )
+
+        states = {}
+        for kind in ('outage', 'timeout', 'malformed', 'empty'):
+            snap, _, _ = asyncio.run(cassettes.replay_pipeline(cassette.scenario(kind, ['gridpoint']), 40.0, 3))
+            states[kind] = (snap['sources']['gridpoint']['state'], snap['sources']['gridpoint']['error'] or '',
+                            snap['sources']['open_meteo']['state'], snap['ok'])
+        self.add_result(
+            "Outage, timeout, malformed and empty scenarios degrade one source",
+            all(s[0] == 'unavailable' and s[2] == 'live' and s[3] for s in states.values())
+            and 'HTTP 503' in states['outage'][1] and ('timeout' in states['timeout'][1] or 'timed out' in states['timeout'][1])
+            and 'JSON parse error' in states['malformed'][1] and 'Empty response' in states['empty'][1],
+            '; '.join(f"{k}: {v[1][:40]}" for k, v in states.items())
+        )
+
+        first = next(i for i in cassette.interactions if i.source == 'alerts')
+        second = first.copy(body=b'{"features":[]}')
+        server = cassettes.ReplayServer(cassettes.Cassette([first, second]))
+
+        async def sequence():
+            await server.start()
+            try:
+                bodies = [await upstream.fetch_json(server.url + first.path + '?zone=NCZ023') for _ in range(3)]
+                missing = await upstream.fetch(server.url + '/nope')
+            finally:
+                await server.stop()
+            return bodies, missing
+
+        bodies, missing = asyncio.run(sequence())
+        self.add_result(
+            "Repeated requests walk the recorded sequence; unknown paths are reported",
+            len(bodies[0]['features']) == 3 and bodies[1] == bodies[2] == {'features': []}
+            and missing.status == 404 and server.unmatched == ['/nope'],
+            f"Feature counts {[len(b['features']) for b in bodies]}"
+        )
+
+    def test_benchmarks(self):
+        """Test the micro-benchmark regression gate"""
+        print(f"\n{Colors.BLUE}Testing Micro-Benchmark Gate...{Colors.RESET}")
+        import io
+
+        base = {'hot': {'ops_per_sec': 1000.0, 'peak_bytes': 100000}}
+        ok = compare_to_baseline({'hot': {'ops_per_sec': 900.0, 'peak_bytes': 110000},
+                                  'fresh': {'ops_per_sec': 1.0, 'peak_bytes': 10 ** 9}}, base, 0.25)
+        slow = compare_to_baseline({'hot': {'ops_per_sec': 600.0, 'peak_bytes': 100000}}, base, 0.25)
+        fat = compare_to_baseline({'hot': {'ops_per_sec': 1000.0, 'peak_bytes': 200000}}, base, 0.25)
+        self.add_result("Gate: regressions beyond the threshold fail, noise and new cases pass",
+                        ok == [] and len(slow) == 1 and 'ops/s' in slow[0][1]
+                        and len(fat) == 1 and 'peak' in fat[0][1],
+                        f"ok={ok} slow={slow} fat={fat}")
+
+        names = [name for name, _ in bench_cases()]
+        wanted = ('calculate_threat_level', 'is_winter_weather_alert', 'detect_winter_weather_from_alerts',
+                  'spc_code_for_dn', 'backoff_delay', 'compile_day', 'ConsensusEngine', 'GridpointDecoder',
+                  'SPCOutlook', 'AFDSummarizer')
+        missing = [w for w in wanted if not any(n.startswith(w) for n in names)]
+        sizes = any('zone' in n for n in names) and any('state' in n for n in names)
+        self.add_result("Suite covers every mirrored hot path, zone to state-wide",
+                        not missing and sizes and len(names) == len(set(names)),
+                        f"missing={missing} names={names}")
+
+        from dashboard_logic import spc_code_for_dn
+        cases = [('spc_code_for_dn[DN 5]', lambda: spc_code_for_dn(5)),
+                 ('alloc[64 KiB]', lambda: bytearray(65536))]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            out = io.StringIO()
+            first = run_benchmarks(path, cases=cases, min_time=0.005, rounds=2, out=out)
+            with open(path) as f:
+                doc = json.load(f)
+            recorded = doc['results']
+            measured = (first == 0 and set(recorded) == {n for n, _ in cases}
+                        and all(r['ops_per_sec'] > 0 for r in recorded.values())
+                        and recorded['alloc[64 KiB]']['peak_bytes'] >= 65536)
+            self.add_result("First run measures ops/sec and allocations and records a JSON baseline",
+                            measured, f"exit={first} results={recorded}")
+
+            doc['results']['spc_code_for_dn[DN 5]']['ops_per_sec'] *= 1000
+            with open(path, 'w') as f:
+                json.dump(doc, f)
+            out = io.StringIO()
+            gated = run_benchmarks(path, cases=cases, min_time=0.005, rounds=2, out=out)
+            report = out.getvalue()
+            self.add_result("Regressed hot path fails the run and is named in the report",
+                            gated == 1 and 'spc_code_for_dn[DN 5]:' in report and 'alloc[64 KiB]:' not in report,
+                            f"exit={gated}")
+
+    def test_capacity_sim(self):
+        """Test the widget client capacity simulator"""
+        print(f"\n{Colors.BLUE}Testing Capacity Simulator...{Colors.RESET}")
+        import capacity_sim
+
+        loop = capacity_sim.VirtualClockLoop()
+        try:
+            t0 = time.perf_counter()
+            loop.run_until_complete(asyncio.sleep(3600))
+            jumped = loop.time() == 3600 and time.perf_counter() - t0 < 1.0
+        finally:
+            loop.close()
+        self.add_result("Virtual clock: an hour of timers runs instantly", jumped)
+
+        # One always-visible client, no errors, no alert changes, just under an hour
+        counts = {}
+        for widget in capacity_sim.WIDGETS:
+            r = capacity_sim.Simulation(1, 3599, 'direct', widgets=(widget,), ramp=0, hidden_mean=0,
+                                        error_rate=0, alert_changes=()).run()
+            counts[widget] = r['by_source']
+        expected = {
+            # updateDashboard x4 (alerts, SPC, 2 AFD index+product pairs) + 19 alert polls
+            'dashboard': {'alerts': 23, 'spc': 4, 'afd': 16},
+            # weather x15 at 240 s, alerts+SPC x20 at 180 s, AFD twice (30-min cache)
+            'forecast': {'open_meteo': 15, 'gridpoint': 15, 'hourly': 15, 'alerts': 20, 'spc': 20, 'afd': 4},
+            # load + 10-min refreshes + 7-min watchdog, minus the 3000 s refresh inside the 90 s guard
+            'radar': {'rainviewer': 13}
+        }
+        self.add_result("Widget timers produce the exact upstream schedule", counts == expected, f"{counts}")
+
+        r = capacity_sim.Simulation(1, 100, 'direct', widgets=('radar',), ramp=0, hidden_mean=0, error_rate=1.0).run()
+        self.add_result("Failing upstream: 3 attempts with backoff, then give up",
+                        r['upstream_requests'] == 3 and r['retries'] == 2 and r['gave_up'] == 1,
+                        f"requests={r['upstream_requests']} retries={r['retries']} gave_up={r['gave_up']}")
+
+        results = capacity_sim.simulate(50, 900, alert_changes=(300,), error_rate=0)
+        direct, proxy = results['direct'], results['proxy']
+        self.add_result("Alert change forces one dashboard refresh per client",
+                        direct['forced_refreshes'] == 50 and proxy['forced_refreshes'] == 50,
+                        f"direct={direct['forced_refreshes']} proxy={proxy['forced_refreshes']}")
+        self.add_result("Shared proxy: far fewer upstream requests, high hit ratio, lower tail latency",
+                        proxy['upstream_requests'] * 20 < direct['upstream_requests']
+                        and proxy['cache_hit_ratio'] > 0.95 and direct['cache_hit_ratio'] < 0.2
+                        and proxy['p99'] < direct['p99'] and direct['upstream_rps_peak'] > 0,
+                        f"direct={direct['upstream_requests']} proxy={proxy['upstream_requests']} "
+                        f"hit={proxy['cache_hit_ratio']:.3f} p99 {direct['p99']:.2f}/{proxy['p99']:.2f}")
+
+        outage = capacity_sim.Simulation(20, 1200, 'proxy', error_rate=0, alert_changes=(),
+                                         outage=(400, 800, 'alerts')).run()
+        self.add_result("Proxy serves stale alerts through an upstream outage",
+                        outage['proxy'].get('stale', 0) > 0 and outage['gave_up'] == 0,
+                        f"proxy={outage['proxy']} gave_up={outage['gave_up']}")
+
+    def test_location_registry(self):
+        """Test the persistent location registry"""
+        print(f"\n{Colors.BLUE}Testing Location Registry...{Colors.RESET}")
+        import location_registry
+        import upstream
+
+        points_doc = {'properties': {
+            'cwa': 'RAH', 'gridId': 'RAH', 'gridX': 49, 'gridY': 69,
+            'forecastZone': 'https://api.weather.gov/zones/forecast/NCZ023',
+            'county': 'https://api.weather.gov/zones/county/NCC001',
+            'fireWeatherZone': 'https://api.weather.gov/zones/fire/NCZ023',
+            'timeZone': 'America/New_York', 'radarStation': 'KRAX',
+            'relativeLocation': {'properties': {'city': 'Mebane', 'state': 'NC'}}}}
+        routes = {'/points/36.1000,-79.3000': (200, points_doc, {}),
+                  '/points/40.0000,-140.0000': (404, {'title': 'Data Unavailable For Requested Point'}, {})}
+        with tempfile.TemporaryDirectory() as tmp, StandInServer(routes) as server:
+            path = os.path.join(tmp, 'locations.json')
+            now = [1_000_000.0]
+            registry = location_registry.LocationRegistry(path, upstream.Upstreams.local(server.url),
+                                                          clock=lambda: now[0])
+            loc = asyncio.run(registry.resolve(36.1, -79.3))
+            again = asyncio.run(registry.resolve(36.1, -79.3))
+            hourly = loc.upstreams().hourly_url()
+            self.add_result("Resolves /points to WFO, grid, zone and county once",
+                            loc.gridpoint == 'RAH/49,69' and loc.zone == 'NCZ023' and loc.county == 'NCC001'
+                            and again is loc and server.hits.get('/points/36.1000,-79.3000') == 1
+                            and hourly.endswith('/gridpoints/RAH/49,69/forecast/hourly'),
+                            f"{loc} hits={server.hits}")
+
+            with open(path) as f:
+                index = json.load(f)
+            reopened = location_registry.LocationRegistry(path, upstream.Upstreams.local(server.url),
+                                                          clock=lambda: now[0])
+            warm = asyncio.run(reopened.resolve(36.1, -79.3))
+            self.add_result("Index persists compact rows and serves a restart without fetching",
+                            index['columns'] == list(location_registry.COLUMNS) and len(index['rows']) == 1
+                            and warm.to_dict() == loc.to_dict() and reopened.fetches == 0,
+                            f"fetches={reopened.fetches}")
+
+            missing = asyncio.run(reopened.resolve_many([(40.0, -140.0), (36.1, -79.3)]))
+            retry = asyncio.run(reopened.resolve_many([(40.0, -140.0)]))
+            self.add_result("Points outside NWS coverage fail without being re-asked",
+                            isinstance(missing['40.0000,-140.0000'], upstream.UpstreamError)
+                            and isinstance(retry['40.0000,-140.0000'], upstream.UpstreamError)
+                            and missing['36.1000,-79.3000'].zone == 'NCZ023'
+                            and server.hits.get('/points/40.0000,-140.0000') == 1,
+                            f"hits={server.hits}")
+
+            now[0] += location_registry.DEFAULT_TTL + 1
+            server.routes['/points/36.1000,-79.3000'] = (503, {}, {})
+            stale = asyncio.run(reopened.resolve(36.1, -79.3))
+            server.routes['/points/36.1000,-79.3000'] = (200, points_doc, {})
+            refreshed = asyncio.run(reopened.resolve(36.1, -79.3, refresh=True))
+            self.add_result("Expired rows are re-resolved, and served stale if that fails",
+                            stale is warm and refreshed.resolved_at == now[0]
+                            and server.hits.get('/points/36.1000,-79.3000') == 3,
+                            f"hits={server.hits}")
+
+        calls, in_flight, peak = [], [0], [0]
+        inner = location_registry.synthetic_fetcher(0.005, calls)
+
+        async def counting(url, headers=None, timeout=12.0):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            try:
+                return await inner(url, headers, timeout)
+            finally:
+                in_flight[0] -= 1
+
+        points = location_registry.random_points(60)
+        batch = location_registry.LocationRegistry(fetcher=counting, concurrency=4)
+        results = asyncio.run(batch.resolve_many(points + points[:20]))
+        self.add_result("Batch resolution: one call per distinct point, concurrency capped",
+                        len(results) == 60 and len(calls) == 60 and peak[0] <= 4
+                        and all(isinstance(r, location_registry.Location) for r in results.values()),
+                        f"calls={len(calls)} peak={peak[0]}")
+
+        zone = batch.zones()[0]
+        in_zone = batch.for_code(zone)
+        county = in_zone[0].county
+        alert = {'properties': {'affectedZones': [f'https://api.weather.gov/zones/forecast/{zone}'],
+                                'geocode': {'UGC': [county]}}}
+        expected = {loc.key for loc in batch if loc.zone == zone or loc.county == county}
+        self.add_result("Reverse lookups: zone, county, WFO and alert -> locations",
+                        in_zone and all(loc.zone == zone for loc in in_zone)
+                        and {loc.key for loc in batch.for_alert(alert)} == expected
+                        and sum(len(batch.for_office(o)) for o in {loc.office for loc in batch}) == 60,
+                        f"zone={zone} {len(in_zone)} alert={len(expected)}")
+
+    def test_threat_map(self):
+        """Test the state-wide threat map batch job"""
+        print(f"\n{Colors.BLUE}Testing State-wide Threat Map...{Colors.RESET}")
+        import spc_outlook
+        import threat_map
+        import upstream
+        from dashboard_logic import SPC_RANK, summarize_alerts
+
+        forecast, counties = threat_map.synthetic_zones(100)
+        zones = threat_map.zones_from_geojson(forecast, counties)
+        base = 'https://api.weather.gov/zones'
+        alerts = [
+            {'properties': {'event': 'Winter Storm Warning', 'severity': 'Severe',
+                            'affectedZones': [f'{base}/forecast/NCZ001', f'{base}/forecast/NCZ002'],
+                            'geocode': {'UGC': ['NCZ001', 'NCZ002']}}},
+            {'properties': {'event': 'Tornado Warning', 'severity': 'Severe',
+                            'affectedZones': [f'{base}/county/NCC005'], 'geocode': {'UGC': ['NCC005']}}},
+            {'properties': {'event': 'Gale Warning', 'severity': 'Moderate',
+                            'affectedZones': [f'{base}/forecast/AMZ130'], 'geocode': {'UGC': ['AMZ130']}}}
+        ]
+        parts = threat_map.partition_alerts(alerts, zones)
+        self.add_result("Partition by affectedZones/UGC, county alerts reach their forecast zone",
+                        len(zones) == 100 and zones[2].aliases == ('NCC005',)
+                        and parts['NCZ001'] == [alerts[0]] and parts['NCZ002'] == [alerts[0]]
+                        and parts['NCZ003'] == [alerts[1]]
+                        and sum(len(p) for p in parts.values()) == 3,
+                        f"NCZ003 aliases={zones[2].aliases}")
+
+        state_alerts = threat_map.synthetic_state_alerts(120, 100, seed=3)
+        outlook = spc_outlook.SPCOutlook(spc_outlook.synthetic_outlook())
+        with threat_map.ThreatMapJob(zones, workers=0) as job:
+            inline = job.evaluate(state_alerts, outlook)
+        mismatches = []
+        for zone, row in zip(zones, inline.rows):
+            mine = [a for a in state_alerts if threat_map.alert_codes(a) & set(zone.codes)]
+            labels = [outlook.brute_force_risk(lon, lat) for lon, lat in zone.points]
+            best = max(labels, key=lambda label: SPC_RANK[label])
+            spc = None if best == 'NONE' else best
+            ref = summarize_alerts(mine, spc)
+            if (row[0], row[2], row[3], row[4], row[5], row[6]) != (
+                    zone.code, ref['threat']['level'], ref['winter']['status'], spc or '',
+                    int(ref['has_active_warnings']), len(mine)):
+                mismatches.append(zone.code)
+        self.add_result("Every zone matches the per-location dashboard logic",
+                        not mismatches and len(inline.rows) == 100 and len(inline.counts()) > 1,
+                        f"mismatches={mismatches[:5]} counts={inline.counts()}")
+
+        with threat_map.ThreatMapJob(zones, workers=2) as job:
+            pooled = job.evaluate(state_alerts, outlook)
+            again = job.evaluate(state_alerts, outlook)
+        self.add_result("Process pool gives identical rows; a warm cycle is well under a second",
+                        pooled.rows == inline.rows and again.timings['total'] < 1.0
+                        and inline.timings['total'] < 1.0,
+                        f"inline {inline.timings['total'] * 1000:.1f} ms, pool {again.timings['total'] * 1000:.1f} ms")
+
+        routes = {'/alerts/active': (200, {'features': state_alerts}, {}),
+                  '/products/outlook/day1otlk_cat.lyr.geojson': (200, spc_outlook.synthetic_outlook(), {})}
+        with StandInServer(routes) as server, \
+                threat_map.ThreatMapJob(zones, upstream.Upstreams.local(server.url), workers=0) as job:
+            live = asyncio.run(job.run_cycle())
+            server.routes['/products/outlook/day1otlk_cat.lyr.geojson'] = (500, {}, {})
+            no_spc = asyncio.run(job.run_cycle())
+            hits = dict(server.hits)
+            server.routes['/products/outlook/day1otlk_cat.lyr.geojson'] = (200, {'features': [None]}, {})
+            bad_spc = asyncio.run(job.run_cycle())
+        doc = live.to_dict()
+        self.add_result("One cycle = one alerts fetch + one SPC fetch, compact table out",
+                        hits == {'/alerts/active': 2, '/products/outlook/day1otlk_cat.lyr.geojson': 2}
+                        and live.rows == inline.rows and doc['columns'] == list(threat_map.COLUMNS)
+                        and len(doc['rows']) == 100 and live.format().splitlines()[0].startswith('zone'),
+                        f"hits={hits}")
+        self.add_result("SPC outage still yields alert-based levels",
+                        len(no_spc.rows) == 100 and all(row[4] == '' for row in no_spc.rows)
+                        and [row[3] for row in no_spc.rows] == [row[3] for row in live.rows],
+                        f"counts={no_spc.counts()}")
+        self.add_result("Malformed SPC outlook is treated like an outage",
+                        bad_spc.rows == no_spc.rows and bad_spc.outlook_issuance is None,
+                        f"counts={bad_spc.counts()}")
+
+        docs = {'forecast': forecast, 'county': counties}
+
+        async def zones_fetcher(url, headers=None, timeout=12.0):
+            return docs['county' if 'type=county' in url else 'forecast']
+
+        job = threat_map.ThreatMapJob(fetcher=zones_fetcher, workers=0)
+        loaded = asyncio.run(job.load_zones())
+        self.add_result("Zone outlines load from /zones GeoJSON with county aliases",
+                        [z.code for z in loaded] == [z.code for z in zones]
+                        and all(z.aliases for z in loaded),
+                        f"{len(loaded)} zones")
+
     def run_all_tests(self):
         """Run all test suites"""
         print(f"{Colors.CYAN}Starting automated test suite...{Colors.RESET}\n")
@@ -475,6 +2479,27 @@ class TestRunner:
         self.test_winter_weather()
         self.test_forecast_widget_resilience()
         self.test_error_handling()
+        self.test_aggregator()
+        self.test_consensus_engine()
+        self.test_gridpoint_decoder()
+        self.test_spc_outlook()
+        self.test_alert_matcher()
+        self.test_afd_summarizer()
+        self.test_http_cache()
+        self.test_retry_engine()
+        self.test_om_decoder()
+        self.test_instrumentation()
+        self.test_alert_stream()
+        self.test_radar_tiles()
+        self.test_radar_sprites()
+        self.test_forecast_store()
+        self.test_model_skill()
+        self.test_snapshot_publisher()
+        self.test_cassettes()
+        self.test_benchmarks()
+        self.test_capacity_sim()
+        self.test_location_registry()
+        self.test_threat_map()
     
     def print_summary(self):
         """Print test results summary"""
@@ -513,8 +2538,235 @@ class TestRunner:
             return 1
 
 
+# ── Benchmarks ───────────────────────────────────────────────────────────────
+
+BENCH_BASELINE = SCRIPT_DIR / 'bench_baseline.json'
+BENCH_THRESHOLD = 0.25      # fail when ops/sec drops (or peak memory grows) by more than this
+BENCH_MIN_TIME = 0.2        # seconds per timing round
+BENCH_ROUNDS = 5            # best round counts (least scheduler noise)
+BENCH_ALLOC_SLACK = 4096    # bytes of tracemalloc jitter ignored by the memory gate
+
+
+def bench_cases():
+    """(name, callable) for every mirrored hot path; payloads are built once, up front.
+
+    One call is one op. Sizes run from a single zone (a handful of alerts, one
+    point, one location) to state-wide (every NC alert, thousands of points).
+    """
+    import random
+    import afd_summarizer
+    import alert_matcher
+    import consensus
+    import gridpoint
+    import retry_engine
+    import spc_outlook
+    from dashboard_logic import spc_code_for_dn
+
+    risks = [None] + sorted(set(SPC_CODE_MAP.values()))
+    winter = [None, 'none', 'advisory', 'warning']
+    zone_feed = alert_matcher.synthetic_feed(5)
+    state_feed = alert_matcher.synthetic_feed(500)
+    state_events = [a['properties']['event'] for a in state_feed]
+    classifier = alert_matcher.WinterAlertClassifier()
+    rng = random.Random(0)
+    location = consensus.synthetic_location(7)
+    locations = [consensus.synthetic_location(7, seed=i) for i in range(10)]
+    engine = consensus.ConsensusEngine()
+    props = gridpoint.synthetic_properties(7)
+    geojson = spc_outlook.synthetic_outlook()
+    outlook = spc_outlook.SPCOutlook(geojson)
+    state_points = spc_outlook.random_nc_points(2000)
+    afd = afd_summarizer.synthetic_afd()
+
+    def threat_levels():
+        for warn in (False, True):
+            for risk in risks:
+                calculate_threat_level(warn, risk)
+
+    def threat_levels_winter():
+        for warn in (False, True):
+            for risk in risks:
+                for status in winter:
+                    calculate_threat_level_with_winter(warn, risk, status)
+
+    def spc_dn_mapping():
+        for dn in range(0, 10):
+            spc_code_for_dn(dn)
+
+    def winter_events():
+        for event in state_events:
+            is_winter_weather_alert(event)
+
+    def backoff():
+        for attempt in range(6):
+            retry_engine.backoff_delay(attempt, rng=rng)
+            retry_engine.retry_timeout(attempt)
+
+    def compile_location():
+        for date_str in location.dates:
+            consensus.compile_day(date_str, location.models, location.grid,
+                                  location.nws_hourly, location.et_off_min)
+
+    return [
+        ('calculate_threat_level[all inputs]', threat_levels),
+        ('calculate_threat_level_with_winter[all inputs]', threat_levels_winter),
+        ('spc_code_for_dn[DN 0-9]', spc_dn_mapping),
+        ('is_winter_weather_alert[500 events]', winter_events),
+        ('detect_winter_weather_from_alerts[zone 5]', lambda: detect_winter_weather_from_alerts(zone_feed)),
+        ('detect_winter_weather_from_alerts[state 500]', lambda: detect_winter_weather_from_alerts(state_feed)),
+        ('WinterAlertClassifier.detect[state 500]', lambda: classifier.detect(state_feed)),
+        ('backoff_delay+retry_timeout[attempts 0-5]', backoff),
+        ('compile_day[1 location x 7 days]', compile_location),
+        ('ConsensusEngine.run[10 locations x 7 days]', lambda: engine.run(locations)),
+        ('GridpointDecoder.grid_maps[7 days]', lambda: gridpoint.GridpointDecoder(props).grid_maps()),
+        ('SPCOutlook[parse+index]', lambda: spc_outlook.SPCOutlook(geojson)),
+        ('SPCOutlook.risk_at[1 point]', lambda: outlook.risk_at(-78.64, 35.78)),
+        ('SPCOutlook.risk_for_points[state 2000]', lambda: outlook.risk_for_points(state_points)),
+        ('AFDSummarizer.summarize_text[cold]',
+         lambda: afd_summarizer.AFDSummarizer().summarize_text(afd, office='RAH')),
+    ]
+
+
+def measure(fn, min_time=BENCH_MIN_TIME, rounds=BENCH_ROUNDS):
+    """ops/sec (best of rounds, loop count calibrated to min_time) and peak bytes per op"""
+    import gc
+    import tracemalloc
+    fn()  # warm caches and lazy imports outside the timed region
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time or loops >= 1 << 24:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / loops
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds - 1):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            best = min(best, (time.perf_counter() - t0) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        kept = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return {'ops_per_sec': 1.0 / best if best > 0 else float('inf'), 'loops': loops,
+            'peak_bytes': peak - start, 'retained_bytes': max(0, current - start)}
+
+
+def compare_to_baseline(results, baseline, threshold=BENCH_THRESHOLD):
+    """Regressions of results vs baseline results: [(name, reason)].
+
+    Cases missing from the baseline are new, not regressions.
+    """
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        floor = base['ops_per_sec'] * (1 - threshold)
+        if res['ops_per_sec'] < floor:
+            regressions.append((name, f"{res['ops_per_sec']:,.0f} ops/s < {floor:,.0f} "
+                                      f"(baseline {base['ops_per_sec']:,.0f}, -{threshold:.0%})"))
+        ceiling = base['peak_bytes'] * (1 + threshold) + BENCH_ALLOC_SLACK
+        if res['peak_bytes'] > ceiling:
+            regressions.append((name, f"peak {res['peak_bytes']:,} B > {ceiling:,.0f} B "
+                                      f"(baseline {base['peak_bytes']:,} B, +{threshold:.0%})"))
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('results', {})
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, results, threshold):
+    import platform
+    doc = {'version': 1, 'python': platform.python_version(), 'machine': platform.machine(),
+           'threshold': threshold, 'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+           'results': results}
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+def run_benchmarks(baseline_path=BENCH_BASELINE, threshold=BENCH_THRESHOLD, update=False,
+                   name_filter=None, min_time=BENCH_MIN_TIME, rounds=BENCH_ROUNDS,
+                   cases=None, out=sys.stdout):
+    """Time every hot path, compare against the stored baseline; returns an exit code.
+
+    With no baseline on disk (or update=True) the run records one and passes.
+    """
+    cases = bench_cases() if cases is None else cases
+    if name_filter:
+        cases = [(name, fn) for name, fn in cases if name_filter.lower() in name.lower()]
+    baseline = None if update else load_baseline(baseline_path)
+    results = {}
+    print(f"{Colors.CYAN}Running micro-benchmarks...{Colors.RESET}\n", file=out)
+    print(f"{'hot path':<48} {'ops/sec':>12} {'peak KiB':>9} {'vs base':>8}", file=out)
+    for name, fn in cases:
+        res = measure(fn, min_time, rounds)
+        results[name] = res
+        base = (baseline or {}).get(name)
+        change = f"{res['ops_per_sec'] / base['ops_per_sec'] - 1:+.0%}" if base else 'new'
+        print(f"{name:<48} {res['ops_per_sec']:>12,.1f} {res['peak_bytes'] / 1024:>9.1f} {change:>8}", file=out)
+    print(file=out)
+
+    if baseline is None:
+        if name_filter and not update:
+            # Never persist a partial run as the whole baseline
+            print(f"{Colors.YELLOW}No baseline at {baseline_path}; run without a filter to record one{Colors.RESET}",
+                  file=out)
+            return 0
+        merged = dict(load_baseline(baseline_path) or {}) if name_filter else {}
+        merged.update(results)
+        save_baseline(baseline_path, merged, threshold)
+        print(f"{Colors.YELLOW}Baseline recorded: {baseline_path}{Colors.RESET}", file=out)
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, threshold)
+    if regressions:
+        print(f"{Colors.RED}{Colors.BRIGHT}✗ {len(regressions)} hot path regression(s):{Colors.RESET}", file=out)
+        for name, reason in regressions:
+            print(f"  {Colors.RED}✗{Colors.RESET} {name}: {reason}", file=out)
+        print(file=out)
+        return 1
+    print(f"{Colors.GREEN}{Colors.BRIGHT}✓ No hot path regressed beyond {threshold:.0%}{Colors.RESET}\n", file=out)
+    return 0
+
+
 def main():
     """Main execution"""
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bench', action='store_true', help='run the micro-benchmarks instead of the tests')
+    parser.add_argument('--baseline', default=str(BENCH_BASELINE), help='baseline JSON path')
+    parser.add_argument('--update-baseline', action='store_true', help='record a fresh baseline')
+    parser.add_argument('--threshold', type=float, default=BENCH_THRESHOLD,
+                        help='allowed regression as a fraction (default %(default)s)')
+    parser.add_argument('--filter', help='only benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=BENCH_MIN_TIME, help='seconds per timing round')
+    args = parser.parse_args()
+    if args.bench:
+        sys.exit(run_benchmarks(args.baseline, args.threshold, args.update_baseline,
+                                args.filter, args.min_time))
+
     # Check if test file exists (informational)
     if not TEST_FILE.exists():
         print(f"{Colors.YELLOW}Note: Test file not found: {TEST_FILE}{Colors.RESET}")
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+
+"""
+Static Snapshot Publisher
+
+Every visitor's browser runs the whole pipeline before the first render:
+fetchAll(), unpackOM(), gMap(), compile(), classify(), the SPC lookup and AFD
+scoring. This publisher runs it server-side on a schedule and writes the
+result as static files a CDN or Weebly can serve:
+
+    <out>/<location>/<YYYY-MM-DD>.json     one day tab: compile() hours as
+                                           columns, alert/threat summary, AFD
+                                           highlights, source states
+    <out>/<location>/<YYYY-MM-DD>.json.gz  pre-compressed (gzip -9, mtime 0)
+    <out>/<location>/<YYYY-MM-DD>.json.br  brotli, when the module is installed
+    <out>/<location>/delta.json            changes since the previous publish
+    <out>/<location>/index.json            day tabs with content hashes
+
+A day file is the only download the widget needs to render a tab. Clients
+that already hold the previous version (index hashes) apply delta.json
+instead of refetching the day files.
+
+Every file is written to a temp file in the same directory and moved into
+place with os.replace(), variants before the plain file and the index last,
+so readers never see a partial file. Unchanged day files are not rewritten,
+which keeps CDN caches and mtimes stable.
+
+Usage:
+    python3 snapshot_publisher.py --out /srv/www/mw --interval 3600
+    python3 snapshot_publisher.py --out /tmp/mw --upstream http://127.0.0.1:9000 --once
+    python3 snapshot_publisher.py --bench
+"""
+
+import argparse
+import asyncio
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import aggregator
+import consensus
+import forecast_store
+import gridpoint
+import upstream
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are skipped without it
+    brotli = None
+
+PUBLISH_VERSION = 1
+DEFAULT_INTERVAL = 3600
+
+
+def et_offset_minutes(date_str):
+    """etOffset() for a day tab: Eastern UTC offset in minutes at local noon"""
+    day = datetime.date.fromisoformat(date_str)
+    noon = datetime.datetime(day.year, day.month, day.day, 12, tzinfo=aggregator.LOCAL_TZ)
+    return int(noon.utcoffset().total_seconds() // 60)
+
+
+def nws_hourly_map(periods):
+    """nwsHrly: NWS hourly periods keyed 'YYYY-MM-DD_H' by UTC start hour"""
+    out = {}
+    for period in periods or []:
+        try:
+            start = datetime.datetime.fromisoformat(str(period.get('startTime')))
+        except (AttributeError, ValueError):
+            continue
+        if start.tzinfo is None:
+            continue
+        start = start.astimezone(datetime.timezone.utc)
+        out.setdefault(consensus.grid_key(start.date().isoformat(), start.hour), period)
+    return out
+
+
+def compile_snapshot(snapshot):
+    """{date: compile_day() records} from an Aggregator snapshot"""
+    hourly = snapshot.get('open_meteo')
+    models = {model: consensus.unpack_om(hourly, model) for model in consensus.MODELS}
+    grid = gridpoint.GridpointDecoder(snapshot.get('gridpoint')).grid_maps()
+    nws_hourly = nws_hourly_map(snapshot.get('hourly'))
+    return {date_str: consensus.compile_day(date_str, models, grid, nws_hourly, et_offset_minutes(date_str))
+            for date_str in snapshot.get('dates') or []}
+
+
+def day_payload(location, date_str, recs, snapshot, afd=None):
+    """One day tab as a compact document: compile() fields as 24-long columns"""
+    fields = list(recs[0]) if recs else []
+    return {
+        'version': PUBLISH_VERSION,
+        'location': location,
+        'date': date_str,
+        'generated_at': int(snapshot.get('generated_at') or time.time()),
+        'ok': snapshot.get('ok', False),
+        'sources': {name: state.get('state') for name, state in (snapshot.get('sources') or {}).items()},
+        'summary': snapshot.get('summary'),
+        'afd': afd,
+        'hours': {field: [rec.get(field) for rec in recs] for field in fields}
+    }
+
+
+def encode(document):
+    return json.dumps(document, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def content_hash(body):
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+# ── Deltas ───────────────────────────────────────────────────────────────────
+
+def day_delta(old, new):
+    """Changes from one day document to the next: top-level keys and per-hour cells"""
+    change = {}
+    top = {k: v for k, v in new.items() if k != 'hours' and old.get(k) != v}
+    if top:
+        change['set'] = top
+    old_hours, new_hours = old.get('hours') or {}, new.get('hours') or {}
+    cells = {}
+    for field, values in new_hours.items():
+        before = old_hours.get(field)
+        if before is None or len(before) != len(values):
+            cells[field] = values
+            continue
+        diff = {str(i): v for i, (a, v) in enumerate(zip(before, values)) if a != v}
+        if diff:
+            cells[field] = diff
+    dropped = [f for f in old_hours if f not in new_hours]
+    if cells:
+        change['hours'] = cells
+    if dropped:
+        change['drop_fields'] = dropped
+    return change
+
+
+def apply_day_delta(old, change):
+    """Client side of day_delta() (used by tests and as the reference for the widget)"""
+    doc = dict(old, **change.get('set', {}))
+    hours = {f: list(v) for f, v in (old.get('hours') or {}).items() if f not in change.get('drop_fields', ())}
+    for field, cells in (change.get('hours') or {}).items():
+        if isinstance(cells, list):
+            hours[field] = list(cells)
+        else:
+            column = hours[field]
+            for i, v in cells.items():
+                column[int(i)] = v
+    doc['hours'] = hours
+    return doc
+
+
+# ── Writing ──────────────────────────────────────────────────────────────────
+
+def write_atomic(path, data):
+    """Write bytes to path via a temp file in the same directory and os.replace()"""
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp, 0o644)   # mkstemp creates 0600; static servers need to read it
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_variants(path, body):
+    """.gz (and .br) first, then the plain file; returns {suffix: bytes written}"""
+    sizes = {}
+    gz = gzip.compress(body, compresslevel=9, mtime=0)
+    write_atomic(path + '.gz', gz)
+    sizes['.gz'] = len(gz)
+    if brotli is not None:
+        br = brotli.compress(body, quality=11)
+        write_atomic(path + '.br', br)
+        sizes['.br'] = len(br)
+    write_atomic(path, body)
+    sizes[''] = len(body)
+    return sizes
+
+
+class SnapshotPublisher:
+    """Runs the widget pipeline for each location and publishes static day files"""
+
+    def __init__(self, out_dir, locations, afd=None, store=None, clock=time.time):
+        self.out_dir = out_dir
+        self.locations = dict(locations)   # key -> aggregator.Aggregator
+        self.afd = afd                     # optional afd_summarizer.AFDSummarizer
+        self.store = store                 # optional forecast_store.ForecastStore for run history
+        self.clock = clock
+        self.stats = {'published': 0, 'unchanged': 0, 'bytes': 0, 'runs': 0}
+
+    def _dir(self, key):
+        path = os.path.join(self.out_dir, forecast_store.location_dirname(key))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _read_index(self, directory):
+        try:
+            with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) and index.get('version') == PUBLISH_VERSION else {}
+
+    @staticmethod
+    def _read_day(directory, date_str):
+        try:
+            with open(os.path.join(directory, date_str + '.json'), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    async def _afd_for(self, agg):
+        if self.afd is None:
+            return None
+        summary = await self.afd.summarize_office(agg.upstreams.office)
+        return summary.to_dict() if summary is not None else None
+
+    async def publish_location(self, key):
+        agg = self.locations[key]
+        snapshot = await agg.snapshot()
+        days = compile_snapshot(snapshot)
+        afd = await self._afd_for(agg)
+        directory = self._dir(key)
+        previous = self._read_index(directory)
+        old_hashes = {d['date']: d['hash'] for d in previous.get('days', [])}
+        now = int(self.clock())
+
+        entries, delta = [], {}
+        for date_str, recs in days.items():
+            doc = day_payload(key, date_str, recs, snapshot, afd)
+            # generated_at alone must not make a day "changed"
+            stable = encode(dict(doc, generated_at=0))
+            digest = content_hash(stable)
+            entry = {'date': date_str, 'hash': digest, 'file': date_str + '.json'}
+            if old_hashes.get(date_str) == digest:
+                entry['generated_at'] = next(d.get('generated_at') for d in previous['days']
+                                             if d['date'] == date_str)
+                self.stats['unchanged'] += 1
+            else:
+                old_doc = self._read_day(directory, date_str) if date_str in old_hashes else None
+                if old_doc is not None:
+                    delta[date_str] = {'from': old_hashes[date_str], 'to': digest,
+                                       'change': day_delta(old_doc, doc)}
+                sizes = write_variants(os.path.join(directory, date_str + '.json'), encode(doc))
+                entry['generated_at'] = doc['generated_at']
+                entry['bytes'] = sizes
+                self.stats['published'] += 1
+                self.stats['bytes'] += sum(sizes.values())
+            entries.append(entry)
+
+        added = [e['date'] for e in entries if e['date'] not in old_hashes]
+        removed = [d for d in old_hashes if d not in days]
+        for date_str in removed:
+            for suffix in ('', '.gz', '.br'):
+                try:
+                    os.unlink(os.path.join(directory, date_str + '.json' + suffix))
+                except OSError:
+                    pass
+        delta_doc = {'version': PUBLISH_VERSION, 'location': key, 'from': previous.get('published_at'),
+                     'to': now, 'days': delta, 'added': added, 'removed': removed}
+        write_variants(os.path.join(directory, 'delta.json'), encode(delta_doc))
+        index = {'version': PUBLISH_VERSION, 'location': key, 'published_at': now, 'days': entries,
+                 'delta': 'delta.json'}
+        write_atomic(os.path.join(directory, 'index.json'), encode(index))
+
+        if self.store is not None and any(days.values()):
+            if self.store.append_run(key, now // 3600 * 3600, days):
+                self.stats['runs'] += 1
+        return index, delta_doc
+
+    async def publish(self):
+        """Publish every location; one failing location does not stop the others"""
+        results = await asyncio.gather(*(self.publish_location(key) for key in self.locations),
+                                       return_exceptions=True)
+        out = {}
+        for key, result in zip(self.locations, results):
+            if isinstance(result, Exception):
+                print(f"publish error for {key}: {result}", file=sys.stderr)
+                continue
+            out[key] = result
+        return out
+
+    async def run_forever(self, interval=DEFAULT_INTERVAL):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.publish()
+            except Exception as e:  # never let the schedule die
+                print(f"publish error: {e}", file=sys.stderr)
+            await asyncio.sleep(max(1.0, interval - (time.monotonic() - started)))
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_snapshot(days=7, seed=0, start='2026-06-01'):
+    """Aggregator-shaped snapshot from consensus/gridpoint synthetic payloads"""
+    loc = consensus.synthetic_location(days, seed=seed, start=start)
+    hourly = {'time': loc.models[consensus.MODELS[0]]['time']}
+    for model, series in loc.models.items():
+        for field, values in series.items():
+            if field != 'time':
+                hourly[field + '_' + model] = values
+    props = gridpoint.synthetic_properties(days, start + 'T00:00:00+00:00')
+    return {
+        'version': aggregator.SNAPSHOT_VERSION, 'generated_at': 1_780_000_000, 'dates': loc.dates, 'ok': True,
+        'sources': {name: {'state': 'live'} for name in aggregator.REFRESH_INTERVALS},
+        'open_meteo': hourly, 'gridpoint': props, 'hourly': [], 'alerts': [],
+        'summary': {'threat': 'LOW', 'has_active_warnings': False, 'spc_risk': 'TSTM', 'alert_count': 0}
+    }
+
+
+class _FixedAggregator:
+    """Stands in for an Aggregator with a prepared snapshot"""
+
+    def __init__(self, snapshot):
+        self.snapshot_doc = snapshot
+        self.upstreams = upstream.Upstreams()
+
+    async def snapshot(self):
+        return self.snapshot_doc
+
+
+def benchmark(days=7, out=sys.stdout):
+    """Bytes and work for a first render: raw upstream payloads vs one published day file"""
+    snapshot = synthetic_snapshot(days)
+    raw = json.dumps({k: snapshot[k] for k in ('open_meteo', 'gridpoint', 'hourly', 'alerts')}).encode('utf-8')
+    t0 = time.perf_counter()
+    compile_snapshot(snapshot)
+    pipeline = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as directory:
+        fake = _FixedAggregator(snapshot)
+        publisher = SnapshotPublisher(directory, {'mebane': fake})
+        t0 = time.perf_counter()
+        index, _ = asyncio.run(publisher.publish_location('mebane'))
+        publish = time.perf_counter() - t0
+        first = index['days'][0]
+        # Next hour: one model nudges one field for a few hours
+        fake.snapshot_doc = dict(snapshot, generated_at=snapshot['generated_at'] + 3600)
+        om = dict(snapshot['open_meteo'])
+        key = 'precipitation_probability_gfs_global'
+        om[key] = [(v or 0) + 7 if 30 <= i < 36 else v for i, v in enumerate(om[key])]
+        fake.snapshot_doc['open_meteo'] = om
+        _, delta = asyncio.run(publisher.publish_location('mebane'))
+        delta_bytes = len(encode(delta))
+        delta_gz = len(gzip.compress(encode(delta), 9, mtime=0))
+    gz_raw = len(gzip.compress(raw, 6))
+    print(f"first render, browser pipeline: {len(raw) / 1024:.0f} KiB upstream JSON ({gz_raw / 1024:.0f} KiB gzip) "
+          f"+ compile of {days} days ({pipeline * 1000:.0f} ms in CPython)", file=out)
+    print(f"first render, published: one day file {first['bytes'][''] / 1024:.1f} KiB "
+          f"({first['bytes']['.gz'] / 1024:.1f} KiB gzip"
+          + (f", {first['bytes']['.br'] / 1024:.1f} KiB brotli" if '.br' in first['bytes'] else ', brotli not installed')
+          + "), no client-side pipeline", file=out)
+    print(f"publish pass {publish * 1000:.0f} ms for {days} day files; next-hour delta {delta_bytes} B "
+          f"({delta_gz} B gzip) touching {len(delta['days'])} day(s)", file=out)
+
+
+async def _run(args):
+    upstreams = upstream.Upstreams.local(args.upstream) if args.upstream else upstream.Upstreams()
+    agg = aggregator.Aggregator(upstreams, days=args.days)
+    afd = None
+    if not args.no_afd:
+        import afd_summarizer
+        afd = afd_summarizer.AFDSummarizer(upstreams)
+    store = forecast_store.ForecastStore(args.history) if args.history else None
+    publisher = SnapshotPublisher(args.out, {args.location: agg}, afd=afd, store=store)
+    try:
+        if args.once:
+            await publisher.publish()
+            print(f"published {publisher.stats['published']} day file(s), "
+                  f"{publisher.stats['unchanged']} unchanged, to {args.out}")
+        else:
+            await publisher.run_forever(args.interval)
+    finally:
+        if store is not None:
+            store.close()
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Publish precompressed static widget snapshots')
+    parser.add_argument('--out', help='Output directory (served statically)')
+    parser.add_argument('--location', default='mebane')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument('--upstream', help='Send upstream requests to this base URL (stand-in server)')
+    parser.add_argument('--history', help='Also append each compiled run to this forecast_store root')
+    parser.add_argument('--no-afd', action='store_true', help='Skip AFD highlights')
+    parser.add_argument('--once', action='store_true')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    if not args.out:
+        parser.error('--out is required (or --bench)')
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""
+SPC Outlook Engine
+
+Answers "what is the SPC Day 1 categorical risk here?" for many points at
+once. fetchSPC() in the model widget ray-casts one hard-coded point against
+every ring of every feature in day1otlk_cat.lyr.geojson; the severe dashboard
+asks ArcGIS once per location.
+
+SPCOutlook parses the GeoJSON once per issuance, keeps every ring as flat
+coordinate arrays with a bounding box, and buckets rings into a uniform
+lat/lon grid. Grid cells that lie wholly inside a ring are marked as such, so
+most points resolve without any ray-casting; only cells crossed by a ring edge
+fall back to a ray-cast over the edges in that latitude band, highest risk
+first, stopping at the first hit. Batches are grouped by cell and edge-cell
+ray-casts are vectorized with NumPy when it is installed.
+
+Results use the same labels and ranking as fetchSPC() (NONE < TSTM < MRGL <
+SLGT < ENH < MDT < HIGH) and fall back to the DN -> code map that
+test_spc_mapping checks when a feature has no LABEL.
+
+Usage:
+    python3 spc_outlook.py --bench
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import sys
+import time
+
+from dashboard_logic import SPC_RANK, spc_code_for_dn
+
+try:
+    import numpy as np
+except ImportError:  # optional: edge-cell ray-casts fall back to per-point loops
+    np = None
+
+DEFAULT_CELL_DEG = 0.5
+
+
+def pip(lon, lat, xs, ys):
+    """Ray-casting point-in-polygon (same arithmetic as pip() in the widget)"""
+    inside = False
+    n = len(xs)
+    j = n - 1
+    for i in range(n):
+        xi, yi, xj, yj = xs[i], ys[i], xs[j], ys[j]
+        if ((yi > lat) != (yj > lat)) and (lon < (xj - xi) * (lat - yi) / (yj - yi) + xi):
+            inside = not inside
+        j = i
+    return inside
+
+
+def feature_label(feature):
+    """LABEL/label as fetchSPC() reads it, falling back to the DN code map"""
+    props = feature.get('properties') or {}
+    label = str(props.get('LABEL') or props.get('label') or '').upper().strip()
+    if not label:
+        dn = props.get('DN', props.get('dn'))
+        label = spc_code_for_dn(dn) or ''
+    return label
+
+
+def feature_rings(feature):
+    """All rings of a Polygon/MultiPolygon (holes included, like inFeature())"""
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') == 'Polygon':
+        return geometry.get('coordinates') or []
+    if geometry.get('type') == 'MultiPolygon':
+        return [ring for polygon in geometry.get('coordinates') or [] for ring in polygon]
+    return []
+
+
+def issuance_key(geojson):
+    """Identify an outlook issuance (ISSUE/VALID properties, else a content hash)"""
+    for feature in geojson.get('features') or []:
+        props = feature.get('properties') or {}
+        if props.get('ISSUE') or props.get('VALID'):
+            return f"{props.get('ISSUE')}/{props.get('VALID')}"
+    return hashlib.sha1(json.dumps(geojson, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class Ring:
+    """One polygon ring with its bbox, risk rank and edges bucketed by latitude band"""
+
+    __slots__ = ('label', 'rank', 'xs', 'ys', 'min_x', 'min_y', 'max_x', 'max_y',
+                 'band_deg', 'bands')
+
+    def __init__(self, label, coords, band_deg=DEFAULT_CELL_DEG):
+        self.label = label
+        self.rank = SPC_RANK[label]
+        self.xs = [float(c[0]) for c in coords]
+        self.ys = [float(c[1]) for c in coords]
+        self.min_x, self.max_x = min(self.xs), max(self.xs)
+        self.min_y, self.max_y = min(self.ys), max(self.ys)
+        # An edge can only flip the ray-cast when min(y) <= lat < max(y), so each
+        # latitude band only needs the edges whose y-range overlaps it
+        self.band_deg = band_deg
+        self.bands = {}
+        j = len(self.xs) - 1
+        for i in range(len(self.xs)):
+            edge = (self.xs[i], self.ys[i], self.xs[j], self.ys[j])
+            lo, hi = sorted((self.ys[i], self.ys[j]))
+            for band in range(math.floor(lo / band_deg), math.floor(hi / band_deg) + 1):
+                self.bands.setdefault(band, []).append(edge)
+            j = i
+
+    def covers(self, lon, lat):
+        return self.min_x <= lon <= self.max_x and self.min_y <= lat <= self.max_y
+
+    def contains(self, lon, lat):
+        """pip() over only the edges in this latitude band (same arithmetic, same result)"""
+        if not self.covers(lon, lat):
+            return False
+        inside = False
+        for xi, yi, xj, yj in self.bands.get(math.floor(lat / self.band_deg), ()):
+            if ((yi > lat) != (yj > lat)) and (lon < (xj - xi) * (lat - yi) / (yj - yi) + xi):
+                inside = not inside
+        return inside
+
+
+class SPCOutlook:
+    """Parsed categorical outlook with a uniform-grid spatial index"""
+
+    def __init__(self, geojson, cell_deg=DEFAULT_CELL_DEG):
+        self.issuance = issuance_key(geojson)
+        self.cell_deg = cell_deg
+        self.rings = []
+        for feature in geojson.get('features') or []:
+            label = feature_label(feature)
+            if label not in SPC_RANK or label == 'NONE':
+                continue  # fetchSPC() never promotes unknown labels
+            for coords in feature_rings(feature):
+                if len(coords) >= 3:
+                    self.rings.append(Ring(label, coords, cell_deg))
+        # Highest risk first: the first containing ring is the answer
+        self.rings.sort(key=lambda r: -r.rank)
+        # cell -> [(ring index, whole cell inside ring?)]. Cells that no ring edge
+        # touches are entirely inside or outside that ring, so they need no ray-cast.
+        self.cells = {}
+        for idx, ring in enumerate(self.rings):
+            boundary = set()
+            j = len(ring.xs) - 1
+            for i in range(len(ring.xs)):
+                boundary.update(self._cells_for_bbox(
+                    min(ring.xs[i], ring.xs[j]), min(ring.ys[i], ring.ys[j]),
+                    max(ring.xs[i], ring.xs[j]), max(ring.ys[i], ring.ys[j])))
+                j = i
+            for cell in self._cells_for_bbox(ring.min_x, ring.min_y, ring.max_x, ring.max_y):
+                if cell in boundary:
+                    self.cells.setdefault(cell, []).append((idx, False))
+                else:
+                    cx = (cell[0] + 0.5) * self.cell_deg
+                    cy = (cell[1] + 0.5) * self.cell_deg
+                    if pip(cx, cy, ring.xs, ring.ys):
+                        self.cells.setdefault(cell, []).append((idx, True))
+
+    def _cell(self, lon, lat):
+        return (math.floor(lon / self.cell_deg), math.floor(lat / self.cell_deg))
+
+    def _cells_for_bbox(self, min_x, min_y, max_x, max_y):
+        x0, y0 = self._cell(min_x, min_y)
+        x1, y1 = self._cell(max_x, max_y)
+        return ((cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1))
+
+    def risk_at(self, lon, lat):
+        """Highest risk label covering one point ('NONE' if outside every ring)"""
+        for idx, whole in self.cells.get(self._cell(lon, lat), ()):
+            ring = self.rings[idx]
+            if whole or ring.contains(lon, lat):
+                return ring.label
+        return 'NONE'
+
+    def risk_for_points(self, points):
+        """Risk label for every (lon, lat) point, in order.
+
+        Points are grouped by grid cell so each cell's candidate rings are
+        visited once per batch: whole-cell rings settle every remaining point
+        in the group at once, and edge cells ray-cast only the unresolved points
+        (vectorized with NumPy for large groups).
+        """
+        groups = {}
+        for i, (lon, lat) in enumerate(points):
+            groups.setdefault(self._cell(lon, lat), []).append(i)
+        labels = ['NONE'] * len(points)
+        for cell, members in groups.items():
+            pending = members
+            for idx, whole in self.cells.get(cell, ()):
+                ring = self.rings[idx]
+                if whole:
+                    hits, pending = pending, []
+                elif np is not None and len(pending) >= 512:
+                    hits, pending = self._contains_numpy(ring, points, pending)
+                else:
+                    hits = [i for i in pending if ring.contains(*points[i])]
+                    if hits:
+                        hit_set = set(hits)
+                        pending = [i for i in pending if i not in hit_set]
+                for i in hits:
+                    labels[i] = ring.label
+                if not pending:
+                    break
+        return labels
+
+    @staticmethod
+    def _contains_numpy(ring, points, members):
+        pts = np.asarray([points[i] for i in members], dtype=np.float64)
+        px, py = pts[:, 0], pts[:, 1]
+        inside = ((px >= ring.min_x) & (px <= ring.max_x)
+                  & (py >= ring.min_y) & (py <= ring.max_y))
+        candidates = np.nonzero(inside)[0]
+        flips = np.zeros(len(pts), dtype=bool)
+        bands = np.floor(py / ring.band_deg).astype(np.int64)
+        for band in np.unique(bands[candidates]).tolist():
+            sel = candidates[bands[candidates] == band]
+            bx, by = px[sel], py[sel]
+            acc = np.zeros(len(sel), dtype=bool)
+            for xi, yi, xj, yj in ring.bands.get(band, ()):
+                crosses = (yi > by) != (yj > by)
+                if crosses.any():
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        x_int = (xj - xi) * (by - yi) / (yj - yi) + xi
+                    acc ^= crosses & (bx < x_int)
+            flips[sel] = acc
+        hits = [members[k] for k in np.nonzero(inside & flips)[0].tolist()]
+        hit_set = set(hits)
+        return hits, [i for i in members if i not in hit_set]
+
+    def brute_force_risk(self, lon, lat):
+        """Unindexed fetchSPC()-style scan over every ring (reference/benchmark)"""
+        best = 'NONE'
+        for ring in self.rings:
+            if SPC_RANK[ring.label] > SPC_RANK[best] and pip(lon, lat, ring.xs, ring.ys):
+                best = ring.label
+        return best
+
+
+class OutlookCache:
+    """Parse each outlook issuance once; reuse it for every query until it changes"""
+
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.outlook = None
+        self.parses = 0
+
+    def load(self, geojson):
+        key = issuance_key(geojson)
+        if self.outlook is None or self.outlook.issuance != key:
+            self.outlook = SPCOutlook(geojson, self.cell_deg)
+            self.parses += 1
+        return self.outlook
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def synthetic_outlook(vertices=400, seed=0):
+    """Nested, wobbly risk polygons over the Southeast, shaped like a busy day"""
+    rng = random.Random(seed)
+    features = []
+    for dn, label, radius in ((2, 'TSTM', 9.0), (3, 'MRGL', 6.0), (4, 'SLGT', 4.0),
+                              (5, 'ENH', 2.5), (6, 'MDT', 1.2)):
+        ring = []
+        for k in range(vertices):
+            a = 2 * math.pi * k / vertices
+            r = radius * (0.95 + 0.1 * rng.random())
+            ring.append([-82.0 + r * math.cos(a), 35.0 + 0.7 * r * math.sin(a)])
+        ring.append(ring[0])
+        features.append({'type': 'Feature',
+                         'properties': {'DN': dn, 'LABEL': label, 'VALID': '202606011300', 'ISSUE': '202606011200'},
+                         'geometry': {'type': 'Polygon', 'coordinates': [ring]}})
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def random_nc_points(n, seed=1):
+    rng = random.Random(seed)
+    return [(rng.uniform(-84.3, -75.5), rng.uniform(33.8, 36.6)) for _ in range(n)]
+
+
+def benchmark(n_points=5000, out=sys.stdout):
+    geojson = synthetic_outlook()
+    points = random_nc_points(n_points)
+    t0 = time.perf_counter()
+    outlook = SPCOutlook(geojson)
+    t_parse = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    brute = [outlook.brute_force_risk(lon, lat) for lon, lat in points]
+    t_brute = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    indexed = [outlook.risk_at(lon, lat) for lon, lat in points]
+    t_index = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batched = outlook.risk_for_points(points)
+    t_batch = time.perf_counter() - t0
+    print(f"parse+index: {t_parse * 1000:.1f} ms ({len(outlook.rings)} rings, {len(outlook.cells)} cells)", file=out)
+    print(f"brute force: {t_brute * 1000:.1f} ms for {n_points} points", file=out)
+    print(f"indexed:     {t_index * 1000:.1f} ms", file=out)
+    print(f"batched:     {t_batch * 1000:.1f} ms ({'numpy' if np is not None else 'python'})", file=out)
+    print(f"agree: {brute == indexed == batched}", file=out)
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='Spatially indexed SPC outlook lookups')
+    parser.add_argument('--bench', action='store_true')
+    parser.add_argument('--points', type=int, default=5000)
+    parser.add_argument('--geojson', help='Outlook GeoJSON file to query')
+    parser.add_argument('--point', nargs=2, type=float, metavar=('LON', 'LAT'), action='append')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark(args.points)
+    elif args.geojson and args.point:
+        with open(args.geojson, encoding='utf-8') as f:
+            outlook = SPCOutlook(json.load(f))
+        for (lon, lat), label in zip(args.point, outlook.risk_for_points(args.point)):
+            print(f"{lon},{lat}\t{label}")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
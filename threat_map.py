@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+"""
+State-wide Threat Map
+
+The dashboard evaluates one location per page load: zone alerts (falling back
+to alerts/active?area=NC), an SPC point query, then
+calculate_threat_level_with_winter(). This batch job does the same for every
+forecast zone in the state from two fetches per cycle:
+
+- one alerts/active?area=NC and one Day 1 categorical outlook (GeoJSON),
+- alerts partitioned with a hash index on their UGC codes (geocode.UGC and
+  the last segment of each affectedZones URL); county-issued alerts reach a
+  forecast zone through the county that contains it,
+- SPC risk per zone is the highest risk over the zone's sample points
+  (centroid plus outline vertices), one batched spc_outlook lookup,
+- summarize_alerts() (WARNING/CAUTION/MONITOR/SAFE plus winter status) per
+  zone, evaluated in chunks on a persistent process pool,
+- one compact table: a column header and one row per zone.
+
+Zone outlines are static, so they are fetched once (forecast and county
+zones, /zones?include_geometry=true) or taken from a location_registry.
+
+Usage:
+    python3 threat_map.py                 # live NWS + SPC, one cycle
+    python3 threat_map.py --json --workers 0
+    python3 threat_map.py --bench
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import random
+import sys
+import time
+
+import upstream
+from alert_matcher import SAMPLE_EVENTS
+from dashboard_logic import SPC_RANK, summarize_alerts
+from spc_outlook import SPCOutlook, pip, synthetic_outlook
+
+COLUMNS = ('zone', 'name', 'threat', 'winter', 'spc', 'warning', 'alerts', 'headline')
+ZONES_TIMEOUT = 15.0
+SAMPLE_VERTICES = 8      # outline vertices per zone tested against the SPC outlook
+
+
+class Zone:
+    """One forecast zone: sample points for the SPC lookup and the other UGC codes that cover it"""
+
+    __slots__ = ('code', 'name', 'points', 'aliases')
+
+    def __init__(self, code, name, points, aliases=()):
+        self.code = code
+        self.name = name
+        self.points = list(points)      # [(lon, lat)]
+        self.aliases = tuple(aliases)   # county / fire zone codes
+
+    @property
+    def codes(self):
+        return (self.code,) + self.aliases
+
+
+def _outer_rings(geometry):
+    geometry = geometry or {}
+    if geometry.get('type') == 'Polygon':
+        return (geometry.get('coordinates') or [])[:1]
+    if geometry.get('type') == 'MultiPolygon':
+        return [polygon[0] for polygon in geometry.get('coordinates') or [] if polygon]
+    return []
+
+
+def sample_points(geometry, vertices=SAMPLE_VERTICES):
+    """Vertex-mean centroid of the largest outer ring plus evenly spaced outline vertices"""
+    rings = [r for r in _outer_rings(geometry) if len(r) >= 3]
+    if not rings:
+        return []
+    ring = max(rings, key=len)
+    n = len(ring) - 1 if ring[0] == ring[-1] else len(ring)
+    centroid = (sum(p[0] for p in ring[:n]) / n, sum(p[1] for p in ring[:n]) / n)
+    step = max(1, n // vertices)
+    return [centroid] + [tuple(ring[i][:2]) for i in range(0, n, step)][:vertices]
+
+
+def _zone_code(feature):
+    props = feature.get('properties') or {}
+    return props.get('id') or str(feature.get('id') or '').rstrip('/').rsplit('/', 1)[-1] or None
+
+
+def zones_from_geojson(forecast, counties=None):
+    """Zones from /zones?type=forecast GeoJSON; a county collection adds county aliases"""
+    county_rings = []
+    for feature in (counties or {}).get('features') or []:
+        code = _zone_code(feature)
+        for ring in _outer_rings(feature.get('geometry')):
+            if code and len(ring) >= 3:
+                county_rings.append((code, [p[0] for p in ring], [p[1] for p in ring]))
+    zones = []
+    for feature in (forecast or {}).get('features') or []:
+        code = _zone_code(feature)
+        points = sample_points(feature.get('geometry'))
+        if not code or not points:
+            continue
+        lon, lat = points[0]
+        aliases = [c for c, xs, ys in county_rings if pip(lon, lat, xs, ys)]
+        zones.append(Zone(code, (feature.get('properties') or {}).get('name') or '', points, aliases[:1]))
+    zones.sort(key=lambda z: z.code)
+    return zones
+
+
+def zones_from_registry(registry):
+    """Zones from a location_registry: registered points, with their counties and fire zones as aliases"""
+    by_zone = {}
+    for loc in registry:
+        zone = by_zone.setdefault(loc.zone, Zone(loc.zone, loc.city or '', [], ()))
+        zone.points.append((loc.lon, loc.lat))
+        zone.aliases = tuple(sorted(set(zone.aliases) | {c for c in (loc.county, loc.fire_zone)
+                                                        if c and c != loc.zone}))
+    return [by_zone[code] for code in sorted(by_zone)]
+
+
+def alert_codes(alert):
+    """UGC codes an alert feature names (geocode.UGC and affectedZones URLs)"""
+    props = alert.get('properties') if isinstance(alert, dict) else None
+    if not isinstance(props, dict):
+        return set()
+    codes = set((props.get('geocode') or {}).get('UGC') or ())
+    codes.update(url.rstrip('/').rsplit('/', 1)[-1] for url in props.get('affectedZones') or ()
+                 if isinstance(url, str) and url)
+    return codes
+
+
+def partition_alerts(alerts, zones):
+    """{zone code: [alert, ...]} via a code -> alert index hash; each alert once per zone"""
+    index = {}
+    for i, alert in enumerate(alerts):
+        for code in alert_codes(alert):
+            index.setdefault(code, []).append(i)
+    parts = {}
+    for zone in zones:
+        hits = set()
+        for code in zone.codes:
+            hits.update(index.get(code, ()))
+        parts[zone.code] = [alerts[i] for i in sorted(hits)]
+    return parts
+
+
+def zone_risks(outlook, zones):
+    """{zone code: highest SPC label or None}, one batched lookup for every sample point"""
+    points = [p for zone in zones for p in zone.points]
+    labels = outlook.risk_for_points(points) if outlook is not None else ['NONE'] * len(points)
+    risks, offset = {}, 0
+    for zone in zones:
+        best = 'NONE'
+        for label in labels[offset:offset + len(zone.points)]:
+            if SPC_RANK[label] > SPC_RANK[best]:
+                best = label
+        risks[zone.code] = None if best == 'NONE' else best
+        offset += len(zone.points)
+    return risks
+
+
+def _slim(alert):
+    """Only what the threat logic reads (keeps the process-pool payload small)"""
+    props = alert.get('properties') or {}
+    return {'properties': {'event': props.get('event'), 'severity': props.get('severity')}}
+
+
+def evaluate_chunk(chunk):
+    """Rows for [(code, name, spc, [alert, ...]), ...]; runs in a pool worker"""
+    rows = []
+    for code, name, spc, alerts in chunk:
+        summary = summarize_alerts(alerts, spc)
+        display = summary['display_alerts']
+        rows.append((code, name, summary['threat']['level'], summary['winter']['status'], spc or '',
+                     int(summary['has_active_warnings']), len(alerts), display[0] if display else ''))
+    return rows
+
+
+class ThreatTable:
+    """One cycle's result: COLUMNS plus one row per zone"""
+
+    def __init__(self, rows, generated, timings, alert_count, outlook_issuance=None):
+        self.rows = rows
+        self.generated = generated
+        self.timings = timings
+        self.alert_count = alert_count
+        self.outlook_issuance = outlook_issuance
+
+    def counts(self):
+        counts = {}
+        for row in self.rows:
+            counts[row[2]] = counts.get(row[2], 0) + 1
+        return counts
+
+    def to_dict(self):
+        return {'generated': self.generated, 'alerts': self.alert_count, 'outlook': self.outlook_issuance,
+                'columns': list(COLUMNS), 'rows': [list(row) for row in self.rows]}
+
+    def format(self):
+        widths = [max(len(str(v)) for v in [name] + [row[i] for row in self.rows])
+                  for i, name in enumerate(COLUMNS)]
+        lines = ['  '.join(str(name).ljust(w) for name, w in zip(COLUMNS, widths))]
+        lines += ['  '.join(str(v).ljust(w) for v, w in zip(row, widths)) for row in self.rows]
+        return '\n'.join(line.rstrip() for line in lines)
+
+
+class ThreatMapJob:
+    """Two fetches per cycle, threat level and winter status for every zone"""
+
+    def __init__(self, zones=None, upstreams=None, fetcher=None, workers=None, clock=time.time):
+        self.upstreams = upstreams or upstream.Upstreams()
+        self.fetcher = fetcher or upstream.fetch_json
+        self.zones = zones
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers
+        self.clock = clock
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None and self.workers > 0:
+            # Kept across cycles: worker start-up would otherwise dominate a ~100-zone cycle
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def load_zones(self):
+        """Forecast + county zone outlines for the state, once"""
+        if self.zones is None:
+            forecast, counties = await asyncio.gather(
+                self.fetcher(self.upstreams.zones_url('forecast'), upstream.NWS_HEADERS, ZONES_TIMEOUT),
+                self.fetcher(self.upstreams.zones_url('county'), upstream.NWS_HEADERS, ZONES_TIMEOUT))
+            self.zones = zones_from_geojson(forecast, counties)
+        return self.zones
+
+    async def fetch(self):
+        """(state-wide alert features, parsed SPC outlook or None); SPC failure is not fatal"""
+        alerts_doc, spc_doc = await asyncio.gather(
+            self.fetcher(self.upstreams.alerts_url(area=self.upstreams.state), upstream.NWS_HEADERS,
+                         upstream.TIMEOUTS['alerts']),
+            self.fetcher(self.upstreams.spc_outlook_url(), None, upstream.TIMEOUTS['spc']),
+            return_exceptions=True)
+        if isinstance(alerts_doc, BaseException):
+            raise alerts_doc
+        features = alerts_doc.get('features') if isinstance(alerts_doc, dict) else None
+        if not isinstance(features, list):
+            raise upstream.UpstreamError(self.upstreams.alerts_url(area=self.upstreams.state),
+                                         'Invalid statewide alert response structure')
+        try:
+            outlook = SPCOutlook(spc_doc) if isinstance(spc_doc, dict) else None
+        except (AttributeError, TypeError, ValueError):  # malformed GeoJSON: same as an outage
+            outlook = None
+        return features, outlook
+
+    def evaluate(self, alerts, outlook, zones=None):
+        """ThreatTable for already fetched data (rows in zone order)"""
+        zones = self.zones if zones is None else zones
+        timings = {}
+        t0 = time.perf_counter()
+        parts = partition_alerts(alerts, zones)
+        t1 = time.perf_counter()
+        risks = zone_risks(outlook, zones)
+        t2 = time.perf_counter()
+        work = [(z.code, z.name, risks[z.code], [_slim(a) for a in parts[z.code]]) for z in zones]
+        pool = self._executor()
+        if pool is None:
+            rows = evaluate_chunk(work)
+        else:
+            size = max(1, -(-len(work) // (self.workers * 2)))
+            chunks = [work[i:i + size] for i in range(0, len(work), size)]
+            rows = [row for part in pool.map(evaluate_chunk, chunks) for row in part]
+        t3 = time.perf_counter()
+        timings.update(partition=t1 - t0, spc=t2 - t1, evaluate=t3 - t2, total=t3 - t0)
+        return ThreatTable(rows, self.clock(), timings, len(alerts),
+                           outlook.issuance if outlook is not None else None)
+
+    async def run_cycle(self):
+        """Fetch once, evaluate every zone"""
+        await self.load_zones()
+        t0 = time.perf_counter()
+        alerts, outlook = await self.fetch()
+        fetched = time.perf_counter() - t0
+        table = self.evaluate(alerts, outlook)
+        table.timings['fetch'] = fetched
+        return table
+
+
+# ── Benchmark ────────────────────────────────────────────────────────────────
+
+def _rect(x0, y0, w, h, steps=6):
+    edge = [(x0 + w * i / steps, y0) for i in range(steps)]
+    edge += [(x0 + w, y0 + h * i / steps) for i in range(steps)]
+    edge += [(x0 + w - w * i / steps, y0 + h) for i in range(steps)]
+    edge += [(x0, y0 + h - h * i / steps) for i in range(steps)]
+    return [[round(x, 4), round(y, 4)] for x, y in edge] + [[round(x0, 4), round(y0, 4)]]
+
+
+def synthetic_zones(n=100, west=-84.3, south=33.8, width=0.88, height=0.28):
+    """(forecast, county) zone GeoJSON tiling NC in a 10-column grid; county NCC(2i+1) contains zone i+1"""
+    cols = 10
+    forecast, counties = [], []
+    for i in range(n):
+        x0, y0 = west + (i % cols) * width, south + (i // cols) * height
+        forecast.append({'id': f'https://api.weather.gov/zones/forecast/NCZ{i + 1:03d}',
+                         'properties': {'id': f'NCZ{i + 1:03d}', 'name': f'Zone {i + 1}'},
+                         'geometry': {'type': 'Polygon', 'coordinates': [_rect(x0, y0, width, height)]}})
+        counties.append({'properties': {'id': f'NCC{2 * i + 1:03d}', 'name': f'County {i + 1}'},
+                         'geometry': {'type': 'Polygon', 'coordinates': [_rect(x0, y0, width, height, 2)]}})
+    return ({'type': 'FeatureCollection', 'features': forecast},
+            {'type': 'FeatureCollection', 'features': counties})
+
+
+def synthetic_state_alerts(n=500, zones=100, seed=0):
+    """alerts/active?area=NC shaped features: forecast-zone and county-issued, 1-8 zones each"""
+    rng = random.Random(seed)
+    events = SAMPLE_EVENTS + ['Tornado Warning', 'Flash Flood Warning']
+    features = []
+    for i in range(n):
+        picked = rng.sample(range(1, zones + 1), rng.randint(1, 8))
+        county = rng.random() < 0.3
+        codes = [f'NCC{2 * z - 1:03d}' if county else f'NCZ{z:03d}' for z in picked]
+        kind = 'county' if county else 'forecast'
+        features.append({'id': f'urn:oid:{i}', 'properties': {
+            'event': rng.choice(events), 'severity': rng.choice(['Minor', 'Moderate', 'Severe']),
+            'affectedZones': [f'https://api.weather.gov/zones/{kind}/{c}' for c in codes],
+            'geocode': {'UGC': codes}}})
+    return features
+
+
+def benchmark(n_zones=100, n_alerts=80, cycles=5, out=sys.stdout):
+    """Per-cycle evaluation time for every zone, inline vs the process pool"""
+    forecast, counties = synthetic_zones(n_zones)
+    zones = zones_from_geojson(forecast, counties)
+    alerts = synthetic_state_alerts(n_alerts, n_zones)
+    outlook = SPCOutlook(synthetic_outlook())
+    print(f"{len(zones)} zones, {len(alerts)} state-wide alerts", file=out)
+    tables = {}
+    for label, workers in (('inline', 0), ('process pool x4', 4)):
+        with ThreatMapJob(zones, workers=workers) as job:
+            t0 = time.perf_counter()
+            job.evaluate(alerts, outlook)   # first cycle starts the pool
+            first = time.perf_counter() - t0
+            best = float('inf')
+            for _ in range(cycles):
+                table = job.evaluate(alerts, outlook)
+                best = min(best, table.timings['total'])
+            tables[label] = table
+            print(f"{label:<16} first {first * 1000:7.1f} ms, steady {best * 1000:6.1f} ms "
+                  f"(partition {table.timings['partition'] * 1000:.1f}, spc {table.timings['spc'] * 1000:.1f}, "
+                  f"evaluate {table.timings['evaluate'] * 1000:.1f})", file=out)
+    same = tables['inline'].rows == tables['process pool x4'].rows
+    print(f"threat counts: {tables['inline'].counts()}  (pool rows identical: {same})", file=out)
+    return tables
+
+
+def main():
+    """Main execution"""
+    parser = argparse.ArgumentParser(description='State-wide threat level for every forecast zone')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='process pool size (0 = inline; about as fast at ~100 zones)')
+    parser.add_argument('--registry', help='location_registry index to take zones from')
+    parser.add_argument('--json', action='store_true', help='print the compact JSON table')
+    parser.add_argument('--bench', action='store_true')
+    args = parser.parse_args()
+    if args.bench:
+        benchmark()
+        return
+    zones = None
+    if args.registry:
+        import location_registry
+        zones = zones_from_registry(location_registry.LocationRegistry(args.registry))
+    with ThreatMapJob(zones, workers=args.workers) as job:
+        table = asyncio.run(job.run_cycle())
+    if args.json:
+        print(json.dumps(table.to_dict(), separators=(',', ':')))
+    else:
+        print(table.format())
+        print(f"\n{len(table.rows)} zones, {table.alert_count} alerts: {table.counts()}; "
+              f"fetch {table.timings['fetch'] * 1000:.0f} ms, evaluate {table.timings['total'] * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+"""
+Upstream Endpoints and Fetch Helpers
+
+Location config and URL builders for every upstream the widgets call
+(Open-Meteo, NWS, SPC, RainViewer), plus a small asyncio fetch helper.
+Uses only the standard library: blocking urllib calls run in worker threads.
+
+Base URLs can be pointed at a local stand-in server for tests.
+"""
+
+import asyncio
+import http.client
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Location config (mirror of LAT/LON and LOCATION_CONFIG in the widgets)
+LAT, LON = 36.1, -79.3
+GRIDPOINT = 'RAH/49,69'
+NWS_ZONE = 'NCZ023'
+STATE_CODE = 'NC'
+NWS_OFFICE = 'RAH'
+
+OM_HOURLY = ('temperature_2m,dewpoint_2m,relativehumidity_2m,precipitation_probability,'
+             'precipitation,weathercode,cloudcover,windspeed_10m,windgusts_10m,cape,lifted_index')
+OM_PARAMS = ('&hourly=' + OM_HOURLY + '&wind_speed_unit=mph&precipitation_unit=inch'
+             '&temperature_unit=fahrenheit&timezone=America/New_York')
+OM_MODELS = ('gfs_global', 'ecmwf_ifs025', 'icon_seamless', 'gfs_hrrr')
+
+# Browsers cannot set User-Agent; server-side we must identify ourselves to NWS
+NWS_HEADERS = {
+    'Accept': 'application/geo+json',
+    'User-Agent': '(MebaneWeather.com dashboard proxy)'
+}
+
+DEFAULT_BASES = {
+    'open_meteo': 'https://api.open-meteo.com',
+    'nws': 'https://api.weather.gov',
+    'spc': 'https://www.spc.noaa.gov',
+    'spc_map': 'https://mapservices.weather.noaa.gov',
+    'rainviewer': 'https://api.rainviewer.com',
+    'nws_wms': 'https://opengeo.ncep.noaa.gov'
+}
+
+# Per-endpoint timeouts in seconds (fetchAll / fetchJSON values)
+TIMEOUTS = {
+    'open_meteo': 15.0,
+    'gridpoint': 12.0,
+    'hourly': 12.0,
+    'alerts': 8.0,
+    'spc': 10.0,
+    'afd': 10.0,
+    'rainviewer': 8.0
+}
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream request fails (network, timeout, HTTP or JSON error)"""
+
+    def __init__(self, url, message, status=None):
+        super().__init__(f"{message}: {url}")
+        self.url = url
+        self.status = status
+
+
+class Response:
+    """Raw upstream response"""
+
+    __slots__ = ('url', 'status', 'headers', 'body', 'elapsed')
+
+    def __init__(self, url, status, headers, body, elapsed):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def json(self):
+        """Parse the body as JSON (raises UpstreamError on empty or invalid JSON)"""
+        if not self.body or not self.body.strip():
+            raise UpstreamError(self.url, 'Empty response received', self.status)
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise UpstreamError(self.url, f'JSON parse error: {e}', self.status)
+
+
+class Upstreams:
+    """URL builders for every upstream, with overridable base URLs"""
+
+    def __init__(self, bases=None, lat=LAT, lon=LON, gridpoint=GRIDPOINT,
+                 zone=NWS_ZONE, state=STATE_CODE, office=NWS_OFFICE):
+        self.bases = dict(DEFAULT_BASES)
+        self.bases.update(bases or {})
+        self.lat = lat
+        self.lon = lon
+        self.gridpoint = gridpoint
+        self.zone = zone
+        self.state = state
+        self.office = office
+
+    @classmethod
+    def local(cls, base_url, **kwargs):
+        """Point every upstream at one stand-in server (paths are preserved)"""
+        return cls({name: base_url.rstrip('/') for name in DEFAULT_BASES}, **kwargs)
+
+    def open_meteo(self, start_date, end_date, models=OM_MODELS):
+        # No _t= cycle buster: caching is the point of running server-side
+        return (self.bases['open_meteo'] + '/v1/forecast?latitude=' + str(self.lat)
+                + '&longitude=' + str(self.lon) + OM_PARAMS
+                + '&models=' + ','.join(models)
+                + '&start_date=' + start_date + '&end_date=' + end_date)
+
+    def gridpoint_url(self):
+        return self.bases['nws'] + '/gridpoints/' + self.gridpoint
+
+    def hourly_url(self):
+        return self.gridpoint_url() + '/forecast/hourly'
+
+    def alerts_url(self, zone=None, area=None):
+        if area:
+            return self.bases['nws'] + '/alerts/active?area=' + area
+        return self.bases['nws'] + '/alerts/active?zone=' + (zone or self.zone)
+
+    def points_url(self, lat, lon):
+        return self.bases['nws'] + '/points/' + f'{lat:.4f},{lon:.4f}'
+
+    def afd_index_url(self, office=None):
+        return self.bases['nws'] + '/products/types/AFD/locations/' + (office or self.office) + '?limit=1'
+
+    def afd_locations_url(self):
+        """Every office that issues an AFD"""
+        return self.bases['nws'] + '/products/types/AFD/locations'
+
+    def product_url(self, product_id):
+        return self.bases['nws'] + '/products/' + product_id
+
+    def observations_url(self, station, start=None):
+        url = self.bases['nws'] + '/stations/' + station + '/observations'
+        return url + '?start=' + urllib.parse.quote(start) if start else url
+
+    def zones_url(self, zone_type='forecast', area=None):
+        return (self.bases['nws'] + '/zones?type=' + zone_type + '&area=' + (area or self.state)
+                + '&include_geometry=true')
+
+    def spc_outlook_url(self):
+        return self.bases['spc'] + '/products/outlook/day1otlk_cat.lyr.geojson'
+
+    def spc_query_url(self, lat=None, lon=None):
+        params = urllib.parse.urlencode({
+            'f': 'json',
+            'geometry': f'{self.lon if lon is None else lon},{self.lat if lat is None else lat}',
+            'geometryType': 'esriGeometryPoint',
+            'spatialRel': 'esriSpatialRelIntersects',
+            'outFields': 'dn,valid,expire',
+            'returnGeometry': 'false'
+        })
+        return (self.bases['spc_map']
+                + '/vector/rest/services/outlooks/SPC_wx_outlks/MapServer/1/query?' + params)
+
+    def rainviewer_maps_url(self):
+        return self.bases['rainviewer'] + '/public/weather-maps.json'
+
+    def host_of(self, url):
+        """Host name of a URL, used for per-host bookkeeping"""
+        return urllib.parse.urlsplit(url).netloc
+
+
+def _blocking_fetch(url, headers, timeout):
+    request = urllib.request.Request(url, headers=headers or {})
+    started = time.monotonic()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            body = resp.read()
+            return Response(url, resp.status, dict(resp.headers.items()), body,
+                            time.monotonic() - started)
+    except urllib.error.HTTPError as e:
+        # Non-2xx (including 304) still carries useful status and headers
+        try:
+            body = e.read() if e.fp else b''
+        except (http.client.HTTPException, OSError):
+            body = b''
+        return Response(url, e.code, dict(e.headers.items()) if e.headers else {}, body,
+                        time.monotonic() - started)
+    except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as e:
+        reason = getattr(e, 'reason', e)
+        raise UpstreamError(url, f'Network error: {reason}')
+
+
+async def fetch(url, headers=None, timeout=12.0):
+    """Fetch a URL without blocking the event loop; returns a Response"""
+    try:
+        return await asyncio.wait_for(
+            asyncio.to_thread(_blocking_fetch, url, headers, timeout), timeout)
+    except asyncio.TimeoutError:
+        raise UpstreamError(url, f'Request timeout after {int(timeout * 1000)}ms')
+
+
+async def fetch_json(url, headers=None, timeout=12.0):
+    """Fetch and parse JSON; raises UpstreamError on any failure (like fetchJSON)"""
+    resp = await fetch(url, headers, timeout)
+    if not resp.ok:
+        raise UpstreamError(url, f'HTTP {resp.status}', resp.status)
+    return resp.json()
+
+
+async def safe_fetch_json(url, headers=None, timeout=12.0):
+    """Like safeFetch(): returns None on any error instead of raising"""
+    try:
+        data = await fetch_json(url, headers, timeout)
+    except UpstreamError:
+        return None
+    if isinstance(data, dict) and data.get('error') is True:
+        return None
+    return data